@@ -0,0 +1,110 @@
+'''
+Redis IPFIX Template Store
+This module provides an implementation of the interface:
+"ports.repositories.ipfix.TemplateStorePort"
+Templates shared by the collector pods. One hash of "<version>|<definition>" values (empty
+definition: withdrawn) and one sorted set of its fields scored by their version: the
+changes since a generation are one ZRANGEBYSCORE. Writes are Lua scripts (the generation
+counter, hash and sorted set updated atomically, in one round trip).
+'''
+import os
+
+from config.config import TEMPLATE_STORE_URL
+from ports.repositories.ipfix import TemplateStorePort, TemplateChange
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+KEY_PREFIX = "ipyfix:templates"
+
+# KEYS: generation, templates, versions; ARGV: field, definition
+_PUT = """
+local version = redis.call('INCR', KEYS[1])
+redis.call('HSET', KEYS[2], ARGV[1], version .. '|' .. ARGV[2])
+redis.call('ZADD', KEYS[3], version, ARGV[1])
+return version
+"""
+# KEYS: generation, templates, versions; ARGV: field prefix of the session
+_WITHDRAW_SESSION = """
+local version = redis.call('INCR', KEYS[1])
+local fields = redis.call('HGETALL', KEYS[2])
+for i = 1, #fields, 2 do
+    local field, value = fields[i], fields[i + 1]
+    -- Live templates only (a withdrawn one has nothing after its version)
+    if string.sub(field, 1, string.len(ARGV[1])) == ARGV[1] and string.find(value, '|', 1, true) < #value then
+        redis.call('HSET', KEYS[2], field, version .. '|')
+        redis.call('ZADD', KEYS[3], version, field)
+    end
+end
+return version
+"""
+
+
+def _field(exporter: str, domain: int, template_id: int) -> str:
+    return f"{exporter}|{domain}|{template_id}"
+
+
+def _change(field: bytes, value: bytes | None) -> TemplateChange | None:
+    if value is None:
+        return None
+    exporter, domain, template_id = field.decode().rsplit("|", 2)
+    version, definition = value.split(b"|", 1)
+    return exporter, int(domain), int(template_id), int(version), definition or None
+
+
+class redis_templates(TemplateStorePort):
+    """
+    Template store of one Redis database (thread safe: pooled connections).
+    """
+    def __init__(self, url: str = TEMPLATE_STORE_URL, prefix: str = KEY_PREFIX, client=None) -> None:
+        if client is None and redis is None:
+            raise ValueError("Redis template store requires redis")
+        self._client = client or redis.Redis.from_url(url)
+        self._keys = [f"{prefix}:generation", f"{prefix}:definitions", f"{prefix}:versions"]
+        self._put = self._client.register_script(_PUT)
+        self._withdraw_session = self._client.register_script(_WITHDRAW_SESSION)
+
+    def put(self, exporter: str, domain: int, template_id: int, definition: bytes) -> int:
+        return int(self._put(keys=self._keys, args=[_field(exporter, domain, template_id), definition]))
+
+    def withdraw(self, exporter: str, domain: int, template_id: int | None = None) -> int:
+        if template_id is None:
+            return int(self._withdraw_session(keys=self._keys, args=[f"{exporter}|{domain}|"]))
+        return int(self._put(keys=self._keys, args=[_field(exporter, domain, template_id), b""]))
+
+    def get(self, exporter: str, domain: int, template_id: int) -> tuple[int, bytes] | None:
+        field = _field(exporter, domain, template_id)
+        change = _change(field.encode(), self._client.hget(self._keys[1], field))
+        return (change[3], change[4]) if change and change[4] is not None else None
+
+    def changes(self, since: int) -> tuple[int, list[TemplateChange]]:
+        fields = self._client.zrangebyscore(self._keys[2], f"({since}", "+inf")
+        if not fields:
+            return since, []
+        changes = [change for change in map(_change, fields, self._client.hmget(self._keys[1], fields)) if change]
+        changes.sort(key=lambda change: change[3])
+        return (changes[-1][3] if changes else since), changes
+
+    def load(self) -> tuple[int, list[TemplateChange]]:
+        # Generation read first: templates written meanwhile are loaded and listed again as changes
+        generation = int(self._client.get(self._keys[0]) or 0)
+        changes = [_change(field, value) for field, value in self._client.hgetall(self._keys[1]).items()]
+        return generation, [change for change in changes if change[4] is not None]
+
+
+_stores: dict[str, redis_templates] = {}
+_stores_pid: int | None = None
+
+
+def redis_template_store(url: str = TEMPLATE_STORE_URL) -> redis_templates:
+    """Per-process store of a Redis URL (connection pools do not survive fork())"""
+    global _stores_pid
+    if _stores_pid != os.getpid():
+        _stores.clear()
+        _stores_pid = os.getpid()
+    store = _stores.get(url)
+    if store is None:
+        store = _stores.setdefault(url, redis_templates(url))
+    return store
@@ -0,0 +1,128 @@
+'''
+SQLite Time Series Rollups Store
+This module provides an implementation of the interface:
+"ports.repositories.sql.RollupStorePort"
+Buckets are rows of a WITHOUT ROWID table clustered on (tenant, tier, scope, data source,
+bucket start): the buckets of a dashboard (one scope, one tier, a time range) are one
+contiguous range of the B-tree, read in one pass. WAL journal: readers (every web worker)
+never wait for the writer (the worker holding the lock file).
+'''
+import os
+import fcntl
+import sqlite3
+import threading
+
+import numpy as np
+
+from config.config import ROLLUP_DB_PATH
+from ports.repositories.sql import RollupStorePort
+
+SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS rollups (
+        tenant TEXT NOT NULL, tier INTEGER NOT NULL, scope TEXT NOT NULL, data_source TEXT NOT NULL,
+        ts INTEGER NOT NULL, sum REAL NOT NULL, count INTEGER NOT NULL, max REAL NOT NULL, p95 REAL NOT NULL,
+        PRIMARY KEY (tenant, tier, scope, data_source, ts)
+    ) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS rollup_watermarks (
+        tenant TEXT NOT NULL, tier INTEGER NOT NULL, watermark INTEGER NOT NULL,
+        PRIMARY KEY (tenant, tier)
+    ) WITHOUT ROWID""",
+)
+
+
+class sqlite_rollups(RollupStorePort):
+    """
+    Rollups store of one SQLite file, one connection per thread.
+    """
+    def __init__(self, path: str = ROLLUP_DB_PATH) -> None:
+        self._path = path
+        self._local = threading.local()
+        self._lock_fd: int | None = None
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as connection:
+            for statement in SCHEMA:
+                connection.execute(statement)
+
+    @property
+    def path(self) -> str:
+        return self._path
+    @path.setter
+    def path(self, value: str) -> None:
+        pass
+    @path.deleter
+    def path(self) -> None:
+        pass
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self._path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def write(self, tenant: str, tier: int, rollups: dict[str, dict[str, dict]], watermark: int) -> int:
+        rows = [
+            (tenant, tier, scope, name, ts, total, count, maximum, p95)
+            for scope, columns in rollups.items()
+            for name, buckets in columns.items()
+            for ts, total, count, maximum, p95 in zip(
+                buckets["ts"].tolist(), buckets["sum"].tolist(), buckets["count"].tolist(),
+                buckets["max"].tolist(), buckets["p95"].tolist())
+        ]
+        with self._connection() as connection:
+            connection.executemany("INSERT OR REPLACE INTO rollups VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            connection.execute("INSERT OR REPLACE INTO rollup_watermarks VALUES (?, ?, ?)", (tenant, tier, watermark))
+        return len(rows)
+
+    def read(self, tenant: str, tier: int, scope: str, start: int, end: int) -> dict[str, dict]:
+        rows = self._connection().execute(
+            "SELECT data_source, ts, sum, count, max, p95 FROM rollups "
+            "WHERE tenant = ? AND tier = ? AND scope = ? AND ts >= ? AND ts < ? ORDER BY data_source, ts",
+            (tenant, tier, scope, start, end)).fetchall()
+        if not rows:
+            return {}
+        names = [row[0] for row in rows]
+        values = np.array([row[1:] for row in rows], dtype=np.float64)
+        # Rows ordered by data source: one slice per data source
+        bounds = [0] + [i for i in range(1, len(names)) if names[i] != names[i - 1]] + [len(names)]
+        return {names[low]: {"ts": values[low:high, 0].astype(np.int64), "sum": values[low:high, 1],
+                             "count": values[low:high, 2].astype(np.int64), "max": values[low:high, 3],
+                             "p95": values[low:high, 4]}
+                for low, high in zip(bounds[:-1], bounds[1:])}
+
+    def watermark(self, tenant: str, tier: int) -> int | None:
+        row = self._connection().execute(
+            "SELECT watermark FROM rollup_watermarks WHERE tenant = ? AND tier = ?", (tenant, tier)).fetchone()
+        return row[0] if row else None
+
+    def lock(self) -> bool:
+        if self._lock_fd is None:
+            fd = os.open(f"{self._path}.lock", os.O_CREAT | os.O_RDWR, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                return False
+            # Held until this process exits
+            self._lock_fd = fd
+        return True
+
+
+_stores: dict[str, sqlite_rollups] = {}
+_stores_pid: int | None = None
+
+
+def rollup_store(path: str = ROLLUP_DB_PATH) -> sqlite_rollups:
+    """Per-process store of a database file (SQLite connections do not survive fork())"""
+    global _stores_pid
+    if _stores_pid != os.getpid():
+        _stores.clear()
+        _stores_pid = os.getpid()
+    store = _stores.get(path)
+    if store is None:
+        store = _stores.setdefault(path, sqlite_rollups(path))
+    return store
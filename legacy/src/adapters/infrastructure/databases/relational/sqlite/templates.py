@@ -0,0 +1,123 @@
+'''
+SQLite IPFIX Template Store
+This module provides an implementation of the interface:
+"ports.repositories.ipfix.TemplateStorePort"
+Templates shared by the collector processes of a host. Versions are the generation of the
+store (max version + 1, taken in an immediate transaction): withdrawn templates stay as
+tombstones (NULL definition) so that their withdrawal is one of the changes since a generation.
+'''
+import os
+import sqlite3
+import threading
+
+from config.config import TEMPLATE_STORE_PATH
+from ports.repositories.ipfix import TemplateStorePort, TemplateChange
+
+SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS ipfix_templates (
+        exporter TEXT NOT NULL, domain INTEGER NOT NULL, template_id INTEGER NOT NULL,
+        version INTEGER NOT NULL, definition BLOB,
+        PRIMARY KEY (exporter, domain, template_id)
+    ) WITHOUT ROWID""",
+    "CREATE INDEX IF NOT EXISTS ipfix_templates_version ON ipfix_templates (version)",
+)
+
+
+class sqlite_templates(TemplateStorePort):
+    """
+    Template store of one SQLite file, one connection per thread.
+    """
+    def __init__(self, path: str = TEMPLATE_STORE_PATH) -> None:
+        self._path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as connection:
+            for statement in SCHEMA:
+                connection.execute(statement)
+
+    @property
+    def path(self) -> str:
+        return self._path
+    @path.setter
+    def path(self, value: str) -> None:
+        pass
+    @path.deleter
+    def path(self) -> None:
+        pass
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self._path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    @staticmethod
+    def _next_version(connection: sqlite3.Connection) -> int:
+        # Write lock taken before the generation is read: versions are unique and ordered
+        connection.execute("BEGIN IMMEDIATE")
+        return connection.execute("SELECT COALESCE(MAX(version), 0) + 1 FROM ipfix_templates").fetchone()[0]
+
+    def put(self, exporter: str, domain: int, template_id: int, definition: bytes) -> int:
+        connection = self._connection()
+        with connection:
+            version = self._next_version(connection)
+            connection.execute("INSERT OR REPLACE INTO ipfix_templates VALUES (?, ?, ?, ?, ?)",
+                               (exporter, domain, template_id, version, definition))
+        return version
+
+    def withdraw(self, exporter: str, domain: int, template_id: int | None = None) -> int:
+        connection = self._connection()
+        with connection:
+            version = self._next_version(connection)
+            if template_id is None:
+                connection.execute(
+                    "UPDATE ipfix_templates SET version = ?, definition = NULL "
+                    "WHERE exporter = ? AND domain = ? AND definition IS NOT NULL", (version, exporter, domain))
+            else:
+                connection.execute("INSERT OR REPLACE INTO ipfix_templates VALUES (?, ?, ?, ?, NULL)",
+                                   (exporter, domain, template_id, version))
+        return version
+
+    def get(self, exporter: str, domain: int, template_id: int) -> tuple[int, bytes] | None:
+        row = self._connection().execute(
+            "SELECT version, definition FROM ipfix_templates WHERE exporter = ? AND domain = ? AND template_id = ?",
+            (exporter, domain, template_id)).fetchone()
+        return row if row and row[1] is not None else None
+
+    def changes(self, since: int) -> tuple[int, list[TemplateChange]]:
+        rows = self._connection().execute(
+            "SELECT exporter, domain, template_id, version, definition FROM ipfix_templates "
+            "WHERE version > ? ORDER BY version", (since,)).fetchall()
+        return (rows[-1][3] if rows else since), rows
+
+    def load(self) -> tuple[int, list[TemplateChange]]:
+        connection = self._connection()
+        # One read transaction: the generation of exactly these rows
+        with connection:
+            connection.execute("BEGIN")
+            generation = connection.execute("SELECT COALESCE(MAX(version), 0) FROM ipfix_templates").fetchone()[0]
+            rows = connection.execute(
+                "SELECT exporter, domain, template_id, version, definition FROM ipfix_templates "
+                "WHERE definition IS NOT NULL").fetchall()
+        return generation, rows
+
+
+_stores: dict[str, sqlite_templates] = {}
+_stores_pid: int | None = None
+
+
+def template_store(path: str = TEMPLATE_STORE_PATH) -> sqlite_templates:
+    """Per-process store of a database file (SQLite connections do not survive fork())"""
+    global _stores_pid
+    if _stores_pid != os.getpid():
+        _stores.clear()
+        _stores_pid = os.getpid()
+    store = _stores.get(path)
+    if store is None:
+        store = _stores.setdefault(path, sqlite_templates(path))
+    return store
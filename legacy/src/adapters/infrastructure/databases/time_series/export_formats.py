@@ -0,0 +1,116 @@
+'''
+Time Series Export Formats
+Incremental encoders used by the time series exports: rows are encoded chunk by chunk
+(one fetched time window at a time), so an export never holds more than a window.
+Every format has the same columns: measurement (UUID), timestamp, then one column per
+data source (the union of the exported measurements' data sources, empty/null when
+unknown or missing).
+'''
+import io
+import math
+import json
+
+import numpy as np
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Parquet rows buffered per row group
+PARQUET_ROW_GROUP = 65536
+
+
+def _take(sink: io.BytesIO) -> bytes:
+    data = sink.getvalue()
+    sink.seek(0)
+    sink.truncate()
+    return data
+
+
+class csv_encoder:
+    def begin(self, data_sources: list[str]) -> bytes:
+        self._width = len(data_sources)
+        header = ["measurement", "timestamp", *data_sources]
+        return (",".join(f'"{name}"' if "," in name or '"' in name else name for name in header) + "\n").encode()
+
+    def rows(self, measurement: str, timestamps: np.ndarray, values: np.ndarray) -> bytes:
+        return _format_rows(f"{measurement.replace('%', '%%')},%d", [","] * self._width, "", timestamps, values, "")
+
+    def end(self) -> bytes:
+        return b""
+
+
+class ndjson_encoder:
+    def begin(self, data_sources: list[str]) -> bytes:
+        self._names = [json.dumps(name).replace("%", "%%") for name in data_sources]
+        return b""
+
+    def rows(self, measurement: str, timestamps: np.ndarray, values: np.ndarray) -> bytes:
+        prefix = '{"measurement":' + json.dumps(measurement).replace("%", "%%") + ',"timestamp":%d'
+        return _format_rows(prefix, [f",{name}:" for name in self._names], "}", timestamps, values, "null")
+
+    def end(self) -> bytes:
+        return b""
+
+
+class parquet_encoder:
+    def __init__(self) -> None:
+        if pyarrow is None:
+            raise ValueError("Parquet exports require pyarrow")
+
+    def begin(self, data_sources: list[str]) -> bytes:
+        self._names = ["measurement", "timestamp", *data_sources]
+        self._schema = pyarrow.schema(
+            [pyarrow.field("measurement", pyarrow.string()), pyarrow.field("timestamp", pyarrow.int64())]
+            + [pyarrow.field(name, pyarrow.float64()) for name in data_sources])
+        self._sink = io.BytesIO()
+        self._writer = pyarrow.parquet.ParquetWriter(self._sink, self._schema)
+        self._pending, self._pending_rows = [], 0
+        return _take(self._sink)
+
+    def rows(self, measurement: str, timestamps: np.ndarray, values: np.ndarray) -> bytes:
+        self._pending.append(pyarrow.record_batch(
+            [pyarrow.array(np.full(len(timestamps), measurement, dtype=object), pyarrow.string()), timestamps]
+            + [pyarrow.array(values[:, i], from_pandas=True) for i in range(values.shape[1])], schema=self._schema))
+        self._pending_rows += len(timestamps)
+        return self._flush() if self._pending_rows >= PARQUET_ROW_GROUP else b""
+
+    def end(self) -> bytes:
+        data = self._flush()
+        self._writer.close()
+        return data + _take(self._sink)
+
+    def _flush(self) -> bytes:
+        if self._pending:
+            self._writer.write_table(pyarrow.Table.from_batches(self._pending, self._schema))
+            self._pending, self._pending_rows = [], 0
+        return _take(self._sink)
+
+
+def _format_rows(prefix: str, cells: list[str], suffix: str, timestamps: np.ndarray, values: np.ndarray,
+                 missing: str) -> bytes:
+    """One line per row: prefix (formatting the timestamp), each value after its cell
+    text, suffix. NaN and infinities (no CSV/JSON number) are written as missing: rows
+    holding one are formatted value by value, the others in one format operation"""
+    number = prefix + "".join(cell + "%.15g" for cell in cells) + suffix + "\n"
+    text = prefix + "".join(cell + "%s" for cell in cells) + suffix + "\n"
+    finite = np.isfinite(values).all(axis=1).tolist()
+    lines = []
+    for timestamp, row, row_finite in zip(timestamps.tolist(), values.tolist(), finite):
+        if row_finite:
+            lines.append(number % (timestamp, *row))
+        else:
+            lines.append(text % (timestamp, *(f"{value:.15g}" if math.isfinite(value) else missing for value in row)))
+    return "".join(lines).encode()
+
+
+EXPORT_FORMATS = {"csv": csv_encoder, "ndjson": ndjson_encoder, "parquet": parquet_encoder}
+
+
+def export_encoder(output_type: str):
+    """New encoder for an output type ('csv', 'ndjson' or 'parquet')"""
+    if output_type not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {output_type}. Supported formats are {', '.join(EXPORT_FORMATS)}.")
+    return EXPORT_FORMATS[output_type]()
@@ -5,14 +5,20 @@ This module provides an implementation of the interface:
 Data-Access implementation for local and S3 storage.
 https://oss.oetiker.ch/rrdtool/doc/rrdtool.en.html
 '''
-import re
-from typing import Any
-from aiofile import AIOFile, LineReader
-from aiopath import AsyncPath
+import time
+import asyncio
+from typing import Any, AsyncIterator
 
+import numpy as np
 import rrdtool
 
+from config.config import RRD_EXPORT_WINDOW_ROWS, RRD_UPDATE_ON_FULL, RRD_S3_TENANT_PREFIX
 from ports.repositories.time_series import DbPort
+from ..export_formats import export_encoder
+from .meta_index import meta_index
+from .rrd_info import info_cache, rrd_threads
+from .s3_cache import s3_cache, s3_index
+from .update_buffer import update_buffer
 
 
 ## Without core management service and tenant features.
@@ -34,6 +40,8 @@ class rrdb:
             raise rrdb_error("path_or_id_not_set")
         self._rrd_local_instance = None
         self._rrd_ts_service_instance_uuid = None
+        self._measurements = []
+        self._instance_version = None
     @property
     def tenant_path(self) -> str:
         return self._path
@@ -62,149 +70,231 @@ class rrdb:
     def service_instance(self) -> None:
         pass
     async def fill_instance_infos(self) -> bool:
-        async for entry in AsyncPath(self.tenant_path).iterdir():
-            if await entry.is_dir():
-                async with AIOFile(f"{entry}/rrd_meta", 'r') as f:
-                    async for line in LineReader(f):
-                        if ":" in line and self._ts_uuid == line.split(":")[1].strip():
-                            self._rrd_local_instance = f"{entry}/"
-                            self._rrd_ts_service_instance_uuid = self._ts_uuid
-                            break
-            if self._rrd_local_instance:
-                break
-        if self._rrd_local_instance:
+        # Indexed by service UUID once per process, see meta_index
+        instance = await meta_index(self.tenant_path).lookup(self._ts_uuid)
+        if instance:
+            self._rrd_local_instance = instance["instance_dir"]
+            self._rrd_ts_service_instance_uuid = self._ts_uuid
+            self._measurements = instance["measurements"]
+            self._instance_version = instance.get("mtime_ns", instance.get("etag"))
             return True
+    def select_measurements(self, uuids: list[str] | None = None, tags: list[str] | None = None) -> list[dict]:
+        """Measurements of the instance among `uuids` (all by default) matching every tag filter:
+        "HTTPS" matches a tag, "server_ip:10.1.96.15" a field value of the rrd_meta line"""
+        selected = []
+        for measurement in self._measurements:
+            if uuids and measurement["uuid"] not in uuids:
+                continue
+            for tag in tags or []:
+                name, separator, value = tag.partition(":")
+                if (str(measurement["fields"].get(name)) != value) if separator else (tag not in measurement["tags"]):
+                    break
+            else:
+                selected.append(measurement)
+        return selected
+    async def rrd_paths(self, measurements: list[dict]) -> list[str]:
+        """Readable RRD files of measurements of the instance"""
+        return [f"{self.local_instance}{measurement['rrd_id']}.rrd" for measurement in measurements]
+
+def _fetch_rrd(path: str, cf: str, start: int, end: int, resolution: int | None) -> dict:
+    """rrdtool.fetch() as NumPy arrays: one float64 column per data source (NaN = unknown)"""
+    args = ["--start", str(start) if start else "end-1d", "--end", str(end) if end else "now"]
+    if resolution:
+        args += ["--resolution", str(resolution)]
+    (first, last, step), names, rows = rrdtool.fetch(path, cf, *args)
+    values = np.array(rows, dtype=np.float64).reshape(len(rows), len(names))
+    return {
+        "start": first, "end": last, "step": step,
+        # Each row is labeled with the end of its step (as in the rrdtool fetch output)
+        "timestamps": first + step * np.arange(1, len(rows) + 1, dtype=np.int64),
+        "columns": {name: values[:, i] for i, name in enumerate(names)},
+    }
+
 
 class rrdb_local(DbPort, rrdb):
     """
     Class for interacting with a local RRDTool database (read/write mode).
     This class implements the DbPort interface (port) for local storage
     """
+    backend = "rrdtool-local-file-system"
 
     async def info(self, options: Any = None) -> dict:
+        """
+        Instance and measurements details. "version" changes whenever the rrd_meta file or
+        any RRD header changes (cache key of anything derived from this info).
+        """
         if not await self.fill_instance_infos():
             return None
 
-        measurements_list = []
         ts_instance_info = {
             "tenant_uuid": service_tenant_uuid,
             "ts_uuid": self.service_instance,
-            "ts_backend": "rrdtool-local-file-system",
+            "ts_backend": self.backend,
             "measurements_list": [],
             "measurements": [],
+            "version": (self.backend, self._instance_version),
         }
 
-        async with AIOFile(f"{self.local_instance}rrd_meta", 'r') as f:
-            async for line in LineReader(f):
-                if not line.startswith("service_uuid"):
-                    measurements_list.append(line.strip())
-        if not measurements_list:
+        if not self._measurements:
             return ts_instance_info
 
-        for measurement in measurements_list:
-            uuid = measurement.split(",")[1].split(":")[1]
-            ts_instance_info["measurements_list"].append(uuid)
-            measurement_data = {}
-            measurement_data = {
-                "uuid": uuid,
-                "tags": [],
-                "fields": {},
-                "data_sources_info": [],
-            }
-            for entry in measurement.split(","):
-                if ":" in entry:
-                    if not re.match(r"^.*_(id|uuid)", entry):
-                        key, value = entry.split(":")
-                        measurement_data["fields"][key] = value
-                else:
-                    measurement_data["tags"].append(entry)
-
-            for key, value in rrdtool.info(
-                f"{self.local_instance}{measurement.split(',')[0].split(':')[1]}.rrd").items():
-                ds_name = re.match(r"^ds\[(?P<ds_name>.*)\].index$", key)
-                rra_info = re.match(r"^rra\[(?P<rra_index>\d+)\].cf$", key)
-                if ds_name and value == 0:
-                    ds_index = value
-                    measurement_data["data_sources_info"].append(())
-                    measurement_data["data_sources_info"][ds_index] += (ds_name.group("ds_name"),)
-                elif ds_name and value != 0:
-                    ds_index = value
-                    measurement_data["data_sources_info"].append(())
-                    measurement_data["data_sources_info"][ds_index] += (ds_name.group("ds_name"),)
-                elif re.match(r"^ds\[.*\].type$", key):
-                    measurement_data["data_sources_info"][ds_index] += (value,)
-                elif re.match(r"^ds\[.*\].minimal_heartbeat$", key):
-                    measurement_data["data_sources_info"][ds_index] += (value,)
-                elif rra_info and rra_info.group("rra_index") == "0":
-                    rra_index = ds_index + 1
-                    measurement_data["data_sources_info"].append(())
-                    measurement_data["data_sources_info"][rra_index] += (value,)
-                elif rra_info and rra_info.group("rra_index") != "0":
-                    rra_index = ds_index + 1
-                    measurement_data["data_sources_info"].append(())
-                    measurement_data["data_sources_info"][rra_index] += (value,)
-                elif re.match(r"^rra\[\d+\].pdp_per_row$", key):
-                    measurement_data["data_sources_info"][rra_index] += (value,)
-                elif re.match(r"^rra\[\d+\].rows$", key):
-                    measurement_data["data_sources_info"][rra_index] += (value,)
-                elif re.match(r"^rra\[\d+\].cur_row$", key):
-                    measurement_data["data_sources_info"][rra_index] += (value,)
-                elif re.match(r"^rra\[\d+\].xff$", key):
-                    measurement_data["data_sources_info"][rra_index] += (value,)
-
-            ts_instance_info["measurements"].append(measurement_data)
+        # Parsed RRD headers (cached), read concurrently off the event loop
+        keyed = await info_cache().get_many_keyed(await self.rrd_paths(self._measurements))
+        ts_instance_info["version"] += tuple(key for key, _ in keyed)
+        for measurement, (_, data_sources_info) in zip(self._measurements, keyed):
+            ts_instance_info["measurements_list"].append(measurement["uuid"])
+            ts_instance_info["measurements"].append({
+                "uuid": measurement["uuid"],
+                "tags": list(measurement["tags"]),
+                "fields": dict(measurement["fields"]),
+                "data_sources_info": list(data_sources_info),
+            })
         return ts_instance_info
 
     def create(self, options) -> bool:
         if not self.path:
             raise rrdb_error("path_not_set")
 
-    def update(self, data) -> bool:
-        if not self.path:
-            raise rrdb_error("path_not_set")
+    async def update(self, data: Any) -> bool:
+        """
+        Queue samples on the write-behind buffer (written by its flush thread, see update_buffer).
+        data: one sample or a list of samples {"measurement": UUID, "timestamp": epoch,
+        "values": {data source: value}}. False if the instance does not exist or any sample
+        was dropped (unknown measurement, buffer full, too old).
+        """
+        if not await self.fill_instance_infos():
+            return False
+        buffer = update_buffer()
+        paths = {m["uuid"]: f"{self.local_instance}{m['rrd_id']}.rrd" for m in self._measurements}
+        accepted = True
+        for sample in [data] if isinstance(data, dict) else data:
+            path = paths.get(sample["measurement"])
+            if path is None:
+                accepted = False
+            elif RRD_UPDATE_ON_FULL == "block" and buffer.full():
+                # Back-pressure: wait for room off the event loop
+                accepted &= await asyncio.to_thread(buffer.add, path, sample["timestamp"], sample["values"], True)
+            else:
+                accepted &= buffer.add(path, sample["timestamp"], sample["values"])
+        return accepted
 
-    def fetch(self, start: int, end: int, options):
-        if not self.path:
-            raise rrdb_error("path_not_set")
+    async def fetch(self, start: int, end: int, options: Any = None) -> dict:
+        """
+        Fetch measurements concurrently (one rrdtool.fetch per RRD file, in the thread pool).
+        options: "measurements" (UUIDs, all by default), "tags" (filters, see select_measurements),
+        "cf" (AVERAGE), "resolution" (seconds).
+        Returns {measurement UUID: {"start", "end", "step", "timestamps", "columns"}}, None if
+        the instance does not exist.
+        """
+        if not await self.fill_instance_infos():
+            return None
+        options = options or {}
+        measurements = self.select_measurements(options.get("measurements"), options.get("tags"))
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(*(
+            loop.run_in_executor(rrd_threads(), _fetch_rrd, path, options.get("cf", "AVERAGE"), start, end,
+                                 options.get("resolution"))
+            for path in await self.rrd_paths(measurements)))
+        return {measurement["uuid"]: result for measurement, result in zip(measurements, results)}
 
-    def export(self, start: int, end: int, options, output_type):
-        if not self.path:
-            raise rrdb_error("path_not_set")
+    async def export(self, start: int, end: int, options: Any = None, output_type: str = "csv") -> Any:
+        """
+        Export measurements as 'csv', 'ndjson' or 'parquet', streamed in time windows of
+        RRD_EXPORT_WINDOW_ROWS rows (memory is bounded whatever the time range).
+        options: "measurements" (UUIDs, all by default), "tags" (filters, see select_measurements),
+        "cf" (AVERAGE), "resolution" (seconds), "path" (write the export to this file).
+        Returns the path when "path" is set, an async iterator of encoded chunks otherwise,
+        None if the instance does not exist.
+        """
+        encoder = export_encoder(output_type)
+        if not await self.fill_instance_infos():
+            return None
+        options = options or {}
+        measurements = self.select_measurements(options.get("measurements"), options.get("tags"))
+        end = int(end) if end else int(time.time())
+        start = int(start) if start else end - 86400
+        cf = options.get("cf", "AVERAGE")
+        paths = await self.rrd_paths(measurements)
+        # One tiny fetch per file: the archive (step) read for the whole range is the one
+        # covering its start, every window is then read from that archive (--resolution step)
+        loop = asyncio.get_running_loop()
+        probes = await asyncio.gather(*(
+            loop.run_in_executor(rrd_threads(), _fetch_rrd, path, cf, start, start + 1, options.get("resolution"))
+            for path in paths))
+        names = list(dict.fromkeys(name for probe in probes for name in probe["columns"]))
+        chunks = self._export_chunks(encoder, measurements, paths, [probe["step"] for probe in probes],
+                                     names, start, end, cf)
+        if not options.get("path"):
+            return chunks
+        with open(options["path"], "wb") as f:
+            async for chunk in chunks:
+                await asyncio.to_thread(f.write, chunk)
+        return options["path"]
+
+    async def _export_chunks(self, encoder, measurements: list[dict], paths: list[str], steps: list[int],
+                             names: list[str], start: int, end: int, cf: str) -> AsyncIterator[bytes]:
+        loop = asyncio.get_running_loop()
+        columns = {name: i for i, name in enumerate(names)}
+        yield encoder.begin(names)
+        for measurement, path, step in zip(measurements, paths, steps):
+            windows = [(cursor, min(end, cursor + step * RRD_EXPORT_WINDOW_ROWS))
+                       for cursor in range(start, end, step * RRD_EXPORT_WINDOW_ROWS)]
+            # The next window is read while the current one is encoded
+            pending = loop.run_in_executor(rrd_threads(), _fetch_rrd, path, cf, *windows[0], step) if windows else None
+            for i, (cursor, stop) in enumerate(windows):
+                data = await pending
+                if i + 1 < len(windows):
+                    pending = loop.run_in_executor(rrd_threads(), _fetch_rrd, path, cf, *windows[i + 1], step)
+                # Windows share their boundary row: each one keeps cursor < timestamp <= stop
+                rows = (data["timestamps"] > cursor) & (data["timestamps"] <= stop)
+                if not rows.any():
+                    continue
+                values = np.full((int(rows.sum()), len(names)), np.nan)
+                for name, column in data["columns"].items():
+                    values[:, columns[name]] = column[rows]
+                yield await loop.run_in_executor(rrd_threads(), encoder.rows, measurement["uuid"],
+                                                 data["timestamps"][rows], values)
+        yield encoder.end()
 
     def delete(self, options):
         if not self.path:
             raise rrdb_error("path_not_set")
 
 
-class rrdb_s3(DbPort, rrdb):
+class rrdb_s3(rrdb_local):
     """
     Class for interacting with a RRDTool database on S3 (read only mode).
-    This class implements the DbPort interface (port) for S3 storage.
+    This class implements the DbPort interface (port) for S3 storage: the instances are
+    indexed from the rrd_meta objects of the tenant prefix, the RRD files are downloaded
+    to the local block cache (see s3_cache), then read like local ones.
     """
+    backend = "rrdtool-s3"
 
-    def info(self, options) -> dict:
-        if not self.path:
-            raise rrdb_error("path_not_set")
+    def __init__(self, ts_uuid: str, path: str = RRD_S3_TENANT_PREFIX) -> None:
+        super().__init__(ts_uuid, path)
 
-    def create(self, options) -> bool:
-        if not self.path:
-            raise rrdb_error("path_not_set")
+    async def fill_instance_infos(self) -> bool:
+        instance = await s3_index(self.tenant_path).lookup(self._ts_uuid)
+        if instance:
+            self._rrd_local_instance = instance["instance_dir"]
+            self._rrd_ts_service_instance_uuid = self._ts_uuid
+            self._measurements = instance["measurements"]
+            self._instance_version = instance.get("mtime_ns", instance.get("etag"))
+            return True
 
-    def update(self, data) -> bool:
-        if not self.path:
-            raise rrdb_error("path_not_set")
+    async def rrd_paths(self, measurements: list[dict]) -> list[str]:
+        """Cached copies of the RRD objects (downloaded concurrently when missing or changed)"""
+        return await s3_cache().get_many(
+            [f"{self.local_instance}{measurement['rrd_id']}.rrd" for measurement in measurements])
 
-    def fetch(self, start: int, end: int, options):
-        if not self.path:
-            raise rrdb_error("path_not_set")
+    def create(self, options) -> bool:
+        raise rrdb_error("read_only")
 
-    def export(self, start: int, end: int, options, output_type):
-        if not self.path:
-            raise rrdb_error("path_not_set")
+    async def update(self, data) -> bool:
+        raise rrdb_error("read_only")
 
     def delete(self, options):
-        if not self.path:
-            raise rrdb_error("path_not_set")
+        raise rrdb_error("read_only")
 
 
 class rrdb_error(Exception):
@@ -216,6 +306,8 @@ class rrdb_error(Exception):
             raise ValueError("Path or UUID time-series service is not set for the RRDTool database/instance. Please provide a valid path or UUID.")
         elif exception_type == "no_instance_found":
             raise ValueError("No RRDTool instance found for the given time-series UUID. Please ensure the instance exists.")
+        elif exception_type == "read_only":
+            raise ValueError("RRDTool instances on S3 are read only.")
         elif exception_type == "no_measurements_found":
             raise ValueError("No measurements found in the RRDTool database. Please ensure the database is initialized and contains data.")
         elif message:
@@ -0,0 +1,171 @@
+'''
+RRDTool Instances Index
+In-process index of the RRDTool instances of a tenant: service UUID -> instance
+directory and parsed rrd_meta measurements. Built once (before the web workers are
+forked), then kept up to date incrementally from the rrd_meta modification times:
+a hit costs one stat() of its rrd_meta file, only misses rescan the tenant directory
+(re-reading the rrd_meta files that changed). The measurements tags and fields are
+indexed along (see tag_index) for searches.
+'''
+import os
+import re
+import time
+import asyncio
+import logging
+import threading
+
+from .tag_index import measurement_tag_index
+
+logger = logging.getLogger(__name__)
+
+RRD_META_FILE = "rrd_meta"
+# Misses rescan the tenant directory at most once per RESCAN_INTERVAL seconds
+# (unknown UUIDs must not turn every request into a directory walk)
+RESCAN_INTERVAL = 1.0
+
+
+def parse_rrd_meta(path: str) -> tuple[str | None, list[dict]]:
+    """Service UUID and measurements of an rrd_meta file:
+    "service_uuid:<uuid>" then one "rdd_id:<file>,measurement_uuid:<uuid>,<tag>,<field>:<value>..." line per measurement"""
+    service_uuid, measurements = None, []
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith("service_uuid"):
+                service_uuid = line.split(":", 1)[1].strip()
+            elif line:
+                entries = line.split(",")
+                measurement = {"rrd_id": entries[0].split(":", 1)[1], "uuid": entries[1].split(":", 1)[1], "tags": [], "fields": {}}
+                for entry in entries:
+                    if ":" in entry:
+                        if not re.match(r"^.*_(id|uuid)", entry):
+                            # Values may hold colons (IPv6 addresses)
+                            key, value = entry.split(":", 1)
+                            measurement["fields"][key] = value
+                    else:
+                        measurement["tags"].append(entry)
+                measurements.append(measurement)
+    return service_uuid, measurements
+
+
+class rrd_meta_index:
+    """
+    Service UUID -> {"instance_dir", "service_uuid", "measurements", "mtime_ns"} for
+    every instance directory of a tenant path.
+    """
+    def __init__(self, path: str) -> None:
+        self._path = path
+        self._lock = threading.Lock()
+        self._by_dir: dict[str, dict] = {}
+        self._by_uuid: dict[str, dict] = {}
+        self._tags = measurement_tag_index()
+        self._scanned_at = 0.0
+        self._stats = {"hits": 0, "misses": 0, "rescans": 0, "reloads": 0, "searches": 0}
+
+    @property
+    def path(self) -> str:
+        return self._path
+    @path.setter
+    def path(self, value: str) -> None:
+        pass
+    @path.deleter
+    def path(self) -> None:
+        pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {**self._stats, "instances": len(self._by_uuid), "measurements": len(self._tags),
+                    "hit_ratio": round(self._stats["hits"] / lookups, 4) if lookups else None}
+
+    def get(self, ts_uuid: str) -> dict | None:
+        """Cached instance, if still up to date (one stat()), None otherwise"""
+        instance = self._by_uuid.get(ts_uuid)
+        if instance and _mtime_ns(instance["instance_dir"]) == instance["mtime_ns"]:
+            with self._lock:
+                self._stats["hits"] += 1
+            return instance
+        return None
+
+    async def lookup(self, ts_uuid: str) -> dict | None:
+        """Instance of a service UUID, rescanning the tenant directory (in a thread) on a miss"""
+        instance = self.get(ts_uuid)
+        if instance:
+            return instance
+        stale = ts_uuid in self._by_uuid
+        with self._lock:
+            self._stats["misses"] += 1
+        await asyncio.to_thread(self.refresh, force=stale)
+        return self._by_uuid.get(ts_uuid)
+
+    async def search(self, terms: list[str], limit: int | None = None) -> list[dict]:
+        """Measurements of the tenant matching every term ("SSH", "server_ip:10.1.32.4",
+        "server_ip:10.1.32.0/24"), the index being rescanned first if older than RESCAN_INTERVAL"""
+        if time.monotonic() - self._scanned_at >= RESCAN_INTERVAL:
+            await asyncio.to_thread(self.refresh, force=False)
+        with self._lock:
+            self._stats["searches"] += 1
+            return self._tags.search(terms, limit)
+
+    def refresh(self, force: bool = True) -> None:
+        """Rescan the tenant directory: (re)parse new or modified rrd_meta files, drop removed instances"""
+        with self._lock:
+            if not force and time.monotonic() - self._scanned_at < RESCAN_INTERVAL:
+                return
+            by_dir = {}
+            try:
+                entries = sorted(entry.path for entry in os.scandir(self._path) if entry.is_dir())
+            except FileNotFoundError:
+                entries = []
+            for instance_dir in entries:
+                instance_dir = f"{instance_dir}/"
+                mtime_ns = _mtime_ns(instance_dir)
+                if mtime_ns is None:
+                    continue
+                cached = self._by_dir.get(instance_dir)
+                if cached and cached["mtime_ns"] == mtime_ns:
+                    by_dir[instance_dir] = cached
+                    continue
+                try:
+                    service_uuid, measurements = parse_rrd_meta(f"{instance_dir}{RRD_META_FILE}")
+                except (OSError, IndexError, ValueError) as e:
+                    logger.warning(f"Skipping RRDTool instance {instance_dir}: {e}")
+                    continue
+                by_dir[instance_dir] = {"instance_dir": instance_dir, "service_uuid": service_uuid,
+                                        "measurements": measurements, "mtime_ns": mtime_ns}
+                self._stats["reloads"] += 1
+            by_uuid = {}
+            for instance in by_dir.values():
+                # Same service UUID in several directories: the first one (by name) wins
+                if instance["service_uuid"]:
+                    by_uuid.setdefault(instance["service_uuid"], instance)
+            # Unchanged instances are the same objects: only the others are (re)indexed
+            indexed, current = {id(i): i for i in self._by_uuid.values()}, {id(i): i for i in by_uuid.values()}
+            for removed in indexed.keys() - current.keys():
+                self._tags.remove_instance(indexed[removed])
+            for added in current.keys() - indexed.keys():
+                self._tags.add_instance(current[added])
+            self._tags.sort()
+            self._by_dir, self._by_uuid = by_dir, by_uuid
+            self._scanned_at = time.monotonic()
+            self._stats["rescans"] += 1
+        logger.debug(f"RRDTool index {self._path}: {len(by_uuid)} instances")
+
+
+def _mtime_ns(instance_dir: str) -> int | None:
+    try:
+        return os.stat(f"{instance_dir}{RRD_META_FILE}").st_mtime_ns
+    except OSError:
+        return None
+
+
+_indexes: dict[str, rrd_meta_index] = {}
+
+
+def meta_index(path: str) -> rrd_meta_index:
+    """Per-process index of a tenant path, built on first use"""
+    index = _indexes.get(path)
+    if index is None:
+        index = _indexes.setdefault(path, rrd_meta_index(path))
+        index.refresh()
+    return index
@@ -0,0 +1,123 @@
+'''
+RRDTool Headers Cache
+Parsed rrdtool.info() headers, cached per (path, mtime, size) with LRU eviction.
+The blocking rrdtool calls (info, fetch) run in a per-process thread pool,
+concurrently for the measurements of an instance, never on the event loop.
+'''
+import os
+import re
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from config.config import RRD_INFO_CACHE_SIZE, RRD_THREADS
+
+logger = logging.getLogger(__name__)
+
+# "ds[<name>].<attribute>" / "rra[<n>].<attribute>" (nested keys such as rra[0].cdp_prep[0].value do not match)
+_INFO_KEY = re.compile(r"^(ds|rra)\[([^\]]+)\]\.(\w+)$")
+_DS_ATTRIBUTES = frozenset(("type", "minimal_heartbeat"))
+_RRA_ATTRIBUTES = frozenset(("cf", "rows", "cur_row", "pdp_per_row", "xff"))
+
+
+def parse_rrd_info(info: dict) -> tuple[tuple, ...]:
+    """data_sources_info of an RRD file, in one pass over the rrdtool.info() keys:
+    one (name, type, minimal_heartbeat) tuple per data source, in index order, then
+    one (cf, rows, cur_row, pdp_per_row, xff) tuple per RRA (values in header order)"""
+    data_sources: dict[str, list] = {}
+    indexes: dict[str, int] = {}
+    archives: dict[int, list] = {}
+    for key, value in info.items():
+        match = _INFO_KEY.match(key)
+        if not match:
+            continue
+        kind, name, attribute = match.groups()
+        if kind == "ds":
+            if attribute == "index":
+                indexes[name] = value
+                data_sources.setdefault(name, []).insert(0, name)
+            elif attribute in _DS_ATTRIBUTES:
+                data_sources.setdefault(name, []).append(value)
+        elif attribute in _RRA_ATTRIBUTES:
+            archives.setdefault(int(name), []).append(value)
+    ordered = sorted(data_sources, key=lambda name: indexes.get(name, len(indexes)))
+    return (tuple(tuple(data_sources[name]) for name in ordered)
+            + tuple(tuple(archives[index]) for index in sorted(archives)))
+
+
+class rrd_info_cache:
+    """
+    LRU cache of parsed RRD headers. A key includes the file mtime and size: an
+    updated RRD file (new cur_row, ...) is parsed again, the stale entry ages out.
+    """
+    def __init__(self, max_entries: int = RRD_INFO_CACHE_SIZE) -> None:
+        self._max_entries = max_entries
+        self._entries: OrderedDict[tuple, tuple] = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {**self._stats, "entries": len(self._entries), "max_entries": self._max_entries,
+                    "hit_ratio": round(self._stats["hits"] / lookups, 4) if lookups else None}
+
+    async def get(self, path: str) -> tuple[tuple, ...]:
+        return await asyncio.get_running_loop().run_in_executor(rrd_threads(), self._get, path)
+
+    async def get_many(self, paths: list[str]) -> list[tuple[tuple, ...]]:
+        """Headers of several RRD files, read concurrently"""
+        return await asyncio.gather(*(self.get(path) for path in paths))
+
+    async def get_many_keyed(self, paths: list[str]) -> list[tuple[tuple, tuple[tuple, ...]]]:
+        """(cache key, headers) of several RRD files, read concurrently: the keys
+        ((path, mtime, size)) tell whether any of the files changed"""
+        loop = asyncio.get_running_loop()
+        return await asyncio.gather(*(loop.run_in_executor(rrd_threads(), self._get_keyed, path) for path in paths))
+
+    def _get(self, path: str) -> tuple[tuple, ...]:
+        return self._get_keyed(path)[1]
+
+    def _get_keyed(self, path: str) -> tuple[tuple, tuple[tuple, ...]]:
+        stat = os.stat(path)
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            parsed = self._entries.get(key)
+            if parsed is not None:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return key, parsed
+            self._stats["misses"] += 1
+        import rrdtool
+        parsed = parse_rrd_info(rrdtool.info(path))
+        with self._lock:
+            self._entries[key] = parsed
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+        return key, parsed
+
+
+_cache: rrd_info_cache | None = None
+_cache_pid: int | None = None
+_threads: ThreadPoolExecutor | None = None
+_threads_pid: int | None = None
+
+
+def info_cache() -> rrd_info_cache:
+    """Per-process cache"""
+    global _cache, _cache_pid
+    if _cache is None or _cache_pid != os.getpid():
+        _cache, _cache_pid = rrd_info_cache(), os.getpid()
+    return _cache
+
+
+def rrd_threads() -> ThreadPoolExecutor:
+    """Per-process thread pool for the blocking rrdtool calls (created after the
+    Gunicorn fork: thread pools do not survive fork())"""
+    global _threads, _threads_pid
+    if _threads is None or _threads_pid != os.getpid():
+        _threads, _threads_pid = ThreadPoolExecutor(max_workers=RRD_THREADS, thread_name_prefix="rrdtool"), os.getpid()
+    return _threads
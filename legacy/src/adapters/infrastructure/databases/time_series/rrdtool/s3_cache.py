@@ -0,0 +1,297 @@
+'''
+RRDTool on S3 - Local Block Cache
+RRD objects of an S3-compatible store are downloaded to a size-bounded on-disk LRU
+cache, one file per (object, ETag): an unchanged object is never downloaded again,
+across requests and restarts. Large objects are downloaded as concurrent ranged GETs
+(pinned to the ETag with If-Match) written in place, over pooled connections.
+The instances are indexed from the rrd_meta objects of the tenant prefix (one LIST
+per rescan, rrd_meta objects re-read only when their ETag changed).
+'''
+import os
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from config.config import (
+    RRD_S3_BUCKET, RRD_S3_ENDPOINT_URL, RRD_S3_CACHE_DIR, RRD_S3_CACHE_BYTES, RRD_S3_REVALIDATE_INTERVAL,
+    RRD_S3_PART_BYTES, RRD_S3_CONNECTIONS,
+)
+from .meta_index import RRD_META_FILE, RESCAN_INTERVAL, parse_rrd_meta
+
+try:
+    import boto3
+    from botocore.config import Config as BotoConfig
+    from botocore.exceptions import ClientError
+except ImportError:
+    boto3 = None
+
+logger = logging.getLogger(__name__)
+
+# Bytes read from a GET response body at a time
+READ_BYTES = 1024 * 1024
+# Concurrent fetches of one object are serialized by one of a fixed set of locks
+KEY_LOCK_STRIPES = 64
+
+
+def s3_client(endpoint_url: str | None = RRD_S3_ENDPOINT_URL, connections: int = RRD_S3_CONNECTIONS):
+    """S3 client (thread safe) with a pool of `connections` connections"""
+    if boto3 is None:
+        raise ValueError("S3 storage requires boto3")
+    return boto3.session.Session().client(
+        "s3", endpoint_url=endpoint_url,
+        config=BotoConfig(max_pool_connections=connections, retries={"max_attempts": 5, "mode": "adaptive"}))
+
+
+class s3_block_cache:
+    """
+    Object key -> path of its cached copy. Cache files are named <sha1(bucket/key)>.<ETag>.
+    """
+    def __init__(self, bucket: str = RRD_S3_BUCKET, cache_dir: str = RRD_S3_CACHE_DIR,
+                 max_bytes: int = RRD_S3_CACHE_BYTES, part_bytes: int = RRD_S3_PART_BYTES,
+                 connections: int = RRD_S3_CONNECTIONS, revalidate_interval: float = RRD_S3_REVALIDATE_INTERVAL,
+                 client=None) -> None:
+        self._bucket = bucket
+        self._cache_dir = cache_dir
+        self._max_bytes = max_bytes
+        self._part_bytes = part_bytes
+        self._revalidate_interval = revalidate_interval
+        self._client = client or s3_client(connections=connections)
+        # Files are fetched on one pool, their parts on another (a file waiting for its
+        # parts must not hold the threads the parts need)
+        self._threads = ThreadPoolExecutor(max_workers=connections, thread_name_prefix="s3")
+        self._part_threads = ThreadPoolExecutor(max_workers=connections, thread_name_prefix="s3-part")
+        # digest -> {"etag", "size", "path", "checked"}, least recently used first
+        self._entries: OrderedDict[str, dict] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._key_locks = [threading.Lock() for _ in range(KEY_LOCK_STRIPES)]
+        self._stats = {"hits": 0, "revalidated": 0, "downloads": 0, "downloaded_bytes": 0, "evictions": 0}
+        os.makedirs(cache_dir, exist_ok=True)
+        self._adopt()
+
+    @property
+    def bucket(self) -> str:
+        return self._bucket
+    @bucket.setter
+    def bucket(self, value: str) -> None:
+        pass
+    @bucket.deleter
+    def bucket(self) -> None:
+        pass
+
+    @property
+    def client(self):
+        return self._client
+    @client.setter
+    def client(self, value) -> None:
+        pass
+    @client.deleter
+    def client(self) -> None:
+        pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "entries": len(self._entries), "bytes": self._bytes, "max_bytes": self._max_bytes}
+
+    async def get_many(self, keys: list[str]) -> list[str]:
+        """Paths of the cached copies of several objects, fetched concurrently"""
+        loop = asyncio.get_running_loop()
+        return await asyncio.gather(*(loop.run_in_executor(self._threads, self.get, key) for key in keys))
+
+    def get(self, key: str) -> str:
+        """Path of the cached copy of an object, downloaded if missing or changed"""
+        digest = hashlib.sha1(f"{self._bucket}/{key}".encode()).hexdigest()
+        entry = self._fresh(digest)
+        if entry:
+            return entry["path"]
+        with self._key_locks[hash(digest) % KEY_LOCK_STRIPES]:
+            # Fetched by another thread meanwhile
+            entry = self._fresh(digest)
+            if entry:
+                return entry["path"]
+            for attempt in range(3):
+                head = self._client.head_object(Bucket=self._bucket, Key=key)
+                etag, size = head["ETag"].strip('"'), head["ContentLength"]
+                with self._lock:
+                    entry = self._entries.get(digest)
+                    if entry and entry["etag"] == etag:
+                        entry["checked"] = time.monotonic()
+                        self._entries.move_to_end(digest)
+                        self._stats["revalidated"] += 1
+                        return entry["path"]
+                path = os.path.join(self._cache_dir, f"{digest}.{etag}")
+                try:
+                    self._download(key, etag, size, path)
+                    break
+                except ClientError as e:
+                    # Replaced during the download: start over with the new version
+                    if e.response.get("Error", {}).get("Code") not in ("PreconditionFailed", "412") or attempt == 2:
+                        raise
+            self._insert(digest, {"etag": etag, "size": size, "path": path, "checked": time.monotonic()})
+            return path
+
+    def _fresh(self, digest: str) -> dict | None:
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry and time.monotonic() - entry["checked"] < self._revalidate_interval:
+                self._entries.move_to_end(digest)
+                self._stats["hits"] += 1
+                return entry
+        return None
+
+    def _download(self, key: str, etag: str, size: int, path: str) -> None:
+        partial = f"{path}.part"
+        fd = os.open(partial, os.O_CREAT | os.O_WRONLY | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(fd, size)
+            offsets = range(0, size, self._part_bytes)
+            if len(offsets) > 1:
+                futures = [self._part_threads.submit(self._download_part, key, etag, fd, offset) for offset in offsets]
+                # Every part settled before the file descriptor may be closed
+                wait(futures)
+                for future in futures:
+                    future.result()
+            elif size:
+                self._download_part(key, etag, fd, 0)
+        except BaseException:
+            os.close(fd)
+            os.remove(partial)
+            raise
+        os.close(fd)
+        os.replace(partial, path)
+        with self._lock:
+            self._stats["downloads"] += 1
+            self._stats["downloaded_bytes"] += size
+
+    def _download_part(self, key: str, etag: str, fd: int, offset: int) -> None:
+        response = self._client.get_object(Bucket=self._bucket, Key=key, IfMatch=f'"{etag}"',
+                                           Range=f"bytes={offset}-{offset + self._part_bytes - 1}")
+        body = response["Body"]
+        while data := body.read(READ_BYTES):
+            os.pwrite(fd, data, offset)
+            offset += len(data)
+
+    def _insert(self, digest: str, entry: dict) -> None:
+        with self._lock:
+            previous = self._entries.pop(digest, None)
+            if previous:
+                self._bytes -= previous["size"]
+                if previous["path"] != entry["path"]:
+                    _remove(previous["path"])
+            self._entries[digest] = entry
+            self._bytes += entry["size"]
+            # The least recently used copies go first (never the one just fetched)
+            while self._bytes > self._max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted["size"]
+                _remove(evicted["path"])
+                self._stats["evictions"] += 1
+
+    def _adopt(self) -> None:
+        """Index the copies left by a previous run (oldest first, ETags revalidated on first use)"""
+        files = []
+        for entry in os.scandir(self._cache_dir):
+            digest, _, etag = entry.name.partition(".")
+            if entry.name.endswith(".part") or not etag:
+                _remove(entry.path)
+                continue
+            stat = entry.stat()
+            files.append((stat.st_mtime, digest, {"etag": etag, "size": stat.st_size, "path": entry.path, "checked": 0.0}))
+        for _, digest, entry in sorted(files, key=lambda item: item[0]):
+            self._insert(digest, entry)
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class s3_meta_index:
+    """
+    Service UUID -> {"instance_dir" (key prefix), "service_uuid", "measurements", "etag"}
+    for every rrd_meta object one level below a tenant prefix.
+    """
+    def __init__(self, prefix: str, cache: s3_block_cache,
+                 revalidate_interval: float = RRD_S3_REVALIDATE_INTERVAL) -> None:
+        self._prefix = prefix
+        self._cache = cache
+        self._revalidate_interval = revalidate_interval
+        self._lock = threading.Lock()
+        self._by_dir: dict[str, dict] = {}
+        self._by_uuid: dict[str, dict] = {}
+        self._scanned_at = 0.0
+
+    def get(self, ts_uuid: str) -> dict | None:
+        """Indexed instance, while the index is younger than the revalidation interval"""
+        if time.monotonic() - self._scanned_at < self._revalidate_interval:
+            return self._by_uuid.get(ts_uuid)
+        return None
+
+    async def lookup(self, ts_uuid: str) -> dict | None:
+        instance = self.get(ts_uuid)
+        if instance:
+            return instance
+        await asyncio.to_thread(self.refresh, force=False)
+        return self._by_uuid.get(ts_uuid)
+
+    def refresh(self, force: bool = True) -> None:
+        """List the tenant prefix: (re)read new or modified rrd_meta objects, drop removed instances"""
+        with self._lock:
+            if not force and time.monotonic() - self._scanned_at < RESCAN_INTERVAL:
+                return
+            listed = {}
+            paginator = self._cache.client.get_paginator("list_objects_v2")
+            for page in paginator.paginate(Bucket=self._cache.bucket, Prefix=self._prefix):
+                for item in page.get("Contents", []):
+                    name = item["Key"][len(self._prefix):]
+                    if name.count("/") == 1 and name.endswith(f"/{RRD_META_FILE}"):
+                        listed[item["Key"][:-len(RRD_META_FILE)]] = item["ETag"].strip('"')
+            by_dir = {}
+            for instance_dir, etag in sorted(listed.items()):
+                cached = self._by_dir.get(instance_dir)
+                if cached and cached["etag"] == etag:
+                    by_dir[instance_dir] = cached
+                    continue
+                try:
+                    service_uuid, measurements = parse_rrd_meta(self._cache.get(f"{instance_dir}{RRD_META_FILE}"))
+                except (OSError, IndexError, ValueError, ClientError) as e:
+                    logger.warning(f"Skipping RRDTool instance s3://{self._cache.bucket}/{instance_dir}: {e}")
+                    continue
+                by_dir[instance_dir] = {"instance_dir": instance_dir, "service_uuid": service_uuid,
+                                        "measurements": measurements, "etag": etag}
+            by_uuid = {}
+            for instance in by_dir.values():
+                if instance["service_uuid"]:
+                    by_uuid.setdefault(instance["service_uuid"], instance)
+            self._by_dir, self._by_uuid = by_dir, by_uuid
+            self._scanned_at = time.monotonic()
+        logger.debug(f"RRDTool S3 index s3://{self._cache.bucket}/{self._prefix}: {len(by_uuid)} instances")
+
+
+_cache: s3_block_cache | None = None
+_cache_pid: int | None = None
+_indexes: dict[str, s3_meta_index] = {}
+
+
+def s3_cache(create: bool = True) -> s3_block_cache | None:
+    """Per-process cache (boto3 clients and thread pools do not survive fork())"""
+    global _cache, _cache_pid
+    if (_cache is None or _cache_pid != os.getpid()) and create:
+        _cache, _cache_pid = s3_block_cache(), os.getpid()
+        _indexes.clear()
+    return _cache if _cache_pid == os.getpid() else None
+
+
+def s3_index(prefix: str) -> s3_meta_index:
+    """Per-process index of a tenant prefix"""
+    cache = s3_cache()
+    index = _indexes.get(prefix)
+    if index is None:
+        index = _indexes.setdefault(prefix, s3_meta_index(prefix, cache))
+    return index
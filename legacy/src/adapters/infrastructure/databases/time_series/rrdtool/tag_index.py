@@ -0,0 +1,126 @@
+'''
+RRDTool Measurements Tag Index
+Inverted index of the rrd_meta measurements, updated instance by instance by the
+instances index (see meta_index) when rrd_meta files appear, change or disappear:
+- tag -> measurements ("HTTPS")
+- (field, value) -> measurements ("server_ip:10.1.96.15")
+- per IP field (server_ip, client_ip, ...) the sorted addresses, so a prefix
+  ("server_ip:10.1.32.0/24") is one range of the sorted list (two bisections), the
+  lists changed by a rescan being sorted again at its end
+A search intersects the sets of its terms, smallest first.
+'''
+import bisect
+import socket
+import ipaddress
+
+# A measurement is (service UUID, measurement UUID)
+Key = tuple[str, str]
+
+
+def _address(value: str) -> tuple[int, int] | None:
+    """(IP version, integer address) of an IP address field value, None otherwise"""
+    for family, version in ((socket.AF_INET, 4), (socket.AF_INET6, 6)):
+        try:
+            return version, int.from_bytes(socket.inet_pton(family, value), "big")
+        except OSError:
+            continue
+    return None
+
+
+class measurement_tag_index:
+    """
+    Tags, field values and IP prefixes -> measurements of the indexed instances.
+    Not thread safe: updated under the instances index lock.
+    """
+    def __init__(self) -> None:
+        self._measurements: dict[Key, dict] = {}
+        self._tags: dict[str, set[Key]] = {}
+        self._fields: dict[tuple[str, str], set[Key]] = {}
+        # (field, IP version) -> integer addresses (and their sorted list, dropped on change),
+        # (field, IP version, address) -> measurements
+        self._addresses: dict[tuple[str, int], set[int]] = {}
+        self._sorted: dict[tuple[str, int], list[int]] = {}
+        self._by_address: dict[tuple[str, int, int], set[Key]] = {}
+
+    def __len__(self) -> int:
+        return len(self._measurements)
+
+    def add_instance(self, instance: dict) -> None:
+        for measurement in instance["measurements"]:
+            key = (instance["service_uuid"], measurement["uuid"])
+            self._measurements[key] = measurement
+            for tag in measurement["tags"]:
+                self._tags.setdefault(tag, set()).add(key)
+            for name, value in measurement["fields"].items():
+                self._fields.setdefault((name, value), set()).add(key)
+                address = _address(value)
+                if address is not None:
+                    keys = self._by_address.setdefault((name, *address), set())
+                    if not keys:
+                        self._addresses.setdefault((name, address[0]), set()).add(address[1])
+                        self._sorted.pop((name, address[0]), None)
+                    keys.add(key)
+
+    def remove_instance(self, instance: dict) -> None:
+        for measurement in instance["measurements"]:
+            key = (instance["service_uuid"], measurement["uuid"])
+            if self._measurements.get(key) is not measurement:
+                # Indexed from another directory with the same service UUID
+                continue
+            del self._measurements[key]
+            for tag in measurement["tags"]:
+                _discard(self._tags, tag, key)
+            for name, value in measurement["fields"].items():
+                _discard(self._fields, (name, value), key)
+                address = _address(value)
+                if address is not None and _discard(self._by_address, (name, *address), key):
+                    self._addresses[(name, address[0])].discard(address[1])
+                    self._sorted.pop((name, address[0]), None)
+
+    def sort(self) -> None:
+        """Sort the address lists changed since the last sort (done by the instances index
+        after each rescan, so that searches only bisect)"""
+        for field in self._addresses.keys() - self._sorted.keys():
+            self._sorted[field] = sorted(self._addresses[field])
+
+    def match(self, term: str) -> set[Key]:
+        """Measurements of one term: "tag", "field:value" or "field:prefix/length" """
+        name, separator, value = term.partition(":")
+        if not separator:
+            return self._tags.get(term, set())
+        if "/" not in value:
+            return self._fields.get((name, value), set())
+        network = ipaddress.ip_network(value, strict=False)
+        addresses = self._sorted.get((name, network.version))
+        if addresses is None:
+            addresses = self._sorted[(name, network.version)] = sorted(self._addresses.get((name, network.version), ()))
+        low = bisect.bisect_left(addresses, int(network.network_address))
+        high = bisect.bisect_right(addresses, int(network.broadcast_address))
+        keys = set()
+        for address in addresses[low:high]:
+            keys |= self._by_address[(name, network.version, address)]
+        return keys
+
+    def search(self, terms: list[str], limit: int | None = None) -> list[dict]:
+        """Measurements matching every term (all of them without terms), as
+        {"ts_uuid", "uuid", "tags", "fields"}, sorted by service then measurement UUID"""
+        if terms:
+            matches = sorted((self.match(term) for term in terms), key=len)
+            keys = matches[0].intersection(*matches[1:])
+        else:
+            keys = self._measurements.keys()
+        return [{"ts_uuid": ts_uuid, "uuid": uuid, "tags": list(self._measurements[(ts_uuid, uuid)]["tags"]),
+                 "fields": dict(self._measurements[(ts_uuid, uuid)]["fields"])}
+                for ts_uuid, uuid in sorted(keys)[:limit]]
+
+
+def _discard(postings: dict, posting: object, key: Key) -> bool:
+    """Remove a key from a posting set, dropping emptied sets (True when emptied)"""
+    keys = postings.get(posting)
+    if keys is None:
+        return False
+    keys.discard(key)
+    if not keys:
+        del postings[posting]
+        return True
+    return False
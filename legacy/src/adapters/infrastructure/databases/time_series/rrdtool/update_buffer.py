@@ -0,0 +1,180 @@
+'''
+RRDTool Write-Behind Updates
+Samples pushed to RRD files are buffered and coalesced per (RRD file, timestamp):
+several samples of the same file and timestamp (e.g. the counters of several flows)
+become one, their values summed per data source (merge="sum") or replaced (merge="last").
+A dedicated thread flushes the buffer with one multi-value rrdtool.update call per
+file ("--template ds1:ds2 t1:v1:v2 t2:v1:v2 ..."), through rrdcached when an address
+is configured. The buffer is bounded: when full, new samples are dropped or block
+their producer (back-pressure), and both are counted.
+'''
+import os
+import math
+import time
+import logging
+import threading
+from typing import Callable
+
+from config.config import (
+    RRD_UPDATE_MAX_PENDING, RRD_UPDATE_FLUSH_INTERVAL, RRD_UPDATE_BLOCK_TIMEOUT, RRDCACHED_ADDRESS,
+)
+
+logger = logging.getLogger(__name__)
+
+MERGE_MODES = ("sum", "last")
+
+
+def _rrdtool_update(path: str, args: list[str]) -> None:
+    import rrdtool
+    rrdtool.update(path, *args)
+
+
+def update_args(samples: dict[int, dict[str, float]], daemon: str | None = None) -> list[str]:
+    """rrdtool.update arguments of one file's samples ({timestamp: {data source: value}}),
+    in time order, unknown values as "U" """
+    names = list(dict.fromkeys(name for values in samples.values() for name in values))
+    args = ["--daemon", daemon] if daemon else []
+    args += ["--template", ":".join(names)]
+    for timestamp in sorted(samples):
+        values = samples[timestamp]
+        args.append(":".join([str(timestamp)] + [
+            "U" if (value := values.get(name)) is None or math.isnan(value) else f"{value:.15g}" for name in names]))
+    return args
+
+
+class rrd_update_buffer:
+    """
+    Bounded write-behind buffer of RRD updates, flushed by its own thread.
+    """
+    def __init__(self, max_pending: int = RRD_UPDATE_MAX_PENDING, flush_interval: float = RRD_UPDATE_FLUSH_INTERVAL,
+                 merge: str = "sum", daemon: str | None = RRDCACHED_ADDRESS,
+                 writer: Callable[[str, list[str]], None] = _rrdtool_update) -> None:
+        if merge not in MERGE_MODES:
+            raise ValueError(f"Unknown merge mode: {merge}. Supported modes are {', '.join(MERGE_MODES)}.")
+        self._max_pending = max_pending
+        self._flush_interval = flush_interval
+        self._merge = merge
+        self._daemon = daemon
+        self._writer = writer
+        # {path: {timestamp: {data source: value}}}, swapped out by each flush
+        self._pending: dict[str, dict[int, dict[str, float]]] = {}
+        self._pending_samples = 0
+        # Last flushed timestamp per file: rrdtool rejects updates that are not newer
+        self._last: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._space = threading.Condition(self._lock)
+        self._wakeup = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self._stats = {"accepted": 0, "coalesced": 0, "dropped_full": 0, "dropped_late": 0, "blocked": 0,
+                       "flushes": 0, "update_calls": 0, "samples_written": 0, "errors": 0, "last_flush_seconds": None}
+        self._thread = threading.Thread(target=self._run, name="rrd-update-flusher", daemon=True)
+        self._thread.start()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "pending": self._pending_samples, "max_pending": self._max_pending}
+
+    def full(self) -> bool:
+        return self._pending_samples >= self._max_pending
+
+    def add(self, path: str, timestamp: int, values: dict[str, float], block: bool = False,
+            timeout: float | None = RRD_UPDATE_BLOCK_TIMEOUT) -> bool:
+        """Buffer one sample of an RRD file. False when it is dropped (buffer full, or not
+        newer than the last flushed update of the file). block=True waits for room first."""
+        timestamp = int(timestamp)
+        with self._lock:
+            if self._closed:
+                raise ValueError("The RRD update buffer is closed")
+            if self._coalesce(path, timestamp, values):
+                return True
+            if self.full() and block:
+                self._stats["blocked"] += 1
+                self._wakeup.notify()
+                self._space.wait_for(lambda: not self.full() or self._closed, timeout)
+                # Flushed meanwhile: the sample may now be late, or coalesce with a newer one
+                if self._coalesce(path, timestamp, values):
+                    return True
+            if timestamp <= self._last.get(path, -1):
+                self._stats["dropped_late"] += 1
+                return False
+            if self.full() or self._closed:
+                self._stats["dropped_full"] += 1
+                return False
+            self._pending.setdefault(path, {})[timestamp] = dict(values)
+            self._pending_samples += 1
+            self._stats["accepted"] += 1
+            if self._pending_samples * 2 >= self._max_pending:
+                self._wakeup.notify()
+            return True
+
+    def _coalesce(self, path: str, timestamp: int, values: dict[str, float]) -> bool:
+        """Merge into a buffered sample of the same file and timestamp, if any (lock held)"""
+        current = self._pending.get(path, {}).get(timestamp)
+        if current is None:
+            return False
+        if self._merge == "sum":
+            for name, value in values.items():
+                current[name] = current[name] + value if name in current else value
+        else:
+            current.update(values)
+        self._stats["coalesced"] += 1
+        return True
+
+    def flush(self) -> None:
+        """Write the buffered samples now (one rrdtool.update per file)"""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending, self._pending_samples = self._pending, {}, 0
+                for path, samples in pending.items():
+                    self._last[path] = max(samples)
+                self._space.notify_all()
+            if not pending:
+                return
+            started = time.perf_counter()
+            written = errors = 0
+            for path, samples in pending.items():
+                try:
+                    self._writer(path, update_args(samples, self._daemon))
+                    written += len(samples)
+                except Exception as e:
+                    errors += 1
+                    logger.error(f"RRD update of {path} failed ({len(samples)} samples): {e}")
+            with self._lock:
+                self._stats["flushes"] += 1
+                self._stats["update_calls"] += len(pending)
+                self._stats["samples_written"] += written
+                self._stats["errors"] += errors
+                self._stats["last_flush_seconds"] = round(time.perf_counter() - started, 6)
+
+    def close(self) -> None:
+        """Flush what is left and stop the flush thread"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._wakeup.notify()
+            self._space.notify_all()
+        self._thread.join()
+        self.flush()
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                if not self._closed and self._pending_samples * 2 < self._max_pending:
+                    self._wakeup.wait(self._flush_interval)
+                if self._closed:
+                    return
+            self.flush()
+
+
+_buffer: rrd_update_buffer | None = None
+_buffer_pid: int | None = None
+
+
+def update_buffer(create: bool = True) -> rrd_update_buffer | None:
+    """Per-process buffer (its flush thread is started on first use, after the Gunicorn fork)"""
+    global _buffer, _buffer_pid
+    if (_buffer is None or _buffer_pid != os.getpid()) and create:
+        _buffer, _buffer_pid = rrd_update_buffer(), os.getpid()
+    return _buffer if _buffer_pid == os.getpid() else None
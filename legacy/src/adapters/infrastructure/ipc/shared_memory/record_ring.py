@@ -0,0 +1,245 @@
+'''
+Shared Memory Record Ring
+This module provides an implementation of the interface:
+"ports.output.record_ring.RecordRingPort"
+A single-producer / single-consumer ring buffer in multiprocessing.shared_memory: a
+batch is written as one length-prefixed entry (layout header, then the raw records) and
+read back as a NumPy view of the ring, nothing pickled or sent through a socket.
+The write index is only stored by the producer and the read index only by the consumer
+(monotonic 64-bit byte counters on their own cache lines), so no lock is needed: an
+entry is written before the write index that publishes it (stores are not reordered on
+x86-64; aligned 64-bit stores are atomic). Python has no memory fence: on other
+platforms (e.g. ARM, where stores may be reordered) no ring is created or attached.
+Entries never wrap: one that does not fit before the end of the ring starts at its
+beginning, after a wrap marker.
+'''
+import time
+import platform
+import struct
+import logging
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from config.config import MEDIATOR_RING_BYTES, MEDIATOR_ON_FULL, MEDIATOR_BLOCK_TIMEOUT
+from core.entities.ipfix_buffer import IpfixRecordBatch
+from core.data_domain.ipfix_decoder import compile_layout
+from ports.output.record_ring import RecordRingPort
+
+logger = logging.getLogger(__name__)
+
+MAGIC = 0x49505846494E4731  # "IPXFRNG1"
+HEADER_BYTES = 256
+# Header words (uint64): one cache line for the constants, one per side
+_MAGIC, _CAPACITY = 0, 1
+_WRITE, _PUT_BATCHES, _PUT_BYTES, _DROPPED_BATCHES, _DROPPED_RECORDS, _BLOCKED, _HIGH_WATER, _OVERSIZED = range(8, 16)
+_READ, _GOT_BATCHES = 16, 17
+_CLOSED = 24
+ENTRY = struct.Struct("<II")  # payload length, kind
+BATCH = struct.Struct("<IIHH")  # observation domain, record count, template id, field count
+FIELD = struct.Struct("<HHI")  # element id, length, enterprise number
+KIND_BATCH, KIND_WRAP = 1, 2
+ON_FULL_MODES = ("drop", "block")
+# Machines (platform.machine()) whose stores are seen in program order by other cores
+ORDERED_STORE_MACHINES = ("x86_64", "amd64")
+# Consumer polling: first checks back-to-back, then sleeps up to POLL_SECONDS
+SPIN_CHECKS = 64
+POLL_SECONDS = 0.001
+
+
+def _align(size: int) -> int:
+    return (size + 7) & ~7
+
+
+class ring_error(Exception):
+    def __init__(self, error_type: str, message: str) -> None:
+        self.error_type = error_type
+        self.message = message
+        super().__init__(f"{error_type}: {message}")
+
+
+class shm_record_ring(RecordRingPort):
+    """
+    One end of a shared memory ring: the owner creates it (capacity rounded up to a
+    power of two), the other process attaches to it by name.
+    """
+    def __init__(self, name: str | None = None, create: bool = False, capacity: int = MEDIATOR_RING_BYTES,
+                 on_full: str = MEDIATOR_ON_FULL, block_timeout: float = MEDIATOR_BLOCK_TIMEOUT) -> None:
+        if on_full not in ON_FULL_MODES:
+            raise ValueError(f"Unknown on_full mode: {on_full}. Supported modes are {', '.join(ON_FULL_MODES)}.")
+        machine = platform.machine()
+        if machine.lower() not in ORDERED_STORE_MACHINES:
+            raise ValueError(f"Shared memory record rings require x86-64 store ordering, not available on {machine}"
+                             " (run the mediator in the collector processes: IPYFIX_MEDIATOR_PROCESS=0)")
+        self._on_full = on_full
+        self._block_timeout = block_timeout
+        if create:
+            capacity = 1 << max(int(capacity) - 1, 4095).bit_length()
+            self._shm = shared_memory.SharedMemory(name, create=True, size=HEADER_BYTES + capacity)
+        else:
+            try:
+                # Python >= 3.13: attaching must not register the segment for removal at exit
+                self._shm = shared_memory.SharedMemory(name, track=False)
+            except TypeError:
+                self._shm = shared_memory.SharedMemory(name)
+        self._header = np.ndarray(HEADER_BYTES // 8, dtype=np.uint64, buffer=self._shm.buf)
+        if create:
+            self._header[:] = 0
+            self._header[_CAPACITY] = capacity
+            self._header[_MAGIC] = MAGIC
+        elif int(self._header[_MAGIC]) != MAGIC:
+            self._header = None
+            self._shm.close()
+            raise ring_error("format", f"Shared memory {name} is not a record ring")
+        self._capacity = int(self._header[_CAPACITY])
+        self._data = self._shm.buf[HEADER_BYTES:HEADER_BYTES + self._capacity]
+        self._owner = create
+        self._producer = False
+        # Read index to publish on release()
+        self._pending_read: int | None = None
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+    @name.setter
+    def name(self, value: str) -> None:
+        pass
+    @name.deleter
+    def name(self) -> None:
+        pass
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+    @capacity.setter
+    def capacity(self, value: int) -> None:
+        pass
+    @capacity.deleter
+    def capacity(self) -> None:
+        pass
+
+    def stats(self) -> dict:
+        header = self._header
+        used = int(header[_WRITE]) - int(header[_READ])
+        return {"capacity": self._capacity, "used_bytes": used, "fill": round(used / self._capacity, 4),
+                "high_water_bytes": int(header[_HIGH_WATER]), "put_batches": int(header[_PUT_BATCHES]),
+                "put_bytes": int(header[_PUT_BYTES]), "got_batches": int(header[_GOT_BATCHES]),
+                "dropped_batches": int(header[_DROPPED_BATCHES]), "dropped_records": int(header[_DROPPED_RECORDS]),
+                "blocked": int(header[_BLOCKED]), "oversized": int(header[_OVERSIZED]),
+                "closed": bool(header[_CLOSED]), "on_full": self._on_full}
+
+    # ---- producer ---------------------------------------------------------------------
+
+    def put(self, batch: IpfixRecordBatch) -> bool:
+        self._producer = True
+        header, capacity = self._header, self._capacity
+        parts = batch.records if isinstance(batch.records, (list, tuple)) else [batch.records]
+        count = sum(len(part) for part in parts)
+        meta = BATCH.size + FIELD.size * len(batch.fields)
+        records_offset = ENTRY.size + _align(meta)
+        size = _align(records_offset + sum(part.nbytes for part in parts))
+        dtype = compile_layout(batch.fields).dtype
+        if dtype.hasobject or size > capacity // 2:
+            # Variable-length records have no raw layout; a batch over half the ring could never fit
+            header[_OVERSIZED] += 1
+            header[_DROPPED_BATCHES] += 1
+            header[_DROPPED_RECORDS] += count
+            return False
+        write = int(header[_WRITE])
+        position = write & (capacity - 1)
+        skip = capacity - position if position + size > capacity else 0
+        if not self._wait_for_room(write, skip + size):
+            header[_DROPPED_BATCHES] += 1
+            header[_DROPPED_RECORDS] += count
+            return False
+        data = self._data
+        if skip:
+            ENTRY.pack_into(data, position, skip - ENTRY.size, KIND_WRAP)
+            position = 0
+        BATCH.pack_into(data, position + ENTRY.size, batch.domain, count, batch.template_id, len(batch.fields))
+        offset = position + ENTRY.size + BATCH.size
+        for field in batch.fields:
+            FIELD.pack_into(data, offset, *field)
+            offset += FIELD.size
+        offset = position + records_offset
+        for part in parts:
+            data[offset:offset + part.nbytes] = np.ascontiguousarray(part).view(np.uint8).reshape(-1)
+            offset += part.nbytes
+        ENTRY.pack_into(data, position, size - ENTRY.size, KIND_BATCH)
+        # Published last: the consumer only reads entries below the write index
+        header[_WRITE] = write + skip + size
+        header[_PUT_BATCHES] += 1
+        header[_PUT_BYTES] += size
+        used = write + skip + size - int(header[_READ])
+        if used > header[_HIGH_WATER]:
+            header[_HIGH_WATER] = used
+        return True
+
+    def _wait_for_room(self, write: int, size: int) -> bool:
+        header, capacity = self._header, self._capacity
+        if write + size - int(header[_READ]) <= capacity:
+            return True
+        if self._on_full != "block":
+            return False
+        header[_BLOCKED] += 1
+        deadline = time.monotonic() + self._block_timeout
+        while write + size - int(header[_READ]) > capacity:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(POLL_SECONDS)
+        return True
+
+    # ---- consumer ---------------------------------------------------------------------
+
+    def get(self, timeout: float | None = None) -> IpfixRecordBatch | None:
+        self.release()
+        header, data, capacity = self._header, self._data, self._capacity
+        read = int(header[_READ])
+        deadline = None if timeout is None else time.monotonic() + timeout
+        checks = 0
+        while int(header[_WRITE]) == read:
+            if header[_CLOSED] and int(header[_WRITE]) == read:
+                return None
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            checks += 1
+            if checks > SPIN_CHECKS:
+                time.sleep(POLL_SECONDS)
+        position = read & (capacity - 1)
+        length, kind = ENTRY.unpack_from(data, position)
+        if kind == KIND_WRAP:
+            read += capacity - position
+            position = 0
+            length, kind = ENTRY.unpack_from(data, position)
+        if kind != KIND_BATCH:
+            raise ring_error("format", f"Corrupted ring {self.name} at {read}")
+        domain, count, template_id, field_count = BATCH.unpack_from(data, position + ENTRY.size)
+        fields = tuple(FIELD.unpack_from(data, position + ENTRY.size + BATCH.size + i * FIELD.size)
+                       for i in range(field_count))
+        dtype = compile_layout(fields).dtype
+        records_offset = position + ENTRY.size + _align(BATCH.size + FIELD.size * field_count)
+        records = np.frombuffer(data, dtype, count, records_offset)
+        self._pending_read = read + ENTRY.size + length
+        header[_GOT_BATCHES] += 1
+        return IpfixRecordBatch(fields, records, template_id, domain)
+
+    def release(self) -> None:
+        if self._pending_read is not None:
+            self._header[_READ] = self._pending_read
+            self._pending_read = None
+
+    def close(self, unlink: bool = False) -> None:
+        if self._shm is None:
+            return
+        if self._owner or self._producer:
+            # Nothing more to read once the ring is drained
+            self._header[_CLOSED] = 1
+        self._header = None
+        try:
+            self._data.release()
+            self._shm.close()
+        except BufferError:
+            logger.warning(f"Record ring {self._shm.name}: batches still referenced, segment left mapped")
+        if unlink:
+            self._shm.unlink()
+        self._shm = None
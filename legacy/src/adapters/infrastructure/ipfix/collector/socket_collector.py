@@ -0,0 +1,218 @@
+'''
+IPFIX UDP/TCP Collector Adapter
+This module provides an implementation of the interface:
+"ports.input.collector_buffer.CollectorBufferPort" for UDP and TCP sockets.
+UDP: the socket is watched by the event loop (add_reader) and drained on each wake-up,
+up to batch_messages datagrams received with recvfrom_into() straight into one
+preallocated buffer, then handed to the handler as one batch (Python exposes no
+recvmmsg(): draining the socket per wake-up is its batching).
+TCP: one asyncio.BufferedProtocol per exporter, the kernel writing into the session's own
+buffer, complete messages framed in place and handed over as one batch per read.
+With reuse_port, several processes bind the same ports (SO_REUSEPORT): the kernel
+spreads the exporters over them.
+https://www.rfc-editor.org/rfc/rfc7011#section-10
+'''
+import socket
+import asyncio
+import logging
+from typing import Callable
+
+from config.config import (
+    COLLECTOR_HOST, COLLECTOR_UDP_PORT, COLLECTOR_TCP_PORT, COLLECTOR_BATCH_MESSAGES, COLLECTOR_BUFFER_BYTES,
+    COLLECTOR_TCP_BUFFER_BYTES, COLLECTOR_SOCKET_RCVBUF,
+)
+from core.entities.ipfix_buffer import IpfixMessageBatch
+from core.data_domain.ipfix_collector import frame_messages
+from ports.input.collector_buffer import CollectorBufferPort, BatchHandler
+
+logger = logging.getLogger(__name__)
+
+# Largest IPFIX message (its length field is 16 bits)
+MAX_MESSAGE_LEN = 65535
+
+
+class _tcp_session(asyncio.BufferedProtocol):
+    """
+    One exporter connection: messages framed in the session buffer, the partial message
+    of each read moved to the buffer start.
+    """
+    def __init__(self, collector: "ipfix_socket_collector") -> None:
+        self._collector = collector
+        self._buffer = bytearray(max(collector._tcp_buffer_bytes, 2 * MAX_MESSAGE_LEN))
+        self._view = memoryview(self._buffer)
+        self._end = 0
+        self._transport = None
+        self._peer = None
+
+    def connection_made(self, transport) -> None:
+        self._transport = transport
+        self._peer = transport.get_extra_info("peername")
+        self._collector._sessions.add(self)
+        self._collector._stats["tcp_sessions"] += 1
+
+    def connection_lost(self, exc) -> None:
+        self._collector._sessions.discard(self)
+        self._collector._closed(self._peer)
+
+    def get_buffer(self, sizehint: int) -> memoryview:
+        return self._view[self._end:]
+
+    def buffer_updated(self, nbytes: int) -> None:
+        self._end += nbytes
+        try:
+            offsets, lengths, position = frame_messages(self._buffer, 0, self._end)
+        except ValueError as e:
+            # Lost framing: nothing after this point can be trusted
+            logger.warning(f"IPFIX collector: closing TCP session of {self._peer}: {e}")
+            self._collector._stats["malformed"] += 1
+            self._transport.close()
+            return
+        if offsets:
+            self._collector._dispatch(IpfixMessageBatch(self._view, offsets, lengths, [self._peer] * len(offsets), "tcp"))
+        if position:
+            left = self._end - position
+            self._buffer[:left] = bytes(self._view[position:self._end])
+            self._end = left
+
+    def close(self) -> None:
+        if self._transport:
+            self._transport.close()
+
+
+class ipfix_socket_collector(CollectorBufferPort):
+    """
+    IPFIX collector of one process: one UDP socket and one TCP listener (port 0 picks a
+    free port, None disables the transport).
+    """
+    def __init__(self, handler: BatchHandler, host: str = COLLECTOR_HOST, udp_port: int | None = COLLECTOR_UDP_PORT,
+                 tcp_port: int | None = COLLECTOR_TCP_PORT, reuse_port: bool = True,
+                 batch_messages: int = COLLECTOR_BATCH_MESSAGES, buffer_bytes: int = COLLECTOR_BUFFER_BYTES,
+                 tcp_buffer_bytes: int = COLLECTOR_TCP_BUFFER_BYTES, rcvbuf: int = COLLECTOR_SOCKET_RCVBUF,
+                 on_close: Callable[[object], None] | None = None) -> None:
+        if buffer_bytes < MAX_MESSAGE_LEN:
+            raise collector_error("configuration", f"Receive buffer of {buffer_bytes} bytes (at least {MAX_MESSAGE_LEN})")
+        self._handler = handler
+        # Called with the exporter address of each ended TCP session (state to drop)
+        self._on_close = on_close
+        self._host = host
+        self._udp_port = udp_port
+        self._tcp_port = tcp_port
+        self._reuse_port = reuse_port
+        self._batch_messages = batch_messages
+        self._tcp_buffer_bytes = tcp_buffer_bytes
+        self._rcvbuf = rcvbuf
+        # Preallocated once: every datagram is received in place
+        self._buffer = bytearray(buffer_bytes)
+        self._view = memoryview(self._buffer)
+        self._udp: socket.socket | None = None
+        self._tcp: asyncio.base_events.Server | None = None
+        self._sessions: set[_tcp_session] = set()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._stats = {"messages": 0, "bytes": 0, "batches": 0, "udp_datagrams": 0, "tcp_sessions": 0,
+                       "malformed": 0, "receive_errors": 0, "handler_errors": 0}
+
+    @property
+    def udp_address(self) -> tuple | None:
+        return self._udp.getsockname() if self._udp else None
+    @udp_address.setter
+    def udp_address(self, value) -> None:
+        pass
+    @udp_address.deleter
+    def udp_address(self) -> None:
+        pass
+
+    @property
+    def tcp_address(self) -> tuple | None:
+        return self._tcp.sockets[0].getsockname() if self._tcp and self._tcp.sockets else None
+    @tcp_address.setter
+    def tcp_address(self, value) -> None:
+        pass
+    @tcp_address.deleter
+    def tcp_address(self) -> None:
+        pass
+
+    def stats(self) -> dict:
+        return {**self._stats, "open_tcp_sessions": len(self._sessions)}
+
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        if self._udp_port is not None:
+            self._udp = self._udp_socket()
+            self._loop.add_reader(self._udp.fileno(), self._receive)
+        if self._tcp_port is not None:
+            self._tcp = await self._loop.create_server(
+                lambda: _tcp_session(self), self._host, self._tcp_port, reuse_port=self._reuse_port or None)
+        logger.info(f"IPFIX collector listening on UDP {self.udp_address} and TCP {self.tcp_address}")
+
+    async def stop(self) -> None:
+        if self._udp:
+            self._loop.remove_reader(self._udp.fileno())
+            self._udp.close()
+            self._udp = None
+        if self._tcp:
+            self._tcp.close()
+            for session in list(self._sessions):
+                session.close()
+            await self._tcp.wait_closed()
+            self._tcp = None
+
+    def _udp_socket(self) -> socket.socket:
+        family, kind, proto, _, address = socket.getaddrinfo(self._host, self._udp_port, type=socket.SOCK_DGRAM)[0]
+        sock = socket.socket(family, kind, proto)
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if self._reuse_port:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            if self._rcvbuf:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self._rcvbuf)
+            sock.setblocking(False)
+            sock.bind(address)
+        except OSError as e:
+            sock.close()
+            raise collector_error("socket", f"Cannot bind the IPFIX UDP socket to {address}: {e}")
+        return sock
+
+    def _receive(self) -> None:
+        """Drain the UDP socket into the receive buffer (one batch per wake-up)"""
+        sock, view = self._udp, self._view
+        offsets, lengths, exporters = [], [], []
+        position, limit = 0, len(self._buffer) - MAX_MESSAGE_LEN
+        while position <= limit and len(offsets) < self._batch_messages:
+            try:
+                nbytes, exporter = sock.recvfrom_into(view[position:], MAX_MESSAGE_LEN)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError as e:
+                self._stats["receive_errors"] += 1
+                logger.warning(f"IPFIX collector: UDP receive failed: {e}")
+                break
+            offsets.append(position)
+            lengths.append(nbytes)
+            exporters.append(exporter)
+            position += nbytes
+        if offsets:
+            self._stats["udp_datagrams"] += len(offsets)
+            self._dispatch(IpfixMessageBatch(view, offsets, lengths, exporters, "udp"))
+
+    def _dispatch(self, batch: IpfixMessageBatch) -> None:
+        self._stats["batches"] += 1
+        self._stats["messages"] += len(batch)
+        self._stats["bytes"] += batch.bytes
+        try:
+            self._handler(batch)
+        except Exception as e:
+            self._stats["handler_errors"] += 1
+            logger.error(f"IPFIX collector: batch handler failed ({len(batch)} messages): {e}")
+
+    def _closed(self, exporter: object) -> None:
+        if self._on_close:
+            self._on_close(exporter)
+
+
+class collector_error(Exception):
+    """
+    Custom exception class for IPFIX collectors
+    """
+    def __init__(self, exception_type = None, message =None):
+        self.exception_type = exception_type
+        super().__init__(message or "An unknown error occurred while collecting IPFIX messages.")
@@ -0,0 +1,216 @@
+'''
+IPFIX Files Exporter Adapter
+This module provides an implementation of the interface:
+"ports.output.exporter_buffer.ExporterBufferPort" for IPFIX files.
+Messages are composed in place in one preallocated buffer (struct.pack_into for the
+headers, one vectorized copy per data set for the records) and written out in large
+sequential writes: nothing is allocated per record or per message.
+https://www.rfc-editor.org/rfc/rfc7011
+https://www.rfc-editor.org/rfc/rfc5655
+'''
+import time
+import struct
+import logging
+
+import numpy as np
+
+from config.config import EXPORT_IPFIX_TEMPLATE_REFRESH, EXPORT_IPFIX_WRITE_BUFFER
+from core.entities.ipfix_record import IpfixTemplate
+from ports.output.exporter_buffer import ExporterBufferPort
+
+logger = logging.getLogger(__name__)
+
+IPFIX_VERSION = 10
+MAX_MESSAGE_LEN = 65535
+TEMPLATE_SET_ID = 2
+ENTERPRISE_BIT = 0x8000
+MESSAGE_HEADER = struct.Struct("!HHIII")  # version, length, export time, sequence number, observation domain
+SET_HEADER = struct.Struct("!HH")  # set id, length
+
+
+def _template_record(template: IpfixTemplate) -> bytes:
+    """Template record (header + field specifiers), built once per template"""
+    record = bytearray(struct.pack("!HH", template.template_id, len(template.fields)))
+    for ie in template.fields:
+        if ie.enterprise_number:
+            record += struct.pack("!HHI", ie.element_id | ENTERPRISE_BIT, ie.length, ie.enterprise_number)
+        else:
+            record += struct.pack("!HH", ie.element_id, ie.length)
+    return bytes(record)
+
+
+class ipfix_file(ExporterBufferPort):
+    """
+    IPFIX file writer: each message is filled with as many records as fit (up to
+    max_message bytes), consecutive records of one template share one data set, and
+    templates are written before their first records (again every template_refresh
+    messages when non-zero).
+    """
+    def __init__(self, path: str, observation_domain_id: int = 0,
+                 template_refresh: int = EXPORT_IPFIX_TEMPLATE_REFRESH,
+                 buffer_size: int = EXPORT_IPFIX_WRITE_BUFFER, max_message: int = MAX_MESSAGE_LEN):
+        if not MESSAGE_HEADER.size + SET_HEADER.size < max_message <= min(buffer_size, MAX_MESSAGE_LEN):
+            raise ipfix_error("configuration", f"Invalid IPFIX message size {max_message} (write buffer {buffer_size})")
+        self._path = path
+        self._observation_domain_id = observation_domain_id
+        self._template_refresh = template_refresh
+        self._max_message = max_message
+        self._buffer = bytearray(buffer_size)
+        self._bytes = np.frombuffer(self._buffer, np.uint8)
+        self._pos = 0
+        # Offsets of the open message / set in the buffer (-1: none)
+        self._message = -1
+        self._set = -1
+        self._set_id = -1
+        self._message_records = 0
+        # Template, its template record and the wire dtype of its data records
+        self._templates: dict[int, tuple[IpfixTemplate, bytes, np.dtype]] = {}
+        self._sent: set[int] = set()
+        self._sequence = 0
+        self._stats = {"messages": 0, "records": 0, "bytes": 0}
+        try:
+            self._file = open(path, "wb", buffering=0)
+        except OSError as e:
+            raise ipfix_error("file", f"Cannot create IPFIX file {path}: {e}")
+
+    @property
+    def path(self) -> str:
+        return self._path
+    @path.setter
+    def path(self, value: str) -> None:
+        pass
+    @path.deleter
+    def path(self) -> None:
+        pass
+
+    @property
+    def stats(self) -> dict:
+        return dict(self._stats)
+    @stats.setter
+    def stats(self, value: dict) -> None:
+        pass
+    @stats.deleter
+    def stats(self) -> None:
+        pass
+
+    def add_template(self, template: IpfixTemplate) -> None:
+        record = _template_record(template)
+        if MESSAGE_HEADER.size + 2 * SET_HEADER.size + len(record) + template.record_length > self._max_message:
+            raise ipfix_error("template", f"Template {template.template_id} does not fit in a {self._max_message} bytes message")
+        self._templates[template.template_id] = (template, record, template.dtype)
+        self._sent.discard(template.template_id)
+
+    def write(self, template_id: int, records: np.ndarray) -> int:
+        if self._file is None:
+            raise ipfix_error("file", f"IPFIX file {self._path} is closed")
+        if template_id not in self._templates:
+            raise ipfix_error("template", f"Unknown template {template_id}")
+        template, _, dtype = self._templates[template_id]
+        length = template.record_length
+        if records.dtype != dtype:
+            # Written as they are: same fields, offsets and (big-endian) byte order only
+            raise ipfix_error("records", f"Records of dtype {records.dtype} for template {template_id} (wire dtype {dtype})")
+        data = np.ascontiguousarray(records).view(np.uint8)
+        done, count = 0, len(records)
+        while done < count:
+            if self._message < 0:
+                self._begin_message()
+            if template_id not in self._sent:
+                if self._room(SET_HEADER.size + len(self._templates[template_id][1])) < 0:
+                    self._end_message()
+                    continue
+                self._add_template_set(template_id)
+            header = 0 if self._set_id == template_id else SET_HEADER.size
+            fit = min(count - done, self._room(header) // length)
+            if fit <= 0:
+                self._end_message()
+                continue
+            if header:
+                self._begin_set(template_id)
+            self._bytes[self._pos:self._pos + fit * length] = data[done * length:(done + fit) * length]
+            self._pos += fit * length
+            self._message_records += fit
+            done += fit
+        return count
+
+    def flush(self) -> None:
+        if self._file is None:
+            return
+        self._end_message()
+        self._write_out()
+
+    def close(self) -> None:
+        if self._file is None:
+            return
+        try:
+            self.flush()
+        finally:
+            self._file.close()
+            self._file = None
+            logger.info(f"IPFIX file {self._path}: {self._stats['records']} records in {self._stats['messages']} messages ({self._stats['bytes']} bytes)")
+
+    # ---- message composition ---------------------------------------------------------
+
+    def _room(self, needed: int) -> int:
+        """Bytes left in the open message once `needed` more bytes are added"""
+        return self._message + self._max_message - self._pos - needed
+
+    def _begin_message(self) -> None:
+        if len(self._buffer) - self._pos < self._max_message:
+            self._write_out()
+        if self._template_refresh and self._stats["messages"] and not self._stats["messages"] % self._template_refresh:
+            self._sent.clear()
+        self._message = self._pos
+        self._pos += MESSAGE_HEADER.size
+        self._message_records = 0
+
+    def _end_message(self) -> None:
+        if self._message < 0:
+            return
+        self._end_set()
+        MESSAGE_HEADER.pack_into(self._buffer, self._message, IPFIX_VERSION, self._pos - self._message,
+                                 int(time.time()), self._sequence, self._observation_domain_id)
+        # Sequence number: data records exported before each message (modulo 2^32)
+        self._sequence = (self._sequence + self._message_records) & 0xFFFFFFFF
+        self._stats["messages"] += 1
+        self._stats["records"] += self._message_records
+        self._message = -1
+
+    def _begin_set(self, set_id: int) -> None:
+        self._end_set()
+        self._set, self._set_id = self._pos, set_id
+        self._pos += SET_HEADER.size
+
+    def _end_set(self) -> None:
+        if self._set < 0:
+            return
+        SET_HEADER.pack_into(self._buffer, self._set, self._set_id, self._pos - self._set)
+        self._set = self._set_id = -1
+
+    def _add_template_set(self, template_id: int) -> None:
+        record = self._templates[template_id][1]
+        self._begin_set(TEMPLATE_SET_ID)
+        self._buffer[self._pos:self._pos + len(record)] = record
+        self._pos += len(record)
+        self._end_set()
+        self._sent.add(template_id)
+
+    def _write_out(self) -> None:
+        """Write the buffered (complete) messages in one sequential write"""
+        view = memoryview(self._buffer)[:self._pos]
+        try:
+            while view:
+                view = view[self._file.write(view):]
+        except OSError as e:
+            raise ipfix_error("file", f"Cannot write IPFIX file {self._path}: {e}")
+        self._stats["bytes"] += self._pos
+        self._pos = 0
+
+
+class ipfix_error(Exception):
+    """
+    Custom exception class for IPFIX exporters
+    """
+    def __init__(self, exception_type = None, message =None):
+        self.exception_type = exception_type
+        super().__init__(message or "An unknown error occurred while exporting IPFIX messages.")
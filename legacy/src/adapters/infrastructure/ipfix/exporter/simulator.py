@@ -0,0 +1,149 @@
+'''
+IPFIX Exporter Simulator
+Synthetic flow records (FLOW_TEMPLATE_IPV4) sent to a collector over UDP or TCP at a
+target rate, to exercise the collector locally:
+    python -m adapters.infrastructure.ipfix.exporter.simulator --transport udp --port 4739 --rate 200000 --seconds 10
+Messages are built once (records of a preallocated pool): sending one only rewrites its
+header (export time, sequence number) in place.
+'''
+import time
+import socket
+import argparse
+
+import numpy as np
+
+from core.entities.ipfix_record import IpfixTemplate, FLOW_TEMPLATE_IPV4
+from .file_writer import IPFIX_VERSION, MESSAGE_HEADER, SET_HEADER, TEMPLATE_SET_ID, _template_record
+
+# Messages of a typical exporter (fits an Ethernet MTU over UDP)
+DEFAULT_MESSAGE_LEN = 1400
+# Template set sent again every TEMPLATE_REFRESH messages (UDP has no session to rely on)
+TEMPLATE_REFRESH = 1024
+# Distinct messages cycled through
+POOL_MESSAGES = 64
+
+
+def flow_records(count: int, template: IpfixTemplate = FLOW_TEMPLATE_IPV4, seed: int = 0) -> np.ndarray:
+    """Random data records with the wire layout of a flow template"""
+    rng = np.random.default_rng(seed)
+    records = np.zeros(count, dtype=template.dtype)
+    now = int(time.time() * 1000)
+    for name in records.dtype.names:
+        kind = records.dtype[name]
+        if kind.kind == "V":
+            records[name] = np.frombuffer(rng.bytes(count * kind.itemsize), dtype=kind)
+        else:
+            records[name] = rng.integers(0, np.iinfo(kind).max, count, dtype=kind.newbyteorder("="), endpoint=True)
+    records["flowEndMilliseconds"] = now - rng.integers(0, 60000, count)
+    records["flowStartMilliseconds"] = records["flowEndMilliseconds"] - rng.integers(0, 60000, count)
+    records["protocolIdentifier"] = rng.choice([6, 17], count)
+    return records
+
+
+class exporter_simulator:
+    """
+    One exporter (one transport session, one observation domain) sending flow records.
+    """
+    def __init__(self, host: str = "127.0.0.1", port: int = 4739, transport: str = "udp",
+                 observation_domain_id: int = 1, max_message: int = DEFAULT_MESSAGE_LEN,
+                 template: IpfixTemplate = FLOW_TEMPLATE_IPV4) -> None:
+        if transport not in ("udp", "tcp"):
+            raise ValueError(f"Unknown transport: {transport}. Supported transports are udp and tcp.")
+        self._transport = transport
+        self._domain = observation_domain_id
+        self._template = template
+        self._per_message = (max_message - MESSAGE_HEADER.size - SET_HEADER.size) // template.record_length
+        if self._per_message < 1:
+            raise ValueError(f"Messages of {max_message} bytes cannot hold a {template.record_length} bytes record")
+        self._messages = self._message_pool()
+        record = _template_record(template)
+        self._template_message = bytearray(MESSAGE_HEADER.size + SET_HEADER.size + len(record))
+        SET_HEADER.pack_into(self._template_message, MESSAGE_HEADER.size, TEMPLATE_SET_ID, SET_HEADER.size + len(record))
+        self._template_message[MESSAGE_HEADER.size + SET_HEADER.size:] = record
+        self._sequence = 0
+        self._sent = 0
+        kind = socket.SOCK_DGRAM if transport == "udp" else socket.SOCK_STREAM
+        family, _, proto, _, address = socket.getaddrinfo(host, port, type=kind)[0]
+        self._socket = socket.socket(family, kind, proto)
+        self._socket.connect(address)
+
+    @property
+    def records_per_message(self) -> int:
+        return self._per_message
+    @records_per_message.setter
+    def records_per_message(self, value: int) -> None:
+        pass
+    @records_per_message.deleter
+    def records_per_message(self) -> None:
+        pass
+
+    def _message_pool(self) -> list[bytearray]:
+        records = flow_records(POOL_MESSAGES * self._per_message, self._template)
+        body = SET_HEADER.size + self._per_message * self._template.record_length
+        messages = []
+        for i in range(POOL_MESSAGES):
+            message = bytearray(MESSAGE_HEADER.size + body)
+            SET_HEADER.pack_into(message, MESSAGE_HEADER.size, self._template.template_id, body)
+            message[MESSAGE_HEADER.size + SET_HEADER.size:] = records[i * self._per_message:(i + 1) * self._per_message].tobytes()
+            messages.append(message)
+        return messages
+
+    def _send(self, message: bytearray, records: int) -> None:
+        MESSAGE_HEADER.pack_into(message, 0, IPFIX_VERSION, len(message), int(time.time()), self._sequence, self._domain)
+        if self._transport == "udp":
+            self._socket.send(message)
+        else:
+            self._socket.sendall(message)
+        self._sequence = (self._sequence + records) & 0xFFFFFFFF
+
+    def send(self, records: int, rate: int = 0) -> dict:
+        """Send at least `records` data records (whole messages), at `rate` records per
+        second (0 = as fast as possible). Returns {"messages", "records", "seconds"}"""
+        started = time.perf_counter()
+        messages = -(-records // self._per_message)
+        for i in range(messages):
+            if not self._sent % TEMPLATE_REFRESH:
+                self._send(self._template_message, 0)
+            self._send(self._messages[i % POOL_MESSAGES], self._per_message)
+            self._sent += 1
+            if rate and not i % 64:
+                ahead = (i + 1) * self._per_message / rate - (time.perf_counter() - started)
+                if ahead > 0:
+                    time.sleep(ahead)
+        return {"messages": messages, "records": messages * self._per_message,
+                "seconds": round(time.perf_counter() - started, 6)}
+
+    def close(self) -> None:
+        self._socket.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="IPFIX exporter simulator (synthetic IPv4 flow records)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4739)
+    parser.add_argument("--transport", choices=("udp", "tcp"), default="udp")
+    parser.add_argument("--rate", type=int, default=200000, help="Records per second (0 = as fast as possible)")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--exporters", type=int, default=1, help="Exporters (source ports / sessions), round robin")
+    parser.add_argument("--message-bytes", type=int, default=DEFAULT_MESSAGE_LEN)
+    args = parser.parse_args()
+    exporters = [exporter_simulator(args.host, args.port, args.transport, i + 1, args.message_bytes)
+                 for i in range(args.exporters)]
+    total = {"messages": 0, "records": 0}
+    started = time.perf_counter()
+    rate = args.rate // len(exporters)
+    chunk = max(rate // 10, exporters[0].records_per_message) if rate else 100000
+    while time.perf_counter() - started < args.seconds:
+        for exporter in exporters:
+            sent = exporter.send(chunk)
+            total["messages"] += sent["messages"]
+            total["records"] += sent["records"]
+        if rate:
+            ahead = total["records"] / args.rate - (time.perf_counter() - started)
+            if ahead > 0:
+                time.sleep(ahead)
+    elapsed = time.perf_counter() - started
+    for exporter in exporters:
+        exporter.close()
+    print(f"{total['records']} records in {total['messages']} messages, {elapsed:.2f}s "
+          f"({total['records'] / elapsed:.0f} records/s)")
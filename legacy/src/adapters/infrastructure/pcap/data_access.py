@@ -0,0 +1,332 @@
+'''
+PCAP/PCAPNG Capture Files Adapter
+This module provides an implementation of the interface:
+"ports.repositories.pcap.PcapPort" for local capture files.
+Files are memory-mapped and parsed in place (struct.unpack_from on the mapping),
+packets are yielded as memoryview slices: memory per reader stays constant
+whatever the capture size.
+https://www.tcpdump.org/manpages/pcap-savefile.5.html
+https://www.ietf.org/archive/id/draft-ietf-opsawg-pcapng-02.html
+'''
+import os
+import mmap
+import struct
+import logging
+from typing import Iterator
+
+from core.entities.pcap_file import PcapFileInfo, PcapInterface
+from core.entities.pcap_packet import PcapPacket
+from ports.repositories.pcap import PcapPort
+
+logger = logging.getLogger(__name__)
+
+## Classic pcap
+PCAP_HEADER_LEN = 24
+PCAP_RECORD_LEN = 16
+# magic (as read little-endian) -> (byte order, timestamp resolution)
+_PCAP_MAGICS = {
+    0xA1B2C3D4: ("<", 1e-6),
+    0xA1B23C4D: ("<", 1e-9),
+    0xD4C3B2A1: (">", 1e-6),
+    0x4D3CB2A1: (">", 1e-9),
+}
+## pcapng
+PCAPNG_SHB = 0x0A0D0D0A
+PCAPNG_IDB = 0x00000001
+PCAPNG_SPB = 0x00000003
+PCAPNG_EPB = 0x00000006
+PCAPNG_BYTE_ORDER_MAGIC = 0x1A2B3C4D
+PCAPNG_OPT_ENDOFOPT = 0
+PCAPNG_OPT_IF_TSRESOL = 9
+
+# Shard boundaries: a record is accepted as a boundary when RESYNC_CHAIN consecutive
+# plausible records start there, searched within RESYNC_WINDOW bytes of the target offset
+RESYNC_CHAIN = 8
+RESYNC_WINDOW = 1024 * 1024
+MAX_PACKET_LEN = 262144
+MAX_TIME_SKEW = 366 * 24 * 3600
+
+# Drop already parsed pages from the mapping every RELEASE_EVERY bytes (keeps RSS flat
+# on multi-GB captures; pages are re-read from the file if a kept view is accessed)
+RELEASE_EVERY = 64 * 1024 * 1024
+
+_structs: dict[str, struct.Struct] = {}
+
+
+def _st(fmt: str) -> struct.Struct:
+    if fmt not in _structs:
+        _structs[fmt] = struct.Struct(fmt)
+    return _structs[fmt]
+
+
+class pcap_local(PcapPort):
+    """
+    Memory-mapped local PCAP/PCAPNG file reader.
+    """
+    def __init__(self, path: str) -> None:
+        self._path = path
+        try:
+            self._file = open(path, "rb")
+        except OSError as e:
+            raise pcap_error("file_not_readable", f"Capture file {path} cannot be opened: {e}")
+        self._size = os.fstat(self._file.fileno()).st_size
+        if self._size < 12:
+            self._file.close()
+            raise pcap_error("unknown_format", f"Capture file {path} is empty or truncated")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if hasattr(self._mm, "madvise"):
+            self._mm.madvise(mmap.MADV_SEQUENTIAL)
+        self._view = memoryview(self._mm)
+        self._info = self._read_info()
+
+    @property
+    def path(self) -> str:
+        return self._path
+    @path.setter
+    def path(self, value):
+        pass
+    @path.deleter
+    def path(self):
+        pass
+
+    @property
+    def size(self) -> int:
+        return self._size
+    @size.setter
+    def size(self, value):
+        pass
+    @size.deleter
+    def size(self):
+        pass
+
+    def info(self) -> PcapFileInfo:
+        return self._info
+
+    def packets(self, start: int = 0, end: int | None = None) -> Iterator[PcapPacket]:
+        """start/end select packets by record offset; start must be 0 or a record
+        boundary (the offset of a previously yielded packet, or a split() boundary).
+        pcapng reads starting past 0 use the interfaces of the first section."""
+        end = self._size if end is None else min(end, self._size)
+        if self._info.format == "pcap":
+            return self._pcap_packets(max(start, PCAP_HEADER_LEN), end)
+        return self._pcapng_packets(start, end)
+
+    def split(self, shard_bytes: int) -> list[tuple[int, int]]:
+        first = self._data_start
+        parts = max(1, -(-(self._size - first) // max(1, shard_bytes)))
+        bounds = [first]
+        for part in range(1, parts):
+            boundary = self._resync(first + part * (self._size - first) // parts)
+            if boundary is not None and boundary > bounds[-1]:
+                bounds.append(boundary)
+        bounds.append(self._size)
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    def close(self) -> None:
+        if self._mm is None:
+            return
+        self._view.release()
+        try:
+            self._mm.close()
+        except BufferError:
+            # Packet views still referenced by the caller: the mapping is freed with them
+            logger.debug(f"Capture {self._path} still has exported packet views")
+        self._mm = None
+        self._file.close()
+
+    # ---- headers ---------------------------------------------------------------------
+
+    def _read_info(self) -> PcapFileInfo:
+        (magic,) = _st("<I").unpack_from(self._mm, 0)
+        if magic in _PCAP_MAGICS:
+            order, resolution = _PCAP_MAGICS[magic]
+            major, minor, _, _, snaplen, network = _st(order + "HHiIII").unpack_from(self._mm, 4)
+            self._order = order
+            self._data_start = PCAP_HEADER_LEN
+            # Plausibility reference for split() boundaries
+            self._first_ts_sec = _st(order + "I").unpack_from(self._mm, PCAP_HEADER_LEN)[0] if self._size >= PCAP_HEADER_LEN + 4 else 0
+            return PcapFileInfo(
+                path=self._path, format="pcap", byte_order=order, size=self._size, version=f"{major}.{minor}",
+                interfaces=[PcapInterface(link_type=network & 0x0FFFFFFF, snaplen=snaplen, ts_resolution=resolution)],
+            )
+        if magic == PCAPNG_SHB:
+            order, major, minor = self._section_header(0)
+            interfaces = []
+            offset = _st(order + "I").unpack_from(self._mm, 4)[0]
+            # Leading Interface Description Blocks of the first section
+            while offset + 12 <= self._size:
+                block_type, block_len = _st(order + "II").unpack_from(self._mm, offset)
+                if block_type != PCAPNG_IDB or block_len < 20:
+                    break
+                interfaces.append(self._interface(order, offset, block_len))
+                offset += block_len
+            self._order = order
+            self._data_start = offset
+            return PcapFileInfo(
+                path=self._path, format="pcapng", byte_order=order, size=self._size,
+                version=f"{major}.{minor}", interfaces=interfaces,
+            )
+        raise pcap_error("unknown_format", f"{self._path} is not a PCAP/PCAPNG file (magic {magic:#010x})")
+
+    def _section_header(self, offset: int) -> tuple[str, int, int]:
+        """Byte order and version of the Section Header Block at offset"""
+        (bom,) = _st("<I").unpack_from(self._mm, offset + 8)
+        if bom == PCAPNG_BYTE_ORDER_MAGIC:
+            order = "<"
+        elif bom == 0x4D3C2B1A:
+            order = ">"
+        else:
+            raise pcap_error("unknown_format", f"Invalid pcapng byte-order magic at offset {offset} in {self._path}")
+        major, minor = _st(order + "HH").unpack_from(self._mm, offset + 12)
+        return order, major, minor
+
+    def _interface(self, order: str, offset: int, block_len: int) -> PcapInterface:
+        link_type, _, snaplen = _st(order + "HHI").unpack_from(self._mm, offset + 8)
+        resolution = 1e-6
+        opt, opt_end = offset + 16, offset + block_len - 4
+        while opt + 4 <= opt_end:
+            code, length = _st(order + "HH").unpack_from(self._mm, opt)
+            if code == PCAPNG_OPT_ENDOFOPT:
+                break
+            if code == PCAPNG_OPT_IF_TSRESOL and length >= 1:
+                value = self._mm[opt + 4]
+                resolution = 2.0 ** -(value & 0x7F) if value & 0x80 else 10.0 ** -value
+            opt += 4 + ((length + 3) & ~3)
+        return PcapInterface(link_type=link_type, snaplen=snaplen, ts_resolution=resolution)
+
+    # ---- shard boundaries ------------------------------------------------------------
+
+    def _resync(self, target: int) -> int | None:
+        """First offset at/after target where a chain of plausible records starts"""
+        check = self._pcap_record_ok if self._info.format == "pcap" else self._pcapng_block_ok
+        for candidate in range(target, min(target + RESYNC_WINDOW, self._size)):
+            offset, chain = candidate, 0
+            while chain < RESYNC_CHAIN and offset < self._size:
+                offset = check(offset)
+                if offset is None:
+                    break
+                chain += 1
+            else:
+                return candidate
+        return None
+
+    def _pcap_record_ok(self, offset: int) -> int | None:
+        """Offset of the next record if a plausible classic pcap record starts at offset"""
+        if offset + PCAP_RECORD_LEN > self._size:
+            return None
+        ts_sec, ts_frac, caplen, wirelen = _st(self._order + "IIII").unpack_from(self._mm, offset)
+        interface = self._info.interfaces[0]
+        if (caplen > wirelen or wirelen > MAX_PACKET_LEN or (interface.snaplen and caplen > interface.snaplen)
+                or ts_frac * interface.ts_resolution >= 1.0 or abs(ts_sec - self._first_ts_sec) > MAX_TIME_SKEW):
+            return None
+        following = offset + PCAP_RECORD_LEN + caplen
+        return following if following <= self._size else None
+
+    def _pcapng_block_ok(self, offset: int) -> int | None:
+        """Offset of the next block if a packet block with a matching trailing length starts at offset"""
+        if offset + 16 > self._size:
+            return None
+        block_type, block_len = _st(self._order + "II").unpack_from(self._mm, offset)
+        if block_type not in (PCAPNG_EPB, PCAPNG_SPB) or block_len % 4 or not 16 <= block_len <= MAX_PACKET_LEN + 64:
+            return None
+        if offset + block_len > self._size or _st(self._order + "I").unpack_from(self._mm, offset + block_len - 4)[0] != block_len:
+            return None
+        return offset + block_len
+
+    # ---- packets ---------------------------------------------------------------------
+
+    def _release(self, upto: int, released: int) -> int:
+        """madvise(DONTNEED) the parsed pages in [released, upto); returns the new mark"""
+        upto -= upto % mmap.PAGESIZE
+        if upto - released >= RELEASE_EVERY and hasattr(self._mm, "madvise"):
+            self._mm.madvise(mmap.MADV_DONTNEED, released, upto - released)
+            return upto
+        return released
+
+    def _pcap_packets(self, offset: int, end: int) -> Iterator[PcapPacket]:
+        interface = self._info.interfaces[0]
+        link_type, resolution = interface.link_type, interface.ts_resolution
+        record = _st(self._order + "IIII")
+        mm, view, size = self._mm, self._view, self._size
+        released = offset - offset % mmap.PAGESIZE
+        while offset < end:
+            if offset + PCAP_RECORD_LEN > size:
+                logger.warning(f"Truncated packet record at offset {offset} in {self._path}")
+                return
+            ts_sec, ts_frac, caplen, wirelen = record.unpack_from(mm, offset)
+            data_start = offset + PCAP_RECORD_LEN
+            if data_start + caplen > size:
+                logger.warning(f"Truncated packet data at offset {offset} in {self._path}")
+                return
+            yield PcapPacket(ts_sec + ts_frac * resolution, caplen, wirelen, link_type, 0, offset,
+                             view[data_start:data_start + caplen], data_start)
+            offset = data_start + caplen
+            if offset - released >= RELEASE_EVERY:
+                released = self._release(offset, released)
+
+    def _pcapng_packets(self, start: int, end: int) -> Iterator[PcapPacket]:
+        mm, view, size = self._mm, self._view, self._size
+        order, interfaces = "<", []
+        offset = 0
+        if start > 0:
+            # Shard read: resume right at a record of the first section
+            order, interfaces, offset = self._order, list(self._info.interfaces), start
+        released = offset - offset % mmap.PAGESIZE
+        # Simple Packet Blocks carry no timestamp: they get the one of the packet before them
+        timestamp = None
+        skipped = {"unknown_interface": 0, "no_timestamp": 0}
+        try:
+            while offset < end:
+                if offset + 12 > size:
+                    return
+                # The SHB type reads the same in both byte orders, the other types do not
+                (block_type,) = _st(order + "I").unpack_from(mm, offset)
+                if block_type == PCAPNG_SHB:
+                    # A new section may switch byte order and always resets the interfaces
+                    order, _, _ = self._section_header(offset)
+                    interfaces = []
+                block_len = _st(order + "I").unpack_from(mm, offset + 4)[0]
+                if block_len < 12 or offset + block_len > size:
+                    logger.warning(f"Truncated pcapng block at offset {offset} in {self._path}")
+                    return
+                if block_type == PCAPNG_IDB:
+                    interfaces.append(self._interface(order, offset, block_len))
+                elif offset >= start and block_type == PCAPNG_EPB:
+                    if_id, ts_high, ts_low, caplen, wirelen = _st(order + "IIIII").unpack_from(mm, offset + 8)
+                    if if_id < len(interfaces):
+                        interface = interfaces[if_id]
+                        timestamp = ((ts_high << 32) | ts_low) * interface.ts_resolution
+                        data_start = offset + 28
+                        yield PcapPacket(timestamp, caplen, wirelen, interface.link_type, if_id, offset,
+                                         view[data_start:data_start + caplen], data_start)
+                    else:
+                        # Malformed capture: interface never described
+                        skipped["unknown_interface"] += 1
+                elif offset >= start and block_type == PCAPNG_SPB:
+                    (wirelen,) = _st(order + "I").unpack_from(mm, offset + 8)
+                    if not interfaces:
+                        skipped["unknown_interface"] += 1
+                    elif timestamp is None:
+                        # No packet before it to take the time of (not placed at the epoch)
+                        skipped["no_timestamp"] += 1
+                    else:
+                        interface = interfaces[0]
+                        caplen = min(wirelen, block_len - 16, interface.snaplen or wirelen)
+                        data_start = offset + 12
+                        yield PcapPacket(timestamp, caplen, wirelen, interface.link_type, 0, offset,
+                                         view[data_start:data_start + caplen], data_start)
+                offset += block_len
+                if offset - released >= RELEASE_EVERY:
+                    released = self._release(offset, released)
+        finally:
+            if any(skipped.values()):
+                logger.warning(f"Skipped pcapng packets in {self._path}: {skipped}")
+
+
+class pcap_error(Exception):
+    """
+    Custom exception class for capture files
+    """
+    def __init__(self, exception_type = None, message =None):
+        self.exception_type = exception_type
+        super().__init__(message or "An unknown error occurred while reading the capture file.")
@@ -0,0 +1,172 @@
+'''
+Content negotiation for the time series data endpoints.
+Besides JSON, series are served as binary columns, streamed in chunks straight from
+the NumPy buffers (no Python float per sample):
+- application/vnd.apache.arrow.stream: Arrow IPC stream (requires pyarrow), one
+  "timestamp" int64 column and one float64 column per data source, NaN = unknown,
+  series metadata in the schema metadata.
+- application/octet-stream: packed little-endian columns. A uint32 header length,
+  the JSON header ({"uuid", "start", "end", "step", "points", "downsampling",
+  "columns": [names]}), then "points" int64 timestamps, then "points" float64 values
+  for each column in header order.
+Compressed with zstd (requires zstandard) or gzip when accepted (Accept-Encoding).
+Exports (CSV, NDJSON, Parquet) are streamed as produced, compressed the same way
+(except Parquet, compressed internally).
+'''
+import io
+import json
+import zlib
+import struct
+from typing import AsyncIterator, Iterator
+
+import numpy as np
+from fastapi.responses import JSONResponse, StreamingResponse
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+JSON = "application/json"
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+PACKED_COLUMNS = "application/octet-stream"
+EXPORT_MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson", "parquet": "application/vnd.apache.parquet"}
+# Rows per Arrow record batch / bytes per packed chunk
+CHUNK_ROWS = 65536
+CHUNK_BYTES = 1024 * 1024
+
+
+def media_types() -> list[str]:
+    return [JSON, PACKED_COLUMNS] + ([ARROW_STREAM] if pyarrow else [])
+
+
+def encodings() -> list[str]:
+    return (["zstd"] if zstandard else []) + ["gzip"]
+
+
+def _ranked(header: str) -> list[tuple[float, str]]:
+    """Header values ranked by quality ("a;q=0.5, b" -> [(1.0, "b"), (0.5, "a")]), q=0 dropped"""
+    ranked = []
+    for position, item in enumerate(header.split(",")):
+        value, *params = [part.strip() for part in item.split(";")]
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if value and quality > 0:
+            ranked.append((-quality, position, value.lower()))
+    return [(-quality, value) for quality, _, value in sorted(ranked)]
+
+
+def negotiate(accept: str | None) -> str | None:
+    """Preferred supported media type (JSON without Accept header), None if none is acceptable"""
+    if not accept:
+        return JSON
+    supported = media_types()
+    for _, value in _ranked(accept):
+        if value in supported:
+            return value
+        if value in ("*/*", "application/*"):
+            return JSON
+    return None
+
+
+def negotiate_encoding(accept_encoding: str | None) -> str | None:
+    """Preferred supported content coding, None for identity"""
+    accepted = [value for _, value in _ranked(accept_encoding or "")]
+    for encoding in encodings():
+        if encoding in accepted:
+            return encoding
+    return None
+
+
+def _packed_chunks(series: dict) -> Iterator[bytes]:
+    header = json.dumps({key: series[key] for key in ("uuid", "start", "end", "step", "points", "downsampling")}
+                        | {"columns": list(series["columns"])}).encode()
+    yield struct.pack("<I", len(header)) + header
+    for array in (series["timestamps"].astype("<i8", copy=False), *(column.astype("<f8", copy=False) for column in series["columns"].values())):
+        data = memoryview(np.ascontiguousarray(array)).cast("B")
+        for offset in range(0, len(data), CHUNK_BYTES):
+            yield bytes(data[offset:offset + CHUNK_BYTES])
+
+
+def _take(sink: io.BytesIO) -> bytes:
+    data = sink.getvalue()
+    sink.seek(0)
+    sink.truncate()
+    return data
+
+
+def _arrow_chunks(series: dict) -> Iterator[bytes]:
+    names = ["timestamp", *series["columns"]]
+    schema = pyarrow.schema(
+        [pyarrow.field("timestamp", pyarrow.int64())] + [pyarrow.field(name, pyarrow.float64()) for name in series["columns"]],
+        metadata={key: json.dumps(series[key]) for key in ("uuid", "start", "end", "step", "points", "downsampling")},
+    )
+    arrays = [series["timestamps"], *series["columns"].values()]
+    sink = io.BytesIO()
+    with pyarrow.ipc.new_stream(sink, schema) as writer:
+        for offset in range(0, max(series["points"], 1), CHUNK_ROWS):
+            writer.write_batch(pyarrow.record_batch([array[offset:offset + CHUNK_ROWS] for array in arrays], names=names))
+            yield _take(sink)
+    yield _take(sink)
+
+
+def _compressor(encoding: str):
+    return zstandard.ZstdCompressor().compressobj() if encoding == "zstd" else zlib.compressobj(6, zlib.DEFLATED, 31)
+
+
+def _compressed(chunks: Iterator[bytes], encoding: str | None) -> Iterator[bytes]:
+    if encoding is None:
+        yield from chunks
+        return
+    compressor = _compressor(encoding)
+    for chunk in chunks:
+        if data := compressor.compress(chunk):
+            yield data
+    yield compressor.flush()
+
+
+async def _compressed_stream(chunks: AsyncIterator[bytes], encoding: str | None) -> AsyncIterator[bytes]:
+    compressor = _compressor(encoding) if encoding else None
+    async for chunk in chunks:
+        if compressor:
+            chunk = compressor.compress(chunk)
+        if chunk:
+            yield chunk
+    if compressor:
+        yield compressor.flush()
+
+
+def series_response(series: dict, media_type: str, encoding: str | None) -> JSONResponse | StreamingResponse:
+    """Response for one series: JSON-ready dict for JSON, NumPy arrays for the binary formats"""
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if media_type == JSON:
+        response = JSONResponse(content=series, headers=headers)
+        if not encoding:
+            return response
+        chunks = iter([response.body])
+    else:
+        chunks = _arrow_chunks(series) if media_type == ARROW_STREAM else _packed_chunks(series)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return StreamingResponse(_compressed(chunks, encoding), media_type=media_type, headers=headers)
+
+
+def export_response(chunks: AsyncIterator[bytes], output_type: str, filename: str,
+                    encoding: str | None) -> StreamingResponse:
+    """Streamed export (attachment), compressed on the fly when accepted"""
+    if output_type == "parquet":
+        encoding = None
+    headers = {"Vary": "Accept-Encoding", "Content-Disposition": f'attachment; filename="{filename}.{output_type}"'}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return StreamingResponse(_compressed_stream(chunks, encoding), media_type=EXPORT_MEDIA_TYPES[output_type],
+                             headers=headers)
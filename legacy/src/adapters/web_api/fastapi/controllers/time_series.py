@@ -2,17 +2,117 @@
 This Adapter module is a controllers (FastApi) for the time-series analyses. This module will interact with the input ports/interfaces and are completely decoupled from the use cases and related business logic.
 '''
 from fastapi import HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
+from adapters.web_api.fastapi.content_negotiation import (
+    EXPORT_MEDIA_TYPES, JSON, export_response, media_types, negotiate, negotiate_encoding, series_response,
+)
 from ports.input.analysis import analysisService
+from core.entities.time_series import SeriesQuery
+from ports.repositories.time_series import timeSeriesCacheStats
 
-async def get_time_series_info(uuid: str, type: str) -> JSONResponse:
-    time_series_info = await analysisService(type=type).instance_info(ts_uuid=uuid)
+async def get_time_series_info(uuid: str, type: str) -> Response:
+    # Serialized once per version of the instance files
+    time_series_info = await analysisService(type=type).instance_info(ts_uuid=uuid, serialized=True)
     if time_series_info:
-        return JSONResponse(content=time_series_info)
+        return Response(content=time_series_info, media_type="application/json")
     else:
         raise HTTPException(
             status_code=404,
             detail={
                 "error": "Time series instance not found",
                 "uuid": uuid
-            })
\ No newline at end of file
+            })
+
+
+async def get_time_series_data(uuid: str, measurement_uuid: str, start: int, end: int,
+                               points: int, method: str, cf: str,
+                               accept: str | None = None, accept_encoding: str | None = None) -> Response:
+    media_type = negotiate(accept)
+    if media_type is None:
+        raise HTTPException(
+            status_code=406,
+            detail={
+                "error": "Not acceptable",
+                "supported_media_types": media_types()
+            })
+    try:
+        series = await analysisService(type="time-series").measurements_fetch(
+            ts_uuid=uuid, measurements=[measurement_uuid], start=start, end=end, points=points, method=method, cf=cf,
+            arrays=media_type != JSON)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail={"error": str(e), "uuid": uuid})
+    if series:
+        return series_response(series[0], media_type, negotiate_encoding(accept_encoding))
+    else:
+        raise HTTPException(
+            status_code=404,
+            detail={
+                "error": "Time series measurement not found",
+                "uuid": uuid,
+                "measurement_uuid": measurement_uuid
+            })
+
+
+async def get_time_series_export(uuid: str, measurements: list[str] | None, start: int, end: int,
+                                 output_type: str, cf: str, accept_encoding: str | None = None) -> Response:
+    if output_type not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "error": f"Unknown export format: {output_type}",
+                "supported_formats": list(EXPORT_MEDIA_TYPES)
+            })
+    try:
+        chunks = await analysisService(type="time-series").measurements_export(
+            ts_uuid=uuid, measurements=measurements, start=start, end=end, output_type=output_type, cf=cf)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail={"error": str(e), "uuid": uuid})
+    if chunks is None:
+        raise HTTPException(
+            status_code=404,
+            detail={
+                "error": "Time series instance not found",
+                "uuid": uuid
+            })
+    return export_response(chunks, output_type, uuid, negotiate_encoding(accept_encoding))
+
+
+async def post_time_series_query(query: SeriesQuery) -> JSONResponse:
+    try:
+        result = await analysisService(type="time-series").measurements_query(
+            ts_uuids=[str(uuid) for uuid in query.ts_uuids],
+            measurements=[str(uuid) for uuid in query.measurements] if query.measurements else None,
+            tags=query.tags, start=query.start, end=query.end, aggregate=query.aggregate, top=query.top, by=query.by,
+            points=query.points, method=query.method, cf=query.cf)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail={"error": str(e)})
+    if result["missing"] and not result["matched"]:
+        raise HTTPException(
+            status_code=404,
+            detail={
+                "error": "Time series instances not found",
+                "uuids": result["missing"]
+            })
+    return JSONResponse(content=result)
+
+
+async def get_time_series_search(terms: list[str], limit: int | None = None) -> JSONResponse:
+    try:
+        result = await analysisService(type="time-series").measurements_search(terms=terms, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail={"error": str(e), "terms": terms})
+    return JSONResponse(content=result)
+
+
+async def get_time_series_rollups(scope: str, start: int, end: int, resolution: int, points: int,
+                                  stat: str) -> JSONResponse:
+    try:
+        result = await analysisService(type="time-series").measurements_rollups(
+            scope=scope, start=start, end=end, resolution=resolution, points=points, stat=stat)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail={"error": str(e), "scope": scope})
+    return JSONResponse(content=result)
+
+
+async def get_time_series_cache_stats() -> dict:
+    return timeSeriesCacheStats()
@@ -1,11 +1,15 @@
-from fastapi import APIRouter, BackgroundTasks
+from fastapi import APIRouter, Header, Query
+from fastapi.responses import JSONResponse
 import logging
-import pickle
 import time
 
-from adapters.web_api.fastapi.controllers.time_series import get_time_series_info
+from adapters.web_api.fastapi.controllers.time_series import (
+    get_time_series_info, get_time_series_data, get_time_series_export, get_time_series_cache_stats,
+    post_time_series_query, get_time_series_search, get_time_series_rollups,
+)
+from core.entities.time_series import SeriesQuery
 # "Hurting" the hexagonal architecture here:
-from core.use_cases.file_exporter.export_task import execute_export_task
+from core.use_cases.file_exporter.export_task import execute_export_task, export_queue_status
 from core.use_cases.file_exporter.subsys_mgmt import simultaneous_tasks_list
 
 # Configure logging
@@ -14,20 +18,44 @@ logger = logging.getLogger(__name__)
 
 test_router = APIRouter()
 
+@test_router.get("/time_series_cache")
+async def time_series_cache_stats():
+    return await get_time_series_cache_stats()
+
+@test_router.post("/time_series/query")
+async def time_series_query(query: SeriesQuery):
+    return await post_time_series_query(query)
+
+@test_router.get("/time_series/search")
+async def time_series_search(q: list[str] = Query(default=[]), limit: int | None = None):
+    return await get_time_series_search(q, limit)
+
+@test_router.get("/time_series/rollups")
+async def time_series_rollups(scope: str = "*", start: int = 0, end: int = 0, resolution: int = 0, points: int = 0,
+                              stat: str = "avg"):
+    return await get_time_series_rollups(scope, start, end, resolution, points, stat)
+
 @test_router.get("/time_series/{ts_service_uuid}")
 async def time_series_info(ts_service_uuid: str):
     return await get_time_series_info(ts_service_uuid, type="time-series")
 
+# Before "/time_series/{ts_service_uuid}/{measurement_uuid}" (matched in order)
+@test_router.get("/time_series/{ts_service_uuid}/export")
+async def time_series_export(ts_service_uuid: str, start: int = 0, end: int = 0, format: str = "csv",
+                             cf: str = "AVERAGE", measurements: list[str] | None = Query(default=None),
+                             accept_encoding: str | None = Header(default=None)):
+    return await get_time_series_export(ts_service_uuid, measurements, start, end, format, cf, accept_encoding)
+
 @test_router.get("/time_series/{ts_service_uuid}/{measurement_uuid}")
-def time_series_fetch(ts_service_uuid: str, measurement_uuid: str, start: int = 0, end: int = 0):
-    if start or end:
-        return {"start": start, "end": end, "uuid": ts_service_uuid, "measurement_uuid": measurement_uuid}
-    else:
-        return {"uuid": ts_service_uuid, "measurement_uuid": measurement_uuid}
+async def time_series_fetch(ts_service_uuid: str, measurement_uuid: str, start: int = 0, end: int = 0,
+                            points: int = 0, method: str = "lttb", cf: str = "AVERAGE",
+                            accept: str | None = Header(default=None), accept_encoding: str | None = Header(default=None)):
+    return await get_time_series_data(ts_service_uuid, measurement_uuid, start, end, points, method, cf,
+                                      accept, accept_encoding)
 
 
 @test_router.post("/file_exporter/export_task")
-async def file_exporter_export_task(background_tasks: BackgroundTasks):
+async def file_exporter_export_task(priority: int = 5, tenant: str = "default"):
     
     # Generate unique task ID for each request (not hardcoded!)
     import os
@@ -35,7 +63,7 @@ async def file_exporter_export_task(background_tasks: BackgroundTasks):
     import time
     task_id = f"api_task_{os.getpid()}_{str(uuid.uuid4())[:8]}"
     
-    pcap_files = ["example1.pcap", "example2.pcap"]
+    pcap_files = ["samples/tenant_test/pcap/example1.pcap", "samples/tenant_test/pcap/example2.pcapng"]
     output_ipfix_path = "output.ipfix"
     
     kwargs = {
@@ -43,42 +71,49 @@ async def file_exporter_export_task(background_tasks: BackgroundTasks):
         "epoch_start_timestamp": str(time.time()),
         "DPI": True,
         "analysis_list": ["Model_analysis1", "Model_analysis2"],
-        "status": "pending"
+        "status": "pending",
+        "priority": priority,
+        "tenant": tenant,
     }
     
     logger.info(f"Starting export task with unique ID: {task_id}")
     
-    # Add the background task with unique ID
-    background_tasks.add_task(execute_export_task, pcap_files, output_ipfix_path, **kwargs)
+    # Queue on the host-wide export scheduler (back-pressure instead of dropping work)
+    result = await execute_export_task(pcap_files, output_ipfix_path, **kwargs)
+    if result["status"] == "rejected":
+        if result["reason"] == "queue_full":
+            return JSONResponse(status_code=429, content=result, headers={"Retry-After": str(result["retry_after"])})
+        return JSONResponse(status_code=409, content=result)
     
-    return {"task_id": task_id, "status": "export task started", "timestamp": time.time()}
+    # Accepted, not started: the job waits for a worker (and may be requeued)
+    return JSONResponse(status_code=202, content={
+        "task_id": task_id, "status": "queued", "timestamp": time.time(),
+        "queue_position": result["position"], "estimated_start_in": result["estimated_start_in"],
+    })
+
+
+@test_router.get("/file_exporter/queue")
+async def get_export_queue():
+    return await export_queue_status()
 
 
 @test_router.get("/file_exporter/tasks")
 async def get_current_tasks():
     """Get current tasks - with Gunicorn --preload, shared memory works across all workers!"""
     try:
-        # Get tasks from shared memory (now works across all workers!)
         tasks_list = simultaneous_tasks_list()
-        current_tasks = []
         
-        with tasks_list.shared_list_lock:
-            for i in range(tasks_list.max_items):
-                try:
-                    task_data = pickle.loads(tasks_list.shared_list[i])
-                    if not task_data.get("task_id", "").startswith("#"):  # Skip empty slots
-                        current_tasks.append({
-                            "index": i,
-                            "task_data": task_data
-                        })
-                except Exception as e:
-                    logger.warning(f"Error reading task at index {i}: {e}")
-                    continue
+        # Lock-free: each slot is read under its seqlock
+        current_tasks = [
+            {"index": slot, "task_data": task_data}
+            for slot, task_data in tasks_list.shared_list.active()
+        ]
         
         return {
             "storage_type": "shared_memory_with_gunicorn_preload",
             "total_tasks": len(current_tasks),
-            "tasks": current_tasks
+            "tasks": current_tasks,
+            "read_stats": tasks_list.shared_list.stats(),
         }
         
     except Exception as e:
@@ -9,11 +9,14 @@ import signal
 import os
 import logging
 
-from cmds.shutdown import file_exporter_shutdown
+from cmds.shutdown import file_exporter_shutdown, time_series_shutdown, ipfix_collector_shutdown
+from core.use_cases.analyses.time_series_rollups import rollup_worker_start
 from adapters.web_api.fastapi.routes import test_router
 
 # FastAPI application setup
 web_app = FastAPI()
+web_app.add_event_handler("startup", rollup_worker_start)
+web_app.add_event_handler("shutdown", time_series_shutdown)
 web_app.add_event_handler("shutdown", file_exporter_shutdown)
 web_app.include_router(
     test_router, prefix="/api/v1/test", tags=["test"]
@@ -21,6 +24,7 @@ web_app.include_router(
 
 # Register atexit handler for graceful shutdown
 atexit.register(file_exporter_shutdown)
+atexit.register(ipfix_collector_shutdown)
 
 # Signal handlers for container environments
 def signal_handler(signum, frame):
@@ -28,6 +32,7 @@ def signal_handler(signum, frame):
     logging.info(f"Received signal {signum}, initiating graceful shutdown...")
     
     try:
+        ipfix_collector_shutdown()
         file_exporter_shutdown()
     except Exception as e:
         logging.error(f"Error during signal shutdown: {e}")
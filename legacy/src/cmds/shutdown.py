@@ -19,11 +19,11 @@ def file_exporter_shutdown() -> None:
 
     try:
         # Get the service components
-        proc_pool_instance, shared_mem_instance = file_export_service(only_shm=False)
+        scheduler_instance, shared_mem_instance = file_export_service(only_shm=False)
         
         # Normal shutdown sequence
-        logger.info("Shutting down process pool...")
-        proc_pool_instance.proc_pool_release()
+        logger.info("Shutting down export scheduler and process pool...")
+        scheduler_instance.instance_release()
         
         logger.info("Shutting down shared memory...")
         shared_mem_instance.instance_release()
@@ -36,3 +36,27 @@ def file_exporter_shutdown() -> None:
         # In containers, this allows the container runtime to clean up
         logger.warning("Normal shutdown failed, exiting...")
         os._exit(1)
+
+
+def time_series_shutdown() -> None:
+    """
+    Stop the rollups and write the buffered time series updates of this worker before it exits.
+    """
+    from ports.repositories.time_series import timeSeriesUpdates
+    from core.use_cases.analyses.time_series_rollups import rollup_worker_stop
+
+    rollup_worker_stop()
+    buffer = timeSeriesUpdates(create=False)
+    if buffer:
+        buffer.close()
+
+
+def ipfix_collector_shutdown() -> None:
+    """
+    Stop the IPFIX collector processes (main process only).
+    """
+    from core.use_cases.collector.collector_service import ipfix_collector_service
+
+    service = ipfix_collector_service(create=False)
+    if service:
+        service.stop()
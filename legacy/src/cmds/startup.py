@@ -2,10 +2,16 @@ from pydantic import validate_call
 
 from adapters.web_api.fastapi.web_server import async_multi_worker_web_server
 from core.use_cases.file_exporter.export_task import file_export_service
+from ports.repositories.time_series import timeSeriesIndex
+from core.use_cases.collector.collector_service import ipfix_collector_service
 
 def init_app():
-    file_export_service(only_shm=True)
-    # ipfix_collector_service()
+    # Shared task slots + export scheduler (queue and process pool) before Gunicorn forks
+    file_export_service(only_shm=False)
+    # Time series instances index, inherited warm by every web worker
+    timeSeriesIndex()
+    # IPFIX collector processes (SO_REUSEPORT shards), owned by the main process
+    ipfix_collector_service()
 
 @validate_call
 async def webapp_startup(
@@ -0,0 +1,189 @@
+'''
+IPyFIXweb settings
+Module-level defaults, each one overridable by an environment variable
+(container friendly: set them in the container/pod spec).
+'''
+import os
+
+
+def _env_int(name: str, default: int | None) -> int | None:
+    value = os.environ.get(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_quotas(name: str) -> dict[str, int]:
+    """Parse "tenant_a=2,tenant_b=1" into {"tenant_a": 2, "tenant_b": 1}"""
+    quotas = {}
+    for item in os.environ.get(name, "").split(","):
+        if "=" in item:
+            tenant, quota = item.split("=", 1)
+            quotas[tenant.strip()] = int(quota)
+    return quotas
+
+
+## File exporter (PCAP -> IPFIX) host-wide process pool
+# Fixed number of export worker processes (None = sized from the CPU affinity mask)
+EXPORT_POOL_WORKERS = _env_int("IPYFIX_EXPORT_POOL_WORKERS", None)
+# CPUs left to the web workers when the pool is sized automatically
+EXPORT_POOL_RESERVED_CPUS = _env_int("IPYFIX_EXPORT_POOL_RESERVED_CPUS", 1)
+# Maximum concurrently running export tasks per tenant (None = no limit besides the pool size)
+EXPORT_DEFAULT_TENANT_QUOTA = _env_int("IPYFIX_EXPORT_DEFAULT_TENANT_QUOTA", None)
+EXPORT_TENANT_QUOTAS = _env_quotas("IPYFIX_EXPORT_TENANT_QUOTAS")
+# Workers started (and fully imported) right after the pool is created (None = all of them)
+EXPORT_POOL_WARM_WORKERS = _env_int("IPYFIX_EXPORT_POOL_WARM_WORKERS", None)
+# Replace a worker after this many tasks (None = never)
+EXPORT_POOL_MAX_TASKS_PER_CHILD = _env_int("IPYFIX_EXPORT_POOL_MAX_TASKS_PER_CHILD", 100)
+# Recycle the pool once a worker's resident memory exceeds this many MiB (None = never)
+EXPORT_POOL_MAX_RSS_MB = _env_int("IPYFIX_EXPORT_POOL_MAX_RSS_MB", 1024)
+# Flow meter timeouts (seconds): a flow is exported after this long without packets,
+# and long-lived flows are split on multiples of the active timeout
+EXPORT_FLOW_IDLE_TIMEOUT = _env_int("IPYFIX_EXPORT_FLOW_IDLE_TIMEOUT", 15)
+EXPORT_FLOW_ACTIVE_TIMEOUT = _env_int("IPYFIX_EXPORT_FLOW_ACTIVE_TIMEOUT", 1800)
+# IPFIX output files: templates are written once per file, and again every
+# EXPORT_IPFIX_TEMPLATE_REFRESH messages when non-zero; messages are buffered and
+# written EXPORT_IPFIX_WRITE_BUFFER bytes at a time
+EXPORT_IPFIX_TEMPLATE_REFRESH = _env_int("IPYFIX_EXPORT_IPFIX_TEMPLATE_REFRESH", 0)
+EXPORT_IPFIX_WRITE_BUFFER = _env_int("IPYFIX_EXPORT_IPFIX_WRITE_BUFFER", 4 * 1024 * 1024)
+# Capture files larger than this are split in packet-aligned byte ranges, each one
+# converted by its own pool worker (one shard per file otherwise)
+EXPORT_SHARD_BYTES = _env_int("IPYFIX_EXPORT_SHARD_BYTES", 256 * 1024 * 1024)
+# Per-shard flow tables, merged (and removed) once every shard of a task is done
+EXPORT_SHARD_DIR = os.environ.get("IPYFIX_EXPORT_SHARD_DIR", "/var/ipyfix/service/export_shards")
+# Journal of the export job queue (pending and interrupted jobs replayed on restart)
+EXPORT_JOURNAL_PATH = os.environ.get("IPYFIX_EXPORT_JOURNAL_PATH", "/var/ipyfix/service/export_queue.journal")
+# Imported once by the forkserver, so every forked worker starts with them loaded
+EXPORT_FORKSERVER_PRELOAD = [
+    "pydantic",
+    "numpy",
+    "adapters.infrastructure.pcap.data_access",
+    "adapters.infrastructure.ipfix.exporter.file_writer",
+    "core.data_domain.pcap_ipfix_exporter",
+    "core.use_cases.file_exporter.task_slots",
+    "core.use_cases.file_exporter.task_manager",
+    "core.use_cases.file_exporter.sharding",
+    "core.use_cases.file_exporter.worker_handler",
+]
+
+
+## Time series (RRDTool) API
+# Parsed RRD headers kept per web worker (LRU), and threads running rrdtool.info()/fetch()
+RRD_INFO_CACHE_SIZE = _env_int("IPYFIX_RRD_INFO_CACHE_SIZE", 4096)
+RRD_THREADS = _env_int("IPYFIX_RRD_THREADS", 8)
+# Exports fetch (and encode) RRD_EXPORT_WINDOW_ROWS rows per measurement at a time
+RRD_EXPORT_WINDOW_ROWS = _env_int("IPYFIX_RRD_EXPORT_WINDOW_ROWS", 8192)
+# Write-behind updates: samples coalesced per (RRD file, timestamp), flushed every
+# RRD_UPDATE_FLUSH_INTERVAL seconds (or when half of RRD_UPDATE_MAX_PENDING is reached)
+# with one multi-value rrdtool.update per file. A full buffer drops new samples, or
+# blocks them up to RRD_UPDATE_BLOCK_TIMEOUT seconds when RRD_UPDATE_ON_FULL is "block".
+# Updates go through rrdcached when RRDCACHED_ADDRESS is set (e.g. unix:/run/rrdcached.sock)
+RRD_UPDATE_MAX_PENDING = _env_int("IPYFIX_RRD_UPDATE_MAX_PENDING", 100000)
+RRD_UPDATE_FLUSH_INTERVAL = _env_int("IPYFIX_RRD_UPDATE_FLUSH_INTERVAL", 5)
+RRD_UPDATE_ON_FULL = os.environ.get("IPYFIX_RRD_UPDATE_ON_FULL", "drop")
+RRD_UPDATE_BLOCK_TIMEOUT = _env_int("IPYFIX_RRD_UPDATE_BLOCK_TIMEOUT", 10)
+RRDCACHED_ADDRESS = os.environ.get("IPYFIX_RRDCACHED_ADDRESS") or None
+
+## Time series storage: "local" (RRD files of the tenant directory) or "s3" (read only,
+# RRD files of an S3-compatible store, e.g. archived tenants)
+TIME_SERIES_STORAGE = os.environ.get("IPYFIX_TIME_SERIES_STORAGE", "local")
+RRD_S3_BUCKET = os.environ.get("IPYFIX_RRD_S3_BUCKET", "ipyfix")
+RRD_S3_TENANT_PREFIX = os.environ.get("IPYFIX_RRD_S3_TENANT_PREFIX", "tenants/rrdtool/")
+# None = AWS; e.g. http://minio:9000 for MinIO
+RRD_S3_ENDPOINT_URL = os.environ.get("IPYFIX_RRD_S3_ENDPOINT_URL") or None
+# Downloaded RRD files, kept per ETag (LRU, at most RRD_S3_CACHE_BYTES on disk) and
+# trusted for RRD_S3_REVALIDATE_INTERVAL seconds before their ETag is checked again
+RRD_S3_CACHE_DIR = os.environ.get("IPYFIX_RRD_S3_CACHE_DIR", "/var/ipyfix/service/rrd_s3_cache")
+RRD_S3_CACHE_BYTES = _env_int("IPYFIX_RRD_S3_CACHE_BYTES", 10 * 1024 * 1024 * 1024)
+RRD_S3_REVALIDATE_INTERVAL = _env_int("IPYFIX_RRD_S3_REVALIDATE_INTERVAL", 30)
+# Objects larger than RRD_S3_PART_BYTES are downloaded as concurrent ranged GETs, over a
+# pool of RRD_S3_CONNECTIONS connections
+RRD_S3_PART_BYTES = _env_int("IPYFIX_RRD_S3_PART_BYTES", 8 * 1024 * 1024)
+RRD_S3_CONNECTIONS = _env_int("IPYFIX_RRD_S3_CONNECTIONS", 16)
+
+## Multi-instance time series queries: instances fetched concurrently (at most
+# TIME_SERIES_QUERY_CONCURRENCY at a time), at most TIME_SERIES_QUERY_MAX_INSTANCES per query
+TIME_SERIES_QUERY_CONCURRENCY = _env_int("IPYFIX_TIME_SERIES_QUERY_CONCURRENCY", 16)
+TIME_SERIES_QUERY_MAX_INSTANCES = _env_int("IPYFIX_TIME_SERIES_QUERY_MAX_INSTANCES", 256)
+# Validated and serialized instance infos kept per web worker (LRU, reused while the
+# instance files are unchanged)
+TIME_SERIES_INFO_CACHE_SIZE = _env_int("IPYFIX_TIME_SERIES_INFO_CACHE_SIZE", 1024)
+
+## Time series rollups: per tenant/tag hourly and daily buckets (sum, count, max, p95 per
+# data source) stored in SQLite, computed every ROLLUP_INTERVAL seconds (0 = never) by one
+# web worker of the host. Buckets are rolled up once ROLLUP_DELAY seconds past their end
+# (late updates), ROLLUP_WINDOW_DAYS of RRD rows at a time, ROLLUP_BACKFILL_DAYS back on
+# the first run
+ROLLUP_DB_PATH = os.environ.get("IPYFIX_ROLLUP_DB_PATH", "/var/ipyfix/service/rollups.sqlite")
+ROLLUP_TIERS = [int(tier) for tier in os.environ.get("IPYFIX_ROLLUP_TIERS", "3600,86400").split(",") if tier.strip()]
+ROLLUP_INTERVAL = _env_int("IPYFIX_ROLLUP_INTERVAL", 900)
+ROLLUP_DELAY = _env_int("IPYFIX_ROLLUP_DELAY", 300)
+ROLLUP_WINDOW_DAYS = _env_int("IPYFIX_ROLLUP_WINDOW_DAYS", 7)
+ROLLUP_BACKFILL_DAYS = _env_int("IPYFIX_ROLLUP_BACKFILL_DAYS", 365)
+
+
+## IPFIX collector (UDP and TCP, RFC 7011): COLLECTOR_PROCESSES processes (0 = no collector)
+# bind the same ports with SO_REUSEPORT, the kernel spreading the exporters over them.
+# Each UDP socket drains up to COLLECTOR_BATCH_MESSAGES datagrams per wake-up into its
+# preallocated COLLECTOR_BUFFER_BYTES receive buffer; each TCP session frames messages in
+# its own COLLECTOR_TCP_BUFFER_BYTES buffer
+COLLECTOR_HOST = os.environ.get("IPYFIX_COLLECTOR_HOST", "0.0.0.0")
+COLLECTOR_UDP_PORT = _env_int("IPYFIX_COLLECTOR_UDP_PORT", 4739)
+COLLECTOR_TCP_PORT = _env_int("IPYFIX_COLLECTOR_TCP_PORT", 4739)
+COLLECTOR_PROCESSES = _env_int("IPYFIX_COLLECTOR_PROCESSES", 1)
+COLLECTOR_BATCH_MESSAGES = _env_int("IPYFIX_COLLECTOR_BATCH_MESSAGES", 1024)
+COLLECTOR_BUFFER_BYTES = _env_int("IPYFIX_COLLECTOR_BUFFER_BYTES", 8 * 1024 * 1024)
+COLLECTOR_TCP_BUFFER_BYTES = _env_int("IPYFIX_COLLECTOR_TCP_BUFFER_BYTES", 1024 * 1024)
+# Kernel receive buffer of the UDP sockets (SO_RCVBUF, capped by net.core.rmem_max)
+COLLECTOR_SOCKET_RCVBUF = _env_int("IPYFIX_COLLECTOR_SOCKET_RCVBUF", 32 * 1024 * 1024)
+# Decode the data sets of the received messages with their compiled templates (0 = count
+# the records from the sequence numbers only)
+COLLECTOR_DECODE = _env_int("IPYFIX_COLLECTOR_DECODE", 1)
+# Templates shared by the collector processes ("sqlite": one host) or pods ("redis"),
+# "" = templates known by the process that received them only. Each process keeps the
+# TEMPLATE_CACHE_SIZE templates it uses in a local LRU, checked against the changes of
+# the store every TEMPLATE_SYNC_INTERVAL seconds
+TEMPLATE_STORE = os.environ.get("IPYFIX_TEMPLATE_STORE", "sqlite")
+TEMPLATE_STORE_PATH = os.environ.get("IPYFIX_TEMPLATE_STORE_PATH", "/var/ipyfix/service/templates.sqlite")
+TEMPLATE_STORE_URL = os.environ.get("IPYFIX_TEMPLATE_STORE_URL", "redis://localhost:6379/0")
+TEMPLATE_CACHE_SIZE = _env_int("IPYFIX_TEMPLATE_CACHE_SIZE", 65536)
+TEMPLATE_SYNC_INTERVAL = _env_int("IPYFIX_TEMPLATE_SYNC_INTERVAL", 1)
+
+## IPFIX mediator: the records decoded by each collector process go through the
+# MEDIATOR_STAGES stages ("filter:...;anonymize:...;sample:...;aggregate:...", see
+# core.data_domain.ipfix_mediator.mediator_stages) and are written to the IPFIX file
+# MEDIATOR_OUTPUT ("{pid}" replaced by the collector process id; "" = no mediator).
+# Batches of at most MEDIATOR_BATCH_RECORDS records, MEDIATOR_QUEUE_BATCHES queued per
+# stage; a full pipeline blocks the collector (up to MEDIATOR_BLOCK_TIMEOUT seconds) or
+# drops the batch when MEDIATOR_ON_FULL is "drop"
+MEDIATOR_OUTPUT = os.environ.get("IPYFIX_MEDIATOR_OUTPUT", "")
+MEDIATOR_STAGES = os.environ.get("IPYFIX_MEDIATOR_STAGES", "")
+MEDIATOR_BATCH_RECORDS = _env_int("IPYFIX_MEDIATOR_BATCH_RECORDS", 65536)
+MEDIATOR_QUEUE_BATCHES = _env_int("IPYFIX_MEDIATOR_QUEUE_BATCHES", 64)
+MEDIATOR_ON_FULL = os.environ.get("IPYFIX_MEDIATOR_ON_FULL", "block")
+MEDIATOR_BLOCK_TIMEOUT = _env_int("IPYFIX_MEDIATOR_BLOCK_TIMEOUT", 1)
+# Idle stages flush (due aggregates, buffered messages) every MEDIATOR_FLUSH_INTERVAL seconds
+MEDIATOR_FLUSH_INTERVAL = _env_int("IPYFIX_MEDIATOR_FLUSH_INTERVAL", 1)
+MEDIATOR_AGGREGATE_INTERVAL = _env_int("IPYFIX_MEDIATOR_AGGREGATE_INTERVAL", 60)
+# Key of the address pseudonymization (anonymize stages without a prefix length)
+MEDIATOR_ANONYMIZE_KEY = _env_int("IPYFIX_MEDIATOR_ANONYMIZE_KEY", 0)
+# Run the mediator in its own process (1) instead of in every collector process (0): each
+# collector process writes its record batches to a MEDIATOR_RING_BYTES shared memory ring
+# (one producer, one consumer), full rings applying MEDIATOR_ON_FULL
+MEDIATOR_PROCESS = _env_int("IPYFIX_MEDIATOR_PROCESS", 0)
+MEDIATOR_RING_BYTES = _env_int("IPYFIX_MEDIATOR_RING_BYTES", 64 * 1024 * 1024)
+
+def available_cpus() -> int:
+    """CPUs this process may run on (cgroup/taskset aware on Linux)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def export_pool_size() -> int:
+    if EXPORT_POOL_WORKERS:
+        return EXPORT_POOL_WORKERS
+    return max(1, available_cpus() - EXPORT_POOL_RESERVED_CPUS)
+
+
+def export_tenant_quota(tenant: str) -> int | None:
+    return EXPORT_TENANT_QUOTAS.get(tenant, EXPORT_DEFAULT_TENANT_QUOTA)
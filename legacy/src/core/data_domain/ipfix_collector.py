@@ -0,0 +1,64 @@
+"""IPFIX collector - message framing and exporter sessions (RFC 7011)
+
+Every message starts with a 16 bytes header: version (10), length, export time, sequence
+number and observation domain. Over UDP one datagram carries one message; over TCP the
+messages of a stream are framed by their length field.
+The sequence number counts the data records exported before the message, per
+(transport session, observation domain), modulo 2^32: the records exported by a session
+are known from the headers alone, without decoding a single set.
+"""
+
+import struct
+
+IPFIX_VERSION = 10
+MESSAGE_HEADER = struct.Struct("!HHIII")  # version, length, export time, sequence number, observation domain
+_VERSION_LENGTH = struct.Struct("!HH")
+
+
+def frame_messages(buffer, start: int, end: int) -> tuple[list[int], list[int], int]:
+    """(offsets, lengths) of the complete messages of a stream in buffer[start:end], and the
+    end of the last one (the start of a partial message). ValueError on an invalid header"""
+    offsets, lengths = [], []
+    position = start
+    while end - position >= _VERSION_LENGTH.size:
+        version, length = _VERSION_LENGTH.unpack_from(buffer, position)
+        if version != IPFIX_VERSION or length < MESSAGE_HEADER.size:
+            raise ValueError(f"Invalid IPFIX message header at offset {position} (version {version}, length {length})")
+        if end - position < length:
+            break
+        offsets.append(position)
+        lengths.append(length)
+        position += length
+    return offsets, lengths, position
+
+
+class exporter_sessions:
+    """
+    (exporter, observation domain) -> last sequence number: data records exported by
+    each session, counted from the sequence numbers of its messages.
+    """
+    def __init__(self) -> None:
+        self._sequences: dict[tuple, int] = {}
+        self.records = 0
+        self.resets = 0
+
+    def __len__(self) -> int:
+        return len(self._sequences)
+
+    def update(self, exporter: object, sequence: int, domain: int) -> None:
+        session = (exporter, domain)
+        last = self._sequences.get(session)
+        self._sequences[session] = sequence
+        if last is None:
+            return
+        delta = (sequence - last) & 0xFFFFFFFF
+        # Backwards (reordered datagram or restarted exporter): not a record count
+        if delta >= 0x80000000:
+            self.resets += 1
+            return
+        self.records += delta
+
+    def forget(self, exporter: object) -> None:
+        """Drop the sessions of an exporter (closed TCP connection)"""
+        for session in [session for session in self._sequences if session[0] == exporter]:
+            del self._sequences[session]
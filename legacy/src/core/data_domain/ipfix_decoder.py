@@ -0,0 +1,307 @@
+'''
+IPFIX decoding - template-compiled data sets (RFC 7011, RFC 6313)
+Each received template is compiled once into a NumPy structured dtype with the wire
+layout of its records (big-endian, packed, with the field lengths of the template, so
+reduced-size encodings included). A data set of a fixed-length template is decoded by one
+np.frombuffer() call: a view of the receive buffer, nothing copied or parsed per record.
+Templates with variable-length fields are compiled into runs of fixed-length fields (one
+precomputed struct.Struct per run) separated by the variable-length fields: only those
+are walked record by record. Structured data fields (basicList, subTemplateList,
+subTemplateMultiList) are decoded with the templates of their session.
+Layouts are shared by every template with the same fields (every exporter of a model).
+'''
+import struct
+import logging
+from functools import lru_cache
+from typing import Callable
+
+import numpy as np
+
+from core.entities.ipfix_ie import IANA_IES_BY_ID, VARIABLE_LENGTH
+from core.entities.ipfix_bl import BasicList
+from core.entities.ipfix_stl import SubTemplateList
+from core.entities.ipfix_stml import SubTemplateMultiList
+from core.data_domain.ipfix_collector import MESSAGE_HEADER, IPFIX_VERSION
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_SET_ID = 2
+OPTIONS_TEMPLATE_SET_ID = 3
+MIN_DATA_SET_ID = 256
+ENTERPRISE_BIT = 0x8000
+SET_HEADER = struct.Struct("!HH")  # set id, length
+_U16 = struct.Struct("!H")
+_U32 = struct.Struct("!I")
+_STRUCTURED = {291: "basicList", 292: "subTemplateList", 293: "subTemplateMultiList"}
+# Wire integer types of the unsigned field lengths (other lengths: raw bytes)
+_UNSIGNED = {1: ("u1", "B"), 2: (">u2", "H"), 4: (">u4", "I"), 8: (">u8", "Q")}
+
+# Field specifier: (element id, length, enterprise number)
+Field = tuple[int, int, int]
+
+
+def _field_name(element_id: int, enterprise_number: int) -> str:
+    ie = IANA_IES_BY_ID.get(element_id) if not enterprise_number else None
+    if ie:
+        return ie.name
+    return f"ie{enterprise_number}_{element_id}" if enterprise_number else f"ie{element_id}"
+
+
+def _wire_type(element_id: int, length: int, enterprise_number: int) -> tuple[str, str]:
+    """(NumPy type, struct format) of a fixed-length field"""
+    ie = IANA_IES_BY_ID.get(element_id) if not enterprise_number else None
+    if ie is not None and ie.data_type in ("octetArray", "string", "ipv6Address"):
+        return f"V{length}", f"{length}s"
+    return _UNSIGNED.get(length, (f"V{length}", f"{length}s"))
+
+
+class template_layout:
+    """
+    Compiled record layout of a field list: structured dtype of the decoded records, and
+    for variable-length templates the runs (struct.Struct of fixed fields, or None for one
+    variable-length field) to walk.
+    """
+    __slots__ = ("fields", "names", "dtype", "record_length", "min_length", "runs")
+
+    def __init__(self, fields: tuple[Field, ...]) -> None:
+        self.fields = fields
+        names, seen = [], {}
+        for element_id, _, enterprise_number in fields:
+            name = _field_name(element_id, enterprise_number)
+            seen[name] = seen.get(name, 0) + 1
+            # The same element twice in a template (e.g. two MPLS labels)
+            names.append(name if seen[name] == 1 else f"{name}_{seen[name]}")
+        self.names = names
+        variable = any(length == VARIABLE_LENGTH for _, length, _ in fields)
+        types = [("O" if length == VARIABLE_LENGTH else _wire_type(element_id, length, enterprise_number)[0])
+                 for element_id, length, enterprise_number in fields]
+        self.dtype = np.dtype(list(zip(names, types)))
+        self.min_length = sum(1 if length == VARIABLE_LENGTH else length for _, length, _ in fields)
+        self.record_length = None if variable else self.min_length
+        self.runs: list[tuple[struct.Struct | None, int]] = []
+        if variable:
+            formats = []
+            for i, (element_id, length, enterprise_number) in enumerate(fields):
+                if length == VARIABLE_LENGTH:
+                    if formats:
+                        self.runs.append((struct.Struct("!" + "".join(formats)), len(formats)))
+                        formats = []
+                    self.runs.append((None, element_id if not enterprise_number else -1))
+                else:
+                    formats.append(_wire_type(element_id, length, enterprise_number)[1])
+            if formats:
+                self.runs.append((struct.Struct("!" + "".join(formats)), len(formats)))
+
+
+@lru_cache(maxsize=4096)
+def compile_layout(fields: tuple[Field, ...]) -> template_layout:
+    """Layout of a field list, compiled once per distinct field list"""
+    return template_layout(fields)
+
+
+class compiled_template:
+    """
+    A received (options) template: its id, scope field count and compiled layout.
+    """
+    __slots__ = ("template_id", "scope_count", "layout")
+
+    def __init__(self, template_id: int, fields: tuple[Field, ...], scope_count: int = 0) -> None:
+        self.template_id = template_id
+        self.scope_count = scope_count
+        self.layout = compile_layout(fields)
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self.layout.dtype
+
+    def decode(self, buffer, offset: int, length: int,
+               templates: Callable[[int], "compiled_template | None"] | None = None) -> np.ndarray:
+        """Records of a data set body (buffer[offset:offset + length], padding ignored).
+        Fixed-length templates: a view of the buffer (copy the records kept after it is reused)"""
+        layout = self.layout
+        if layout.record_length is not None:
+            return np.frombuffer(buffer, layout.dtype, length // layout.record_length, offset) \
+                if layout.record_length else np.empty(0, layout.dtype)
+        return self._decode_variable(buffer, offset, offset + length, templates)
+
+    def _decode_variable(self, buffer, position: int, end: int, templates) -> np.ndarray:
+        layout, rows = self.layout, []
+        while end - position >= layout.min_length:
+            row = []
+            for run, count in layout.runs:
+                if run is not None:
+                    row += run.unpack_from(buffer, position)
+                    position += run.size
+                    continue
+                size = buffer[position]
+                position += 1
+                if size == 255:
+                    size = _U16.unpack_from(buffer, position)[0]
+                    position += 2
+                if position + size > end:
+                    raise ValueError(f"Variable-length field overruns the data set of template {self.template_id}")
+                row.append(decode_structured(count, buffer, position, size, templates))
+                position += size
+            rows.append(tuple(row))
+        return np.array(rows, dtype=layout.dtype) if rows else np.empty(0, layout.dtype)
+
+
+def decode_structured(element_id: int, buffer, offset: int, length: int, templates) -> object:
+    """Value of a variable-length field: structured data lists decoded (RFC 6313), raw bytes otherwise"""
+    kind = _STRUCTURED.get(element_id)
+    if kind is None or length < 1:
+        return bytes(buffer[offset:offset + length])
+    semantic, end = buffer[offset], offset + length
+    if kind == "subTemplateList":
+        template_id = _U16.unpack_from(buffer, offset + 1)[0]
+        template = templates(template_id) if templates else None
+        records = template.decode(buffer, offset + 3, end - offset - 3, templates) if template else None
+        return SubTemplateList(semantic, template_id, records)
+    if kind == "subTemplateMultiList":
+        groups, position = [], offset + 1
+        while end - position >= 4:
+            template_id, size = SET_HEADER.unpack_from(buffer, position)
+            if size < 4 or position + size > end:
+                raise ValueError(f"Invalid subTemplateMultiList record group of template {template_id}")
+            template = templates(template_id) if templates else None
+            groups.append((template_id, template.decode(buffer, position + 4, size - 4, templates) if template else None))
+            position += size
+        return SubTemplateMultiList(semantic, groups)
+    # basicList: semantic, field id, element length (, enterprise number), values
+    element_id, size = SET_HEADER.unpack_from(buffer, offset + 1)
+    position, enterprise_number = offset + 5, 0
+    if element_id & ENTERPRISE_BIT:
+        element_id &= ~ENTERPRISE_BIT
+        enterprise_number = _U32.unpack_from(buffer, position)[0]
+        position += 4
+    if size != VARIABLE_LENGTH:
+        values = np.frombuffer(buffer, _wire_type(element_id, size, enterprise_number)[0], (end - position) // size, position) \
+            if size else np.empty(0)
+        return BasicList(semantic, element_id, enterprise_number, values)
+    values = []
+    while position < end:
+        size = buffer[position]
+        position += 1
+        if size == 255:
+            size = _U16.unpack_from(buffer, position)[0]
+            position += 2
+        values.append(decode_structured(element_id if not enterprise_number else -1, buffer, position, size, templates))
+        position += size
+    return BasicList(semantic, element_id, enterprise_number, values)
+
+
+def parse_template_set(buffer, offset: int, end: int, options: bool = False) -> list[tuple[int, tuple[Field, ...], int]]:
+    """(template id, field specifiers, scope field count) of the records of a (options)
+    template set body. An empty field list withdraws the template"""
+    templates, position = [], offset
+    while end - position >= 4:
+        template_id, count = SET_HEADER.unpack_from(buffer, position)
+        position += 4
+        scope_count = 0
+        if options and count:
+            scope_count = _U16.unpack_from(buffer, position)[0]
+            position += 2
+        if template_id < MIN_DATA_SET_ID and count:
+            # Set padding (or a corrupted set): nothing to read after it
+            break
+        fields = []
+        for _ in range(count):
+            element_id, length = SET_HEADER.unpack_from(buffer, position)
+            position += 4
+            enterprise_number = 0
+            if element_id & ENTERPRISE_BIT:
+                element_id &= ~ENTERPRISE_BIT
+                enterprise_number = _U32.unpack_from(buffer, position)[0]
+                position += 4
+            fields.append((element_id, length, enterprise_number))
+        if position > end:
+            raise ValueError(f"Template {template_id} overruns its set")
+        templates.append((template_id, tuple(fields), scope_count))
+    return templates
+
+
+class ipfix_decoder:
+    """
+    Decoder of the messages of a collector: templates are compiled per (exporter,
+    observation domain, template id), data sets decoded with them. Data sets of unknown
+    templates (UDP templates not received yet) are counted and skipped.
+    """
+    def __init__(self, templates=None) -> None:
+        if templates is None:
+            from core.data_domain.ipfix_templates import template_cache
+            templates = template_cache()
+        # core.data_domain.ipfix_templates.template_cache (shared with the other collectors, or not)
+        self._templates = templates
+        self._stats = {"messages": 0, "data_sets": 0, "records": 0, "templates": 0, "withdrawals": 0,
+                       "unknown_template_sets": 0, "malformed": 0}
+
+    @property
+    def templates(self):
+        return self._templates
+    @templates.setter
+    def templates(self, value) -> None:
+        pass
+    @templates.deleter
+    def templates(self) -> None:
+        pass
+
+    def stats(self) -> dict:
+        return {**self._stats, "active_templates": len(self._templates)}
+
+    def template(self, exporter: object, domain: int, template_id: int) -> compiled_template | None:
+        return self._templates.get(exporter, domain, template_id)
+
+    def add_template(self, exporter: object, domain: int, template: compiled_template) -> None:
+        self._templates.put(exporter, domain, template)
+        self._stats["templates"] += 1
+
+    def withdraw(self, exporter: object, domain: int, template_id: int | None = None) -> None:
+        """Withdraw one template, or every template of a session (template_id None)"""
+        self._templates.withdraw(exporter, domain, template_id)
+        self._stats["withdrawals"] += 1
+
+    def forget(self, exporter: object) -> None:
+        """Drop the templates of an exporter (closed TCP session), in the shared store too"""
+        self._templates.forget(exporter)
+
+    def decode_message(self, exporter: object, message) -> list[tuple[compiled_template, np.ndarray]]:
+        """(template, records) of every data set of a message, in order. Records of
+        fixed-length templates are views of the message buffer"""
+        if len(message) < MESSAGE_HEADER.size:
+            self._stats["malformed"] += 1
+            return []
+        version, length, _, _, domain = MESSAGE_HEADER.unpack_from(message, 0)
+        if version != IPFIX_VERSION or length > len(message):
+            self._stats["malformed"] += 1
+            return []
+        self._stats["messages"] += 1
+        lookup = lambda template_id: self._templates.get(exporter, domain, template_id)
+        decoded, position = [], MESSAGE_HEADER.size
+        try:
+            while length - position >= SET_HEADER.size:
+                set_id, set_length = SET_HEADER.unpack_from(message, position)
+                if set_length < SET_HEADER.size or position + set_length > length:
+                    raise ValueError(f"Invalid set {set_id} of length {set_length}")
+                body, end = position + SET_HEADER.size, position + set_length
+                if set_id >= MIN_DATA_SET_ID:
+                    template = lookup(set_id)
+                    if template is None:
+                        self._stats["unknown_template_sets"] += 1
+                    else:
+                        records = template.decode(message, body, end - body, lookup)
+                        decoded.append((template, records))
+                        self._stats["data_sets"] += 1
+                        self._stats["records"] += len(records)
+                elif set_id in (TEMPLATE_SET_ID, OPTIONS_TEMPLATE_SET_ID):
+                    for template_id, fields, scope_count in parse_template_set(
+                            message, body, end, set_id == OPTIONS_TEMPLATE_SET_ID):
+                        if fields:
+                            self.add_template(exporter, domain, compiled_template(template_id, fields, scope_count))
+                        else:
+                            # Template id equal to the set id: every template of the session
+                            self.withdraw(exporter, domain, None if template_id == set_id else template_id)
+                position = end
+        except (ValueError, struct.error, IndexError) as e:
+            self._stats["malformed"] += 1
+            logger.debug(f"IPFIX decoder: malformed message from {exporter}: {e}")
+        return decoded
@@ -0,0 +1,188 @@
+'''
+IPFIX template cache - compiled templates of a collector process
+An LRU of the compiled templates used by the process, in front of an optional shared
+store (ports.repositories.ipfix.TemplateStorePort): templates received by any collector
+are put in the store, and a data set whose template this process never received is
+decoded with the store's copy instead of waiting for the exporter to send it again.
+Every store write has a version: the cache pulls the changes since the last generation
+it saw every sync_interval seconds, and drops (or replaces) the templates withdrawn or
+redefined elsewhere. Keys already looked up and missing are remembered, so an unknown
+template costs one store lookup, not one per data set.
+'''
+import time
+import struct
+import logging
+from collections import OrderedDict
+
+from config.config import TEMPLATE_CACHE_SIZE, TEMPLATE_SYNC_INTERVAL
+from core.data_domain.ipfix_decoder import compiled_template, Field
+
+logger = logging.getLogger(__name__)
+
+_SCOPE = struct.Struct("!H")
+_FIELD = struct.Struct("!HHI")
+
+
+def encode_template(template: compiled_template) -> bytes:
+    """Store definition of a template: scope field count, then (element id, length, enterprise number)"""
+    return _SCOPE.pack(template.scope_count) + b"".join(_FIELD.pack(*field) for field in template.layout.fields)
+
+
+def decode_template(template_id: int, definition: bytes) -> compiled_template:
+    fields: tuple[Field, ...] = tuple(_FIELD.iter_unpack(definition[_SCOPE.size:]))
+    return compiled_template(template_id, fields, _SCOPE.unpack_from(definition)[0])
+
+
+def exporter_name(exporter: object) -> str:
+    """Store key of an exporter: "host:port" of a socket address, "[host]:port" for IPv6"""
+    if isinstance(exporter, tuple):
+        host, port = exporter[0], exporter[1]
+        return f"[{host}]:{port}" if ":" in str(host) else f"{host}:{port}"
+    return str(exporter)
+
+
+class template_cache:
+    """
+    Compiled templates by (exporter, observation domain, template id), least recently
+    used first; with a shared store, a process-local view of it.
+    """
+    def __init__(self, store=None, capacity: int = TEMPLATE_CACHE_SIZE,
+                 sync_interval: float = TEMPLATE_SYNC_INTERVAL) -> None:
+        self._store = store
+        self._capacity = max(capacity, 1)
+        self._sync_interval = sync_interval
+        # (exporter name, domain, template id) -> (version, compiled template)
+        self._entries: OrderedDict[tuple, tuple[int, compiled_template]] = OrderedDict()
+        self._missing: set[tuple] = set()
+        self._names: dict[object, str] = {}
+        # Exporter name -> observation domains it put templates for (withdrawn when it ends)
+        self._domains: dict[str, set[int]] = {}
+        self._generation = 0
+        self._synced = time.monotonic()
+        self._stats = {"hits": 0, "misses": 0, "shared_hits": 0, "shared_writes": 0, "invalidations": 0,
+                       "evictions": 0, "store_errors": 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        return {**self._stats, "templates": len(self._entries), "generation": self._generation}
+
+    def _key(self, exporter: object, domain: int, template_id: int) -> tuple:
+        name = self._names.get(exporter)
+        if name is None:
+            name = self._names[exporter] = exporter_name(exporter)
+        return name, domain, template_id
+
+    def _shared(self, method: str, *args):
+        """Store call; the cache keeps working locally while the store is unavailable"""
+        try:
+            return getattr(self._store, method)(*args)
+        except Exception as e:
+            self._stats["store_errors"] += 1
+            logger.warning(f"IPFIX template store {method} failed: {e}")
+            return None
+
+    def _insert(self, key: tuple, version: int, template: compiled_template) -> None:
+        self._entries[key] = (version, template)
+        self._entries.move_to_end(key)
+        self._missing.discard(key)
+        while len(self._entries) > self._capacity:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def get(self, exporter: object, domain: int, template_id: int) -> compiled_template | None:
+        key = self._key(exporter, domain, template_id)
+        if self._store is not None and time.monotonic() - self._synced >= self._sync_interval:
+            self.sync()
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[1]
+        self._stats["misses"] += 1
+        if self._store is None or key in self._missing:
+            return None
+        shared = self._shared("get", *key)
+        if shared is None:
+            if len(self._missing) >= self._capacity:
+                self._missing.clear()
+            self._missing.add(key)
+            return None
+        template = decode_template(template_id, shared[1])
+        self._insert(key, shared[0], template)
+        self._stats["shared_hits"] += 1
+        return template
+
+    def put(self, exporter: object, domain: int, template: compiled_template) -> None:
+        key = self._key(exporter, domain, template.template_id)
+        entry = self._entries.get(key)
+        if (entry is not None and entry[1].layout.fields == template.layout.fields
+                and entry[1].scope_count == template.scope_count):
+            # Template sent again (UDP refresh): nothing new for the store
+            self._entries.move_to_end(key)
+            return
+        self._domains.setdefault(key[0], set()).add(domain)
+        version = self._shared("put", *key, encode_template(template)) if self._store is not None else None
+        if version is not None:
+            self._stats["shared_writes"] += 1
+        self._insert(key, version or 0, template)
+
+    def withdraw(self, exporter: object, domain: int, template_id: int | None = None) -> None:
+        """Withdraw a template, or every template of an exporter session (template_id None)"""
+        name = self._key(exporter, domain, 0)[0]
+        if template_id is None:
+            for key in [key for key in self._entries if key[0] == name and key[1] == domain]:
+                del self._entries[key]
+        else:
+            self._entries.pop((name, domain, template_id), None)
+        if self._store is not None:
+            self._shared("withdraw", name, domain, template_id)
+
+    def forget(self, exporter: object) -> None:
+        """Drop the templates of an exporter whose TCP session ended, locally and in the
+        store: they are no longer valid (RFC 7011), and a new session of the exporter comes
+        from another source port, so nothing else would ever withdraw them"""
+        name = self._names.pop(exporter, None) or exporter_name(exporter)
+        for key in [key for key in self._entries if key[0] == name]:
+            del self._entries[key]
+        domains = self._domains.pop(name, ())
+        if self._store is not None:
+            for domain in domains:
+                self._shared("withdraw", name, domain, None)
+
+    def sync(self) -> int:
+        """Apply the changes of the store since the last sync to the cached (and missing)
+        templates. Returns the number of changes applied"""
+        self._synced = time.monotonic()
+        changed = self._shared("changes", self._generation) if self._store is not None else None
+        if not changed:
+            return 0
+        self._generation, changes = changed
+        applied = 0
+        for exporter, domain, template_id, version, definition in changes:
+            key = (exporter, domain, template_id)
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] >= version:
+                continue
+            if definition is None:
+                if self._entries.pop(key, None) is not None:
+                    self._stats["invalidations"] += 1
+                    applied += 1
+            elif entry is not None or key in self._missing:
+                if entry is not None:
+                    self._stats["invalidations"] += 1
+                self._insert(key, version, decode_template(template_id, definition))
+                applied += 1
+        return applied
+
+    def prefetch(self) -> int:
+        """Load the live templates of the store (collector start). Returns the number loaded"""
+        loaded = self._shared("load") if self._store is not None else None
+        if not loaded:
+            return 0
+        self._generation, templates = loaded
+        self._synced = time.monotonic()
+        for exporter, domain, template_id, version, definition in templates[-self._capacity:]:
+            self._insert((exporter, domain, template_id), version, decode_template(template_id, definition))
+        return min(len(templates), self._capacity)
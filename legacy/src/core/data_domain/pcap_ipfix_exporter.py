@@ -0,0 +1,370 @@
+'''
+PCAP -> IPFIX flow metering
+Packets are buffered in fixed-size batches (only their buffer offset, length and
+timestamp: the first SNAP_LEN bytes of every packet are gathered from the mapped capture
+with one NumPy fancy indexing per batch), headers are decoded column-wise with NumPy and packets are aggregated into flows with a
+vectorized group-by: sort on a 64-bit hash of the flow key, segment runs on
+key change / idle gap / active timeout window, reduce each segment with ufunc.reduceat.
+Only the open flows (one row per key) are carried from one batch to the next. Idle gaps
+and active timeout windows (aligned on multiples of the timeout) are local properties,
+so the records do not depend on the batch size, nor on how a capture is sharded.
+'''
+import logging
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from config.config import EXPORT_FLOW_ACTIVE_TIMEOUT, EXPORT_FLOW_IDLE_TIMEOUT
+from core.entities.ipfix_ie import (
+    FLOW_END_IDLE_TIMEOUT, FLOW_END_ACTIVE_TIMEOUT, FLOW_END_OF_FLOW_DETECTED, FLOW_END_FORCED_END,
+)
+from core.entities.ipfix_record import IpfixTemplate, FLOW_TEMPLATE_IPV4, FLOW_TEMPLATE_IPV6
+
+logger = logging.getLogger(__name__)
+
+# Captured bytes kept per packet: enough for QinQ + IPv4 with options + TCP flags
+SNAP_LEN = 128
+# Re-aligned L3 (IPv6 fixed header) and L4 (TCP up to flags) header windows
+L3_LEN = 40
+L4_LEN = 16
+BATCH_SIZE = 65536
+# Flow key bytes: src(16) dst(16) sport(2) dport(2) proto(1) ip version(1) padding(2);
+# IPv4 addresses are stored in the last 4 bytes of the 16-byte address fields
+KEY_LEN = 40
+
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_IPV6 = 0x86DD
+ETHERTYPES_VLAN = (0x8100, 0x88A8, 0x9100)
+PROTOCOLS_WITH_PORTS = (6, 17, 132)
+TCP_FIN_RST = 0x01 | 0x04
+
+_HASH_PRIMES = (np.uint64(0x9E3779B97F4A7C15), np.uint64(0xC2B2AE3D27D4EB4F), np.uint64(0x165667B19E3779F9),
+                np.uint64(0xD6E8FEB86659FD93), np.uint64(0xFF51AFD7ED558CCD))
+
+_FLOW_COLUMNS = ("key", "hash", "start", "last", "packets", "octets", "flags", "tos")
+
+
+def _take(flows: dict, idx) -> dict:
+    return {name: column[idx] for name, column in flows.items()}
+
+
+def _concat(a: dict | None, b: dict) -> dict:
+    if a is None or not len(a["hash"]):
+        return b
+    return {name: np.concatenate((a[name], b[name])) for name in _FLOW_COLUMNS}
+
+
+def _empty_flows() -> dict:
+    return {
+        "key": np.empty((0, KEY_LEN), np.uint8), "hash": np.empty(0, np.uint64),
+        "start": np.empty(0, np.float64), "last": np.empty(0, np.float64),
+        "packets": np.empty(0, np.uint64), "octets": np.empty(0, np.uint64),
+        "flags": np.empty(0, np.uint16), "tos": np.empty(0, np.uint8),
+    }
+
+
+def _u16(columns: np.ndarray, offset: int) -> np.ndarray:
+    """Big-endian 16-bit column at offset of a (n, width) uint8 array"""
+    return (columns[:, offset].astype(np.int64) << 8) | columns[:, offset + 1]
+
+
+def flow_hash(keys: np.ndarray) -> np.ndarray:
+    """64-bit multiplicative hash of (n, KEY_LEN) uint8 flow keys"""
+    words = np.ascontiguousarray(keys).view("<u8")
+    h = np.zeros(len(keys), np.uint64)
+    for j, prime in enumerate(_HASH_PRIMES):
+        h = (h ^ words[:, j]) * prime
+    return h ^ (h >> np.uint64(29))
+
+
+class FlowMeter:
+    """
+    Batched flow meter: feed packets (add/add_packets), then flush() and collect
+    the IPFIX flow records per template (records/drain).
+    With keep_table=True (one shard of a capture) nothing is exported: table() returns
+    every flow as an aggregated row, and merge_tables() of all the shards' tables
+    produces the records.
+    """
+    def __init__(self, active_timeout: float | None = None, idle_timeout: float | None = None,
+                 batch_size: int = BATCH_SIZE, keep_table: bool = False) -> None:
+        self._active = float(active_timeout or EXPORT_FLOW_ACTIVE_TIMEOUT)
+        self._idle = float(idle_timeout or EXPORT_FLOW_IDLE_TIMEOUT)
+        self._batch_size = batch_size
+        # Buffer (mapped capture) the listed packets point into, and their columns
+        self._source = None
+        self._offsets: list[int] = []
+        self._caplens: list[int] = []
+        self._timestamps: list[float] = []
+        self._links: list[int] = []
+        # Already gathered (header snippets copied out of their buffer) parts of the batch
+        self._gathered: list[tuple] = []
+        self._gathered_count = 0
+        self._now = 0.0
+        self._open: dict | None = None
+        self._keep_table = keep_table
+        self._closed: list[dict] = []
+        self._exported: dict[int, list[np.ndarray]] = {FLOW_TEMPLATE_IPV4.template_id: [], FLOW_TEMPLATE_IPV6.template_id: []}
+        self._stats = {"packets": 0, "non_ip_packets": 0, "batches": 0, "flows": 0}
+
+    @property
+    def stats(self) -> dict:
+        return {**self._stats, "open_flows": 0 if self._open is None else len(self._open["hash"])}
+    @stats.setter
+    def stats(self, value):
+        pass
+    @stats.deleter
+    def stats(self):
+        pass
+
+    # ---- ingestion -------------------------------------------------------------------
+
+    def add(self, packet) -> None:
+        self.add_packets((packet,))
+
+    def add_packets(self, packets) -> None:
+        """Hot loop: only four list appends per packet, everything else is per batch.
+        The packets' buffers are only read during this call (they may be closed after)."""
+        offsets, caplens, timestamps, links = self._offsets, self._caplens, self._timestamps, self._links
+        for packet in packets:
+            if packet.data.obj is not self._source:
+                self._gather()
+                self._source = packet.data.obj
+            offsets.append(packet.data_offset)
+            caplens.append(packet.caplen)
+            timestamps.append(packet.timestamp)
+            links.append(packet.link_type)
+            if len(offsets) + self._gathered_count >= self._batch_size:
+                self._gather()
+                self._process_batch()
+        self._gather()
+        self._source = None
+
+    def flush(self) -> None:
+        """End of input: aggregate the pending batch and expire every open flow"""
+        self._process_batch()
+        if not self._keep_table and self._open is not None and len(self._open["hash"]):
+            self._aggregate(self._open, now=self._now, final=True)
+
+    def records(self) -> dict[int, np.ndarray]:
+        """All exported flow records so far, as wire-format structured arrays per template id"""
+        # dtype kept: by default the wire byte order would be promoted to the native one
+        return {template_id: np.concatenate(chunks, dtype=self._template(template_id).dtype, casting="no")
+                if chunks else np.empty(0, self._template(template_id).dtype)
+                for template_id, chunks in self._exported.items()}
+
+    def drain(self) -> dict[int, np.ndarray]:
+        """records() and forget them (stream the output instead of holding every flow)"""
+        records = self.records()
+        for chunks in self._exported.values():
+            chunks.clear()
+        return records
+
+    def table(self) -> dict:
+        """Every flow seen (closed and still open) as aggregated rows (keep_table mode)"""
+        table = _empty_flows()
+        for flows in [*self._closed, self._open]:
+            if flows is not None:
+                table = _concat(table, flows)
+        return table
+
+    def save_table(self, path: str) -> None:
+        np.savez(path, **self.table())
+
+    @staticmethod
+    def load_table(path: str) -> dict:
+        with np.load(path) as table:
+            return {name: table[name] for name in _FLOW_COLUMNS}
+
+    def merge_tables(self, tables: list[dict]) -> None:
+        """Aggregate the flow tables of consecutive shards (in shard order) and export
+        every flow: flows cut at a shard boundary are joined back, giving exactly the
+        records of an unsharded run."""
+        rows = _empty_flows()
+        for table in tables:
+            rows = _concat(rows, table)
+        if len(rows["hash"]):
+            self._now = max(self._now, float(rows["last"].max()))
+            self._aggregate(rows, now=self._now, final=True)
+
+    @staticmethod
+    def _template(template_id: int) -> IpfixTemplate:
+        return FLOW_TEMPLATE_IPV4 if template_id == FLOW_TEMPLATE_IPV4.template_id else FLOW_TEMPLATE_IPV6
+
+    # ---- vectorized processing -------------------------------------------------------
+
+    def _gather(self) -> None:
+        """Copy the first SNAP_LEN bytes of the listed packets out of their buffer"""
+        if not self._offsets:
+            return
+        source = np.frombuffer(self._source, np.uint8)
+        if len(source) < SNAP_LEN:
+            source = np.concatenate((source, np.zeros(SNAP_LEN - len(source), np.uint8)))
+        offsets = np.array(self._offsets, np.int64)
+        limit = len(source) - SNAP_LEN
+        # Row gather on a (len - SNAP_LEN + 1, SNAP_LEN) strided view: one memcpy per packet
+        hdr = sliding_window_view(source, SNAP_LEN)[np.minimum(offsets, limit)]
+        for row in np.flatnonzero(offsets > limit):
+            # Packets ending in the last SNAP_LEN bytes of the buffer
+            hdr[row] = 0
+            hdr[row, :len(source) - offsets[row]] = source[offsets[row]:]
+        self._gathered.append((
+            hdr,
+            np.minimum(np.array(self._caplens, np.int64), SNAP_LEN),
+            np.array(self._links, np.int64), np.array(self._timestamps, np.float64),
+        ))
+        self._gathered_count += len(offsets)
+        for column in (self._offsets, self._caplens, self._timestamps, self._links):
+            column.clear()
+
+    def _process_batch(self) -> None:
+        n = self._gathered_count
+        if not n:
+            return
+        self._stats["packets"] += n
+        self._stats["batches"] += 1
+        packets = self._decode(*(np.concatenate(column) for column in zip(*self._gathered)))
+        self._gathered.clear()
+        self._gathered_count = 0
+        self._now = max(self._now, float(packets.pop("now")))
+        self._stats["non_ip_packets"] += n - len(packets["hash"])
+        if len(packets["hash"]):
+            self._aggregate(_concat(self._open, packets), now=self._now, final=False)
+
+    def _decode(self, hdr: np.ndarray, caplen: np.ndarray, link: np.ndarray, timestamps: np.ndarray) -> dict:
+        """Decode L2/L3/L4 headers of the batch column-wise into flow rows (IP packets only).
+        Every row is re-aligned on its L3 and L4 header (strided row gathers), so each
+        field is then a plain column slice."""
+        n = len(hdr)
+        flat = hdr.reshape(-1)
+        base = np.arange(n) * SNAP_LEN
+
+        ethernet = link == LINKTYPE_ETHERNET
+        l3 = np.where(ethernet, 14, 0)
+        ethertype = _u16(hdr, 12)
+        for tag in range(2):
+            vlan = ethernet & np.isin(ethertype, ETHERTYPES_VLAN)
+            ethertype = np.where(vlan, _u16(hdr, 16 + 4 * tag), ethertype)
+            l3 = np.where(vlan, l3 + 4, l3)
+        ip = sliding_window_view(flat, L3_LEN)[base + l3]
+        version = ip[:, 0] >> 4
+        raw = (link == LINKTYPE_RAW) | (link == LINKTYPE_IPV4) | (link == LINKTYPE_IPV6)
+        ipv4 = (version == 4) & ((ethernet & (ethertype == ETHERTYPE_IPV4)) | (raw & (link != LINKTYPE_IPV6)))
+        ipv6 = (version == 6) & ((ethernet & (ethertype == ETHERTYPE_IPV6)) | (raw & (link != LINKTYPE_IPV4)))
+        valid = (ipv4 & (caplen >= l3 + 20)) | (ipv6 & (caplen >= l3 + 40))
+
+        idx = np.flatnonzero(valid)
+        ip, caplen, l3, base, v6 = ip[idx], caplen[idx], l3[idx], base[idx], ipv6[idx]
+        v4 = ~v6
+        ts = timestamps[idx]
+
+        proto = np.where(v6, ip[:, 6], ip[:, 9])
+        tos = np.where(v6, ((ip[:, 0] & 0x0F) << 4) | (ip[:, 1] >> 4), ip[:, 1])
+        octets = np.where(v6, _u16(ip, 4) + 40, _u16(ip, 2))
+        fragment = v4 & ((_u16(ip, 6) & 0x1FFF) != 0)
+        l4 = l3 + np.where(v6, 40, (ip[:, 0] & 0x0F).astype(np.int64) * 4)
+        transport = sliding_window_view(flat, L4_LEN)[base + np.minimum(l4, SNAP_LEN - L4_LEN)]
+        has_ports = np.isin(proto, PROTOCOLS_WITH_PORTS) & ~fragment & (caplen >= l4 + 4)
+        icmp = (((proto == 1) & v4) | ((proto == 58) & v6)) & ~fragment & (caplen >= l4 + 2)
+        # ICMP type/code in destinationTransportPort (as most IPFIX exporters do)
+        ports = np.where((has_ports | icmp)[:, None], transport[:, 0:4], 0).astype(np.uint8)
+        ports[icmp, 2:4], ports[icmp, 0:2] = ports[icmp, 0:2], 0
+        flags = np.where((proto == 6) & ~fragment & (caplen >= l4 + 14), transport[:, 13], 0)
+
+        key = np.zeros((len(idx), KEY_LEN), np.uint8)
+        key[v6, 0:32] = ip[v6, 8:40]
+        key[v4, 12:16] = ip[v4, 12:16]
+        key[v4, 28:32] = ip[v4, 16:20]
+        key[:, 32:36] = ports
+        key[:, 36] = proto
+        key[:, 37] = np.where(v6, 6, 4)
+        return {
+            "key": key, "hash": flow_hash(key), "start": ts, "last": ts.copy(),
+            "packets": np.ones(len(idx), np.uint64), "octets": octets.astype(np.uint64),
+            "flags": flags.astype(np.uint16), "tos": tos.astype(np.uint8), "now": timestamps.max(),
+        }
+
+    def _aggregate(self, rows: dict, now: float, final: bool) -> None:
+        """Group rows (open flows + new packets) into flows, export the expired ones and
+        keep the last flow of each still active key open"""
+        order = np.lexsort((rows["start"], rows["hash"]))
+        rows = _take(rows, order)
+        key, start, last = rows["key"], rows["start"], rows["last"]
+        same = rows["hash"][1:] == rows["hash"][:-1]
+        if (same & (key[1:] != key[:-1]).any(axis=1)).any():
+            # 64-bit hash collision: group on the full key bytes instead
+            _, group = np.unique(np.ascontiguousarray(key).view(f"V{KEY_LEN}").ravel(), return_inverse=True)
+            order = np.lexsort((start, group))
+            rows, group = _take(rows, order), group[order]
+            key, start, last = rows["key"], rows["start"], rows["last"]
+            same = group[1:] == group[:-1]
+
+        new_key = np.ones(len(start), bool)
+        new_key[1:] = ~same
+        new_segment = new_key.copy()
+        new_segment[1:] |= start[1:] - last[:-1] > self._idle
+        # Active timeout windows are aligned on multiples of the timeout: a flow never
+        # spans two windows, which keeps flows independent of batch and shard edges
+        window = np.floor(start / self._active)
+        new_flow = new_segment.copy()
+        new_flow[1:] |= window[1:] != window[:-1]
+
+        heads = np.flatnonzero(new_flow)
+        flows = {
+            "key": key[heads], "hash": rows["hash"][heads],
+            "start": np.minimum.reduceat(start, heads), "last": np.maximum.reduceat(last, heads),
+            "packets": np.add.reduceat(rows["packets"], heads), "octets": np.add.reduceat(rows["octets"], heads),
+            "flags": np.bitwise_or.reduceat(rows["flags"], heads), "tos": rows["tos"][heads],
+        }
+
+        # Flows followed by another flow of the same key are over; the others expire once
+        # `now` passed their idle or active deadline. The reason is the deadline reached
+        # first, so it does not depend on when (in which batch) the expiry is noticed.
+        split = np.zeros(len(heads), bool)
+        split[:-1] = ~new_key[heads[1:]]
+        window_end = (np.floor(flows["start"] / self._active) + 1) * self._active
+        expired = split | (now - flows["last"] > self._idle) | (now >= window_end)
+        active_first = window_end <= flows["last"] + self._idle
+        reason = np.where(expired, np.where(active_first, FLOW_END_ACTIVE_TIMEOUT, FLOW_END_IDLE_TIMEOUT), 0).astype(np.uint8)
+        if final:
+            reason[reason == 0] = FLOW_END_FORCED_END
+        # Expired flows that saw a FIN/RST ended on their own
+        reason[(reason != 0) & (reason != FLOW_END_ACTIVE_TIMEOUT) & ((flows["flags"] & TCP_FIN_RST) != 0)] = FLOW_END_OF_FLOW_DETECTED
+
+        closed = reason != 0
+        self._open = _take(flows, ~closed)
+        if self._keep_table:
+            self._closed.append(_take(flows, closed))
+        else:
+            self._export(_take(flows, closed), reason[closed])
+
+    def _export(self, flows: dict, reason: np.ndarray) -> None:
+        if not len(reason):
+            return
+        self._stats["flows"] += len(reason)
+        key = flows["key"]
+        v6 = key[:, 37] == 6
+        for template, mask in ((FLOW_TEMPLATE_IPV4, ~v6), (FLOW_TEMPLATE_IPV6, v6)):
+            if not mask.any():
+                continue
+            k = key[mask]
+            records = np.empty(int(mask.sum()), template.dtype)
+            records["flowStartMilliseconds"] = np.round(flows["start"][mask] * 1000)
+            records["flowEndMilliseconds"] = np.round(flows["last"][mask] * 1000)
+            records["octetDeltaCount"] = flows["octets"][mask]
+            records["packetDeltaCount"] = flows["packets"][mask]
+            if template is FLOW_TEMPLATE_IPV4:
+                records["sourceIPv4Address"] = np.ascontiguousarray(k[:, 12:16]).view(">u4").ravel()
+                records["destinationIPv4Address"] = np.ascontiguousarray(k[:, 28:32]).view(">u4").ravel()
+            else:
+                records["sourceIPv6Address"] = np.ascontiguousarray(k[:, 0:16]).view("V16").ravel()
+                records["destinationIPv6Address"] = np.ascontiguousarray(k[:, 16:32]).view("V16").ravel()
+            records["sourceTransportPort"] = np.ascontiguousarray(k[:, 32:34]).view(">u2").ravel()
+            records["destinationTransportPort"] = np.ascontiguousarray(k[:, 34:36]).view(">u2").ravel()
+            records["protocolIdentifier"] = k[:, 36]
+            records["tcpControlBits"] = flows["flags"][mask]
+            records["ipClassOfService"] = flows["tos"][mask]
+            records["flowEndReason"] = reason[mask]
+            self._exported[template.template_id].append(records)
@@ -0,0 +1,59 @@
+"""Time series aggregation - merge the series of several measurements/instances
+
+Series fetched from different RRD files may differ in step and time range: they are
+first aligned on a common time axis (the largest step, rows labeled with the end of
+their step, finer rows averaged into it), then per data source:
+- sum / avg: one merged series (unknown values ignored, NaN where all are unknown)
+- top: the N series with the largest total of a data source, kept apart
+"""
+
+import numpy as np
+
+AGGREGATIONS = ("sum", "avg", "top")
+
+
+def align(series: list[dict]) -> tuple[np.ndarray, list[str], np.ndarray]:
+    """(timestamps, data source names, values[series, row, data source]) on a common time axis"""
+    names = list(dict.fromkeys(name for item in series for name in item["columns"]))
+    filled = [item for item in series if len(item["timestamps"])]
+    if not filled:
+        return np.empty(0, dtype=np.int64), names, np.full((len(series), 0, len(names)), np.nan)
+    step = max(int(item["step"]) for item in filled)
+    first = -(-min(int(item["timestamps"][0]) for item in filled) // step) * step
+    last = -(-max(int(item["timestamps"][-1]) for item in filled) // step) * step
+    timestamps = np.arange(first, last + step, step, dtype=np.int64)
+    values = np.full((len(series), len(timestamps), len(names)), np.nan)
+    for i, item in enumerate(series):
+        if not len(item["timestamps"]):
+            continue
+        rows = (-(-item["timestamps"] // step) * step - first) // step
+        for name, column in item["columns"].items():
+            known = ~np.isnan(column)
+            counts = np.bincount(rows[known], minlength=len(timestamps))
+            sums = np.bincount(rows[known], weights=column[known], minlength=len(timestamps))
+            values[i, :, names.index(name)] = np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+    return timestamps, names, values
+
+
+def aggregate(series: list[dict], how: str = "sum", top: int = 10, by: str | None = None) -> list[dict]:
+    """Aligned series merged by `how`: one series for sum/avg ("members" = number of merged
+    series), the `top` series ranked by their total of `by` (first data source by default) for top.
+    Input/output series: {"timestamps", "columns", "step", ...}, extra keys of kept series preserved"""
+    if how not in AGGREGATIONS:
+        raise ValueError(f"Unknown aggregation: {how}. Supported aggregations are {', '.join(AGGREGATIONS)}.")
+    timestamps, names, values = align(series)
+    step = int(timestamps[1] - timestamps[0]) if len(timestamps) > 1 else max([int(item["step"]) for item in series] or [0])
+    axis = {"timestamps": timestamps, "step": step,
+            "start": int(timestamps[0]) - step if len(timestamps) else 0, "end": int(timestamps[-1]) if len(timestamps) else 0}
+    if how == "top":
+        if by is not None and by not in names:
+            raise ValueError(f"Unknown data source: {by}")
+        column = names.index(by) if by is not None else 0
+        totals = np.nansum(values[:, :, column], axis=1) if names else np.zeros(len(series))
+        ranked = np.argsort(-totals, kind="stable")[:max(top, 0)]
+        return [{**series[i], **axis, "columns": {name: values[i, :, j] for j, name in enumerate(names)}} for i in ranked]
+    known = (~np.isnan(values)).sum(axis=0)
+    totals = np.nansum(values, axis=0)
+    merged = totals if how == "sum" else totals / np.maximum(known, 1)
+    merged = np.where(known > 0, merged, np.nan)
+    return [{**axis, "members": len(series), "columns": {name: merged[:, j] for j, name in enumerate(names)}}]
@@ -0,0 +1,95 @@
+"""Time series downsampling - reduce a fetched series to a target number of points
+
+Every data source of a measurement shares one time axis, so both methods select row
+indices common to all the columns:
+- LTTB (Largest-Triangle-Three-Buckets): one row per bucket, the one forming the
+  largest triangle with the previously selected row and the next bucket's average,
+  the areas of the columns being summed after scaling each column to its range.
+- min-max: the rows holding the minimum and maximum of every column in each bucket
+  (spikes are never dropped, at the price of up to 2 rows per column per bucket).
+Unknown values (NaN) never win a bucket unless the whole bucket is unknown.
+"""
+
+import numpy as np
+
+DOWNSAMPLING_METHODS = ("lttb", "minmax")
+
+
+def _scaled(values: np.ndarray) -> np.ndarray:
+    """Columns scaled to [0, 1], unknown values kept as NaN (2-D, one column per data source)"""
+    values = values.reshape(len(values), -1)
+    known = ~np.isnan(values)
+    low = np.min(values, axis=0, initial=np.inf, where=known)
+    high = np.max(values, axis=0, initial=-np.inf, where=known)
+    span = np.where(np.isfinite(high - low) & (high > low), high - low, 1.0)
+    return (values - np.where(np.isfinite(low), low, 0.0)) / span
+
+
+def _mean(rows: np.ndarray) -> np.ndarray:
+    """Per-column mean of the known values (NaN for a column without any)"""
+    known = ~np.isnan(rows)
+    counts = known.sum(axis=0)
+    return np.where(counts > 0, np.where(known, rows, 0.0).sum(axis=0) / np.maximum(counts, 1), np.nan)
+
+
+def lttb_indices(timestamps: np.ndarray, values: np.ndarray, points: int) -> np.ndarray:
+    """Rows kept by LTTB (first and last rows always kept)"""
+    rows = len(timestamps)
+    if points >= rows:
+        return np.arange(rows)
+    if points < 3:
+        return np.array([0, rows - 1][:max(points, 0)], dtype=np.int64)
+    x = timestamps.astype(np.float64)
+    y = _scaled(values)
+    # Buckets of the rows between the first and the last one
+    edges = np.linspace(1, rows - 1, points - 1).astype(np.int64)
+    selected = np.empty(points, dtype=np.int64)
+    selected[0], selected[-1] = 0, rows - 1
+    previous = 0
+    for bucket in range(points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        if bucket + 2 < len(edges):
+            next_x, next_y = x[end:edges[bucket + 2]].mean(), _mean(y[end:edges[bucket + 2]])
+        else:
+            next_x, next_y = x[-1], y[-1]
+        # Twice the triangle areas, summed over the known columns (-1 for rows without any)
+        areas = np.abs((x[previous] - next_x) * (y[start:end] - y[previous])
+                       - (x[previous] - x[start:end, None]) * (next_y - y[previous]))
+        unknown = np.isnan(areas)
+        areas = np.where(unknown.all(axis=1), -1.0, np.where(unknown, 0.0, areas).sum(axis=1))
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    return selected
+
+
+def min_max_indices(values: np.ndarray, points: int) -> np.ndarray:
+    """Rows holding each bucket's minimum and maximum of every column (sorted, at most `points`)"""
+    values = values.reshape(len(values), -1)
+    rows, columns = values.shape
+    if points >= rows:
+        return np.arange(rows)
+    buckets = max(1, points // (2 * columns))
+    bucket = np.arange(rows) * buckets // rows
+    firsts = np.searchsorted(bucket, np.arange(buckets))
+    lasts = np.append(firsts[1:], rows) - 1
+    selected = []
+    for column in values.T:
+        # Within each bucket (rows ordered by bucket then value): first = min, last = max
+        selected.append(np.lexsort((np.where(np.isnan(column), np.inf, column), bucket))[firsts])
+        selected.append(np.lexsort((np.where(np.isnan(column), -np.inf, column), bucket))[lasts])
+    return np.unique(np.concatenate(selected))
+
+
+def downsample(timestamps: np.ndarray, columns: dict[str, np.ndarray], points: int,
+               method: str = "lttb") -> tuple[np.ndarray, dict[str, np.ndarray]]:
+    """(timestamps, columns) reduced to about `points` rows"""
+    if method not in DOWNSAMPLING_METHODS:
+        raise ValueError(f"Unknown downsampling method: {method}. Supported methods are {', '.join(DOWNSAMPLING_METHODS)}.")
+    if not columns or points <= 0 or points >= len(timestamps):
+        return timestamps, columns
+    values = np.column_stack(list(columns.values()))
+    if method == "lttb":
+        rows = lttb_indices(timestamps, values, points)
+    else:
+        rows = min_max_indices(values, points)
+    return timestamps[rows], {name: column[rows] for name, column in columns.items()}
@@ -0,0 +1,59 @@
+"""Time series rollups - pre-aggregated tiers of a series (hourly, daily, ...)
+
+A series row labeled t covers (t - step, t]: it belongs to the tier bucket starting at
+floor((t - 1) / tier) * tier. Each bucket keeps, per data source, the sum, the count of
+known values, the maximum and the 95th percentile of the rows (p95 does not compose:
+every tier is computed from the rows, never from a finer tier).
+Rows coarser than a tier (step > tier) do not contribute to it. Queries read the coarsest
+tier satisfying their resolution (plan_tier).
+"""
+
+import numpy as np
+
+ROLLUP_STATS = ("avg", "sum", "max", "p95")
+
+
+def rollup_buckets(timestamps: np.ndarray, step: int, columns: dict[str, np.ndarray], tier: int,
+                   since: int = 0, until: int | None = None) -> dict[str, dict[str, np.ndarray]]:
+    """{data source: {"ts" (bucket starts), "sum", "count", "max", "p95"}} of the complete
+    buckets in [since, until), buckets without any known value left out"""
+    if step > tier or not len(timestamps):
+        return {}
+    buckets = (timestamps.astype(np.int64) - 1) // tier * tier
+    rollups = {}
+    for name, column in columns.items():
+        keep = ~np.isnan(column) & (buckets >= since)
+        if until is not None:
+            keep &= buckets + tier <= until
+        if not keep.any():
+            continue
+        bucket, values = buckets[keep], column[keep]
+        # Rows ordered by bucket then value: each bucket is a sorted slice
+        order = np.lexsort((values, bucket))
+        bucket, values = bucket[order], values[order]
+        starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+        counts = np.diff(np.r_[starts, len(bucket)])
+        # Linear interpolation between the closest ranks (numpy's default percentile)
+        rank = starts + 0.95 * (counts - 1)
+        low = np.floor(rank).astype(np.int64)
+        high = np.minimum(low + 1, starts + counts - 1)
+        rollups[name] = {
+            "ts": bucket[starts],
+            "sum": np.add.reduceat(values, starts),
+            "count": counts,
+            "max": values[starts + counts - 1],
+            "p95": values[low] + (values[high] - values[low]) * (rank - low),
+        }
+    return rollups
+
+
+def plan_tier(tiers: list[int], start: int, end: int, resolution: int = 0, points: int = 0) -> int | None:
+    """Coarsest tier satisfying the requested resolution (seconds per point, or the range
+    over `points` points), the finest tier when neither is set. None when every tier is
+    coarser than requested: the raw series must be read instead"""
+    if resolution <= 0 and points > 0:
+        resolution = max((end - start) // points, 1)
+    if resolution <= 0:
+        return min(tiers) if tiers else None
+    fitting = [tier for tier in tiers if tier <= resolution]
+    return max(fitting) if fitting else None
@@ -0,0 +1,27 @@
+import numpy as np
+
+## Semantics of the structured data lists (RFC 6313 section 4.4)
+LIST_NONE_OF = 0
+LIST_EXACTLY_ONE_OF = 1
+LIST_ONE_OR_MORE_OF = 2
+LIST_ALL_OF = 3
+LIST_ORDERED = 4
+LIST_UNDEFINED = 0xFF
+
+
+class BasicList:
+    """basicList (RFC 6313): values of one information element. Fixed-length values as a
+    NumPy array (wire types), variable-length ones as a list of bytes."""
+    __slots__ = ("semantic", "element_id", "enterprise_number", "values")
+
+    def __init__(self, semantic: int, element_id: int, enterprise_number: int, values: np.ndarray | list) -> None:
+        self.semantic = semantic
+        self.element_id = element_id
+        self.enterprise_number = enterprise_number
+        self.values = values
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __repr__(self) -> str:
+        return f"BasicList(semantic={self.semantic}, element_id={self.element_id}, values={len(self.values)})"
@@ -0,0 +1,53 @@
+from typing import Iterator
+
+import numpy as np
+
+
+class IpfixMessageBatch:
+    """IPFIX messages received by one collector socket in one read burst: (offset, length)
+    slices of the socket's receive buffer, handed over without copying. The buffer is
+    reused by the next batch: views must not outlive the handler call (copy what is kept)."""
+    __slots__ = ("buffer", "offsets", "lengths", "exporters", "transport")
+
+    def __init__(self, buffer: memoryview, offsets: list[int], lengths: list[int], exporters: list,
+                 transport: str) -> None:
+        self.buffer = buffer
+        self.offsets = offsets
+        self.lengths = lengths
+        # Exporter address of each message ((host, port) of the datagram or of the TCP peer)
+        self.exporters = exporters
+        self.transport = transport
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __iter__(self) -> Iterator[tuple[object, memoryview]]:
+        """(exporter, message view) of every message"""
+        buffer = self.buffer
+        for offset, length, exporter in zip(self.offsets, self.lengths, self.exporters):
+            yield exporter, buffer[offset:offset + length]
+
+    @property
+    def bytes(self) -> int:
+        return sum(self.lengths)
+
+
+class IpfixRecordBatch:
+    """Decoded data records of one template layout (field specifiers (element id, length,
+    enterprise number)), owned by the batch: the mediator stages may modify them in place.
+    Records are one structured array, or the list of its parts before they are copied
+    out of a receive buffer."""
+    __slots__ = ("fields", "records", "template_id", "domain")
+
+    def __init__(self, fields: tuple[tuple[int, int, int], ...], records: np.ndarray | list[np.ndarray], template_id: int,
+                 domain: int = 0) -> None:
+        self.fields = fields
+        self.records = records
+        # Template id and observation domain of the (first) exporter of the records
+        self.template_id = template_id
+        self.domain = domain
+
+    def __len__(self) -> int:
+        if isinstance(self.records, list):
+            return sum(len(part) for part in self.records)
+        return len(self.records)
@@ -0,0 +1,68 @@
+from typing import Dict, Literal
+from pydantic import BaseModel
+
+
+IeDataType = Literal[
+    "unsigned8", "unsigned16", "unsigned32", "unsigned64",
+    "ipv4Address", "ipv6Address", "dateTimeMilliseconds", "octetArray", "string",
+    "basicList", "subTemplateList", "subTemplateMultiList",
+]
+
+# Wire (big-endian) NumPy type of the fixed-length data types
+_NUMPY_TYPES = {
+    "unsigned8": "u1", "unsigned16": ">u2", "unsigned32": ">u4", "unsigned64": ">u8",
+    "ipv4Address": ">u4", "ipv6Address": "V16", "dateTimeMilliseconds": ">u8",
+}
+VARIABLE_LENGTH = 65535
+
+
+class InformationElement(BaseModel):
+    name: str
+    element_id: int
+    data_type: IeDataType
+    length: int
+    enterprise_number: int = 0
+
+    @property
+    def numpy_type(self) -> str:
+        """Wire-format NumPy type (big-endian), raw bytes for octet arrays/strings"""
+        if self.length == VARIABLE_LENGTH:
+            raise ValueError(f"Information element {self.name} is variable-length")
+        return _NUMPY_TYPES.get(self.data_type, f"V{self.length}")
+
+
+def _ie(name: str, element_id: int, data_type: IeDataType, length: int) -> InformationElement:
+    return InformationElement(name=name, element_id=element_id, data_type=data_type, length=length)
+
+
+## IANA IPFIX Information Elements used by IPyFIXweb (https://www.iana.org/assignments/ipfix)
+IANA_IES: Dict[str, InformationElement] = {ie.name: ie for ie in [
+    _ie("octetDeltaCount", 1, "unsigned64", 8),
+    _ie("packetDeltaCount", 2, "unsigned64", 8),
+    _ie("deltaFlowCount", 3, "unsigned64", 8),
+    _ie("protocolIdentifier", 4, "unsigned8", 1),
+    _ie("ipClassOfService", 5, "unsigned8", 1),
+    _ie("tcpControlBits", 6, "unsigned16", 2),
+    _ie("sourceTransportPort", 7, "unsigned16", 2),
+    _ie("sourceIPv4Address", 8, "ipv4Address", 4),
+    _ie("destinationTransportPort", 11, "unsigned16", 2),
+    _ie("destinationIPv4Address", 12, "ipv4Address", 4),
+    _ie("sourceIPv6Address", 27, "ipv6Address", 16),
+    _ie("destinationIPv6Address", 28, "ipv6Address", 16),
+    _ie("flowEndReason", 136, "unsigned8", 1),
+    _ie("flowStartMilliseconds", 152, "dateTimeMilliseconds", 8),
+    _ie("flowEndMilliseconds", 153, "dateTimeMilliseconds", 8),
+    # Structured data (RFC 6313)
+    _ie("basicList", 291, "basicList", VARIABLE_LENGTH),
+    _ie("subTemplateList", 292, "subTemplateList", VARIABLE_LENGTH),
+    _ie("subTemplateMultiList", 293, "subTemplateMultiList", VARIABLE_LENGTH),
+]}
+
+IANA_IES_BY_ID: Dict[int, InformationElement] = {ie.element_id: ie for ie in IANA_IES.values()}
+
+## flowEndReason values (RFC 7012)
+FLOW_END_IDLE_TIMEOUT = 1
+FLOW_END_ACTIVE_TIMEOUT = 2
+FLOW_END_OF_FLOW_DETECTED = 3
+FLOW_END_FORCED_END = 4
+FLOW_END_LACK_OF_RESOURCES = 5
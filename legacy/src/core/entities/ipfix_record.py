@@ -0,0 +1,35 @@
+from typing import List
+import numpy as np
+from pydantic import BaseModel
+
+from core.entities.ipfix_ie import InformationElement, IANA_IES
+
+
+class IpfixTemplate(BaseModel):
+    template_id: int
+    fields: List[InformationElement]
+
+    @property
+    def dtype(self) -> np.dtype:
+        """Packed structured dtype laid out exactly like a data record on the wire:
+        a data set body is ``records.tobytes()``, and np.frombuffer() decodes one"""
+        return np.dtype([(ie.name, ie.numpy_type) for ie in self.fields])
+
+    @property
+    def record_length(self) -> int:
+        return sum(ie.length for ie in self.fields)
+
+
+def _template(template_id: int, names: List[str]) -> IpfixTemplate:
+    return IpfixTemplate(template_id=template_id, fields=[IANA_IES[name] for name in names])
+
+
+_FLOW_FIELDS = [
+    "flowStartMilliseconds", "flowEndMilliseconds", "octetDeltaCount", "packetDeltaCount",
+    "{src}", "{dst}", "sourceTransportPort", "destinationTransportPort",
+    "protocolIdentifier", "tcpControlBits", "ipClassOfService", "flowEndReason",
+]
+
+## Templates of the flow records produced by the PCAP -> IPFIX flow meter
+FLOW_TEMPLATE_IPV4 = _template(256, [name.format(src="sourceIPv4Address", dst="destinationIPv4Address") for name in _FLOW_FIELDS])
+FLOW_TEMPLATE_IPV6 = _template(257, [name.format(src="sourceIPv6Address", dst="destinationIPv6Address") for name in _FLOW_FIELDS])
@@ -0,0 +1,19 @@
+import numpy as np
+
+
+class SubTemplateList:
+    """subTemplateList (RFC 6313): records of one template, decoded as its data sets are
+    (structured array with the template's wire layout, None while the template is unknown)."""
+    __slots__ = ("semantic", "template_id", "records")
+
+    def __init__(self, semantic: int, template_id: int, records: np.ndarray | None) -> None:
+        self.semantic = semantic
+        self.template_id = template_id
+        self.records = records
+
+    def __len__(self) -> int:
+        return len(self.records) if self.records is not None else 0
+
+    def __repr__(self) -> str:
+        return f"SubTemplateList(semantic={self.semantic}, template_id={self.template_id}, records={len(self)})"
+
@@ -0,0 +1,18 @@
+import numpy as np
+
+
+class SubTemplateMultiList:
+    """subTemplateMultiList (RFC 6313): records of several templates, one
+    (template id, structured array) entry per encoded data record group (None while the
+    template is unknown)."""
+    __slots__ = ("semantic", "groups")
+
+    def __init__(self, semantic: int, groups: list[tuple[int, np.ndarray | None]]) -> None:
+        self.semantic = semantic
+        self.groups = groups
+
+    def __len__(self) -> int:
+        return sum(len(records) for _, records in self.groups if records is not None)
+
+    def __repr__(self) -> str:
+        return f"SubTemplateMultiList(semantic={self.semantic}, groups={[(tid, len(r) if r is not None else None) for tid, r in self.groups]})"
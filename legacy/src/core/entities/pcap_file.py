@@ -0,0 +1,19 @@
+from typing import List, Literal
+from pydantic import BaseModel
+
+
+class PcapInterface(BaseModel):
+    link_type: int
+    snaplen: int
+    # Seconds per timestamp unit (1e-6 for classic pcap, 1e-9 for nanosecond pcap)
+    ts_resolution: float = 1e-6
+
+
+class PcapFileInfo(BaseModel):
+    path: str
+    format: Literal["pcap", "pcapng"]
+    byte_order: Literal["<", ">"]
+    size: int
+    version: str
+    # Classic pcap has exactly one interface, pcapng one per Interface Description Block
+    interfaces: List[PcapInterface] = []
@@ -0,0 +1,22 @@
+class PcapPacket:
+    """One captured packet. ``data`` is a zero-copy memoryview into the mapped capture
+    file: valid until the reader is closed, copy it (bytes(data)) to keep it longer."""
+    __slots__ = ("timestamp", "caplen", "wirelen", "link_type", "interface_id", "offset", "data", "data_offset")
+
+    def __init__(self, timestamp: float, caplen: int, wirelen: int, link_type: int,
+                 interface_id: int, offset: int, data: memoryview, data_offset: int = 0):
+        self.timestamp = timestamp
+        self.caplen = caplen
+        self.wirelen = wirelen
+        self.link_type = link_type
+        self.interface_id = interface_id
+        # File offset of the packet record (block) header
+        self.offset = offset
+        self.data = data
+        # Offset of data within its underlying buffer (data.obj, the mapped file):
+        # lets batch consumers gather packet bytes with one vectorized indexing
+        self.data_offset = data_offset
+
+    def __repr__(self) -> str:
+        return (f"PcapPacket(timestamp={self.timestamp}, caplen={self.caplen}, wirelen={self.wirelen}, "
+                f"link_type={self.link_type}, offset={self.offset})")
@@ -1,7 +1,11 @@
 import re
 from uuid import UUID
 from typing import List, Dict
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, Field, field_validator
+
+
+_INTEGER = re.compile(r"^[\d]+$")
+_DECIMAL = re.compile(r"^[\d]+[\.|\,][\d]+$")
 
 
 class MeasurementDetails(BaseModel):
@@ -18,9 +22,9 @@ class MeasurementDetails(BaseModel):
         fields = v.copy()
         for k, value in v.items():
             if isinstance(value, str):
-                if re.match(r"^[\d]+$", value):
+                if _INTEGER.match(value):
                     fields[k] = int(value)
-                elif re.match(r"^[\d]+[\.|\,][\d]+$", value):
+                elif _DECIMAL.match(value):
                     fields[k] = float(value)
             elif not isinstance(value, (int, float)):
                 raise ValueError(
@@ -45,3 +49,41 @@ class Instance(BaseModel):
     ts_backend: str
     measurements_list: List[str]
     measurements: List[MeasurementDetails]
+
+
+class MeasurementSeries(BaseModel):
+    uuid: UUID
+    start: int
+    end: int
+    step: int
+    points: int
+    downsampling: str | None = None
+    timestamps: List[int]
+    columns: Dict[str, List[float | None]]
+
+
+class SeriesQuery(BaseModel):
+    ts_uuids: List[UUID] = Field(min_length=1)
+    measurements: List[UUID] | None = None
+    tags: List[str] = []
+    start: int = 0
+    end: int = 0
+    aggregate: str = "sum"
+    top: int = 10
+    by: str | None = None
+    points: int = 0
+    method: str = "lttb"
+    cf: str = "AVERAGE"
+
+
+class AggregatedSeries(BaseModel):
+    ts_uuid: UUID | None = None
+    uuid: UUID | None = None
+    members: int = 1
+    start: int
+    end: int
+    step: int
+    points: int
+    downsampling: str | None = None
+    timestamps: List[int]
+    columns: Dict[str, List[float | None]]
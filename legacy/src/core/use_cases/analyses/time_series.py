@@ -6,7 +6,7 @@ This module provides an implementation of the interface:
 
 from typing import Any
 from ports.input.analysis import timeSeriesPort
-from core.use_cases.analyses.time_series_business import timeSeries as ts_analyses
+from core.use_cases.analyses.time_series_business import timeSeries as ts_analyses, query_instances, search_measurements, query_rollups
 
 class service(timeSeriesPort):
     """
@@ -14,11 +14,41 @@ class service(timeSeriesPort):
     implementing the timeSeriesPort interface.
     """
 
-    async def instance_info(self, ts_uuid: Any = None):
+    async def instance_info(self, ts_uuid: Any = None, serialized: bool = False):
+        if ts_uuid and serialized:
+            return await ts_analyses(ts_uuid).store_info_json()
         if ts_uuid:
             return await ts_analyses(ts_uuid).store_info()
         return None
 
+    async def measurements_fetch(self, ts_uuid: Any, measurements: list[str] | None = None, start: int = 0,
+                                 end: int = 0, points: int = 0, method: str = "lttb", cf: str = "AVERAGE",
+                                 arrays: bool = False):
+        if ts_uuid:
+            return await ts_analyses(ts_uuid).fetch_measurements(measurements, start, end, points, method, cf, arrays)
+        return None
+
+    async def measurements_export(self, ts_uuid: Any, measurements: list[str] | None = None, start: int = 0,
+                                  end: int = 0, output_type: str = "csv", cf: str = "AVERAGE", path: str | None = None):
+        if ts_uuid:
+            return await ts_analyses(ts_uuid).export_measurements(measurements, start, end, output_type, cf, path)
+        return None
+
+    async def measurements_query(self, ts_uuids: list[Any], measurements: list[str] | None = None,
+                                 tags: list[str] | None = None, start: int = 0, end: int = 0, aggregate: str = "sum",
+                                 top: int = 10, by: str | None = None, points: int = 0, method: str = "lttb",
+                                 cf: str = "AVERAGE"):
+        if ts_uuids:
+            return await query_instances(ts_uuids, measurements, tags, start, end, aggregate, top, by, points, method, cf)
+        return None
+
+    async def measurements_search(self, terms: list[str], limit: int | None = None):
+        return await search_measurements(terms, limit)
+
+    async def measurements_rollups(self, scope: str = "*", start: int = 0, end: int = 0, resolution: int = 0,
+                                   points: int = 0, stat: str = "avg"):
+        return await query_rollups(scope, start, end, resolution, points, stat)
+
 
 
 
@@ -2,10 +2,67 @@
 This module implements the use cases for the time-series analyses business logic. This module will interact with the repositories ports/interfaces and are completely decoupled from the infrastructure and related adapters.
 '''
 
+import time
+import asyncio
+import threading
 from typing import Any
+from collections import OrderedDict
 
-from ports.repositories.time_series import timeSeriesDb
-from core.entities.time_series import Instance
+import numpy as np
+from pydantic import BaseModel
+
+from config.config import (
+    TIME_SERIES_QUERY_CONCURRENCY, TIME_SERIES_QUERY_MAX_INSTANCES, TIME_SERIES_INFO_CACHE_SIZE,
+    ROLLUP_TIERS,
+)
+from ports.repositories.sql import rollupStore
+from ports.repositories.time_series import timeSeriesDb, timeSeriesIndex, timeSeriesTenant
+from core.entities.time_series import Instance, MeasurementSeries, AggregatedSeries
+from core.data_domain.time_series_downsampling import downsample, DOWNSAMPLING_METHODS
+from core.data_domain.time_series_aggregation import aggregate, AGGREGATIONS
+from core.data_domain.time_series_rollups import plan_tier, ROLLUP_STATS
+
+
+def json_bytes(model: BaseModel) -> bytes:
+    """Model serialized to JSON by pydantic (no intermediate dict)"""
+    return model.model_dump_json().encode()
+
+
+class info_json_cache:
+    """
+    ts_uuid -> (info version, serialized Instance): the adapter output is validated and
+    serialized once per version of the instance files (LRU eviction).
+    """
+    def __init__(self, max_entries: int = TIME_SERIES_INFO_CACHE_SIZE) -> None:
+        self._max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[Any, bytes]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0}
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "entries": len(self._entries), "max_entries": self._max_entries}
+
+    def get(self, ts_uuid: str, info: dict) -> bytes:
+        version = info.get("version")
+        with self._lock:
+            cached = self._entries.get(ts_uuid)
+            if cached and version is not None and cached[0] == version:
+                self._entries.move_to_end(ts_uuid)
+                self._stats["hits"] += 1
+                return cached[1]
+            self._stats["misses"] += 1
+        body = json_bytes(Instance(**info))
+        if version is not None:
+            with self._lock:
+                self._entries[ts_uuid] = (version, body)
+                self._entries.move_to_end(ts_uuid)
+                while len(self._entries) > self._max_entries:
+                    self._entries.popitem(last=False)
+        return body
+
+
+info_json = info_json_cache()
 
 
 class timeSeries:
@@ -41,3 +98,130 @@ class timeSeries:
         if not info:
             return None
         return Instance(**info).model_dump(mode="json")
+
+    async def store_info_json(self) -> bytes | None:
+        """store_info serialized to JSON, validated and serialized again only when the instance files changed"""
+        info = await self._ts_db.info()
+        if not info:
+            return None
+        return info_json.get(str(self._ts_uuid), info)
+
+    async def fetch_measurements(self, measurements: list[str] | None = None, start: int = 0, end: int = 0,
+                                 points: int = 0, method: str = "lttb", cf: str = "AVERAGE",
+                                 arrays: bool = False) -> list | None:
+        """Series of the measurements (all by default), reduced to `points` rows when set.
+        arrays=True keeps "timestamps" and "columns" as NumPy arrays (binary encoders),
+        JSON-ready lists otherwise"""
+        if method not in DOWNSAMPLING_METHODS:
+            raise ValueError(f"Unknown downsampling method: {method}. Supported methods are {', '.join(DOWNSAMPLING_METHODS)}.")
+        fetched = await self._ts_db.fetch(start, end, {"measurements": measurements, "cf": cf})
+        if fetched is None:
+            return None
+        series = []
+        for uuid, data in fetched.items():
+            timestamps, columns = downsample(data["timestamps"], data["columns"], points, method)
+            metadata = {
+                "uuid": uuid, "start": data["start"], "end": data["end"], "step": data["step"], "points": len(timestamps),
+                "downsampling": method if len(timestamps) < len(data["timestamps"]) else None,
+            }
+            if arrays:
+                series.append({**metadata, "timestamps": timestamps, "columns": columns})
+                continue
+            series.append(MeasurementSeries(
+                **metadata,
+                timestamps=timestamps.tolist(),
+                # Unknown values (NaN) as null
+                columns={name: np.where(np.isnan(column), None, column).tolist() for name, column in columns.items()},
+            ).model_dump(mode="json"))
+        return series
+
+    async def export_measurements(self, measurements: list[str] | None = None, start: int = 0, end: int = 0,
+                                  output_type: str = "csv", cf: str = "AVERAGE", path: str | None = None) -> Any:
+        """Export of the measurements (all by default): async iterator of encoded chunks,
+        or the file path when `path` is set"""
+        return await self._ts_db.export(start, end, {"measurements": measurements, "cf": cf, "path": path}, output_type)
+
+
+async def query_instances(ts_uuids: list[str], measurements: list[str] | None = None, tags: list[str] | None = None,
+                          start: int = 0, end: int = 0, how: str = "sum", top: int = 10, by: str | None = None,
+                          points: int = 0, method: str = "lttb", cf: str = "AVERAGE") -> dict:
+    """Measurements of several instances (filtered by UUIDs and tags), fetched concurrently
+    (at most TIME_SERIES_QUERY_CONCURRENCY instances at a time) and merged by `how`.
+    Returns {"series": [...], "matched": number of fetched measurements, "missing": [unknown instances]}"""
+    if how not in AGGREGATIONS:
+        raise ValueError(f"Unknown aggregation: {how}. Supported aggregations are {', '.join(AGGREGATIONS)}.")
+    if method not in DOWNSAMPLING_METHODS:
+        raise ValueError(f"Unknown downsampling method: {method}. Supported methods are {', '.join(DOWNSAMPLING_METHODS)}.")
+    ts_uuids = list(dict.fromkeys(ts_uuids))
+    if len(ts_uuids) > TIME_SERIES_QUERY_MAX_INSTANCES:
+        raise ValueError(f"Too many instances: {len(ts_uuids)} (at most {TIME_SERIES_QUERY_MAX_INSTANCES} per query).")
+    semaphore = asyncio.Semaphore(TIME_SERIES_QUERY_CONCURRENCY)
+
+    async def fetch(ts_uuid: str) -> dict | None:
+        async with semaphore:
+            return await timeSeriesDb(ts_uuid=ts_uuid).fetch(
+                start, end, {"measurements": measurements, "tags": tags, "cf": cf})
+
+    fetched = await asyncio.gather(*(fetch(ts_uuid) for ts_uuid in ts_uuids))
+    series, missing = [], []
+    for ts_uuid, data in zip(ts_uuids, fetched):
+        if data is None:
+            missing.append(ts_uuid)
+            continue
+        series += [{**item, "ts_uuid": ts_uuid, "uuid": uuid} for uuid, item in data.items()]
+    merged = aggregate(series, how, top, by) if series else []
+    result = []
+    for item in merged:
+        timestamps, columns = downsample(item["timestamps"], item["columns"], points, method)
+        result.append(AggregatedSeries(
+            ts_uuid=item.get("ts_uuid"), uuid=item.get("uuid"), members=item.get("members", 1),
+            start=item["start"], end=item["end"], step=item["step"], points=len(timestamps),
+            downsampling=method if len(timestamps) < len(item["timestamps"]) else None,
+            timestamps=timestamps.tolist(),
+            columns={name: np.where(np.isnan(column), None, column).tolist() for name, column in columns.items()},
+        ).model_dump(mode="json"))
+    return {"series": result, "matched": len(series), "missing": missing}
+
+
+async def search_measurements(terms: list[str], limit: int | None = None) -> dict:
+    """Measurements matching every term ("SSH", "server_ip:10.1.32.4", "server_ip:10.1.32.0/24"),
+    looked up in the in-memory tag index"""
+    measurements = await timeSeriesIndex().search(terms, limit)
+    return {"terms": terms, "count": len(measurements), "measurements": measurements}
+
+
+async def query_rollups(scope: str = "*", start: int = 0, end: int = 0, resolution: int = 0, points: int = 0,
+                        stat: str = "avg") -> dict:
+    """Series of a scope (the whole tenant "*" or a tag) read from the coarsest rollup tier
+    satisfying the requested resolution (or `points` points over the range), one `stat` per
+    bucket and data source. Finer requests fall back to the raw series of the scope, summed.
+    Returns {"scope", "stat", "tier" (None for raw series), "watermark", "series": [...]}"""
+    if stat not in ROLLUP_STATS:
+        raise ValueError(f"Unknown rollup statistic: {stat}. Supported statistics are {', '.join(ROLLUP_STATS)}.")
+    end = end or int(time.time())
+    start = start or end - 86400
+    tier = plan_tier(ROLLUP_TIERS, start, end, resolution, points)
+    if tier is None:
+        ts_uuids = sorted({item["ts_uuid"] for item in await timeSeriesIndex().search([] if scope == "*" else [scope])})
+        raw = await query_instances(ts_uuids, None, None if scope == "*" else [scope], start, end, "sum",
+                                    points=points) if ts_uuids else {"series": []}
+        return {"scope": scope, "stat": stat, "tier": None, "watermark": None, "series": raw["series"]}
+    store, tenant = rollupStore(), timeSeriesTenant()
+    buckets = await asyncio.to_thread(store.read, tenant, tier, scope, start // tier * tier, end)
+    watermark = await asyncio.to_thread(store.watermark, tenant, tier)
+    series = []
+    if buckets:
+        # Data sources on a common axis (a bucket is missing where a data source had no known value)
+        starts = np.unique(np.concatenate([columns["ts"] for columns in buckets.values()]))
+        values = {}
+        for name, columns in buckets.items():
+            column = np.full(len(starts), np.nan)
+            column[np.searchsorted(starts, columns["ts"])] = (
+                columns["sum"] / columns["count"] if stat == "avg" else columns[stat])
+            values[name] = np.where(np.isnan(column), None, column).tolist()
+        series.append(AggregatedSeries(
+            start=int(starts[0]), end=int(starts[-1]) + tier, step=tier, points=len(starts),
+            # Buckets labeled with their end, as the RRD rows
+            timestamps=(starts + tier).tolist(), columns=values,
+        ).model_dump(mode="json"))
+    return {"scope": scope, "stat": stat, "tier": tier, "watermark": watermark, "series": series}
@@ -0,0 +1,110 @@
+'''
+This module implements the background rollup of the time series: the series of every
+instance of the tenant are read window by window and summed per scope (the whole tenant
+"*" and each measurement tag), then reduced to hourly/daily buckets (see
+core.data_domain.time_series_rollups) stored in the rollups store. Each tier resumes at its
+watermark, so a run only reads the rows added since the previous one.
+One web worker per host runs the rollups (the one holding the store lock), every ROLLUP_INTERVAL seconds.
+'''
+
+import time
+import asyncio
+import logging
+
+from config.config import (
+    ROLLUP_TIERS, ROLLUP_INTERVAL, ROLLUP_DELAY, ROLLUP_WINDOW_DAYS, ROLLUP_BACKFILL_DAYS,
+    TIME_SERIES_QUERY_CONCURRENCY,
+)
+from ports.repositories.sql import rollupStore
+from ports.repositories.time_series import timeSeriesDb, timeSeriesIndex, timeSeriesTenant
+from core.data_domain.time_series_aggregation import aggregate
+from core.data_domain.time_series_rollups import rollup_buckets
+
+logger = logging.getLogger(__name__)
+
+DAY = 86400
+
+
+def rollup_scopes(scopes: dict[str, list[dict]], tier: int, since: int, until: int) -> dict[str, dict]:
+    """{scope: {data source: buckets}} of the summed series of each scope"""
+    rollups = {}
+    for scope, series in scopes.items():
+        merged = aggregate(series, "sum")[0]
+        buckets = rollup_buckets(merged["timestamps"], merged["step"], merged["columns"], tier, since, until)
+        if buckets:
+            rollups[scope] = buckets
+    return rollups
+
+
+async def run_rollups(now: int | None = None, tiers: list[int] = ROLLUP_TIERS) -> dict:
+    """Roll up the complete buckets of every tier since its watermark (ROLLUP_BACKFILL_DAYS
+    back on the first run). Returns {"tenant", "watermarks": {tier: watermark}, "buckets": written}"""
+    store, tenant = rollupStore(), timeSeriesTenant()
+    tiers = sorted(tiers)
+    coarsest = tiers[-1]
+    now = int(now or time.time()) - ROLLUP_DELAY
+    untils = {tier: now // tier * tier for tier in tiers}
+    first = (now - ROLLUP_BACKFILL_DAYS * DAY) // coarsest * coarsest
+    marks = {}
+    for tier in tiers:
+        mark = await asyncio.to_thread(store.watermark, tenant, tier)
+        marks[tier] = first if mark is None else mark
+    # Windows aligned on the coarsest tier: no bucket straddles two windows
+    window = max(ROLLUP_WINDOW_DAYS * DAY // coarsest, 1) * coarsest
+    start, last = min(marks.values()) // coarsest * coarsest, max(untils.values())
+    tags = {(item["ts_uuid"], item["uuid"]): item["tags"] for item in await timeSeriesIndex().search([])}
+    ts_uuids = sorted({ts_uuid for ts_uuid, _ in tags})
+    semaphore = asyncio.Semaphore(TIME_SERIES_QUERY_CONCURRENCY)
+
+    async def fetch(ts_uuid: str, start: int, end: int) -> dict | None:
+        async with semaphore:
+            return await timeSeriesDb(ts_uuid=ts_uuid).fetch(start, end, {"cf": "AVERAGE"})
+
+    written = 0
+    while start < last:
+        end = min(start + window, last)
+        fetched = await asyncio.gather(*(fetch(ts_uuid, start, end) for ts_uuid in ts_uuids))
+        scopes: dict[str, list[dict]] = {}
+        for ts_uuid, data in zip(ts_uuids, fetched):
+            for uuid, series in (data or {}).items():
+                for scope in ["*", *tags.get((ts_uuid, uuid), [])]:
+                    scopes.setdefault(scope, []).append(series)
+        for tier in tiers:
+            since, until = max(start, marks[tier]), min(end, untils[tier])
+            if since >= until:
+                continue
+            rollups = await asyncio.to_thread(rollup_scopes, scopes, tier, since, until) if scopes else {}
+            written += await asyncio.to_thread(store.write, tenant, tier, rollups, until)
+            marks[tier] = until
+        start = end
+    return {"tenant": tenant, "watermarks": marks, "buckets": written}
+
+
+async def _rollup_worker() -> None:
+    while True:
+        try:
+            if await asyncio.to_thread(rollupStore().lock):
+                started = time.perf_counter()
+                result = await run_rollups()
+                logger.info(f"Time series rollups: {result['buckets']} buckets in "
+                            f"{time.perf_counter() - started:.3f}s, watermarks {result['watermarks']}")
+        except Exception as e:
+            logger.error(f"Time series rollups failed: {e}")
+        await asyncio.sleep(ROLLUP_INTERVAL)
+
+
+_worker: asyncio.Task | None = None
+
+
+def rollup_worker_start() -> None:
+    """Start the rollups of this web worker (idle while another process holds the store lock)"""
+    global _worker
+    if ROLLUP_INTERVAL and _worker is None:
+        _worker = asyncio.get_running_loop().create_task(_rollup_worker())
+
+
+def rollup_worker_stop() -> None:
+    global _worker
+    if _worker is not None:
+        _worker.cancel()
+        _worker = None
@@ -0,0 +1,245 @@
+"""IPFIX Collector Service - SO_REUSEPORT sharded collector processes
+
+COLLECTOR_PROCESSES processes each run their own event loop and collector, bound to the
+same UDP/TCP ports (SO_REUSEPORT): the kernel spreads the exporters over them, and no
+message crosses a process boundary before being handled. Each process publishes its
+counters in one row of a shared array, summed by stats().
+The mediator runs in each collector process, or (MEDIATOR_PROCESS) in a process of its
+own reading the record batches of every collector process from their shared memory ring.
+"""
+
+import os
+import signal
+import sqlite3
+import asyncio
+import threading
+import logging
+import multiprocessing
+
+import numpy as np
+
+from config.config import (
+    COLLECTOR_PROCESSES, COLLECTOR_DECODE, TEMPLATE_STORE, MEDIATOR_OUTPUT, MEDIATOR_STAGES,
+    MEDIATOR_AGGREGATE_INTERVAL, MEDIATOR_ANONYMIZE_KEY, MEDIATOR_PROCESS,
+)
+from core.entities.ipfix_buffer import IpfixMessageBatch
+from core.data_domain.ipfix_collector import MESSAGE_HEADER, IPFIX_VERSION, exporter_sessions
+from core.data_domain.ipfix_decoder import ipfix_decoder
+from core.data_domain.ipfix_templates import template_cache
+from core.data_domain.ipfix_mediator import mediator_stages
+from core.use_cases.mediator_exporter.mediator_pipeline import (
+    mediator_pipeline, exporter_sink, ring_writer, consume_rings,
+)
+from ports.input.collector_buffer import collectorBuffer
+from ports.repositories.ipfix import templateStore
+from ports.output.exporter_buffer import exporterBuffer
+from ports.output.record_ring import recordRing
+
+logger = logging.getLogger(__name__)
+
+STAT_FIELDS = ("messages", "bytes", "batches", "records", "sessions", "malformed", "sequence_resets",
+               "decoded_records", "data_sets", "unknown_template_sets", "templates", "shared_template_hits")
+
+
+class message_counter:
+    """
+    Batch handler counting the messages of each batch and the data records announced by
+    their sequence numbers, into a stats row. With a decoder, the data sets of the messages
+    are decoded too, and handed to on_records once per batch (when given):
+    [(exporter, domain, [(template, records)])], views valid during the call only.
+    """
+    def __init__(self, row: np.ndarray | None = None, decoder: ipfix_decoder | None = None,
+                 on_records=None) -> None:
+        self._row = row if row is not None else np.zeros(len(STAT_FIELDS), dtype=np.uint64)
+        self._sessions = exporter_sessions()
+        self._decoder = decoder
+        self._on_records = on_records
+        self._decoder_malformed = 0
+
+    def stats(self) -> dict:
+        return dict(zip(STAT_FIELDS, self._row.tolist()))
+
+    def __call__(self, batch: IpfixMessageBatch) -> None:
+        sessions, buffer, malformed, decoded = self._sessions, batch.buffer, 0, []
+        for offset, length, exporter in zip(batch.offsets, batch.lengths, batch.exporters):
+            if length < MESSAGE_HEADER.size:
+                malformed += 1
+                continue
+            version, message_length, _, sequence, domain = MESSAGE_HEADER.unpack_from(buffer, offset)
+            if version != IPFIX_VERSION or message_length != length:
+                malformed += 1
+                continue
+            sessions.update(exporter, sequence, domain)
+            if self._decoder is not None:
+                data_sets = self._decoder.decode_message(exporter, buffer[offset:offset + length])
+                if data_sets:
+                    decoded.append((exporter, domain, data_sets))
+        if decoded and self._on_records is not None:
+            self._on_records(decoded)
+        row = self._row
+        row[0] += len(batch)
+        row[1] += batch.bytes
+        row[2] += 1
+        row[3] = sessions.records
+        row[4] = len(sessions)
+        row[5] += malformed
+        row[6] = sessions.resets
+        if self._decoder is not None:
+            counters = self._decoder.stats()
+            row[5] += counters["malformed"] - self._decoder_malformed
+            self._decoder_malformed = counters["malformed"]
+            row[7:12] = (counters["records"], counters["data_sets"], counters["unknown_template_sets"],
+                         counters["active_templates"], self._decoder.templates.stats()["shared_hits"])
+
+    def forget(self, exporter: object) -> None:
+        self._sessions.forget(exporter)
+        self._row[4] = len(self._sessions)
+        if self._decoder is not None:
+            self._decoder.forget(exporter)
+
+
+def shared_templates() -> template_cache:
+    """Template cache of a collector process, backed by the TEMPLATE_STORE store (when
+    available) and prefetched from it"""
+    store = None
+    if TEMPLATE_STORE:
+        try:
+            store = templateStore(TEMPLATE_STORE)
+        except (ValueError, OSError, sqlite3.Error) as e:
+            # e.g. read-only or locked database file: the collector decodes on its own
+            logger.warning(f"IPFIX collector: no shared templates ({e})")
+    templates = template_cache(store)
+    prefetched = templates.prefetch()
+    if prefetched:
+        logger.info(f"IPFIX collector: {prefetched} templates prefetched")
+    return templates
+
+
+def collector_mediator() -> mediator_pipeline | None:
+    """Mediator pipeline of a collector process (MEDIATOR_OUTPUT set, records decoded)"""
+    if not (MEDIATOR_OUTPUT and COLLECTOR_DECODE):
+        return None
+    stages = mediator_stages(MEDIATOR_STAGES, MEDIATOR_AGGREGATE_INTERVAL, MEDIATOR_ANONYMIZE_KEY)
+    exporter = exporterBuffer(MEDIATOR_OUTPUT.format(pid=os.getpid()))
+    return mediator_pipeline(stages + [exporter_sink(exporter)])
+
+
+async def _serve(row: np.ndarray, ring_name: str | None = None) -> None:
+    # Records to the mediator process through the ring, or to a mediator of this process
+    ring = recordRing(ring_name) if ring_name else None
+    mediator = collector_mediator() if ring is None else None
+    on_records = ring_writer(ring) if ring is not None else mediator.submit if mediator else None
+    counter = message_counter(row, ipfix_decoder(shared_templates()) if COLLECTOR_DECODE else None, on_records)
+    collector = collectorBuffer(counter, on_close=counter.forget)
+    await collector.start()
+    stopped = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stopped.set)
+    await stopped.wait()
+    await collector.stop()
+    if ring is not None:
+        ring.close()
+    if mediator is not None:
+        mediator.close()
+        logger.info(f"IPFIX mediator of process {os.getpid()} stopped: {mediator.stats()}")
+    logger.info(f"IPFIX collector process {os.getpid()} stopped: {counter.stats()}")
+
+
+def _collector_process(shared_stats, index: int, ring_name: str | None = None) -> None:
+    row = np.frombuffer(shared_stats.get_obj(), dtype=np.uint64).reshape(-1, len(STAT_FIELDS))[index]
+    asyncio.run(_serve(row, ring_name))
+
+
+def _mediator_process(ring_names: list[str]) -> None:
+    """Consume the rings of the collector processes until they are all closed and drained
+    (SIGTERM: until they are idle)"""
+    stopped = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopped.set())
+    # Stopped by the main process, after the collector processes
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    rings = [recordRing(name) for name in ring_names]
+    mediator = collector_mediator()
+    records = consume_rings(rings, mediator, stopped)
+    mediator.close()
+    for ring in rings:
+        ring.close()
+    logger.info(f"IPFIX mediator process {os.getpid()} stopped: {records} records, {mediator.stats()}")
+
+
+class collector_service:
+    """
+    The collector processes of the host (started by the main process, before the web
+    server forks its workers).
+    """
+    def __init__(self, processes: int = COLLECTOR_PROCESSES) -> None:
+        context = multiprocessing.get_context("spawn")
+        self._pid = os.getpid()
+        self._stats = context.Array("Q", max(processes, 1) * len(STAT_FIELDS))
+        # One ring per collector process (single producer), all read by the mediator process
+        self._rings = []
+        if MEDIATOR_PROCESS and MEDIATOR_OUTPUT and COLLECTOR_DECODE:
+            try:
+                for index in range(processes):
+                    self._rings.append(recordRing(f"ipyfix-{self._pid}-{index}", create=True))
+            except ValueError as e:
+                # e.g. no x86-64 store ordering: a mediator in each collector process
+                logger.warning(f"IPFIX collector: no mediator process ({e})")
+                for ring in self._rings:
+                    ring.close(unlink=True)
+                self._rings = []
+        self._mediator = context.Process(target=_mediator_process, args=([ring.name for ring in self._rings],),
+                                         name="ipfix-mediator", daemon=True) if self._rings else None
+        self._processes = [
+            context.Process(target=_collector_process,
+                            args=(self._stats, index, self._rings[index].name if self._rings else None),
+                            name=f"ipfix-collector-{index}", daemon=True)
+            for index in range(processes)
+        ]
+        if self._mediator is not None:
+            self._mediator.start()
+        for process in self._processes:
+            process.start()
+        logger.info(f"IPFIX collector: {processes} processes started"
+                    + (", mediator process fed through shared memory rings" if self._mediator else ""))
+
+    def stats(self) -> dict:
+        rows = np.frombuffer(self._stats.get_obj(), dtype=np.uint64).reshape(-1, len(STAT_FIELDS))
+        return {"processes": [dict(zip(STAT_FIELDS, row.tolist())) for row in rows[:len(self._processes)]],
+                **dict(zip(STAT_FIELDS, rows.sum(axis=0).tolist())),
+                "processes_alive": sum(process.is_alive() for process in self._processes)
+                if os.getpid() == self._pid else None,
+                "mediator_rings": [ring.stats() for ring in self._rings] if os.getpid() == self._pid else None}
+
+    def stop(self, timeout: float = 5.0) -> None:
+        # Only the process that started them (not the forked web workers)
+        if os.getpid() != self._pid:
+            return
+        for process in self._processes:
+            if process.is_alive():
+                process.terminate()
+        for process in self._processes:
+            process.join(timeout)
+        self._processes = []
+        # Rings closed (even those of crashed collectors) and unlinked, still mapped by the
+        # mediator process: it drains them and exits
+        for ring in self._rings:
+            ring.close(unlink=True)
+        self._rings = []
+        if self._mediator is not None:
+            self._mediator.join(timeout)
+            if self._mediator.is_alive():
+                self._mediator.terminate()
+                self._mediator.join(timeout)
+            self._mediator = None
+
+
+_service: collector_service | None = None
+
+
+def ipfix_collector_service(create: bool = True) -> collector_service | None:
+    """The collector processes of this host (none when COLLECTOR_PROCESSES is 0)"""
+    global _service
+    if _service is None and create and COLLECTOR_PROCESSES:
+        _service = collector_service()
+    return _service
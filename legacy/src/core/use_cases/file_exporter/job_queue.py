@@ -0,0 +1,233 @@
+"""Bounded, priority-aware export job queue backed by an append-only on-disk journal
+
+Ordering rules:
+    * lower ``priority`` value runs first (0 = most urgent)
+    * within a priority level tenants are served round-robin (per-tenant fairness)
+    * within a tenant and priority level jobs are FIFO
+
+Every state change is appended to a JSONL journal (``enqueue``/``start``/``done``),
+so pending and interrupted jobs are replayed when the queue is recreated (interrupted
+jobs that already used up their retries are journaled as failed instead).
+"""
+
+import os
+import json
+import math
+import time
+import logging
+from collections import deque
+from pathlib import Path
+
+from config.config import EXPORT_JOURNAL_PATH
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_PATH = Path(EXPORT_JOURNAL_PATH)
+MAX_QUEUED_JOBS = 256
+# Attempts of a job after its first one (broken process pool, interrupted run)
+MAX_RETRIES = 2
+DEFAULT_PRIORITY = 5
+DEFAULT_TENANT = "default"
+# Rewrite the journal with only the pending jobs once it holds this many records
+COMPACT_AFTER_RECORDS = 5000
+
+
+class ExportJobQueue:
+    """Priority levels -> tenants (round-robin) -> FIFO deques of jobs"""
+
+    def __init__(self, journal_path: str | Path = JOURNAL_PATH, max_jobs: int = MAX_QUEUED_JOBS, fsync: bool = True,
+                 max_retries: int = MAX_RETRIES):
+        self._journal_path = Path(journal_path)
+        self._max_jobs = max_jobs
+        self._fsync = fsync
+        self._max_retries = max_retries
+        # Ids of the interrupted jobs failed by the replay (their task slots are stale)
+        self.failed_on_replay: list[str] = []
+        self._levels: dict[int, dict[str, deque]] = {}
+        self._tenants_rr: dict[int, deque] = {}
+        self._queued: dict[str, dict] = {}
+        self._started: dict[str, dict] = {}
+        self._seq = 0
+        self._records = 0
+        self._journal = None
+        self._replay()
+
+    # ---- journal ---------------------------------------------------------------------
+
+    def _replay(self) -> None:
+        """Rebuild pending jobs from the journal; started-but-unfinished jobs are requeued,
+        unless they were started more than max_retries times (e.g. the job kills its worker)"""
+        pending: dict[str, dict] = {}
+        self._journal_path.parent.mkdir(parents=True, exist_ok=True)
+        if self._journal_path.exists():
+            with self._journal_path.open("r") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        logger.warning("Skipping torn export journal record")
+                        continue
+                    op, task_id = record.get("op"), record.get("task_id")
+                    if op == "enqueue":
+                        pending[task_id] = record["job"]
+                    elif op == "start" and task_id in pending:
+                        pending[task_id]["attempts"] = pending[task_id].get("attempts", 0) + 1
+                    elif op == "done":
+                        pending.pop(task_id, None)
+        self.failed_on_replay = [task_id for task_id, job in pending.items()
+                                 if job.get("attempts", 0) > self._max_retries]
+        for task_id in self.failed_on_replay:
+            logger.error(f"Export task {task_id} interrupted {pending.pop(task_id)['attempts']} times, not replayed")
+        self._rewrite(pending.values())
+        for task_id in self.failed_on_replay:
+            self._append({"op": "done", "task_id": task_id, "status": "failed"})
+        for job in sorted(pending.values(), key=lambda j: j["seq"]):
+            self._push(job)
+        self._seq = max((j["seq"] for j in pending.values()), default=0)
+        self._records = len(pending)
+        if pending:
+            logger.info(f"Export queue replayed {len(pending)} pending job(s) from {self._journal_path}")
+
+    def _rewrite(self, jobs) -> None:
+        """Compact the journal to one enqueue record per pending job (atomic rename)"""
+        if self._journal:
+            self._journal.close()
+        tmp_path = self._journal_path.with_suffix(".tmp")
+        with tmp_path.open("w") as f:
+            for job in jobs:
+                f.write(json.dumps({"op": "enqueue", "task_id": job["task_id"], "job": job}, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._journal_path)
+        self._journal = self._journal_path.open("a")
+        self._records = len(self._queued) + len(self._started)
+
+    def _append(self, record: dict) -> None:
+        self._journal.write(json.dumps(record, default=str) + "\n")
+        self._journal.flush()
+        if self._fsync:
+            os.fsync(self._journal.fileno())
+        self._records += 1
+        if self._records >= COMPACT_AFTER_RECORDS:
+            self._rewrite([*self._started.values(), *self._queued.values()])
+
+    def close(self) -> None:
+        if self._journal:
+            self._journal.close()
+            self._journal = None
+
+    # ---- queue -----------------------------------------------------------------------
+
+    def _push(self, job: dict, front: bool = False) -> None:
+        priority, tenant = job["priority"], job["tenant"]
+        tenants = self._levels.setdefault(priority, {})
+        if tenant not in tenants:
+            tenants[tenant] = deque()
+            self._tenants_rr.setdefault(priority, deque()).append(tenant)
+        tenants[tenant].appendleft(job) if front else tenants[tenant].append(job)
+        self._queued[job["task_id"]] = job
+
+    def __len__(self) -> int:
+        return len(self._queued)
+
+    def __contains__(self, task_id: str) -> bool:
+        return task_id in self._queued or task_id in self._started
+
+    @property
+    def max_jobs(self) -> int:
+        return self._max_jobs
+
+    def full(self) -> bool:
+        return len(self._queued) >= self._max_jobs
+
+    def put(self, job: dict) -> dict:
+        """Journal and enqueue a new job; fills in seq/priority/tenant defaults"""
+        self._seq += 1
+        job = {
+            **job, "seq": self._seq, "attempts": job.get("attempts", 0),
+            "priority": int(job.get("priority", DEFAULT_PRIORITY)),
+            "tenant": str(job.get("tenant") or DEFAULT_TENANT), "queued_at": time.time(),
+        }
+        self._append({"op": "enqueue", "task_id": job["task_id"], "job": job})
+        self._push(job)
+        return job
+
+    def requeue(self, job: dict, attempted: bool = True) -> None:
+        """Put a started job back at the head of its tenant queue (e.g. broken pool retry).
+        attempted=False: the job never ran (no free slot), its pop() is not an attempt."""
+        self._started.pop(job["task_id"], None)
+        if not attempted:
+            job["attempts"] -= 1
+        self._append({"op": "enqueue", "task_id": job["task_id"], "job": job})
+        self._push(job, front=True)
+
+    def pop(self, eligible=None) -> dict | None:
+        """Next job: most urgent priority, next tenant in round-robin order, FIFO.
+        eligible(tenant) -> bool skips tenants that may not start a job now (quotas)."""
+        for priority in sorted(self._levels):
+            tenants, rr = self._levels[priority], self._tenants_rr[priority]
+            for _ in range(len(rr)):
+                if eligible is None or eligible(rr[0]):
+                    break
+                rr.rotate(-1)
+            else:
+                continue
+            tenant = rr.popleft()
+            job = tenants[tenant].popleft()
+            if tenants[tenant]:
+                rr.append(tenant)
+            else:
+                del tenants[tenant]
+            if not tenants:
+                del self._levels[priority], self._tenants_rr[priority]
+            del self._queued[job["task_id"]]
+            job["attempts"] += 1
+            self._started[job["task_id"]] = job
+            self._append({"op": "start", "task_id": job["task_id"]})
+            return job
+        return None
+
+    def done(self, task_id: str, status: str) -> None:
+        self._started.pop(task_id, None)
+        self._append({"op": "done", "task_id": task_id, "status": status})
+
+    def position(self, task_id: str) -> int:
+        """0-based dispatch position of a queued job (-1 if not queued)"""
+        if task_id not in self._queued:
+            return -1
+        order = []
+        levels = {p: {t: list(q) for t, q in tenants.items()} for p, tenants in self._levels.items()}
+        for priority in sorted(levels):
+            rr = list(self._tenants_rr[priority])
+            while rr:
+                tenant = rr.pop(0)
+                order.append(levels[priority][tenant].pop(0)["task_id"])
+                if levels[priority][tenant]:
+                    rr.append(tenant)
+        return order.index(task_id)
+
+    def snapshot(self) -> dict:
+        per_tenant: dict[str, int] = {}
+        for job in self._queued.values():
+            per_tenant[job["tenant"]] = per_tenant.get(job["tenant"], 0) + 1
+        return {"queued": len(self._queued), "started": len(self._started),
+                "max_queued": self._max_jobs, "queued_per_tenant": per_tenant}
+
+
+class DurationEstimator:
+    """Rolling average of recent task durations, used for Retry-After / start estimates"""
+
+    def __init__(self, window: int = 50, default_duration: float = 10.0):
+        self._durations = deque(maxlen=window)
+        self._default = default_duration
+
+    def add(self, seconds: float) -> None:
+        self._durations.append(seconds)
+
+    @property
+    def average(self) -> float:
+        return sum(self._durations) / len(self._durations) if self._durations else self._default
+
+    def wait_seconds(self, jobs_ahead: int, workers: int) -> int:
+        """Seconds until jobs_ahead jobs have been drained by workers parallel workers"""
+        return math.ceil(self.average * max(0, jobs_ahead) / max(1, workers))
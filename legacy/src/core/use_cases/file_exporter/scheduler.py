@@ -0,0 +1,227 @@
+"""Export Scheduler - host-wide job queue feeding the single export process pool
+
+The scheduler lives in a manager server process started by the Gunicorn master
+(--preload), so every uvicorn worker submits to the same bounded queue over the
+manager's local Unix socket, and only this process owns export worker processes.
+"""
+
+import time
+import logging
+import threading
+from concurrent.futures import BrokenExecutor, CancelledError, Future
+from multiprocessing.managers import BaseManager
+
+from config.config import export_tenant_quota
+from .job_queue import ExportJobQueue, DurationEstimator, JOURNAL_PATH, MAX_QUEUED_JOBS, MAX_RETRIES
+from .task_manager import attach_task_manager
+from .sharding import ExportShardData, plan_shards, shard_table_path, remove_shard_tables
+from .worker_handler import ExportTaskData, export_task, export_shard
+
+logger = logging.getLogger(__name__)
+
+
+class ExportScheduler:
+    """Dispatches queued export jobs to the process pool, at most `workers` at a time
+    and at most export_tenant_quota(tenant) per tenant"""
+
+    def __init__(self, shared_list_name: str, workers: int, journal_path=None, max_queued: int = MAX_QUEUED_JOBS):
+        self._cond = threading.Condition()
+        self._queue = ExportJobQueue(journal_path or JOURNAL_PATH, max_queued)
+        self._durations = DurationEstimator()
+        self._shared_list_name = shared_list_name
+        self._task_manager = attach_task_manager(shared_list_name)
+        self._workers = workers
+        self._running: dict[str, float] = {}
+        self._tenant_running: dict[str, int] = {}
+        self._stopping = False
+        # The host-wide export pool, sized once for this process
+        from .subsys_mgmt import _ProcPool
+        _ProcPool(max_workers=workers)
+        # Slots of interrupted jobs replayed from (or failed by) the journal are stale
+        for task in self._task_manager.get_current_tasks():
+            if task["task_id"] in self._queue or task["task_id"] in self._queue.failed_on_replay:
+                self._task_manager.complete_task(task["task_id"], success=False)
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="export-dispatcher", daemon=True)
+        self._dispatcher.start()
+        logger.info(f"Export scheduler started: {workers} workers, {len(self._queue)} queued job(s)")
+
+    # ---- exposed through the manager proxy -------------------------------------------
+
+    def submit(self, job: dict) -> dict:
+        """Queue a job, or reject it (duplicate id / back-pressure with a Retry-After estimate)"""
+        task_id = job["task_id"]
+        with self._cond:
+            if task_id in self._queue or task_id in self._running or self._task_manager.get_task(task_id):
+                return {"status": "rejected", "task_id": task_id, "reason": "duplicate_task_id",
+                        "message": f"Task {task_id} already exists"}
+            if self._queue.full():
+                retry_after = max(1, self._durations.wait_seconds(1, self._workers))
+                return {"status": "rejected", "task_id": task_id, "reason": "queue_full",
+                        "message": "Server busy - export queue full", "retry_after": retry_after}
+            self._queue.put(job)
+            position = self._queue.position(task_id)
+            estimated = self._durations.wait_seconds(position + len(self._running) - self._workers + 1, self._workers)
+            self._cond.notify_all()
+        return {"status": "queued", "task_id": task_id, "position": position, "estimated_start_in": estimated}
+
+    def status(self) -> dict:
+        from .subsys_mgmt import proc_pool
+        pool = proc_pool().stats()
+        with self._cond:
+            return {
+                **self._queue.snapshot(),
+                "running": len(self._running),
+                "running_per_tenant": dict(self._tenant_running),
+                "workers": self._workers,
+                "avg_task_duration": round(self._durations.average, 3),
+                "pool": pool,
+            }
+
+    def shutdown(self) -> None:
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        from .subsys_mgmt import proc_pool
+        proc_pool().proc_pool_release()
+        self._queue.close()
+        self._task_manager.shared_list.close()
+
+    # ---- dispatching -----------------------------------------------------------------
+
+    def _dispatch_loop(self) -> None:
+        while True:
+            with self._cond:
+                job = None
+                while not self._stopping:
+                    if len(self._running) < self._workers and (job := self._queue.pop(self._eligible)):
+                        break
+                    self._cond.wait()
+                if self._stopping:
+                    return
+                task_id = job["task_id"]
+                task_data = {
+                    "task_id": task_id, "status": "starting", "created_at": job["queued_at"],
+                    "updated_at": time.time(), "file_count": job["file_count"], "output_path": job["output_path"],
+                }
+                if not self._task_manager.add_task(task_data) and not self._task_manager.update_task_status(task_id, "starting"):
+                    # All slots taken (by tasks outside the scheduler): back off and retry, the
+                    # job never ran so this does not use up one of its MAX_RETRIES
+                    self._queue.requeue(job, attempted=False)
+                    self._cond.wait(timeout=1)
+                    continue
+                self._running[task_id] = time.time()
+                self._tenant_running[job["tenant"]] = self._tenant_running.get(job["tenant"], 0) + 1
+            self._start(job)
+
+    def _eligible(self, tenant: str) -> bool:
+        quota = export_tenant_quota(tenant)
+        return quota is None or self._tenant_running.get(tenant, 0) < quota
+
+    def _start(self, job: dict) -> None:
+        from .subsys_mgmt import proc_pool
+        definitions = {**job["kwargs"], "task_id": job["task_id"]}
+        try:
+            shards = plan_shards(job["pcap_files"])
+            if len(shards) > 1:
+                self._start_shards(job, definitions, shards)
+                return
+            export_data = ExportTaskData(job["pcap_files"], job["output_ipfix_path"], definitions, self._shared_list_name)
+            future = proc_pool().submit(export_task, export_data)
+        except Exception as e:
+            self._finish(job, e)
+            return
+        future.add_done_callback(lambda f: self._finish(job, _future_error(f)))
+
+    def _start_shards(self, job: dict, definitions: dict, shards: list[tuple[str, int, int, float]]) -> None:
+        """Fan the job out, one pool task per shard; once all are done, one more task merges
+        their flow tables (in shard order, so the output does not depend on completion order)
+        and runs the remaining export steps"""
+        from .subsys_mgmt import proc_pool
+        task_id = job["task_id"]
+        tables = [shard_table_path(task_id, index) for index in range(len(shards))]
+        state = {"pending": len(shards), "error": None, "lock": threading.Lock()}
+
+        def shard_done(future) -> None:
+            with state["lock"]:
+                state["error"] = state["error"] or _future_error(future)
+                state["pending"] -= 1
+                pending, error = state["pending"], state["error"]
+            if pending:
+                if error is None:
+                    self._task_manager.update_task_status(task_id, f"step_2_shards_{len(shards) - pending}_of_{len(shards)}")
+                return
+            if error is not None or self._stopping:
+                self._finish(job, error)
+                return
+            try:
+                merge_data = ExportTaskData(job["pcap_files"], job["output_ipfix_path"], definitions,
+                                            self._shared_list_name, shard_tables=tables)
+                proc_pool().submit(export_task, merge_data).add_done_callback(lambda f: self._finish(job, _future_error(f)))
+            except Exception as e:
+                self._finish(job, e)
+
+        logger.info(f"Task {task_id}: {len(shards)} shards over {len(job['pcap_files'])} file(s)")
+        self._task_manager.update_task_status(task_id, f"step_2_shards_0_of_{len(shards)}", progress=0.0)
+        for index, (path, start, end, weight) in enumerate(shards):
+            shard = ExportShardData(task_id, path, start, end, weight, tables[index], definitions, self._shared_list_name)
+            try:
+                future = proc_pool().submit(export_shard, shard)
+            except Exception as e:
+                # Count the shards that never made it to the pool as failed
+                future = Future()
+                future.set_exception(e)
+            future.add_done_callback(shard_done)
+
+    def _finish(self, job: dict, error: BaseException | None) -> None:
+        task_id = job["task_id"]
+        remove_shard_tables(task_id)
+        with self._cond:
+            started_at = self._running.pop(task_id, time.time())
+            self._tenant_running[job["tenant"]] -= 1
+            if not self._tenant_running[job["tenant"]]:
+                del self._tenant_running[job["tenant"]]
+            if self._stopping:
+                # Interrupted by shutdown: left "started" in the journal, replayed on restart
+                return
+            if isinstance(error, BrokenExecutor) and job["attempts"] <= MAX_RETRIES:
+                logger.warning(f"Task {task_id} hit a broken process pool (attempt {job['attempts']}), requeueing: {error}")
+                self._task_manager.update_task_status(task_id, f"retrying_attempt_{job['attempts'] + 1}")
+                self._queue.requeue(job)
+            else:
+                if error is None:
+                    self._durations.add(time.time() - started_at)
+                    logger.info(f"Task {task_id} completed successfully")
+                else:
+                    logger.error(f"Task {task_id} failed: {error}")
+                self._queue.done(task_id, "completed" if error is None else "failed")
+                # The worker frees its own slot; make sure a crashed worker does not leak it
+                if self._task_manager.get_task(task_id):
+                    self._task_manager.complete_task(task_id, success=error is None)
+            self._cond.notify_all()
+        if not self._stopping:
+            from .subsys_mgmt import proc_pool
+            proc_pool().recycle_if_bloated()
+
+
+def _future_error(future) -> BaseException | None:
+    return CancelledError() if future.cancelled() else future.exception()
+
+
+_scheduler: ExportScheduler | None = None
+
+
+def _init_scheduler(shared_list_name: str, workers: int) -> None:
+    """Manager server process initializer"""
+    global _scheduler
+    _scheduler = ExportScheduler(shared_list_name, workers)
+
+
+def _get_scheduler() -> ExportScheduler:
+    return _scheduler
+
+
+class ExportSchedulerManager(BaseManager):
+    pass
+
+
+ExportSchedulerManager.register("scheduler", callable=_get_scheduler, exposed=("submit", "status", "shutdown"))
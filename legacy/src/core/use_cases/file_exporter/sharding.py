@@ -0,0 +1,62 @@
+"""Export task sharding - fan a task out across files and packet-aligned byte ranges"""
+
+import shutil
+import logging
+from pathlib import Path
+
+from config.config import EXPORT_SHARD_BYTES, EXPORT_SHARD_DIR
+from ports.repositories.pcap import pcapReader
+
+logger = logging.getLogger(__name__)
+
+# Share of the task progress covered by packet parsing (the merge/output steps do the rest)
+PARSE_SHARE = 0.9
+
+
+class ExportShardData:
+    """Ultra-compact data class for one shard: a byte range of one capture file"""
+    def __init__(self, task_id: str, pcap_file: str, start: int, end: int, weight: float,
+                 table_path: str, task_definitions: dict, shared_list_name: str = None):
+        self.task_id = task_id
+        self.pcap_file = pcap_file
+        self.start = start
+        self.end = end
+        # Fraction of the whole task's capture bytes covered by this shard
+        self.weight = weight
+        self.table_path = table_path
+        self.tasks_definitions = task_definitions
+        self.shared_list_name = shared_list_name
+
+
+def plan_shards(pcap_files: list[str], shard_bytes: int = EXPORT_SHARD_BYTES) -> list[tuple[str, int, int, float]]:
+    """(file, start, end, weight) per shard, in file then offset order: one shard per
+    file, large files split every ~shard_bytes on packet boundaries"""
+    ranges = []
+    for path in pcap_files:
+        with pcapReader(path) as reader:
+            ranges += [(path, start, end) for start, end in reader.split(shard_bytes)]
+    total = sum(end - start for _, start, end in ranges) or 1
+    return [(path, start, end, (end - start) / total) for path, start, end in ranges]
+
+
+def _shard_dir(task_id: str) -> Path:
+    """Directory of the shard tables of a task: one entry right under EXPORT_SHARD_DIR
+    (task ids come with the task kwargs, e.g. "../.." or "a/b" are refused)"""
+    root = Path(EXPORT_SHARD_DIR).resolve()
+    path = (root / task_id).resolve()
+    if path.parent != root:
+        raise ValueError(f"Invalid task id for shard tables: {task_id!r}")
+    return path
+
+
+def shard_table_path(task_id: str, index: int) -> str:
+    return str(_shard_dir(task_id) / f"shard_{index:05d}.npz")
+
+
+def remove_shard_tables(task_id: str) -> None:
+    try:
+        shard_dir = _shard_dir(task_id)
+    except ValueError as e:
+        logger.warning(f"Shard tables not removed: {e}")
+        return
+    shutil.rmtree(shard_dir, ignore_errors=True)
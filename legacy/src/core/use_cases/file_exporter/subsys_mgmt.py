@@ -1,76 +1,56 @@
-import pickle
 import logging
 import os
 import signal
-import asyncio
-from multiprocessing import Manager, get_context
+import time
+import threading
+from multiprocessing import get_context
 from multiprocessing.managers import SharedMemoryManager
 from concurrent.futures import ProcessPoolExecutor
 
-from pydantic import BaseModel, validate_call
+from pydantic import validate_call
 
-from core.entities.file_exporter_task import FileExporterTask
+from config.config import (
+    export_pool_size, EXPORT_POOL_WARM_WORKERS, EXPORT_POOL_MAX_TASKS_PER_CHILD,
+    EXPORT_POOL_MAX_RSS_MB, EXPORT_FORKSERVER_PRELOAD,
+)
+from core.use_cases.file_exporter.task_slots import TaskSlotTable
 
 logger = logging.getLogger(__name__)
 
+_forkserver_ctx = None
 
-class _ProcessPoolSemaphore:
-    """Singleton (single-process wide) asyncio semaphore for each Gunicorn uvicorn-worker
-    (Only single process can use asyncio semaphore, not threads)"""
-    _instance = None
-
-    def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super(_ProcessPoolSemaphore, cls).__new__(cls)
-            logger.info(" ****** Creating new ProcessPoolSemaphore instance")
-        else:
-            logger.info(" ****** Using existing ProcessPoolSemaphore instance")
-        return cls._instance
-
-    def __init__(self, max_workers=2):
-        if not hasattr(self, '_initialized'):
-            self._max_workers = max_workers
-            self._semaphore = asyncio.Semaphore(max_workers)
-            _ProcessPoolSemaphore._instance = self
-            self._initialized = True
-            logger.info(f"  ******  Created process pool semaphore with {max_workers} permits [{hex(id(self))} - {os.getpid()}]")
-        else:
-            logger.info(f"  ******  Skipping re-initialization of existing ProcessPoolSemaphore instance [{hex(id(self))} - {os.getpid()}]")
-            return
-
-    @classmethod
-    def get_instance(cls):
-        if cls._instance is None:
-            cls._instance = cls()
-        return cls._instance
 
-    @property
-    def semaphore(self):
-        return self._semaphore
+def _forkserver_context():
+    """The forkserver context, with the export modules preloaded by the fork server
+    (must be configured before the fork server is started by the first pool)"""
+    global _forkserver_ctx
+    if _forkserver_ctx is None:
+        _forkserver_ctx = get_context('forkserver')
+        _forkserver_ctx.set_forkserver_preload(EXPORT_FORKSERVER_PRELOAD)
+    return _forkserver_ctx
 
-    async def acquire(self, timeout=30):
-        """Acquire semaphore with timeout"""
-        try:
-            await asyncio.wait_for(self._semaphore.acquire(), timeout=timeout)
-            return True
-        except asyncio.TimeoutError:
-            logger.warning(f"Failed to acquire process pool semaphore within {timeout}s")
-            return False
 
-    def release(self):
-        """Release semaphore"""
-        try:
-            self._semaphore.release()
-        except ValueError:
-            logger.warning("Attempted to release semaphore more times than acquired")
+def _rss_mb(pid: int) -> float:
+    """Resident set size of a process in MiB (0 when unavailable)"""
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return 0.0
 
 
 class _ProcPool:
-    """Singleton (single-process/local-threads wide) process pool manager for each Gunicorn uvicorn-worker 
-    (threads can start separated new process in a pool)"""
+    """Singleton (single-process/local-threads wide) process pool manager.
+    Only instantiated inside the export scheduler server process, so it is the single
+    host-wide export pool shared by every Gunicorn uvicorn-worker. Sized from the CPU
+    affinity mask unless configured (config.EXPORT_POOL_WORKERS).
+    Workers are forked from a fork server that preloaded config.EXPORT_FORKSERVER_PRELOAD,
+    started warm right after the executor is created, replaced after
+    config.EXPORT_POOL_MAX_TASKS_PER_CHILD tasks, and the whole pool is recycled once a
+    worker exceeds config.EXPORT_POOL_MAX_RSS_MB."""
     _instance = {}
 
-    def __new__(cls):
+    def __new__(cls, *args, **kwargs):
         current_pid = os.getpid()
         if current_pid in cls._instance:
             logger.info(f" ****** info: Using EXISTING instance for PID {current_pid}")
@@ -81,18 +61,55 @@ class _ProcPool:
         cls._instance[current_pid] = instance
         return instance
 
-    def __init__(self, max_workers=2):
+    def __init__(self, max_workers: int | None = None):
         if hasattr(self, '_initialized'):
             logger.info(f" ****** SKIPPING re-initialization of existing instance {hex(id(self))} for PID {os.getpid()}")
             return
 
         logger.info(f" ****** INITIALIZING NEW instance {hex(id(self))} for PID {os.getpid()}")
+        max_workers = max_workers or export_pool_size()
         self._max_workers = max_workers
-        self._executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=get_context('forkserver'))
+        self._recycle_lock = threading.RLock()
+        self._stats = {
+            "created_at": time.time(), "startup_seconds": None, "recycles": 0,
+            "recycle_reasons": {}, "last_recycle_at": None, "last_recycle_seconds": None, "warmup_tasks": 0,
+        }
+        self._executor = self._new_executor("startup_seconds")
         self._worker_pid = os.getpid()
         self._initialized = True
         logger.info(f" ****** Created process pool executor with {max_workers} workers for worker PID {self._worker_pid}")
 
+    def _new_executor(self, timing_key: str) -> ProcessPoolExecutor:
+        """Create the executor and start its warm workers; the time until every warm
+        worker answered is recorded under self._stats[timing_key]"""
+        started = time.perf_counter()
+        from .worker_handler import warmup_worker
+        warm = min(self._max_workers, EXPORT_POOL_WARM_WORKERS if EXPORT_POOL_WARM_WORKERS is not None else self._max_workers)
+        # The warmup task counts as a task of its worker (the executor does not tell them
+        # apart): warm workers run one export task less, no worker ever runs more than
+        # EXPORT_POOL_MAX_TASKS_PER_CHILD tasks. Warmup tasks are counted in the stats
+        executor = ProcessPoolExecutor(
+            max_workers=self._max_workers, mp_context=_forkserver_context(),
+            max_tasks_per_child=EXPORT_POOL_MAX_TASKS_PER_CHILD,
+        )
+        if not warm:
+            self._stats[timing_key] = round(time.perf_counter() - started, 3)
+            return executor
+
+        # Each submission finding no idle worker spawns a new one, up to max_workers
+        futures = [executor.submit(warmup_worker) for _ in range(warm)]
+        self._stats["warmup_tasks"] += warm
+
+        def _warmed(_):
+            if all(f.done() for f in futures) and self._stats[timing_key] is None:
+                self._stats[timing_key] = round(time.perf_counter() - started, 3)
+                logger.info(f"Process pool warm: {warm} worker(s) ready in {self._stats[timing_key]}s")
+
+        self._stats[timing_key] = None
+        for future in futures:
+            future.add_done_callback(_warmed)
+        return executor
+
     @property
     def executor(self):
         # Check if executor is still healthy before returning it
@@ -105,45 +122,76 @@ class _ProcPool:
             self._recreate_executor()
         return self._executor
 
+    def submit(self, fn, *args, **kwargs):
+        """executor.submit() that cannot race with a pool recycle"""
+        with self._recycle_lock:
+            return self.executor.submit(fn, *args, **kwargs)
+
+    def _worker_pids(self, executor: ProcessPoolExecutor | None = None) -> list[int]:
+        processes = getattr(executor or self._executor, '_processes', None) or {}
+        return [process.pid for process in list(processes.values()) if process is not None and process.pid]
+
+    def recycle_if_bloated(self) -> bool:
+        """Gracefully replace the executor when a worker grew past EXPORT_POOL_MAX_RSS_MB:
+        running tasks finish in the old workers, new tasks go to a fresh warm pool"""
+        if not EXPORT_POOL_MAX_RSS_MB:
+            return False
+        bloated = [pid for pid in self._worker_pids() if _rss_mb(pid) > EXPORT_POOL_MAX_RSS_MB]
+        if not bloated:
+            return False
+        logger.warning(f"Export workers {bloated} exceed {EXPORT_POOL_MAX_RSS_MB} MiB RSS, recycling the pool")
+        self._recycle("rss_limit", graceful=True)
+        return True
+
+    def _recycle(self, reason: str, graceful: bool) -> None:
+        with self._recycle_lock:
+            old = self._executor
+            self._executor = self._new_executor("last_recycle_seconds")
+            self._stats["recycles"] += 1
+            self._stats["recycle_reasons"][reason] = self._stats["recycle_reasons"].get(reason, 0) + 1
+            self._stats["last_recycle_at"] = time.time()
+        try:
+            # graceful: workers exit once their running task is done
+            old.shutdown(wait=False, cancel_futures=not graceful)
+        except Exception as e:
+            logger.info(f"Error shutting down old executor: {e}")
+
     def _recreate_executor(self):
         """Recreate the process pool when it becomes broken"""
         try:
             # Force kill only child processes from THIS executor (not other workers)
             logger.info("Force killing child processes from current executor...")
             try:
-                if hasattr(self, '_executor') and self._executor:
-                    processes = getattr(self._executor, '_processes', {})
-                    killed_count = 0
-                    if processes is not None and hasattr(processes, 'values'):
-                        for process in processes.values():
-                            try:
-                                if process is not None and hasattr(process, 'pid'):
-                                    os.kill(process.pid, signal.SIGKILL)
-                                    killed_count += 1
-                                    logger.info(f"Force killed process {process.pid}")
-                            except (ProcessLookupError, OSError):
-                                pass
-                        logger.info(f"Killed {killed_count} processes from current executor")
-                    else:
-                        logger.info("Current executor has no processes to kill")
+                killed_count = 0
+                for pid in self._worker_pids():
+                    try:
+                        os.kill(pid, signal.SIGKILL)
+                        killed_count += 1
+                        logger.info(f"Force killed process {pid}")
+                    except (ProcessLookupError, OSError):
+                        pass
+                logger.info(f"Killed {killed_count} processes from current executor")
             except Exception as e:
                 logger.warning(f"Error during child process cleanup: {e}")
 
-            # Shutdown the old executor
-            if hasattr(self, '_executor') and self._executor:
-                try:
-                    self._executor.shutdown(wait=False, cancel_futures=True)
-                except Exception as e:
-                    logger.info(f"Error shutting down old executor: {e}")
-
-            # Create new executor
-            self._executor = ProcessPoolExecutor(max_workers=self._max_workers)
+            # Replace with a new (forkserver, warm) executor and shut the old one down
+            self._recycle("broken", graceful=False)
             logger.info(f"Successfully recreated process pool executor with {self._max_workers} workers")
 
         except Exception as e:
             logger.error(f"Failed to recreate process pool: {e}")
             raise
 
+    def stats(self) -> dict:
+        """Pool startup/recycle timings and current workers"""
+        pids = self._worker_pids()
+        return {
+            **self._stats, "recycle_reasons": dict(self._stats["recycle_reasons"]),
+            "max_workers": self._max_workers, "live_workers": len(pids),
+            "max_tasks_per_child": EXPORT_POOL_MAX_TASKS_PER_CHILD, "max_rss_mb": EXPORT_POOL_MAX_RSS_MB,
+            "workers_rss_mb": {pid: round(_rss_mb(pid), 1) for pid in pids},
+        }
+
     @classmethod
     def get_instance(cls, only_id: bool = False):
         current_pid = os.getpid()
@@ -192,6 +240,8 @@ class _SharedMemoryList:
     System Wide Singleton, for all child process, Gunicorn uvicorn-worker and threads.
     Shared memory list for task management synchronization. Shared Resource initialized
     exclusively in the main process before Gunicorn start/fork workers (--preload).
+    The list is a struct-packed TaskSlotTable; processes that do not inherit it
+    (forkserver pool workers) attach by shared_list_name.
     """
     _instance = None
 
@@ -204,21 +254,16 @@ class _SharedMemoryList:
         return cls._instance
 
     @validate_call
-    def __init__(
-        self,
-        value_model: BaseModel = FileExporterTask().model_dump(mode='python'),
-        max_items: int = 15
-        ):
+    def __init__(self, max_items: int = 15):
         if not hasattr(self, '_initialized'):
             self._shared_memory_manager = SharedMemoryManager()
             self._shared_memory_manager.start()
             self._max_items = max_items
-            byte_serialized_data = pickle.dumps(value_model)
-            self._shared_list = self._shared_memory_manager.ShareableList(
-                [byte_serialized_data] * self._max_items
-            )
-            self._shared_list_name = self._shared_list.shm.name
-            self._shared_list_lock = Manager().Lock()
+            shm = self._shared_memory_manager.SharedMemory(size=TaskSlotTable.size_for(max_items))
+            self._shared_list = TaskSlotTable(shm, max_items=max_items, create=True)
+            self._shared_list_name = self._shared_list.name
+            # Writers lock inside the shared memory segment, readers use the slots' seqlocks
+            self._shared_list_lock = self._shared_list.writer_lock
             _SharedMemoryList._instance = self
             self._initialized = True
 
@@ -277,7 +322,9 @@ class _SharedMemoryList:
             logger.info("Starting shared memory cleanup...")
             
             try:
-                # Force shutdown shared memory manager
+                # Release slot table views, then force shutdown shared memory manager
+                if getattr(self, '_shared_list', None) is not None:
+                    self._shared_list.close()
                 if hasattr(self, '_shared_memory_manager'):
                     self._shared_memory_manager.shutdown()
                 
@@ -292,11 +339,72 @@ class _SharedMemoryList:
             finally:
                 _SharedMemoryList._instance = None
 
+class _ExportScheduler:
+    """
+    System Wide Singleton, created in the main process before Gunicorn start/fork
+    workers (--preload). Starts the manager server process hosting the export job
+    queue and the single export process pool; every uvicorn worker submits to it
+    through a per-process proxy over the manager's local Unix socket.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(_ExportScheduler, cls).__new__(cls)
+            logger.info(" ****** Creating new ExportScheduler instance")
+        return cls._instance
+
+    @validate_call
+    def __init__(self, workers: int | None = None):
+        if not hasattr(self, '_initialized'):
+            from core.use_cases.file_exporter.scheduler import ExportSchedulerManager, _init_scheduler
+            workers = workers or export_pool_size()
+            tasks_list = simultaneous_tasks_list()
+            self._manager = ExportSchedulerManager()
+            self._manager.start(initializer=_init_scheduler, initargs=(tasks_list.shared_list_name, workers))
+            self._owner_pid = os.getpid()
+            self._proxies = {}
+            _ExportScheduler._instance = self
+            self._initialized = True
+            logger.info(f" ****** Export scheduler server started with {workers} export workers [{self._owner_pid}]")
+
+    @property
+    def scheduler(self):
+        """Proxy to the scheduler, one per process (proxies are not shared across forks)"""
+        current_pid = os.getpid()
+        if current_pid not in self._proxies:
+            self._proxies[current_pid] = self._manager.scheduler()
+        return self._proxies[current_pid]
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is not None and isinstance(cls._instance, _ExportScheduler):
+            return cls._instance
+        return cls()
+
+    def instance_release(self):
+        """Stop dispatching, release the export pool and the manager (owner process only)"""
+        if self._instance is None or os.getpid() != self._owner_pid:
+            return
+        logger.info("Starting export scheduler shutdown...")
+        try:
+            self.scheduler.shutdown()
+        except Exception as e:
+            logger.warning(f"Export scheduler shutdown error: {e}")
+        try:
+            self._manager.shutdown()
+            logger.info("Export scheduler shutdown completed")
+        except Exception as e:
+            logger.warning(f"Export scheduler manager shutdown error: {e}")
+        finally:
+            _ExportScheduler._instance = None
+
+
 def proc_pool() -> _ProcPool:
     return _ProcPool().get_instance()
 
 def simultaneous_tasks_list() -> _SharedMemoryList:
     return _SharedMemoryList.get_instance()
 
-def get_process_pool_semaphore() -> _ProcessPoolSemaphore:
-    return _ProcessPoolSemaphore.get_instance()
+def export_scheduler() -> _ExportScheduler:
+    return _ExportScheduler.get_instance()
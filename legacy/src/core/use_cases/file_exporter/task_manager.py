@@ -1,14 +1,13 @@
 """Ultra-compact bulletproof task manager - Maximum efficiency"""
 
 import time
-import pickle
 import logging
 
 logger = logging.getLogger(__name__)
 
 
 class TaskSlotManager:
-    """Ultra-compact bulletproof shared memory manager"""
+    """Ultra-compact bulletproof shared memory manager (backed by a TaskSlotTable)"""
     
     def __init__(self, shared_list, shared_lock, max_items):
         self.shared_list = shared_list
@@ -16,146 +15,127 @@ class TaskSlotManager:
         self.max_items = max_items
     
     def _safe_op(self, func):
-        """Ultra-compact safe operation wrapper"""
+        """Writer operation wrapper - the slot table writer lock is held for microseconds,
+        so writers block on it instead of giving up after a timeout. It is not reentrant:
+        the table is read with held=True inside func"""
         try:
-            if self.shared_lock.acquire(timeout=0.1):
-                try:
-                    return func()
-                finally:
-                    self.shared_lock.release()
-        except:
-            pass
+            with self.shared_lock:
+                return func()
+        except Exception as e:
+            logger.warning(f"Task slot write failed: {e}")
         return None
     
-    def _get_data(self, i):
-        """Get slot data safely"""
-        try:
-            return pickle.loads(self.shared_list[i])
-        except:
-            return None
-    
-    def _set_data(self, i, data):
-        """Set slot data safely"""
-        try:
-            self.shared_list[i] = pickle.dumps(data)
-            return True
-        except:
-            return False
-    
     def add_task(self, task_data: dict) -> bool:
-        """Add task - ultra-compact"""
+        """Add task - O(1) id lookup and free-slot pop"""
         def _add():
             task_id = task_data.get('task_id', 'unknown')
-            free_slot = -1
-            
-            # Single pass: check duplicates and find free slot
-            for i in range(self.max_items):
-                data = self._get_data(i)
-                if data:
-                    if data.get("task_id") == task_id and not data.get("task_id", "").startswith("#"):
-                        logger.warning(f"Task {task_id} already exists")
-                        return False
-                    elif data.get("task_id", "").startswith("#") and free_slot == -1:
-                        free_slot = i
-            
-            if free_slot != -1 and self._set_data(free_slot, task_data):
-                logger.info(f"Task {task_id} → slot {free_slot}")
-                return True
-            
-            logger.warning("All slots full")
-            return False
+            slot = self.shared_list.insert(task_data)
+            if slot == -2:
+                logger.warning(f"Task {task_id} already exists")
+                return False
+            if slot == -1:
+                logger.warning("All slots full")
+                return False
+            logger.info(f"Task {task_id} → slot {slot}")
+            return True
         
         return self._safe_op(_add) or False
     
-    def update_task_status(self, task_id: str, status: str) -> bool:
-        """Update status - ultra-compact"""
+    def update_task_status(self, task_id: str, status: str, progress: float | None = None) -> bool:
+        """Update status (and optionally progress) in place"""
         def _update():
-            for i in range(self.max_items):
-                data = self._get_data(i)
-                if data and data.get("task_id") == task_id:
-                    data.update({"status": status, "updated_at": time.time()})
-                    return self._set_data(i, data)
-            return False
+            slot = self.shared_list.find(task_id, held=True)
+            if slot == -1:
+                return False
+            self.shared_list.update(slot, status=status, updated_at=time.time(), progress=progress)
+            return True
         
         return self._safe_op(_update) or False
     
+    def advance_task(self, task_id: str, delta: float, status: str | None = None) -> bool:
+        """Add delta to the progress - the shards of a task report their share concurrently"""
+        def _advance():
+            slot = self.shared_list.find(task_id, held=True)
+            if slot == -1:
+                return False
+            progress = min(1.0, self.shared_list.read(slot, held=True)["progress"] + delta)
+            self.shared_list.update(slot, status=status, updated_at=time.time(), progress=progress)
+            return True
+        
+        return self._safe_op(_advance) or False
+    
     def complete_task(self, task_id: str, success: bool = True) -> bool:
-        """Complete task - ultra-compact"""
+        """Complete task - free its slot, then log it outside of the writer lock"""
         def _complete():
-            for i in range(self.max_items):
-                data = self._get_data(i)
-                if data and data.get("task_id") == task_id:
-                    # Log completion
-                    try:
-                        from .task_logger import log_task_completion
-                        log_task_completion(data, success)
-                    except:
-                        pass
-                    
-                    # Free slot
-                    empty = {"task_id": f"#empty_slot_{i}", "status": "empty", "epoch_timestamp": str(time.time())}
-                    if self._set_data(i, empty):
-                        logger.info(f"Task {task_id} completed, slot {i} freed")
-                        return True
-            return False
+            data = self.shared_list.get(task_id, held=True)
+            if not data:
+                return None
+            slot = self.shared_list.remove(task_id)
+            logger.info(f"Task {task_id} completed, slot {slot} freed")
+            return data
         
-        return self._safe_op(_complete) or False
+        data = self._safe_op(_complete)
+        if not data:
+            return False
+        # Log completion
+        try:
+            from .task_logger import log_task_completion
+            log_task_completion(data, success)
+        except:
+            pass
+        return True
+    
+    def get_task(self, task_id: str) -> dict | None:
+        """Get a single task by id - lock-free (seqlock) read"""
+        return self.shared_list.get(task_id)
     
     def get_current_tasks(self) -> list:
-        """Get active tasks - ultra-compact"""
-        def _get_tasks():
-            return [data for i in range(self.max_items) 
-                   if (data := self._get_data(i)) and not data.get("task_id", "").startswith("#")]
-        
-        return self._safe_op(_get_tasks) or []
+        """Get active tasks - lock-free (seqlock) reads, no deserialization"""
+        return [data for _, data in self.shared_list.active()]
     
     def get_task_count(self) -> dict:
-        """Get task counts - ultra-compact"""
-        def _count():
-            counts = {"running": 0, "completed": 0, "failed": 0, "empty": 0}
-            for i in range(self.max_items):
-                data = self._get_data(i)
-                if data:
-                    status = data.get("status", "unknown")
-                    counts[status if status in counts else ("empty" if data.get("task_id", "").startswith("#") else "running")] += 1
-                else:
-                    counts["empty"] += 1
-            return counts
-        
-        return self._safe_op(_count) or {"running": 0, "completed": 0, "failed": 0, "empty": self.max_items}
+        """Get task counts - lock-free (seqlock) reads"""
+        counts = {"running": 0, "completed": 0, "failed": 0, "empty": 0}
+        for _, data in self.shared_list.active():
+            status = data.get("status", "unknown")
+            counts[status if status in counts else "running"] += 1
+        counts["empty"] = self.max_items - self.shared_list.used_count()
+        return counts
     
     def force_cleanup_all_slots(self) -> int:
         """Brute force cleanup - clean ALL slots regardless of status"""
         def _brute_force_cleanup():
-            current_time = time.time()
-            cleaned_count = 0
+            cleaned = []
             
-            for i in range(self.max_items):
-                data = self._get_data(i)
-                if data and not data.get("task_id", "").startswith("#"):
-                    # Log all cleaned tasks
-                    try:
-                        from .task_logger import log_task_completion
-                        data_copy = data.copy()
-                        data_copy["status"] = "brute_force_cleanup"
-                        log_task_completion(data_copy, success=False)
-                    except:
-                        pass
-                    
-                    # Free the slot - no matter what status
-                    empty = {"task_id": f"#empty_slot_{i}", "status": "empty", "epoch_timestamp": str(current_time)}
-                    if self._set_data(i, empty):
-                        cleaned_count += 1
-                        logger.warning(f"Brute force cleaned slot {i} (was: {data.get('task_id', 'unknown')})")
+            for slot, data in list(self.shared_list.active(held=True)):
+                # Free the slot - no matter what status
+                if self.shared_list.remove(data["task_id"]) != -1:
+                    cleaned.append(data)
+                    logger.warning(f"Brute force cleaned slot {slot} (was: {data.get('task_id', 'unknown')})")
             
-            return cleaned_count
+            return cleaned
         
-        result = self._safe_op(_brute_force_cleanup)
-        if result is not None and result > 0:
-            logger.info(f"Brute force cleaned {result} slots")
-        return result or 0
+        cleaned = self._safe_op(_brute_force_cleanup) or []
+        # Log all cleaned tasks
+        for data in cleaned:
+            try:
+                from .task_logger import log_task_completion
+                data["status"] = "brute_force_cleanup"
+                log_task_completion(data, success=False)
+            except:
+                pass
+        if cleaned:
+            logger.info(f"Brute force cleaned {len(cleaned)} slots")
+        return len(cleaned)
 
 
 def create_task_manager(shared_list, shared_lock, max_items):
     """Factory function"""
     return TaskSlotManager(shared_list, shared_lock, max_items)
+
+
+def attach_task_manager(shared_list_name: str) -> TaskSlotManager:
+    """Factory for processes that did not inherit the slot table (e.g. forkserver pool workers)"""
+    from .task_slots import TaskSlotTable
+    table = TaskSlotTable.attach(shared_list_name)
+    return TaskSlotManager(table, table.writer_lock, table.max_items)
@@ -0,0 +1,421 @@
+"""Fixed-layout binary task-slot table living directly in shared memory
+
+Layout of the shared memory block (all little-endian):
+
+    header | free-slot stack (int32 * max_items) | id index (int32 * index_size) | slots
+
+Each slot is a fixed-width ``struct`` record, so reading or updating a task never
+(de)serializes Python objects. The id index is an open-addressing hash table
+(linear probing, backward-shift deletion) mapping a task id to its slot number,
+which keeps lookups, updates and frees O(1) regardless of ``max_items``.
+
+Concurrency is a seqlock: every slot (and the id index as a whole) carries a
+sequence counter that writers make odd while they modify it. Readers never lock,
+they copy the record and retry if the counter was odd or changed meanwhile.
+Writers serialize on a byte-range ``fcntl`` lock over the shared memory segment
+itself (plus a thread lock for writers of the same process), so no Manager
+process round-trip is involved and the kernel drops the lock if a writer dies.
+"""
+
+import os
+import fcntl
+import struct
+import threading
+import zlib
+import logging
+from multiprocessing import resource_tracker, shared_memory
+
+logger = logging.getLogger(__name__)
+
+_MAGIC = b"IPYFXTS2"
+_HEADER = struct.Struct("<8sIIIIQ")  # magic, max_items, index_size, slot_size, free_top, index_seq
+_FREE_TOP = struct.Struct("<I")
+_FREE_TOP_OFFSET = 20
+_SEQ64 = struct.Struct("<Q")
+_INDEX_SEQ_OFFSET = 24
+_SEQ = struct.Struct("<I")
+_SLOT = struct.Struct("<IB64s32s64sddIf")  # seq, used, task_id, status, output_path, created_at, updated_at, file_count, progress
+_INT32 = 4
+
+TASK_ID_SIZE = 64
+STATUS_SIZE = 32
+OUTPUT_PATH_SIZE = 64
+
+# Spins before a reader falls back to the writer lock (a writer died mid-update)
+MAX_READ_SPINS = 1000
+
+
+def _encode(value, size: int) -> bytes:
+    return str(value or "").encode("utf-8")[:size]
+
+
+def _decode(raw: bytes) -> str:
+    return raw.rstrip(b"\x00").decode("utf-8", errors="replace")
+
+
+def _index_size(max_items: int) -> int:
+    size = 8
+    while size < max_items * 2:
+        size <<= 1
+    return size
+
+
+def _attach_shm(name: str) -> shared_memory.SharedMemory:
+    """Attach to an existing block without letting this process' resource tracker own it"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+        return shm
+
+
+class ShmWriterLock:
+    """Writer lock held on the first byte of the shared memory segment (/dev/shm/<name>).
+
+    POSIX record locks belong to a process, so a thread lock serializes the writers
+    of one process; both are (re)created lazily after a fork.
+    """
+
+    def __init__(self, shm_name: str):
+        self._path = f"/dev/shm/{shm_name.lstrip('/')}"
+        self._pid = None
+        self._fd = None
+        self._thread_lock = None
+        self.contended = 0
+
+    def _local(self):
+        if self._pid != os.getpid():
+            self._fd = os.open(self._path, os.O_RDWR)
+            self._thread_lock = threading.Lock()
+            self._pid = os.getpid()
+        return self._fd, self._thread_lock
+
+    def acquire(self, timeout: float | None = None) -> bool:
+        fd, thread_lock = self._local()
+        if not thread_lock.acquire(timeout=-1 if timeout is None else timeout):
+            return False
+        try:
+            fcntl.lockf(fd, fcntl.LOCK_EX | fcntl.LOCK_NB, 1, 0)
+        except OSError:
+            self.contended += 1
+            fcntl.lockf(fd, fcntl.LOCK_EX, 1, 0)
+        except BaseException:
+            thread_lock.release()
+            raise
+        return True
+
+    def release(self) -> None:
+        fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, 0)
+        self._thread_lock.release()
+
+    def close(self) -> None:
+        if self._fd is not None and self._pid == os.getpid():
+            try:
+                os.close(self._fd)
+            except OSError:
+                pass
+        self._fd = self._pid = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class TaskSlotTable:
+    """Struct-packed task slots with an id -> slot index, shared by every process"""
+
+    def __init__(self, shm: shared_memory.SharedMemory, max_items: int = 0, create: bool = False):
+        self._shm = shm
+        buf = shm.buf
+        if create:
+            index_size = _index_size(max_items)
+            _HEADER.pack_into(buf, 0, _MAGIC, max_items, index_size, _SLOT.size, 0, 0)
+        magic, self._max_items, self._index_size, slot_size, _, _ = _HEADER.unpack_from(buf, 0)
+        if magic != _MAGIC or slot_size != _SLOT.size:
+            raise ValueError(f"Shared memory block {shm.name} is not a task slot table")
+
+        self._mask = self._index_size - 1
+        free_off = _HEADER.size
+        index_off = free_off + self._max_items * _INT32
+        self._slots_off = index_off + self._index_size * _INT32
+        self._free = buf[free_off:index_off].cast("i")
+        self._index = buf[index_off:self._slots_off].cast("i")
+        self._writer_lock = ShmWriterLock(shm.name)
+        # Per-process reader statistics
+        self.read_retries = 0
+        self.contended_reads = 0
+
+        if create:
+            for i in range(self._index_size):
+                self._index[i] = 0
+            for i in range(self._max_items):
+                _SLOT.pack_into(buf, self._slot_offset(i), 0, 0, b"", b"empty", b"", 0.0, 0.0, 0, 0.0)
+                # Lowest slot on top of the stack
+                self._free[i] = self._max_items - 1 - i
+            self._set_free_top(self._max_items)
+
+    # ---- sizing / attaching ----------------------------------------------------------
+
+    @staticmethod
+    def size_for(max_items: int) -> int:
+        return _HEADER.size + (max_items + _index_size(max_items)) * _INT32 + max_items * _SLOT.size
+
+    @classmethod
+    def attach(cls, name: str) -> "TaskSlotTable":
+        return cls(_attach_shm(name))
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    @property
+    def max_items(self) -> int:
+        return self._max_items
+
+    @property
+    def writer_lock(self) -> ShmWriterLock:
+        return self._writer_lock
+
+    def stats(self) -> dict:
+        return {
+            "read_retries": self.read_retries,
+            "contended_reads": self.contended_reads,
+            "contended_writes": self._writer_lock.contended,
+        }
+
+    def close(self) -> None:
+        """Release the memory views (required before the block can be closed)"""
+        self._writer_lock.close()
+        for view in (self._free, self._index):
+            try:
+                view.release()
+            except Exception:
+                pass
+        try:
+            self._shm.close()
+        except Exception:
+            pass
+
+    # ---- internals -------------------------------------------------------------------
+
+    def _slot_offset(self, slot: int) -> int:
+        return self._slots_off + slot * _SLOT.size
+
+    def _free_top(self) -> int:
+        return _FREE_TOP.unpack_from(self._shm.buf, _FREE_TOP_OFFSET)[0]
+
+    def _set_free_top(self, value: int) -> None:
+        _FREE_TOP.pack_into(self._shm.buf, _FREE_TOP_OFFSET, value)
+
+    def _index_seq(self) -> int:
+        return _SEQ64.unpack_from(self._shm.buf, _INDEX_SEQ_OFFSET)[0]
+
+    def _bump_index_seq(self) -> None:
+        _SEQ64.pack_into(self._shm.buf, _INDEX_SEQ_OFFSET, self._index_seq() + 1)
+
+    def _home(self, raw_id: bytes) -> int:
+        return zlib.crc32(raw_id) & self._mask
+
+    def _slot_id(self, slot: int) -> bytes:
+        off = self._slot_offset(slot) + 5
+        return bytes(self._shm.buf[off:off + TASK_ID_SIZE]).rstrip(b"\x00")
+
+    def _probe(self, raw_id: bytes) -> tuple[int, int]:
+        """Return (index position, slot) for raw_id, or (free index position, -1)"""
+        pos = self._home(raw_id)
+        for _ in range(self._index_size):
+            entry = self._index[pos]
+            if entry == 0:
+                return pos, -1
+            if self._slot_id(entry - 1) == raw_id:
+                return pos, entry - 1
+            pos = (pos + 1) & self._mask
+        return pos, -1
+
+    def _unindex(self, pos: int) -> None:
+        """Backward-shift deletion keeps probe chains short without tombstones"""
+        index, mask = self._index, self._mask
+        index[pos] = 0
+        j = pos
+        while True:
+            j = (j + 1) & mask
+            entry = index[j]
+            if entry == 0:
+                return
+            home = self._home(self._slot_id(entry - 1))
+            if (j > pos and (home <= pos or home > j)) or (j < pos and pos >= home > j):
+                index[pos] = entry
+                index[j] = 0
+                pos = j
+
+    def _write_slot(self, slot: int, *values) -> None:
+        """Seqlock write: odd sequence while the record is being rewritten"""
+        off = self._slot_offset(slot)
+        seq = self._read_slot_held(slot)[0]
+        _SEQ.pack_into(self._shm.buf, off, (seq + 1) & 0xFFFFFFFF)
+        _SLOT.pack_into(self._shm.buf, off, (seq + 1) & 0xFFFFFFFF, *values)
+        _SEQ.pack_into(self._shm.buf, off, (seq + 2) & 0xFFFFFFFF)
+
+    def _read_slot(self, slot: int) -> tuple:
+        """Seqlock read: copy the record, retry if a writer was (or got) in the middle"""
+        buf, off = self._shm.buf, self._slot_offset(slot)
+        for spin in range(MAX_READ_SPINS):
+            values = _SLOT.unpack_from(buf, off)
+            if values[0] & 1:
+                self.contended_reads += 1
+            elif _SEQ.unpack_from(buf, off)[0] == values[0]:
+                return values
+            self.read_retries += 1
+            if spin % 64 == 63:
+                os.sched_yield()
+        return self._read_slot_locked(slot)
+
+    def _read_slot_locked(self, slot: int) -> tuple:
+        """Slow path: a writer died mid-update, repair the sequence under the lock"""
+        with self._writer_lock:
+            return self._read_slot_held(slot)
+
+    def _read_slot_held(self, slot: int) -> tuple:
+        """Read with the writer lock held (no writer can be live): an odd sequence was
+        left by a dead writer and is repaired"""
+        off = self._slot_offset(slot)
+        values = _SLOT.unpack_from(self._shm.buf, off)
+        if values[0] & 1:
+            logger.warning(f"Repairing torn task slot {slot} left by a dead writer")
+            _SEQ.pack_into(self._shm.buf, off, (values[0] + 1) & 0xFFFFFFFF)
+            values = _SLOT.unpack_from(self._shm.buf, off)
+        return values
+
+    def _find_unlocked(self, raw_id: bytes) -> int:
+        """Lock-free index lookup validated by the index sequence counter"""
+        for spin in range(MAX_READ_SPINS):
+            seq = self._index_seq()
+            if seq & 1:
+                self.contended_reads += 1
+            else:
+                slot = self._probe(raw_id)[1]
+                if self._index_seq() == seq:
+                    return slot
+            self.read_retries += 1
+            if spin % 64 == 63:
+                os.sched_yield()
+        with self._writer_lock:
+            return self._find_held(raw_id)
+
+    def _repair_index_held(self) -> None:
+        if self._index_seq() & 1:
+            logger.warning("Repairing the task slot index left by a dead writer")
+            self._bump_index_seq()
+
+    def _find_held(self, raw_id: bytes) -> int:
+        """Index lookup with the writer lock held, repairing the index sequence if needed"""
+        self._repair_index_held()
+        return self._probe(raw_id)[1]
+
+    def _to_dict(self, values: tuple) -> dict:
+        seq, used, task_id, status, output_path, created_at, updated_at, file_count, progress = values
+        return {
+            "task_id": _decode(task_id), "status": _decode(status), "created_at": created_at,
+            "updated_at": updated_at, "file_count": file_count, "output_path": _decode(output_path),
+            "progress": round(progress, 4),
+        }
+
+    # ---- writers (callers hold writer_lock) ------------------------------------------
+
+    def insert(self, task_data: dict) -> int:
+        """Store a task; returns its slot, -1 when full, -2 when the id already exists"""
+        raw_id = _encode(task_data.get("task_id"), TASK_ID_SIZE)
+        self._repair_index_held()
+        pos, slot = self._probe(raw_id)
+        if slot != -1:
+            return -2
+        top = self._free_top()
+        if top == 0:
+            return -1
+        slot = self._free[top - 1]
+        created_at = float(task_data.get("created_at") or 0.0)
+        self._bump_index_seq()
+        try:
+            self._set_free_top(top - 1)
+            self._write_slot(
+                slot, 1, raw_id,
+                _encode(task_data.get("status"), STATUS_SIZE),
+                _encode(task_data.get("output_path"), OUTPUT_PATH_SIZE),
+                created_at, float(task_data.get("updated_at") or created_at),
+                int(task_data.get("file_count") or 0), float(task_data.get("progress") or 0.0),
+            )
+            self._index[pos] = slot + 1
+        finally:
+            self._bump_index_seq()
+        return slot
+
+    def update(self, slot: int, status: str | None = None, updated_at: float | None = None,
+               progress: float | None = None) -> None:
+        values = list(self._read_slot_held(slot))
+        if status is not None:
+            values[3] = _encode(status, STATUS_SIZE)
+        if updated_at is not None:
+            values[6] = updated_at
+        if progress is not None:
+            values[8] = progress
+        self._write_slot(slot, *values[1:])
+
+    def remove(self, task_id: str) -> int:
+        """Free the slot of task_id; returns the freed slot or -1"""
+        self._repair_index_held()
+        pos, slot = self._probe(_encode(task_id, TASK_ID_SIZE))
+        if slot == -1:
+            return -1
+        self._bump_index_seq()
+        try:
+            self._unindex(pos)
+            self._write_slot(slot, 0, b"", b"empty", b"", 0.0, 0.0, 0, 0.0)
+            top = self._free_top()
+            self._free[top] = slot
+            self._set_free_top(top + 1)
+        finally:
+            self._bump_index_seq()
+        return slot
+
+    # ---- lock-free readers (held: the caller holds writer_lock) ----------------------
+
+    def find(self, task_id: str, held: bool = False) -> int:
+        raw_id = _encode(task_id, TASK_ID_SIZE)
+        return self._find_held(raw_id) if held else self._find_unlocked(raw_id)
+
+    def read(self, slot: int, held: bool = False) -> dict | None:
+        values = self._read_slot_held(slot) if held else self._read_slot(slot)
+        return self._to_dict(values) if values[1] else None
+
+    def get(self, task_id: str, held: bool = False) -> dict | None:
+        raw_id = _encode(task_id, TASK_ID_SIZE)
+        if held:
+            slot = self._find_held(raw_id)
+            return self.read(slot, held=True) if slot != -1 else None
+        for _ in range(MAX_READ_SPINS):
+            slot = self._find_unlocked(raw_id)
+            if slot == -1:
+                return None
+            values = self._read_slot(slot)
+            # The slot may have been freed/reused between the lookup and the read
+            if values[1] and values[2].rstrip(b"\x00") == raw_id:
+                return self._to_dict(values)
+            self.read_retries += 1
+        return None
+
+    def active(self, held: bool = False):
+        """Yield (slot, task dict) for every occupied slot"""
+        for slot in range(self._max_items):
+            values = self._read_slot_held(slot) if held else self._read_slot(slot)
+            if values[1]:
+                yield slot, self._to_dict(values)
+
+    def used_count(self) -> int:
+        return self._max_items - self._free_top()
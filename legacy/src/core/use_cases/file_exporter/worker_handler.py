@@ -2,16 +2,98 @@
 import os
 import time
 import logging
+from itertools import islice
+
+from core.data_domain.pcap_ipfix_exporter import FlowMeter
+from core.entities.ipfix_record import FLOW_TEMPLATE_IPV4, FLOW_TEMPLATE_IPV6
+from ports.output.exporter_buffer import exporterBuffer
+from ports.repositories.pcap import pcapReader
+from .sharding import ExportShardData, PARSE_SHARE
 
 logger = logging.getLogger(__name__)
 
 
 class ExportTaskData:
     """Ultra-compact data class for worker processes"""
-    def __init__(self, pcap_files: list[str], output_ipfix_file: str, task_definitions: dict):
+    def __init__(self, pcap_files: list[str], output_ipfix_file: str, task_definitions: dict,
+                 shared_list_name: str = None, shard_tables: list[str] | None = None):
         self.pcap_files = pcap_files
         self.ipfix_file = output_ipfix_file
         self.tasks_definitions = task_definitions
+        # Forkserver workers do not inherit the slot table: attach to it by name
+        self.shared_list_name = shared_list_name
+        # Flow tables of the task's shards (export_shard): merged instead of parsing the captures
+        self.shard_tables = shard_tables
+
+
+# Publish the parsing progress every PROGRESS_EVERY packets
+PROGRESS_EVERY = 65536
+
+
+def _parse_packets(readers: list, meter: FlowMeter, task_manager, task_id: str) -> tuple[int, int]:
+    """Stream every packet of every capture (memory-mapped, zero-copy) into the flow
+    meter, publishing the progress as the fraction of capture bytes consumed"""
+    total = sum(reader.size for reader in readers) or 1
+    done = packets = 0
+    for reader in readers:
+        stream = reader.packets()
+        while chunk := list(islice(stream, PROGRESS_EVERY)):
+            meter.add_packets(chunk)
+            packets += len(chunk)
+            if task_manager:
+                task_manager.update_task_status(task_id, "step_2_parsing_packets", progress=PARSE_SHARE * (done + chunk[-1].offset) / total)
+        done += reader.size
+    return packets, done
+
+
+def _meter(task_definitions: dict, keep_table: bool = False) -> FlowMeter:
+    return FlowMeter(task_definitions.get("active_timeout"), task_definitions.get("idle_timeout"), keep_table=keep_table)
+
+
+def export_shard(shard: ExportShardData) -> dict:
+    """Convert one byte range of one capture into a flow table (saved to shard.table_path),
+    adding its share of parsing progress to the task's slot"""
+    from .task_manager import attach_task_manager
+    task_manager = attach_task_manager(shard.shared_list_name) if shard.shared_list_name else None
+    try:
+        meter = _meter(shard.tasks_definitions, keep_table=True)
+        packets, position = 0, shard.start
+        span = max(1, shard.end - shard.start)
+        with pcapReader(shard.pcap_file) as reader:
+            stream = reader.packets(shard.start, shard.end)
+            while chunk := list(islice(stream, PROGRESS_EVERY)):
+                meter.add_packets(chunk)
+                packets += len(chunk)
+                if task_manager:
+                    task_manager.advance_task(shard.task_id, PARSE_SHARE * shard.weight * (chunk[-1].offset - position) / span)
+                position = chunk[-1].offset
+        meter.flush()
+        os.makedirs(os.path.dirname(shard.table_path), exist_ok=True)
+        meter.save_table(shard.table_path)
+        if task_manager:
+            task_manager.advance_task(shard.task_id, PARSE_SHARE * shard.weight * (shard.end - position) / span)
+        logger.info(f"Task {shard.task_id}: shard {shard.pcap_file}[{shard.start}:{shard.end}] parsed {packets} packets")
+        return {"table": shard.table_path, "packets": packets}
+    finally:
+        if task_manager:
+            task_manager.shared_list.close()
+
+
+def _write_ipfix(path: str, records: dict) -> None:
+    """Write the flow records, one data set run per template"""
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with exporterBuffer(path) as writer:
+        for template in (FLOW_TEMPLATE_IPV4, FLOW_TEMPLATE_IPV6):
+            if len(records[template.template_id]):
+                writer.add_template(template)
+                writer.write(template.template_id, records[template.template_id])
+
+
+def warmup_worker() -> int:
+    """No-op submitted right after pool creation: forces the worker process to start
+    (forked from the preloaded forkserver) before the first real export arrives"""
+    return os.getpid()
 
 
 def export_task(task_data: ExportTaskData):
@@ -25,12 +107,10 @@ def export_task(task_data: ExportTaskData):
         # Try shared memory connection (CRITICAL - must succeed)
         task_manager = None
         try:
-            from core.use_cases.file_exporter.subsys_mgmt import simultaneous_tasks_list
-            from .task_manager import TaskSlotManager
-            current_tasks = simultaneous_tasks_list()
-            if current_tasks.shared_list and current_tasks.shared_list_lock:
-                task_manager = TaskSlotManager(current_tasks.shared_list, current_tasks.shared_list_lock, current_tasks.max_items)
-                logger.info("Worker connected to shared memory")
+            from .task_manager import attach_task_manager
+            if task_data.shared_list_name:
+                task_manager = attach_task_manager(task_data.shared_list_name)
+                logger.info(f"Worker connected to shared memory {task_data.shared_list_name}")
             else:
                 raise Exception("Shared memory not available")
         except Exception as e:
@@ -42,14 +122,37 @@ def export_task(task_data: ExportTaskData):
 
         logger.info(f" ****** Export task {task_id} started in worker process {os.getpid()} ########## {task_id}")
 
-        for i, step in enumerate(steps, 1):
-            logger.info(f"Step {i}/6: {step} - Task {task_id}")
-            time.sleep(1)  # Simulate processing
-            if task_manager:
-                    if i == len(steps):
-                        task_manager.update_task_status(task_id, "completed_all_steps")
-                    else:
-                        task_manager.update_task_status(task_id, f"step_{i}_{step.lower().replace(' ', '_')}")
+        readers = []
+        meter = _meter(task_data.tasks_definitions)
+        try:
+            for i, step in enumerate(steps, 1):
+                logger.info(f"Step {i}/6: {step} - Task {task_id}")
+                if i == 1 and not task_data.shard_tables:
+                    readers = [pcapReader(path) for path in task_data.pcap_files]
+                elif i == 2 and task_data.shard_tables:
+                    # Captures already parsed by the shards: merge their flow tables in shard order
+                    meter.merge_tables([FlowMeter.load_table(path) for path in task_data.shard_tables])
+                    logger.info(f"Task {task_id}: merged {len(task_data.shard_tables)} shard flow tables")
+                elif i == 2:
+                    packets, size = _parse_packets(readers, meter, task_manager, task_id)
+                    logger.info(f"Task {task_id}: parsed {packets} packets ({size} bytes)")
+                elif i == 4:
+                    meter.flush()
+                    records = meter.records()
+                    logger.info(f"Task {task_id}: {meter.stats['flows']} flow records "
+                                f"({', '.join(f'template {t}: {len(r)}' for t, r in records.items())})")
+                elif i == 5:
+                    _write_ipfix(task_data.ipfix_file, records)
+                else:
+                    time.sleep(1)  # Simulate processing
+                if task_manager:
+                        if i == len(steps):
+                            task_manager.update_task_status(task_id, "completed_all_steps")
+                        else:
+                            task_manager.update_task_status(task_id, f"step_{i}_{step.lower().replace(' ', '_')}")
+        finally:
+            for reader in readers:
+                reader.close()
         # Mark task as completed and free the slot
         if task_manager:
             try:
@@ -95,3 +198,8 @@ def export_task(task_data: ExportTaskData):
             except Exception as completion_error:
                 logger.warning(f"Failed to mark failed task {task_id} as completed: {completion_error}")
         raise e
+
+    finally:
+        # Detach from the slot table (the block itself is owned by the main process)
+        if 'task_manager' in locals() and task_manager:
+            task_manager.shared_list.close()
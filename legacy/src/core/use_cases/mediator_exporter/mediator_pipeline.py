@@ -0,0 +1,283 @@
+"""IPFIX Mediator Pipeline - batched stages between the collector and an exporter
+
+The records decoded from one collector batch are copied out of the receive buffer once,
+coalesced per template layout (at most batch_records records per batch), and queued to
+the first stage. Every stage runs in its own thread between two bounded queues: a slow
+stage (or exporter) fills its input queue and blocks the stage before it, up to the
+collector, which blocks (on_full "block", at most block_timeout seconds) or drops the
+batch (on_full "drop"); both are counted. Stages see whole batches only (vectorized).
+A mediator process is fed the same batches by the collector processes through record
+rings (ring_writer on the collector side, consume_rings on the mediator side).
+"""
+
+import time
+import queue
+import logging
+import threading
+from typing import Callable
+
+import numpy as np
+
+from config.config import (
+    MEDIATOR_QUEUE_BATCHES, MEDIATOR_BATCH_RECORDS, MEDIATOR_ON_FULL, MEDIATOR_BLOCK_TIMEOUT,
+    MEDIATOR_FLUSH_INTERVAL,
+)
+from core.entities.ipfix_buffer import IpfixRecordBatch
+from core.data_domain.ipfix_mediator import export_template
+from ports.output.exporter_buffer import ExporterBufferPort
+from ports.output.record_ring import RecordRingPort
+
+logger = logging.getLogger(__name__)
+
+ON_FULL_MODES = ("block", "drop")
+Stage = Callable[[IpfixRecordBatch], list[IpfixRecordBatch]]
+# Queued after the last batch: stages flush what they hold and stop
+_END = None
+# Mediator process: sleep between two polls of idle rings
+RING_POLL_SECONDS = 0.001
+
+
+def decoded_batches(decoded: list[tuple[object, int, list]]) -> list[IpfixRecordBatch]:
+    """Records decoded from one collector batch ([(exporter, domain, [(template, records)])])
+    grouped per template layout: one batch per layout, records as the list of their parts"""
+    groups: dict[tuple, IpfixRecordBatch] = {}
+    for _, domain, data_sets in decoded:
+        for template, records in data_sets:
+            if not len(records):
+                continue
+            batch = groups.get(template.layout.fields)
+            if batch is None:
+                groups[template.layout.fields] = IpfixRecordBatch(template.layout.fields, [records],
+                                                                  template.template_id, domain)
+            else:
+                batch.records.append(records)
+    return list(groups.values())
+
+
+class exporter_sink:
+    """
+    Last stage: writes the batches to an exporter, one exported template per distinct
+    layout (template ids from first_template_id). Variable-length layouts are skipped.
+    """
+    def __init__(self, exporter: ExporterBufferPort, first_template_id: int = 256) -> None:
+        self._exporter = exporter
+        self._template_ids: dict[tuple, int | None] = {}
+        self._next_template_id = first_template_id
+        self.stats = {"records": 0, "batches": 0, "skipped_records": 0}
+
+    def __call__(self, batch: IpfixRecordBatch) -> list[IpfixRecordBatch]:
+        template_id = self._template_ids.get(batch.fields, -1)
+        if template_id == -1:
+            template_id = None
+            try:
+                template = export_template(self._next_template_id, batch.fields)
+                self._exporter.add_template(template)
+                template_id = self._next_template_id
+                self._next_template_id += 1
+            except ValueError as e:
+                logger.warning(f"IPFIX mediator: records of template {batch.template_id} not exported ({e})")
+            self._template_ids[batch.fields] = template_id
+        if template_id is None:
+            self.stats["skipped_records"] += len(batch)
+            return []
+        self._exporter.write(template_id, batch.records)
+        self.stats["records"] += len(batch)
+        self.stats["batches"] += 1
+        return []
+
+    def flush(self, force: bool = False) -> list[IpfixRecordBatch]:
+        self._exporter.flush()
+        return []
+
+    def close(self) -> None:
+        self._exporter.close()
+
+
+class mediator_pipeline:
+    """
+    Stages (callables of a batch returning the batches to pass on, with an optional
+    flush(force)) chained by bounded queues, each one in its own thread.
+    """
+    def __init__(self, stages: list[Stage], queue_batches: int = MEDIATOR_QUEUE_BATCHES,
+                 batch_records: int = MEDIATOR_BATCH_RECORDS, on_full: str = MEDIATOR_ON_FULL,
+                 block_timeout: float = MEDIATOR_BLOCK_TIMEOUT, flush_interval: float = MEDIATOR_FLUSH_INTERVAL) -> None:
+        if on_full not in ON_FULL_MODES:
+            raise ValueError(f"Unknown on_full mode: {on_full}. Supported modes are {', '.join(ON_FULL_MODES)}.")
+        if not stages:
+            raise ValueError("A mediator pipeline needs at least one stage")
+        self._stages = stages
+        self._batch_records = batch_records
+        self._on_full = on_full
+        self._block_timeout = block_timeout
+        self._flush_interval = flush_interval
+        self._queues = [queue.Queue(maxsize=max(queue_batches, 1)) for _ in stages]
+        self._lock = threading.Lock()
+        self._stats = {"submitted_records": 0, "queued_batches": 0, "blocked": 0, "dropped_batches": 0,
+                       "dropped_records": 0, "stage_errors": 0}
+        self._stage_stats = [{"batches_in": 0, "records_in": 0, "records_out": 0, "seconds": 0.0} for _ in stages]
+        self._closed = False
+        self._threads = [
+            threading.Thread(target=self._run, args=(index,), name=f"ipfix-mediator-{index}", daemon=True)
+            for index in range(len(stages))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "queued": [q.qsize() for q in self._queues],
+                    "stages": [dict(stats, stage=type(stage).__name__)
+                               for stage, stats in zip(self._stages, self._stage_stats)]}
+
+    def submit(self, decoded: list[tuple[object, int, list]]) -> int:
+        """Queue the records decoded from one collector batch ([(exporter, domain,
+        [(template, records)])], views of the receive buffer). Returns the records queued"""
+        return sum(self.put(batch) for batch in decoded_batches(decoded))
+
+    def put(self, batch: IpfixRecordBatch) -> int:
+        """Queue a copy of a batch (its records may be views of a receive buffer or of a
+        ring, and parts of one array). Returns the records queued"""
+        if self._closed:
+            raise ValueError("The mediator pipeline is closed")
+        # One copy per layout: the batch no longer depends on the buffer it was read from
+        # (dtype kept: by default the wire byte order would be promoted to the native one)
+        parts = batch.records if isinstance(batch.records, list) else [batch.records]
+        records = np.concatenate(parts, dtype=parts[0].dtype, casting="no")
+        queued = 0
+        for start in range(0, len(records), self._batch_records):
+            queued += self._put_first(IpfixRecordBatch(
+                batch.fields, records[start:start + self._batch_records], batch.template_id, batch.domain))
+        with self._lock:
+            self._stats["submitted_records"] += queued
+        return queued
+
+    def _put_first(self, batch: IpfixRecordBatch) -> int:
+        first = self._queues[0]
+        try:
+            first.put_nowait(batch)
+        except queue.Full:
+            try:
+                if self._on_full != "block":
+                    raise
+                with self._lock:
+                    self._stats["blocked"] += 1
+                first.put(batch, timeout=self._block_timeout)
+            except queue.Full:
+                with self._lock:
+                    self._stats["dropped_batches"] += 1
+                    self._stats["dropped_records"] += len(batch)
+                return 0
+        with self._lock:
+            self._stats["queued_batches"] += 1
+        return len(batch)
+
+    def _run(self, index: int) -> None:
+        stage, source = self._stages[index], self._queues[index]
+        target = self._queues[index + 1] if index + 1 < len(self._queues) else None
+        flush = getattr(stage, "flush", None)
+        stats = self._stage_stats[index]
+        while True:
+            try:
+                batch = source.get(timeout=self._flush_interval)
+            except queue.Empty:
+                # Idle: due aggregates, buffered exporter messages
+                batch, outputs = False, self._call(flush, False) if flush else []
+            else:
+                if batch is _END:
+                    outputs = self._call(flush, True) if flush else []
+                else:
+                    started = time.perf_counter()
+                    outputs = self._call(stage, batch)
+                    stats["batches_in"] += 1
+                    stats["records_in"] += len(batch)
+                    stats["seconds"] += time.perf_counter() - started
+            stats["records_out"] += sum(len(output) for output in outputs)
+            if target is not None:
+                for output in outputs:
+                    # Blocking: back-pressure on this stage, and so on up to the collector
+                    target.put(output)
+            if batch is _END:
+                if target is not None:
+                    target.put(_END)
+                return
+
+    def _call(self, function, argument) -> list[IpfixRecordBatch]:
+        try:
+            return function(argument) or []
+        except Exception as e:
+            with self._lock:
+                self._stats["stage_errors"] += 1
+            logger.error(f"IPFIX mediator stage {getattr(function, '__qualname__', function)} failed: {e}")
+            return []
+
+    def close(self, timeout: float | None = None) -> None:
+        """Process the queued batches, flush every stage and stop the threads"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queues[0].put(_END)
+        for thread in self._threads:
+            thread.join(timeout)
+        close = getattr(self._stages[-1], "close", None)
+        if close:
+            close()
+
+
+def split_batch(batch: IpfixRecordBatch, batch_records: int) -> list[IpfixRecordBatch]:
+    """Batch (records as the list of their parts) split in batches of at most batch_records
+    records, parts sliced but not copied"""
+    batches, parts, count = [], [], 0
+    for part in batch.records:
+        while len(part):
+            piece, part = part[:batch_records - count], part[batch_records - count:]
+            parts.append(piece)
+            count += len(piece)
+            if count == batch_records:
+                batches.append(IpfixRecordBatch(batch.fields, parts, batch.template_id, batch.domain))
+                parts, count = [], 0
+    if parts:
+        batches.append(IpfixRecordBatch(batch.fields, parts, batch.template_id, batch.domain))
+    return batches
+
+
+class ring_writer:
+    """
+    Collector side of a mediator process: the records decoded from each collector batch
+    written to a record ring, one entry per template layout and batch_records records
+    (parts copied into the ring directly, no intermediate array).
+    """
+    def __init__(self, ring: RecordRingPort, batch_records: int = MEDIATOR_BATCH_RECORDS) -> None:
+        self._ring = ring
+        self._batch_records = batch_records
+
+    def __call__(self, decoded: list[tuple[object, int, list]]) -> int:
+        return sum(len(batch) for layout in decoded_batches(decoded)
+                   for batch in split_batch(layout, self._batch_records) if self._ring.put(batch))
+
+
+def consume_rings(rings: list[RecordRingPort], pipeline: mediator_pipeline, stopped: threading.Event) -> int:
+    """Mediator process: feed the batches of the rings to the pipeline, round robin, until
+    every ring is closed and drained (or stopped is set). Returns the records consumed"""
+    consumed, open_rings = 0, list(rings)
+    while open_rings:
+        idle = True
+        for ring in list(open_rings):
+            batch = ring.get(timeout=0)
+            if batch is None:
+                if not ring.stats()["closed"]:
+                    continue
+                # The producer may have written its last batch just before closing the ring
+                batch = ring.get(timeout=0)
+                if batch is None:
+                    open_rings.remove(ring)
+                    continue
+            idle = False
+            # Copied by the pipeline: the ring space is given back right away
+            consumed += pipeline.put(batch)
+            del batch
+            ring.release()
+        if idle:
+            if stopped.is_set():
+                break
+            time.sleep(RING_POLL_SECONDS)
+    return consumed
@@ -12,10 +12,84 @@ class timeSeriesPort(ABC):
     This class defines the interface for performing time series analyses and queries.
     """
     @abstractmethod
-    async def instance_info(self, ts_uuid: Any = None):
+    async def instance_info(self, ts_uuid: Any = None, serialized: bool = False):
         '''
         Retrieve information about a specific time series instance.
         :param ts_id: Identifier for the time series instance.
+        :param serialized: Return the information serialized to JSON (bytes, cached while the instance is unchanged).
+        '''
+        ...
+    @abstractmethod
+    async def measurements_fetch(self, ts_uuid: Any, measurements: list[str] | None = None, start: int = 0,
+                                 end: int = 0, points: int = 0, method: str = "lttb", cf: str = "AVERAGE",
+                                 arrays: bool = False):
+        '''
+        Retrieve the data of measurements of a time series instance.
+        :param ts_uuid: Identifier for the time series instance.
+        :param measurements: Measurement UUIDs (None for every measurement of the instance).
+        :param start: Start timestamp (0 for one day before end).
+        :param end: End timestamp (0 for now).
+        :param points: Downsample each series to this number of points (0 for every point).
+        :param method: Downsampling method ('lttb' or 'minmax').
+        :param cf: Consolidation function of the archive to read (e.g. 'AVERAGE', 'MAX').
+        :param arrays: Timestamps and data source columns as NumPy arrays instead of JSON-ready lists.
+        '''
+        ...
+    @abstractmethod
+    async def measurements_export(self, ts_uuid: Any, measurements: list[str] | None = None, start: int = 0,
+                                  end: int = 0, output_type: str = "csv", cf: str = "AVERAGE", path: str | None = None):
+        '''
+        Export the data of measurements of a time series instance, streamed chunk by chunk.
+        :param ts_uuid: Identifier for the time series instance.
+        :param measurements: Measurement UUIDs (None for every measurement of the instance).
+        :param start: Start timestamp (0 for one day before end).
+        :param end: End timestamp (0 for now).
+        :param output_type: Export format ('csv', 'ndjson' or 'parquet').
+        :param cf: Consolidation function of the archive to read (e.g. 'AVERAGE', 'MAX').
+        :param path: Write the export to this file (returns the path) instead of returning the chunks (async iterator of bytes).
+        '''
+        ...
+    @abstractmethod
+    async def measurements_query(self, ts_uuids: list[Any], measurements: list[str] | None = None,
+                                 tags: list[str] | None = None, start: int = 0, end: int = 0, aggregate: str = "sum",
+                                 top: int = 10, by: str | None = None, points: int = 0, method: str = "lttb",
+                                 cf: str = "AVERAGE"):
+        '''
+        Retrieve and merge the measurements of several time series instances, fetched concurrently.
+        :param ts_uuids: Identifiers of the time series instances.
+        :param measurements: Measurement UUIDs (None for every measurement of the instances).
+        :param tags: Filters every selected measurement matches: "HTTPS" (tag) or "server_ip:10.1.96.15" (field value).
+        :param start: Start timestamp (0 for one day before end).
+        :param end: End timestamp (0 for now).
+        :param aggregate: 'sum' or 'avg' (one merged series) or 'top' (the `top` series with the largest total of `by`).
+        :param top: Number of series kept by 'top'.
+        :param by: Data source ranking the series for 'top' (the first data source by default).
+        :param points: Downsample each resulting series to this number of points (0 for every point).
+        :param method: Downsampling method ('lttb' or 'minmax').
+        :param cf: Consolidation function of the archive to read (e.g. 'AVERAGE', 'MAX').
+        '''
+        ...
+    @abstractmethod
+    async def measurements_search(self, terms: list[str], limit: int | None = None):
+        '''
+        Search the measurements of every instance by tags and fields.
+        :param terms: Terms every measurement matches: "SSH" (tag), "server_ip:10.1.32.4" (field value)
+            or "server_ip:10.1.32.0/24" (IP prefix of a field).
+        :param limit: Maximum number of measurements returned (None for all).
+        '''
+        ...
+    @abstractmethod
+    async def measurements_rollups(self, scope: str = "*", start: int = 0, end: int = 0, resolution: int = 0,
+                                   points: int = 0, stat: str = "avg"):
+        '''
+        Read the pre-aggregated (hourly, daily) series of the tenant or of a tag, from the coarsest
+        rollup tier satisfying the requested resolution.
+        :param scope: "*" (every measurement of the tenant) or a tag ("HTTPS").
+        :param start: Start timestamp (0 for one day before end).
+        :param end: End timestamp (0 for now).
+        :param resolution: Requested seconds per point (0 to derive it from points).
+        :param points: Requested number of points over the range (0 for the finest tier).
+        :param stat: Statistic of each bucket: 'avg', 'sum', 'max' or 'p95'.
         '''
         ...
 
@@ -0,0 +1,57 @@
+'''
+IPFIX Collector Port - Interface Module
+This module defines the interface for receiving IPFIX messages (RFC 7011) from exporters.
+'''
+
+from abc import ABC, abstractmethod
+from typing import Callable
+
+from core.entities.ipfix_buffer import IpfixMessageBatch
+
+BatchHandler = Callable[[IpfixMessageBatch], None]
+
+
+class CollectorBufferPort(ABC):
+    """
+    Abstract base class for IPFIX collectors.
+    Received messages are handed to a handler in batches, as views of the receive buffers.
+    """
+    @abstractmethod
+    async def start(self) -> None:
+        """
+        Open the listening sockets and start receiving (in the running event loop).
+        """
+        ...
+    @abstractmethod
+    async def stop(self) -> None:
+        """
+        Close the listening sockets and the open sessions.
+        """
+        ...
+    @abstractmethod
+    def stats(self) -> dict:
+        """
+        Counters of the received messages, batches, bytes, sessions and errors.
+        """
+        ...
+
+
+def collectorBuffer(handler: BatchHandler, transport: str = "socket", **options) -> CollectorBufferPort:
+    """
+    Factory function to get the IPFIX collector.
+    Only UDP/TCP sockets are supported at this moment.
+
+    :param handler: Called with every batch of received messages (views valid during the call only).
+    :param transport: Type of the input ('socket').
+    :param options: Collector options (host, udp_port, tcp_port, reuse_port, batch_messages, buffer_bytes,
+        tcp_buffer_bytes, rcvbuf, on_close: called with the exporter of each ended TCP session).
+    :return: IPFIX collector.
+    """
+    from adapters.infrastructure.ipfix.collector.socket_collector import ipfix_socket_collector
+    if transport == "socket":
+        return ipfix_socket_collector(handler, **options)
+    else:
+        raise ValueError(
+            f"Unknown transport type: {transport}. "
+            "Supported types are 'socket'."
+            )
@@ -0,0 +1,71 @@
+'''
+IPFIX Exporter Port - Interface Module
+This module defines the interface for writing IPFIX messages (RFC 7011) to an output.
+'''
+
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+from core.entities.ipfix_record import IpfixTemplate
+
+
+class ExporterBufferPort(ABC):
+    """
+    Abstract base class for IPFIX exporters.
+    Data records are buffered and packed into messages as large as the output allows.
+    """
+    @abstractmethod
+    def add_template(self, template: IpfixTemplate) -> None:
+        """
+        Register a template: it is exported before its first data records.
+        :param template: Template of the data records to be written.
+        """
+        ...
+    @abstractmethod
+    def write(self, template_id: int, records: np.ndarray) -> int:
+        """
+        Write data records.
+        :param template_id: Id of a registered template.
+        :param records: Structured array with the template's wire layout (IpfixTemplate.dtype).
+        :return: Number of records written.
+        """
+        ...
+    @abstractmethod
+    def flush(self) -> None:
+        """
+        Close the current message and write out every buffered message.
+        """
+        ...
+    @abstractmethod
+    def close(self) -> None:
+        """
+        Flush and release the output.
+        """
+        ...
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def exporterBuffer(path: str, target: str = "file", **options) -> ExporterBufferPort:
+    """
+    Factory function to get the IPFIX exporter.
+    Only IPFIX files are supported at this moment.
+
+    :param path: Path of the IPFIX file.
+    :param target: Type of the output ('file').
+    :param options: Exporter options (observation_domain_id, template_refresh, buffer_size).
+    :return: IPFIX exporter.
+    """
+    from adapters.infrastructure.ipfix.exporter.file_writer import ipfix_file
+    if target == "file":
+        return ipfix_file(path, **options)
+    else:
+        raise ValueError(
+            f"Unknown target type: {target}. "
+            "Supported types are 'file'."
+            )
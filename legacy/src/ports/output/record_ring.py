@@ -0,0 +1,71 @@
+'''
+IPFIX Record Ring Port - Interface Module
+This module defines the interface for passing decoded record batches from a collector
+process to a mediator process of the same host (one producer, one consumer).
+'''
+
+from abc import ABC, abstractmethod
+
+from core.entities.ipfix_buffer import IpfixRecordBatch
+
+
+class RecordRingPort(ABC):
+    """
+    Abstract base class for the record batch rings.
+    Batches are written by exactly one producer and read, in order, by exactly one consumer.
+    """
+    @abstractmethod
+    def put(self, batch: IpfixRecordBatch) -> bool:
+        """
+        Write a batch of fixed-length records (producer).
+        :param batch: Records as one array, or a list of arrays of the same layout (written one after the other).
+        :return: False when the batch is dropped (ring full, or batch larger than the ring allows).
+        """
+        ...
+    @abstractmethod
+    def get(self, timeout: float | None = None) -> IpfixRecordBatch | None:
+        """
+        Read the next batch (consumer). Its records may be a view of the ring, valid until release().
+        :param timeout: Seconds to wait for a batch (None: no limit, 0: no wait).
+        :return: The batch, or None when none came (or the producer closed the ring and it is empty).
+        """
+        ...
+    @abstractmethod
+    def release(self) -> None:
+        """
+        Give the space of the last batch read back to the producer (consumer).
+        """
+        ...
+    @abstractmethod
+    def stats(self) -> dict:
+        """
+        Fill level, high-water mark, batches and bytes through the ring, overruns (dropped batches).
+        """
+        ...
+    @abstractmethod
+    def close(self, unlink: bool = False) -> None:
+        """
+        Detach from the ring (the producer marks it closed first); unlink removes it.
+        """
+        ...
+
+
+def recordRing(name: str | None = None, create: bool = False, transport: str = "shm", **options) -> RecordRingPort:
+    """
+    Factory function to get a record batch ring.
+    Only shared memory rings are supported at this moment.
+
+    :param name: Name of the ring (None: a new unique name, with create=True).
+    :param create: Create the ring (its owner) instead of attaching to an existing one.
+    :param transport: Type of the ring ('shm').
+    :param options: Ring options (capacity: bytes, on_full: 'drop' or 'block', block_timeout: seconds).
+    :return: Record batch ring.
+    """
+    from adapters.infrastructure.ipc.shared_memory.record_ring import shm_record_ring
+    if transport == "shm":
+        return shm_record_ring(name, create, **options)
+    else:
+        raise ValueError(
+            f"Unknown ring transport: {transport}. "
+            "Supported transports are 'shm'."
+            )
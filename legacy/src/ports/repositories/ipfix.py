@@ -0,0 +1,76 @@
+'''
+IPFIX Template Store Port - Interface Module
+This module defines the interface for the IPFIX templates shared by the collectors
+(processes and pods): a data set can be decoded by a collector that never received its template.
+'''
+
+from abc import ABC, abstractmethod
+from typing import Any
+
+# (exporter, observation domain, template id, version, definition: None once withdrawn)
+TemplateChange = tuple[str, int, int, int, bytes | None]
+
+
+class TemplateStorePort(ABC):
+    """
+    Abstract base class for the shared IPFIX template stores.
+    Every put or withdrawal gets a new version from a store-wide generation counter: the
+    changes since a generation are the templates to invalidate in the local caches.
+    Definitions are opaque (encoded by the template cache).
+    """
+    @abstractmethod
+    def put(self, exporter: str, domain: int, template_id: int, definition: bytes) -> int:
+        """
+        Store (or replace) a template.
+        :return: Version of the template.
+        """
+        ...
+    @abstractmethod
+    def withdraw(self, exporter: str, domain: int, template_id: int | None = None) -> int:
+        """
+        Withdraw a template, or every template of an exporter session (template_id None).
+        :return: Version of the withdrawal.
+        """
+        ...
+    @abstractmethod
+    def get(self, exporter: str, domain: int, template_id: int) -> tuple[int, bytes] | None:
+        """
+        (version, definition) of a template (None when unknown or withdrawn).
+        """
+        ...
+    @abstractmethod
+    def changes(self, since: int) -> tuple[int, list[TemplateChange]]:
+        """
+        Templates put or withdrawn after a generation.
+        :return: (current generation, changes).
+        """
+        ...
+    @abstractmethod
+    def load(self) -> tuple[int, list[TemplateChange]]:
+        """
+        Every live template (prefetch of a starting collector).
+        :return: (generation, templates).
+        """
+        ...
+
+
+def templateStore(db_type: str = "sqlite", location: Any = None) -> TemplateStorePort:
+    """
+    Factory function to get the shared IPFIX template store.
+
+    :param db_type: Type of the database ('sqlite' for the collectors of one host, 'redis' across hosts).
+    :param location: Database file (config.TEMPLATE_STORE_PATH by default) or Redis URL
+        (config.TEMPLATE_STORE_URL by default).
+    :return: Template store of this process.
+    """
+    if db_type == "sqlite":
+        from adapters.infrastructure.databases.relational.sqlite.templates import template_store
+        return template_store(location) if location else template_store()
+    elif db_type == "redis":
+        from adapters.infrastructure.databases.key_value.redis.templates import redis_template_store
+        return redis_template_store(location) if location else redis_template_store()
+    else:
+        raise ValueError(
+            f"Unknown template store type: {db_type}. "
+            "Supported types are 'sqlite' and 'redis'."
+            )
@@ -0,0 +1,72 @@
+'''
+PCAP Repository Port - Interface Module
+This module defines the interface for reading packet capture files (PCAP/PCAPNG).
+'''
+
+from abc import ABC, abstractmethod
+from typing import Iterator
+
+from core.entities.pcap_file import PcapFileInfo
+from core.entities.pcap_packet import PcapPacket
+
+
+class PcapPort(ABC):
+    """
+    Abstract base class for packet capture file readers.
+    Packets are streamed: implementations must not load whole capture files in memory.
+    """
+    @abstractmethod
+    def info(self) -> PcapFileInfo:
+        """
+        Get the capture file header information.
+        :return: Format, byte order, size and capture interfaces of the file.
+        """
+        ...
+    @abstractmethod
+    def packets(self, start: int = 0, end: int | None = None) -> Iterator[PcapPacket]:
+        """
+        Stream the packets of the capture file.
+        :param start: Only packets whose record starts at or after this file offset.
+        :param end: Only packets whose record starts before this file offset (None = end of file).
+        :return: Generator of packets, ``data`` being a zero-copy view valid until close().
+        """
+        ...
+    @abstractmethod
+    def split(self, shard_bytes: int) -> list[tuple[int, int]]:
+        """
+        Split the packet records of the file in byte ranges on packet boundaries.
+        :param shard_bytes: Target size of a range.
+        :return: (start, end) offsets, to be read with packets(start, end).
+        """
+        ...
+    @abstractmethod
+    def close(self) -> None:
+        """
+        Release the capture file.
+        """
+        ...
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def pcapReader(path: str, storage: str = "local") -> PcapPort:
+    """
+    Factory function to get the capture file reader.
+    Only local (memory-mapped) files are supported at this moment.
+
+    :param path: Path of the PCAP/PCAPNG file.
+    :param storage: Type of the storage ('local').
+    :return: Reader for the capture file.
+    """
+    from adapters.infrastructure.pcap.data_access import pcap_local
+    if storage == "local":
+        return pcap_local(path)
+    else:
+        raise ValueError(
+            f"Unknown storage type: {storage}. "
+            "Supported types are 'local'."
+            )
@@ -0,0 +1,66 @@
+'''
+Relational Database Port - Interface Module
+This module defines the interface for the relational stores (rollups of the time series).
+'''
+
+from abc import ABC, abstractmethod
+from typing import Any
+
+
+class RollupStorePort(ABC):
+    """
+    Abstract base class for the time series rollups store.
+    Rollups are pre-aggregated tiers (bucket size in seconds) of the time series of a
+    tenant, per scope ("*" for the whole tenant, a tag otherwise) and data source.
+    """
+    @abstractmethod
+    def write(self, tenant: str, tier: int, rollups: dict[str, dict[str, dict]], watermark: int) -> int:
+        """
+        Store the buckets of every scope and advance the tier watermark, atomically
+        (buckets already stored are replaced: a window may be rolled up again).
+        :param tenant: Tenant UUID.
+        :param tier: Bucket size in seconds.
+        :param rollups: {scope: {data source: {"ts", "sum", "count", "max", "p95"}}} (arrays of bucket values).
+        :param watermark: End of the last complete bucket rolled up for this tier.
+        :return: Number of buckets written.
+        """
+        ...
+    @abstractmethod
+    def read(self, tenant: str, tier: int, scope: str, start: int, end: int) -> dict[str, dict]:
+        """
+        Buckets of a scope starting in [start, end).
+        :return: {data source: {"ts", "sum", "count", "max", "p95"}} (NumPy arrays, ordered by time).
+        """
+        ...
+    @abstractmethod
+    def watermark(self, tenant: str, tier: int) -> int | None:
+        """
+        End of the last complete bucket rolled up for a tier (None before the first rollup).
+        """
+        ...
+    @abstractmethod
+    def lock(self) -> bool:
+        """
+        Try to become the single writer of the store on this host (non-blocking).
+        :return: True while this process holds the lock.
+        """
+        ...
+
+
+def rollupStore(db_type: str = "sqlite", path: Any = None) -> RollupStorePort:
+    """
+    Factory function to get the time series rollups store.
+    Only SQLite is supported at this moment.
+
+    :param db_type: Type of the database ('sqlite').
+    :param path: Database file (config.ROLLUP_DB_PATH by default).
+    :return: Rollups store of this process.
+    """
+    from adapters.infrastructure.databases.relational.sqlite.rollups import rollup_store
+    if db_type == "sqlite":
+        return rollup_store(path) if path else rollup_store()
+    else:
+        raise ValueError(
+            f"Unknown rollups database type: {db_type}. "
+            "Supported types are 'sqlite'."
+            )
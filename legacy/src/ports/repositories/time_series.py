@@ -70,28 +70,100 @@ class DbPort(ABC):
 def timeSeriesDb(
         db_type: str = "rrd",
         ts_uuid: Any = None,
-        storage: str = "local",
+        storage: str | None = None,
     ) -> DbPort:
     """
     Factory function to get the appropriate time series database instance.
     at this moment only RRDTool is supported, but this function can be extended to support other timeseries (InfluxDB for example), to working together or defining one at startup. The supported RRDTool values to the storage argument are:
+    'local' (read/write, tenant directory) and 's3' (read only, S3-compatible store).
 
     :param db_type: Type of the database (default is 'rrd').
     :param ts_uuid: Identifier for the time series instance.
-    :param storage: Type of the storage ('local').
+    :param storage: Type of the storage ('local' or 's3', config.TIME_SERIES_STORAGE by default).
     :return: Instance of the specified time series database.
     """
+    from config.config import TIME_SERIES_STORAGE
     from adapters.infrastructure.databases.time_series.rrdtool.data_access import (
-        rrdb_local,
+        rrdb_local, rrdb_s3,
     )
     if not ts_uuid:
         raise ValueError("ts_uuid must be provided to identify the time-series instance.")
     if db_type != "rrd":
         raise ValueError(f"Unknown time-series DB type: {db_type}")
+    storage = storage or TIME_SERIES_STORAGE
     if storage == 'local':
         return rrdb_local(ts_uuid=ts_uuid)
+    elif storage == 's3':
+        return rrdb_s3(ts_uuid=ts_uuid)
+    else:
+        raise ValueError(
+            f"Unknown storage type: {storage}. "
+            "Supported types are 'local' and 's3'."
+            )
+
+
+def timeSeriesIndex(db_type: str = "rrd", storage: str = "local") -> Any:
+    """
+    Factory function to get the in-process index of the time series instances.
+    Building it before the web workers are forked lets every worker start with a warm index.
+
+    :param db_type: Type of the database (default is 'rrd').
+    :param storage: Type of the storage ('local').
+    :return: Index of the instances (refresh() to rebuild it, stats() for its hit/miss counters).
+    """
+    from adapters.infrastructure.databases.time_series.rrdtool.data_access import rdd_instances_dir_path
+    from adapters.infrastructure.databases.time_series.rrdtool.meta_index import meta_index
+    if db_type != "rrd":
+        raise ValueError(f"Unknown time-series DB type: {db_type}")
+    if storage == 'local':
+        return meta_index(rdd_instances_dir_path)
     else:
         raise ValueError(
             f"Unknown storage type: {storage}. "
             "Supported types are 'local'."
             )
+
+
+def timeSeriesTenant(db_type: str = "rrd", storage: str = "local") -> str:
+    """
+    Tenant of the time series instances served by this process.
+    :param db_type: Type of the database (default is 'rrd').
+    :param storage: Type of the storage ('local').
+    :return: Tenant UUID.
+    """
+    from adapters.infrastructure.databases.time_series.rrdtool.data_access import service_tenant_uuid
+    if db_type != "rrd" or storage != "local":
+        raise ValueError(f"Unknown time-series DB type/storage: {db_type}/{storage}")
+    return service_tenant_uuid
+
+
+def timeSeriesUpdates(db_type: str = "rrd", storage: str = "local", create: bool = True) -> Any:
+    """
+    Factory function to get the write-behind update buffer of this process.
+
+    :param db_type: Type of the database (default is 'rrd').
+    :param storage: Type of the storage ('local').
+    :param create: Start the buffer (and its flush thread) if this process has none yet.
+    :return: The buffer (flush() to write it now, close() to write it and stop, stats()), None if not created.
+    """
+    from adapters.infrastructure.databases.time_series.rrdtool.update_buffer import update_buffer
+    if db_type != "rrd" or storage != "local":
+        raise ValueError(f"Unknown time-series DB type/storage: {db_type}/{storage}")
+    return update_buffer(create=create)
+
+
+def timeSeriesCacheStats(db_type: str = "rrd", storage: str = "local") -> dict:
+    """
+    Hit/miss counters of the time series caches of this process.
+
+    :param db_type: Type of the database (default is 'rrd').
+    :param storage: Type of the storage ('local').
+    :return: Statistics of the instances index, of the parsed headers cache, of the write-behind updates
+        and of the S3 block cache.
+    """
+    from adapters.infrastructure.databases.time_series.rrdtool.rrd_info import info_cache
+    from adapters.infrastructure.databases.time_series.rrdtool.s3_cache import s3_cache
+    buffer = timeSeriesUpdates(create=False)
+    cache = s3_cache(create=False)
+    return {"instances_index": timeSeriesIndex(db_type, storage).stats(), "rrd_info": info_cache().stats(),
+            "rrd_updates": buffer.stats() if buffer else None, "s3_cache": cache.stats() if cache else None}
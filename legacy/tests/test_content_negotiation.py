@@ -0,0 +1,57 @@
+import sys, os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+import asyncio
+import gzip
+import json
+import struct
+import numpy as np
+import pytest
+
+from adapters.web_api.fastapi import content_negotiation as cn
+
+
+def _series(points: int = 200_000) -> dict:
+    flows = np.arange(points, dtype=np.float64)
+    flows[7] = np.nan
+    return {
+        "uuid": "3fdb16a0-00db-51eb-b9ec-7d8aebd5243a", "start": 0, "end": 60 * points, "step": 60,
+        "points": points, "downsampling": None,
+        "timestamps": 60 * np.arange(1, points + 1, dtype=np.int64),
+        "columns": {"flows": flows, "octets": flows * 1500},
+    }
+
+
+def _body(response) -> bytes:
+    async def collect():
+        return b"".join([chunk async for chunk in response.body_iterator])
+    return asyncio.run(collect())
+
+
+def test_negotiation():
+    assert cn.negotiate(None) == cn.JSON
+    assert cn.negotiate("text/html, */*;q=0.1") == cn.JSON
+    assert cn.negotiate("application/json;q=0.5, application/octet-stream") == cn.PACKED_COLUMNS
+    assert cn.negotiate("text/csv") is None
+    assert cn.negotiate_encoding("gzip;q=0, br") is None
+    assert cn.negotiate_encoding("gzip, deflate") == "gzip"
+
+
+def test_packed_columns_gzip():
+    series = _series()
+    data = gzip.decompress(_body(cn.series_response(series, cn.PACKED_COLUMNS, "gzip")))
+    length, = struct.unpack_from("<I", data)
+    header = json.loads(data[4:4 + length])
+    assert header["columns"] == ["flows", "octets"] and header["points"] == series["points"]
+    arrays = np.frombuffer(data, "<i8", series["points"], 4 + length), np.frombuffer(data, "<f8", offset=4 + length + 8 * series["points"])
+    assert (arrays[0] == series["timestamps"]).all()
+    np.testing.assert_array_equal(arrays[1].reshape(2, -1), np.stack(list(series["columns"].values())))
+
+
+def test_arrow_stream():
+    pyarrow = pytest.importorskip("pyarrow")
+    series = _series()
+    table = pyarrow.ipc.open_stream(_body(cn.series_response(series, cn.ARROW_STREAM, None))).read_all()
+    assert table.num_rows == series["points"] and table.column_names == ["timestamp", "flows", "octets"]
+    np.testing.assert_array_equal(table["octets"].to_numpy(), series["columns"]["octets"])
+    assert json.loads(table.schema.metadata[b"step"]) == 60
@@ -0,0 +1,59 @@
+import sys, os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+import io
+import json
+import numpy as np
+import pytest
+
+from adapters.infrastructure.databases.time_series.export_formats import export_encoder
+
+
+def _export(output_type: str) -> bytes:
+    encoder = export_encoder(output_type)
+    timestamps = 60 * np.arange(1, 5, dtype=np.int64)
+    values = np.array([[1.0, np.nan], [2.5, 3.0], [np.nan, np.nan], [1e12, 0.1]])
+    return (encoder.begin(["in", "out"])
+            + encoder.rows("ma", timestamps, values)
+            + encoder.rows("mb", timestamps[:1], values[:1])
+            + encoder.end())
+
+
+def test_csv_export():
+    lines = _export("csv").decode().splitlines()
+    assert lines == ["measurement,timestamp,in,out", "ma,60,1,", "ma,120,2.5,3", "ma,180,,",
+                     "ma,240,1000000000000,0.1", "mb,60,1,"]
+
+
+def test_ndjson_export():
+    rows = [json.loads(line) for line in _export("ndjson").decode().splitlines()]
+    assert rows[0] == {"measurement": "ma", "timestamp": 60, "in": 1, "out": None}
+    assert rows[3] == {"measurement": "ma", "timestamp": 240, "in": 1e12, "out": 0.1}
+    assert len(rows) == 5
+
+
+def test_non_finite_values_and_names_are_kept_apart():
+    names = ["dns_latency_nanoseconds", "infra"]
+    timestamps = np.array([60, 120], dtype=np.int64)
+    values = np.array([[np.inf, np.nan], [-np.inf, 5.0]])
+    csv, ndjson = export_encoder("csv"), export_encoder("ndjson")
+    assert (csv.begin(names) + csv.rows("nan", timestamps, values)).decode().splitlines() == \
+        ["measurement,timestamp,dns_latency_nanoseconds,infra", "nan,60,,", "nan,120,,5"]
+    ndjson.begin(names)
+    rows = [json.loads(line) for line in ndjson.rows("nan", timestamps, values).decode().splitlines()]
+    assert rows == [{"measurement": "nan", "timestamp": 60, "dns_latency_nanoseconds": None, "infra": None},
+                    {"measurement": "nan", "timestamp": 120, "dns_latency_nanoseconds": None, "infra": 5}]
+
+
+def test_parquet_export():
+    pytest.importorskip("pyarrow")
+    import pyarrow.parquet
+    table = pyarrow.parquet.read_table(io.BytesIO(_export("parquet")))
+    assert table.column_names == ["measurement", "timestamp", "in", "out"]
+    assert table.column("timestamp").to_pylist() == [60, 120, 180, 240, 60]
+    assert table.column("out").to_pylist() == [None, 3.0, None, 0.1, None]
+
+
+def test_unknown_export_format():
+    with pytest.raises(ValueError):
+        export_encoder("xlsx")
@@ -0,0 +1,184 @@
+import sys, os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+import threading
+from multiprocessing import shared_memory
+from pytest import fixture, raises
+
+from core.use_cases.file_exporter.task_slots import TaskSlotTable
+from core.use_cases.file_exporter.task_manager import TaskSlotManager
+
+
+@fixture
+def slot_table():
+    max_items = 64
+    shm = shared_memory.SharedMemory(create=True, size=TaskSlotTable.size_for(max_items))
+    table = TaskSlotTable(shm, max_items=max_items, create=True)
+    yield table
+    table.close()
+    shm.unlink()
+
+
+def test_slot_table_add_update_remove(slot_table):
+    slot = slot_table.insert({"task_id": "task_1", "status": "starting", "created_at": 1.0, "file_count": 2})
+
+    assert slot == 0
+    assert slot_table.insert({"task_id": "task_1"}) == -2
+    assert slot_table.find("task_1") == slot
+
+    slot_table.update(slot, status="running", updated_at=2.0, progress=0.5)
+    data = slot_table.get("task_1")
+
+    assert data["status"] == "running"
+    assert data["file_count"] == 2
+    assert data["progress"] == 0.5
+
+    assert slot_table.remove("task_1") == slot
+    assert slot_table.get("task_1") is None
+    assert slot_table.used_count() == 0
+
+
+def test_slot_table_full_and_index_consistency(slot_table):
+    for i in range(slot_table.max_items):
+        assert slot_table.insert({"task_id": f"task_{i}", "status": "running"}) >= 0
+    assert slot_table.insert({"task_id": "one_too_many"}) == -1
+
+    # Removing every other task must keep the remaining ids reachable (backward-shift deletion)
+    for i in range(0, slot_table.max_items, 2):
+        assert slot_table.remove(f"task_{i}") != -1
+    for i in range(slot_table.max_items):
+        assert (slot_table.find(f"task_{i}") != -1) == bool(i % 2)
+
+    attached = TaskSlotTable.attach(slot_table.name)
+    assert len(list(attached.active())) == slot_table.max_items // 2
+    attached.close()
+
+
+def test_slot_table_seqlock_reads(slot_table):
+    slot = slot_table.insert({"task_id": "task_seq", "status": "running"})
+
+    with slot_table.writer_lock:
+        slot_table.update(slot, status="step_2_parsing_packets", progress=0.25)
+
+    assert slot_table.get("task_seq")["status"] == "step_2_parsing_packets"
+    assert slot_table.stats()["read_retries"] == 0
+
+    # A writer that died mid-update leaves an odd sequence: readers repair it and carry on
+    off = slot_table._slot_offset(slot)
+    slot_table._shm.buf[off] += 1
+    assert slot_table.get("task_seq")["progress"] == 0.25
+    assert slot_table.stats()["contended_reads"] > 0
+
+
+def test_task_manager_writes_repair_torn_slots(slot_table):
+    manager = TaskSlotManager(slot_table, slot_table.writer_lock, slot_table.max_items)
+    slot = slot_table.insert({"task_id": "task_torn", "status": "running"})
+    slot_table.insert({"task_id": "task_done", "status": "running"})
+
+    def writes():
+        # Dead writers: a slot and the id index left with odd sequences
+        slot_table._shm.buf[slot_table._slot_offset(slot)] += 1
+        slot_table._bump_index_seq()
+        results.append(manager.advance_task("task_torn", 0.5, status="step_2_parsing_packets"))
+        results.append(manager.complete_task("task_done"))
+
+    # The writer lock is not reentrant: a repair taking it again would hang
+    results = []
+    writer = threading.Thread(target=writes, daemon=True)
+    writer.start()
+    writer.join(5)
+    assert not writer.is_alive() and results == [True, True]
+    assert slot_table.get("task_torn")["progress"] == 0.5
+    assert slot_table.get("task_done") is None and slot_table.used_count() == 1
+    assert slot_table.stats()["read_retries"] == 0
+
+
+def test_export_job_queue_order_and_replay(tmp_path):
+    from core.use_cases.file_exporter.job_queue import ExportJobQueue
+
+    journal = tmp_path / "export_queue.journal"
+    queue = ExportJobQueue(journal, max_jobs=5, fsync=False)
+    for task_id, tenant, priority in [("a1", "a", 5), ("a2", "a", 5), ("b1", "b", 5), ("u1", "a", 0), ("a3", "a", 5)]:
+        queue.put({"task_id": task_id, "tenant": tenant, "priority": priority})
+
+    assert queue.full()
+    assert queue.position("b1") == 2
+    # Most urgent first, then tenants round-robin, FIFO within a tenant
+    assert [queue.pop()["task_id"] for _ in range(2)] == ["u1", "a1"]
+    queue.done("u1", "completed")
+    queue.close()
+
+    # "a1" was started but never finished: it is replayed ahead of the still-queued jobs
+    replayed = ExportJobQueue(journal, max_jobs=5, fsync=False)
+    assert [replayed.pop()["task_id"] for _ in range(len(replayed))] == ["a1", "b1", "a2", "a3"]
+    replayed.close()
+
+
+def test_export_job_queue_skips_tenants_over_quota(tmp_path):
+    from core.use_cases.file_exporter.job_queue import ExportJobQueue
+
+    queue = ExportJobQueue(tmp_path / "export_queue.journal", fsync=False)
+    for task_id, tenant in [("a1", "a"), ("a2", "a"), ("b1", "b")]:
+        queue.put({"task_id": task_id, "tenant": tenant})
+
+    assert queue.pop(eligible=lambda tenant: tenant != "a")["task_id"] == "b1"
+    assert queue.pop(eligible=lambda tenant: tenant != "a") is None
+    assert queue.pop()["task_id"] == "a1"
+    queue.close()
+
+
+def test_export_job_queue_requeue_counts_attempts(tmp_path):
+    from core.use_cases.file_exporter.job_queue import ExportJobQueue
+
+    journal = tmp_path / "export_queue.journal"
+    queue = ExportJobQueue(journal, fsync=False)
+    queue.put({"task_id": "a1", "tenant": "a"})
+    # No free slot: the job never ran, popping it again is still its first attempt
+    for _ in range(5):
+        queue.requeue(queue.pop(), attempted=False)
+    job = queue.pop()
+    assert job["attempts"] == 1
+    queue.requeue(job)
+    assert queue.pop()["attempts"] == 2
+    queue.close()
+    # Replayed from the journal: 2 attempts started, the last one unfinished
+    replayed = ExportJobQueue(journal, fsync=False)
+    assert replayed.pop()["attempts"] == 3
+    replayed.close()
+
+
+def test_export_job_queue_fails_jobs_interrupted_too_often(tmp_path):
+    from core.use_cases.file_exporter.job_queue import ExportJobQueue
+
+    journal = tmp_path / "export_queue.journal"
+    queue = ExportJobQueue(journal, fsync=False, max_retries=2)
+    queue.put({"task_id": "a1", "tenant": "a"})
+    queue.put({"task_id": "b1", "tenant": "b"})
+    # "a1" kills its worker (or the manager) on every run: started, never finished
+    for _ in range(3):
+        assert queue.pop(eligible=lambda tenant: tenant == "a")["task_id"] == "a1"
+        queue.close()
+        queue = ExportJobQueue(journal, fsync=False, max_retries=2)
+    assert queue.failed_on_replay == ["a1"]
+    assert "a1" not in queue and len(queue) == 1
+    queue.close()
+
+    replayed = ExportJobQueue(journal, fsync=False, max_retries=2)
+    assert replayed.failed_on_replay == [] and replayed.pop()["task_id"] == "b1"
+    replayed.close()
+
+
+def test_shard_tables_stay_in_the_shard_dir(tmp_path, monkeypatch):
+    from core.use_cases.file_exporter import sharding
+
+    monkeypatch.setattr(sharding, "EXPORT_SHARD_DIR", str(tmp_path / "shards"))
+    (tmp_path / "shards" / "task_1").mkdir(parents=True)
+    (tmp_path / "keep").mkdir()
+    assert sharding.shard_table_path("task_1", 3) == str(tmp_path / "shards" / "task_1" / "shard_00003.npz")
+    for task_id in ("..", "../keep", "task_1/..", "", "/tmp"):
+        with raises(ValueError):
+            sharding.shard_table_path(task_id, 0)
+        sharding.remove_shard_tables(task_id)
+    assert (tmp_path / "keep").is_dir() and (tmp_path / "shards").is_dir()
+    sharding.remove_shard_tables("task_1")
+    assert not (tmp_path / "shards" / "task_1").exists()
@@ -0,0 +1,104 @@
+import sys, os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+import socket
+import struct
+import numpy as np
+
+from core.data_domain.pcap_ipfix_exporter import FlowMeter
+from core.entities.ipfix_ie import FLOW_END_IDLE_TIMEOUT, FLOW_END_ACTIVE_TIMEOUT, FLOW_END_FORCED_END, FLOW_END_OF_FLOW_DETECTED
+from core.entities.pcap_packet import PcapPacket
+from core.entities.ipfix_record import FLOW_TEMPLATE_IPV4, FLOW_TEMPLATE_IPV6
+
+
+def _frame(src: str, dst: str, sport: int, dport: int, proto: int = 17, payload: int = 10, flags: int = 0x10, vlan: bool = False) -> bytes:
+    if ":" in src:
+        l4 = struct.pack("!HHIIBBHHH", sport, dport, 0, 0, 5 << 4, flags, 0, 0, 0) if proto == 6 else struct.pack("!HHHH", sport, dport, 8 + payload, 0)
+        l3 = struct.pack("!IHBB16s16s", 6 << 28, len(l4) + payload, proto, 64, socket.inet_pton(socket.AF_INET6, src), socket.inet_pton(socket.AF_INET6, dst))
+        ethertype = 0x86DD
+    else:
+        l4 = struct.pack("!HHIIBBHHH", sport, dport, 0, 0, 5 << 4, flags, 0, 0, 0) if proto == 6 else struct.pack("!HHHH", sport, dport, 8 + payload, 0)
+        l3 = struct.pack("!BBHHHBBH4s4s", 0x45, 0, 20 + len(l4) + payload, 0, 0, 64, proto, 0, socket.inet_aton(src), socket.inet_aton(dst))
+        ethertype = 0x0800
+    l2 = b"\x00" * 12 + (struct.pack("!HHH", 0x8100, 10, ethertype) if vlan else struct.pack("!H", ethertype))
+    return l2 + l3 + l4 + b"\x00" * payload
+
+
+def _packets(frames: list[tuple[float, bytes]]) -> list[PcapPacket]:
+    buffer = b"".join(frame for _, frame in frames)
+    packets, offset = [], 0
+    for ts, frame in frames:
+        packets.append(PcapPacket(ts, len(frame), len(frame), 1, 0, offset, memoryview(buffer)[offset:offset + len(frame)], offset))
+        offset += len(frame)
+    return packets
+
+
+def _meter(frames, batch_size=65536, **timeouts) -> dict[int, np.ndarray]:
+    meter = FlowMeter(batch_size=batch_size, **timeouts)
+    meter.add_packets(_packets(frames))
+    meter.flush()
+    return meter.records()
+
+
+def test_flow_meter_aggregates_five_tuples():
+    frames = [(100.0 + i, _frame("10.0.0.1", "10.0.0.2", 1000, 53)) for i in range(5)]
+    frames += [(100.5 + i, _frame("10.0.0.2", "10.0.0.1", 53, 1000, payload=20)) for i in range(3)]
+    frames += [(101.0, _frame("2001:db8::1", "2001:db8::2", 4000, 443, proto=6, flags=0x02, vlan=True))]
+    records = _meter(frames, idle_timeout=60)
+    v4, v6 = records[256], records[257]
+
+    assert len(v4) == 2 and len(v6) == 1
+    # Written to the IPFIX file as they are: wire layout and byte order
+    assert v4.dtype == FLOW_TEMPLATE_IPV4.dtype and v6.dtype == FLOW_TEMPLATE_IPV6.dtype
+    forward = v4[v4["sourceTransportPort"] == 1000][0]
+    assert forward["packetDeltaCount"] == 5
+    assert forward["octetDeltaCount"] == 5 * (20 + 8 + 10)
+    assert forward["sourceIPv4Address"] == int.from_bytes(socket.inet_aton("10.0.0.1"), "big")
+    assert forward["flowStartMilliseconds"] == 100000 and forward["flowEndMilliseconds"] == 104000
+    assert forward["flowEndReason"] == FLOW_END_FORCED_END
+    assert v6[0]["protocolIdentifier"] == 6 and v6[0]["tcpControlBits"] == 0x02
+    assert v6[0]["destinationIPv6Address"].tobytes() == socket.inet_pton(socket.AF_INET6, "2001:db8::2")
+
+
+def test_flow_meter_timeouts_independent_of_batch_size():
+    frames = [(t, _frame("10.0.0.1", "10.0.0.2", 1000, 53)) for t in (0.0, 1.0, 2.0, 30.0, 31.0)]
+    frames += [(float(t), _frame("10.0.0.3", "10.0.0.4", 2000, 80)) for t in range(0, 25)]
+    frames += [(40.0, _frame("10.0.0.5", "10.0.0.6", 3000, 80, proto=6, flags=0x01))]
+    frames.sort(key=lambda f: f[0])
+    order = ["flowStartMilliseconds", "sourceTransportPort"]
+    expected = np.sort(_meter(frames, idle_timeout=10, active_timeout=20)[256], order=order)
+
+    for batch_size in (1, 3, 7):
+        assert (np.sort(_meter(frames, batch_size=batch_size, idle_timeout=10, active_timeout=20)[256], order=order) == expected).all()
+    idle_split = expected[expected["sourceTransportPort"] == 1000]
+    assert list(idle_split["packetDeltaCount"]) == [3, 2]
+    assert idle_split[0]["flowEndReason"] == FLOW_END_IDLE_TIMEOUT
+    active_split = expected[expected["sourceTransportPort"] == 2000]
+    assert list(active_split["packetDeltaCount"]) == [20, 5]
+    assert active_split[0]["flowEndReason"] == FLOW_END_ACTIVE_TIMEOUT
+    assert expected[expected["sourceTransportPort"] == 3000][0]["flowEndReason"] == FLOW_END_OF_FLOW_DETECTED
+
+
+def test_flow_meter_sharded_merge_matches_single_pass(tmp_path):
+    from ports.repositories.pcap import pcapReader
+    samples = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "samples", "tenant_test", "pcap")
+    paths = [os.path.join(samples, name) for name in ("example1.pcap", "example2.pcapng")]
+
+    single = FlowMeter(active_timeout=5, idle_timeout=2)
+    tables = []
+    for path in paths:
+        with pcapReader(path) as reader:
+            single.add_packets(reader.packets())
+            for index, (start, end) in enumerate(reader.split(4096)):
+                shard = FlowMeter(active_timeout=5, idle_timeout=2, keep_table=True)
+                shard.add_packets(reader.packets(start, end))
+                shard.flush()
+                shard.save_table(tmp_path / f"{os.path.basename(path)}_{index}.npz")
+                tables.append(FlowMeter.load_table(tmp_path / f"{os.path.basename(path)}_{index}.npz"))
+    single.flush()
+    merged = FlowMeter(active_timeout=5, idle_timeout=2)
+    merged.merge_tables(tables)
+
+    assert len(tables) > 2
+    for template_id, records in single.records().items():
+        assert (np.sort(merged.records()[template_id]) == np.sort(records)).all()
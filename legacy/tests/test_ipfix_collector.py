@@ -0,0 +1,102 @@
+import sys, os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+import asyncio
+import socket
+
+import pytest
+
+from core.data_domain.ipfix_collector import MESSAGE_HEADER, frame_messages, exporter_sessions
+from core.use_cases.collector.collector_service import message_counter
+from ports.input.collector_buffer import collectorBuffer
+from adapters.infrastructure.ipfix.exporter.simulator import exporter_simulator
+
+
+def _message(sequence: int, body: bytes = b"", domain: int = 1) -> bytes:
+    return MESSAGE_HEADER.pack(10, MESSAGE_HEADER.size + len(body), 0, sequence, domain) + body
+
+
+def test_frame_messages_keeps_partial_message():
+    stream = _message(0, b"a" * 10) + _message(5) + _message(9, b"b" * 20)[:20]
+    offsets, lengths, end = frame_messages(stream, 0, len(stream))
+    assert offsets == [0, 26] and lengths == [26, 16] and end == 42
+    with pytest.raises(ValueError):
+        frame_messages(b"\x00\x09\x00\x10" + bytes(12), 0, 16)
+
+
+def test_sessions_count_records_from_sequence_numbers():
+    sessions = exporter_sessions()
+    for exporter, sequence in [("a", 0), ("a", 30), ("b", 7), ("a", 60), ("b", 17), ("a", 50)]:
+        sessions.update(exporter, sequence, 1)
+    assert sessions.records == 70 and sessions.resets == 1 and len(sessions) == 2
+    sessions.update("a", 0xFFFFFFF0, 2)
+    sessions.update("a", 0x10, 2)
+    assert sessions.records == 102
+    sessions.forget("a")
+    assert len(sessions) == 1
+
+
+def test_udp_and_tcp_batches_reach_the_handler():
+    async def run():
+        received = []
+        counter = message_counter()
+
+        def handler(batch):
+            # Views valid during the call only
+            received.extend((batch.transport, bytes(message)) for _, message in batch)
+            counter(batch)
+
+        collector = collectorBuffer(handler, host="127.0.0.1", udp_port=0, tcp_port=0, reuse_port=False,
+                                    buffer_bytes=128 * 1024, on_close=counter.forget)
+        await collector.start()
+        udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        for sequence in range(0, 50, 10):
+            udp.sendto(_message(sequence, b"x" * sequence), collector.udp_address)
+        reader, writer = await asyncio.open_connection(*collector.tcp_address)
+        stream = b"".join(_message(sequence, b"y" * 100) for sequence in (0, 3, 6))
+        # Messages split across reads
+        for part in (stream[:5], stream[5:150], stream[150:]):
+            writer.write(part)
+            await writer.drain()
+            await asyncio.sleep(0.01)
+        for _ in range(100):
+            if len(received) == 8:
+                break
+            await asyncio.sleep(0.01)
+        writer.close()
+        udp.close()
+        await asyncio.sleep(0.01)
+        stats = collector.stats()
+        await collector.stop()
+        return received, stats, counter.stats()
+
+    received, stats, counted = asyncio.run(run())
+    assert [message for transport, message in received if transport == "udp"] == [
+        _message(sequence, b"x" * sequence) for sequence in range(0, 50, 10)]
+    assert [message for transport, message in received if transport == "tcp"] == [
+        _message(sequence, b"y" * 100) for sequence in (0, 3, 6)]
+    assert stats["messages"] == 8 and stats["tcp_sessions"] == 1 and stats["open_tcp_sessions"] == 0
+    assert counted["messages"] == 8 and counted["records"] == 40 + 6 and counted["malformed"] == 0
+    # Closed TCP session forgotten
+    assert counted["sessions"] == 1
+
+
+def test_simulator_records_are_counted():
+    async def run():
+        counter = message_counter()
+        collector = collectorBuffer(counter, host="127.0.0.1", udp_port=None, tcp_port=0, reuse_port=False)
+        await collector.start()
+        simulator = exporter_simulator(*collector.tcp_address, transport="tcp")
+        sent = await asyncio.to_thread(simulator.send, 10 * simulator.records_per_message)
+        for _ in range(100):
+            if counter.stats()["messages"] == sent["messages"] + 1:
+                break
+            await asyncio.sleep(0.01)
+        simulator.close()
+        await collector.stop()
+        return sent, counter.stats(), simulator.records_per_message
+
+    sent, counted, per_message = asyncio.run(run())
+    # Template message first, then one data message per records_per_message records
+    assert counted["messages"] == sent["messages"] + 1
+    assert counted["records"] == sent["records"] - per_message
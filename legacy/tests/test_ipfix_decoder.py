@@ -0,0 +1,91 @@
+import sys, os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+import struct
+
+import numpy as np
+
+from core.entities.ipfix_record import FLOW_TEMPLATE_IPV4
+from core.entities.ipfix_ie import VARIABLE_LENGTH
+from core.entities.ipfix_stl import SubTemplateList
+from core.entities.ipfix_bl import BasicList, LIST_ALL_OF
+from core.data_domain.ipfix_decoder import ipfix_decoder, compile_layout
+from core.use_cases.collector.collector_service import message_counter
+from core.entities.ipfix_buffer import IpfixMessageBatch
+from adapters.infrastructure.ipfix.exporter.file_writer import MESSAGE_HEADER, SET_HEADER, _template_record
+from adapters.infrastructure.ipfix.exporter.simulator import flow_records
+
+
+def _message(*sets: tuple[int, bytes], domain: int = 1) -> bytes:
+    body = b"".join(SET_HEADER.pack(set_id, SET_HEADER.size + len(data)) + data for set_id, data in sets)
+    return MESSAGE_HEADER.pack(10, MESSAGE_HEADER.size + len(body), 0, 0, domain) + body
+
+
+def _template(template_id: int, *fields: tuple[int, int]) -> bytes:
+    return struct.pack("!HH", template_id, len(fields)) + b"".join(struct.pack("!HH", *field) for field in fields)
+
+
+def test_fixed_length_data_set_decodes_to_the_records_sent():
+    records = flow_records(20)
+    decoder = ipfix_decoder()
+    message = _message((2, _template_record(FLOW_TEMPLATE_IPV4)), (256, records.tobytes() + b"\x00\x00\x00"))
+    [(template, decoded)] = decoder.decode_message(("10.0.0.1", 4739), message)
+    # Same wire layout as the exporter's template, a view of the message
+    assert decoded.dtype == FLOW_TEMPLATE_IPV4.dtype and not decoded.flags.owndata
+    assert np.array_equal(decoded, records)
+    # Templates are per exporter and observation domain
+    assert decoder.decode_message(("10.0.0.1", 4739), _message((256, records.tobytes()), domain=2)) == []
+    assert decoder.stats()["unknown_template_sets"] == 1 and decoder.stats()["records"] == 20
+
+
+def test_reduced_size_encoding_and_shared_layouts():
+    decoder = ipfix_decoder()
+    # octetDeltaCount (1) on 4 bytes instead of 8, protocolIdentifier (4)
+    message = _message((2, _template(300, (1, 4), (4, 1))), (300, struct.pack("!IB", 1500, 6) * 3))
+    [(template, decoded)] = decoder.decode_message("a", message)
+    assert decoded.dtype.itemsize == 5 and decoded["octetDeltaCount"].tolist() == [1500] * 3
+    decoder.decode_message("b", message)
+    assert decoder.template("a", 1, 300).layout is decoder.template("b", 1, 300).layout
+    assert compile_layout(((1, 4, 0), (4, 1, 0))) is template.layout
+    # Withdrawal
+    decoder.decode_message("a", _message((2, struct.pack("!HH", 300, 0))))
+    assert decoder.template("a", 1, 300) is None and decoder.template("b", 1, 300) is not None
+
+
+def test_variable_length_and_structured_data_fields():
+    decoder = ipfix_decoder()
+    templates = (_template(400, (8, 4), (12, 4))
+                 + _template(401, (4, 1), (82, VARIABLE_LENGTH), (292, VARIABLE_LENGTH), (291, VARIABLE_LENGTH)))
+    stl = struct.pack("!BH", LIST_ALL_OF, 400) + struct.pack("!II", 1, 2) + struct.pack("!II", 3, 4)
+    basic = struct.pack("!BHH", LIST_ALL_OF, 7, 2) + struct.pack("!HHH", 80, 443, 8080)
+    long_name = b"x" * 300
+    data = b"".join([
+        struct.pack("!B", 6), bytes([4]) + b"eth0", bytes([len(stl)]) + stl, bytes([len(basic)]) + basic,
+        struct.pack("!B", 17), b"\xff" + struct.pack("!H", 300) + long_name, b"\x00", b"\x00",
+    ])
+    [(_, records)] = decoder.decode_message("a", _message((2, templates), (401, data)))
+    assert records["protocolIdentifier"].tolist() == [6, 17]
+    assert records["ie82"].tolist() == [b"eth0", long_name]
+    first = records["subTemplateList"][0]
+    assert isinstance(first, SubTemplateList) and first.template_id == 400
+    assert first.records["sourceIPv4Address"].tolist() == [1, 3]
+    assert first.records["destinationIPv4Address"].tolist() == [2, 4]
+    ports = records["basicList"][0]
+    assert isinstance(ports, BasicList) and ports.element_id == 7 and ports.values.tolist() == [80, 443, 8080]
+    # Truncated variable-length field
+    assert decoder.decode_message("a", _message((401, data[:12]))) == []
+    assert decoder.stats()["malformed"] == 1
+
+
+def test_counter_decodes_the_batches():
+    records = flow_records(10)
+    message = _message((2, _template_record(FLOW_TEMPLATE_IPV4)), (256, records.tobytes()))
+    decoded = []
+    counter = message_counter(decoder=ipfix_decoder(), on_records=decoded.extend)
+    counter(IpfixMessageBatch(memoryview(message), [0], [len(message)], ["a"], "udp"))
+    stats = counter.stats()
+    assert stats["decoded_records"] == 10 and stats["data_sets"] == 1 and stats["templates"] == 1
+    [(exporter, domain, [(_, data)])] = decoded
+    assert exporter == "a" and domain == 1 and np.array_equal(data, records)
+    counter.forget("a")
+    assert counter.stats()["sessions"] == 0
@@ -0,0 +1,87 @@
+import sys, os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+import struct
+import numpy as np
+
+from pytest import raises
+
+from core.entities.ipfix_record import FLOW_TEMPLATE_IPV4, FLOW_TEMPLATE_IPV6
+from ports.output.exporter_buffer import exporterBuffer
+from adapters.infrastructure.ipfix.exporter.file_writer import ipfix_error
+
+
+def _read_messages(path: str) -> list[tuple[tuple, list[tuple[int, bytes]]]]:
+    data = open(path, "rb").read()
+    messages, offset = [], 0
+    while offset < len(data):
+        header = struct.unpack_from("!HHIII", data, offset)
+        sets, position = [], offset + 16
+        while position < offset + header[1]:
+            set_id, length = struct.unpack_from("!HH", data, position)
+            sets.append((set_id, data[position + 4:position + length]))
+            position += length
+        messages.append((header, sets))
+        offset += header[1]
+    return messages
+
+
+def _records(template, count: int) -> np.ndarray:
+    records = np.zeros(count, template.dtype)
+    records["packetDeltaCount"] = np.arange(count)
+    records["sourceTransportPort"] = np.arange(count) % 65536
+    return records
+
+
+def test_ipfix_file_packs_records_in_full_messages(tmp_path):
+    path = tmp_path / "out.ipfix"
+    v4, v6 = _records(FLOW_TEMPLATE_IPV4, 5000), _records(FLOW_TEMPLATE_IPV6, 10)
+    with exporterBuffer(str(path), observation_domain_id=7, buffer_size=65535) as writer:
+        writer.add_template(FLOW_TEMPLATE_IPV4)
+        writer.add_template(FLOW_TEMPLATE_IPV6)
+        writer.write(256, v4[:1234])
+        writer.write(256, v4[1234:])
+        writer.write(257, v6)
+
+    messages = _read_messages(str(path))
+    template_set = 4 + 4 + 4 * len(FLOW_TEMPLATE_IPV4.fields)
+    first_message = (65535 - 16 - template_set - 4) // FLOW_TEMPLATE_IPV4.record_length
+    assert all(header[0] == 10 and header[4] == 7 and header[1] <= 65535 for header, _ in messages)
+    assert [set_id for _, sets in messages for set_id, _ in sets].count(2) == 2
+    # Records of consecutive writes share one data set per message
+    assert all([set_id for set_id, _ in sets].count(256) == 1 for _, sets in messages)
+    # Sequence numbers count the data records of the previous messages
+    counts = [sum(len(body) // (FLOW_TEMPLATE_IPV4 if set_id == 256 else FLOW_TEMPLATE_IPV6).record_length
+                  for set_id, body in sets if set_id != 2) for _, sets in messages]
+    assert [header[3] for header, _ in messages] == list(np.cumsum([0] + counts[:-1]))
+    assert counts[0] == first_message
+    decoded = np.concatenate([np.frombuffer(body, FLOW_TEMPLATE_IPV4.dtype) for _, sets in messages for set_id, body in sets if set_id == 256])
+    assert (decoded == v4).all()
+    decoded = np.concatenate([np.frombuffer(body, FLOW_TEMPLATE_IPV6.dtype) for _, sets in messages for set_id, body in sets if set_id == 257])
+    assert (decoded == v6).all()
+
+
+def test_ipfix_file_template_refresh(tmp_path):
+    path = tmp_path / "refresh.ipfix"
+    with exporterBuffer(str(path), template_refresh=2, max_message=1024, buffer_size=4096) as writer:
+        writer.add_template(FLOW_TEMPLATE_IPV4)
+        writer.write(256, _records(FLOW_TEMPLATE_IPV4, 200))
+
+    messages = _read_messages(str(path))
+    assert len(messages) > 4
+    assert all(header[1] <= 1024 for header, _ in messages)
+    # Template set at the start of every other message
+    assert [sets[0][0] == 2 for _, sets in messages] == [i % 2 == 0 for i in range(len(messages))]
+
+
+def test_ipfix_file_rejects_records_not_in_wire_format(tmp_path):
+    records = _records(FLOW_TEMPLATE_IPV4, 10)
+    native = records.astype([(name, records.dtype[name].newbyteorder("=")) for name in records.dtype.names])
+    with exporterBuffer(str(tmp_path / "out.ipfix")) as writer:
+        writer.add_template(FLOW_TEMPLATE_IPV4)
+        # Same size, native byte order: would be written byte-swapped
+        with raises(ipfix_error):
+            writer.write(256, native)
+        with raises(ipfix_error):
+            writer.write(256, _records(FLOW_TEMPLATE_IPV6, 10))
+        assert writer.write(256, records) == 10
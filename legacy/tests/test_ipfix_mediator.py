@@ -0,0 +1,124 @@
+import sys, os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+import time
+import ipaddress
+
+import numpy as np
+
+from core.entities.ipfix_record import FLOW_TEMPLATE_IPV4, FLOW_TEMPLATE_IPV6
+from core.entities.ipfix_buffer import IpfixRecordBatch
+from core.data_domain.ipfix_decoder import ipfix_decoder, compiled_template
+from core.data_domain.ipfix_collector import frame_messages
+from core.data_domain.ipfix_mediator import field_filter, anonymizer, sampler, aggregator, mediator_stages
+from core.use_cases.mediator_exporter.mediator_pipeline import mediator_pipeline, exporter_sink
+from ports.output.exporter_buffer import exporterBuffer
+from adapters.infrastructure.ipfix.exporter.simulator import flow_records
+
+FIELDS = tuple((ie.element_id, ie.length, 0) for ie in FLOW_TEMPLATE_IPV4.fields)
+
+
+def _batch(records: np.ndarray, template=FLOW_TEMPLATE_IPV4) -> IpfixRecordBatch:
+    return IpfixRecordBatch(tuple((ie.element_id, ie.length, 0) for ie in template.fields), records.copy(),
+                            template.template_id)
+
+
+def test_filters_and_samplers_are_masks_over_the_batch():
+    records = flow_records(1000)
+    records["sourceIPv4Address"][:100] = int(ipaddress.ip_address("10.1.2.3"))
+    [kept] = field_filter([("protocolIdentifier", "==", "6"), ("sourceIPv4Address", "!=", "10.0.0.0/8")])(_batch(records))
+    expected = (records["protocolIdentifier"] == 6) & (records["sourceIPv4Address"] >> 24 != 10)
+    assert np.array_equal(kept.records, records[expected])
+    assert field_filter([("ie999", "==", 1)])(_batch(records)) == []
+    # Systematic sampling continued across batches
+    every = sampler(7)
+    kept = [batch.records for part in np.array_split(records, 5) for batch in every(_batch(part))]
+    assert np.array_equal(np.concatenate(kept), records[::7])
+
+
+def test_anonymization_truncates_or_pseudonymizes_addresses():
+    records = flow_records(500, FLOW_TEMPLATE_IPV6)
+    records["sourceIPv6Address"][:250] = records["sourceIPv6Address"][250:]
+    [truncated] = anonymizer(["sourceIPv6Address"], prefix_bits=48)(_batch(records, FLOW_TEMPLATE_IPV6))
+    raw = truncated.records["sourceIPv6Address"].tobytes()
+    assert all(raw[i + 6:i + 16] == bytes(10) for i in range(0, len(raw), 16))
+    assert np.array_equal(truncated.records["octetDeltaCount"], records["octetDeltaCount"])
+    [pseudonymized] = anonymizer(["sourceIPv6Address"], key=42)(_batch(records, FLOW_TEMPLATE_IPV6))
+    addresses = pseudonymized.records["sourceIPv6Address"]
+    # Same addresses map to the same pseudonym, distinct ones to distinct pseudonyms
+    assert np.array_equal(addresses[:250], addresses[250:])
+    assert len(np.unique(addresses)) == len(np.unique(records["sourceIPv6Address"]))
+    assert not np.array_equal(addresses, records["sourceIPv6Address"])
+
+
+def test_aggregation_by_key_over_batches():
+    records = flow_records(2000)
+    records["sourceIPv4Address"] = np.arange(2000) % 10
+    records["protocolIdentifier"] = np.arange(2000) % 2 + 6
+    stage = aggregator(["sourceIPv4Address", "protocolIdentifier"], interval=3600, template_id=300)
+    assert stage(_batch(records[:1500])) == [] and stage(_batch(records[1500:])) == []
+    [aggregated] = stage.flush(force=True)
+    assert len(aggregated) == 10 and aggregated.template_id == 300
+    assert aggregated.records["deltaFlowCount"].sum() == 2000
+    assert aggregated.records["octetDeltaCount"].sum() == records["octetDeltaCount"].astype(np.uint64).sum()
+    first = aggregated.records[aggregated.records["sourceIPv4Address"] == 3][0]
+    group = records[records["sourceIPv4Address"] == 3]
+    assert first["flowStartMilliseconds"] == group["flowStartMilliseconds"].min()
+    assert first["flowEndMilliseconds"] == group["flowEndMilliseconds"].max()
+    assert "tcpControlBits" not in aggregated.records.dtype.names
+
+
+def test_pipeline_exports_the_mediated_records(tmp_path):
+    path = str(tmp_path / "mediated.ipfix")
+    stages = mediator_stages("filter:protocolIdentifier==6; aggregate:sourceIPv4Address", aggregate_interval=3600)
+    pipeline = mediator_pipeline(stages + [exporter_sink(exporterBuffer(path))], batch_records=100)
+    template = compiled_template(256, FIELDS)
+    batches = [flow_records(250, seed=seed) for seed in range(4)]
+    for records in batches:
+        records["sourceIPv4Address"] %= 5
+        pipeline.submit([(("192.0.2.1", 4739), 1, [(template, records[:120]), (template, records[120:])])])
+    pipeline.close()
+    stats = pipeline.stats()
+    assert stats["submitted_records"] == 1000 and stats["dropped_records"] == 0
+    assert stats["stages"][0]["batches_in"] == 12
+    with open(path, "rb") as file:
+        data = file.read()
+    offsets, lengths, _ = frame_messages(data, 0, len(data))
+    decoder = ipfix_decoder()
+    exported = [records for offset, length in zip(offsets, lengths)
+                for _, records in decoder.decode_message("file", memoryview(data)[offset:offset + length])]
+    exported = np.concatenate(exported)
+    tcp = np.concatenate(batches)
+    tcp = tcp[tcp["protocolIdentifier"] == 6]
+    assert sorted(exported["sourceIPv4Address"].tolist()) == sorted(set(tcp["sourceIPv4Address"].tolist()))
+    assert exported["deltaFlowCount"].sum() == len(tcp)
+    assert exported["packetDeltaCount"].sum() == tcp["packetDeltaCount"].astype(np.uint64).sum()
+    # Records exported as they are, in wire byte order
+    decoded = [(template, batches[0])]
+    passthrough = str(tmp_path / "passthrough.ipfix")
+    pipeline = mediator_pipeline([exporter_sink(exporterBuffer(passthrough))])
+    pipeline.submit([(("192.0.2.1", 4739), 1, decoded)])
+    pipeline.close()
+    with open(passthrough, "rb") as file:
+        assert batches[0].tobytes() in file.read()
+
+
+def test_full_pipeline_drops_or_blocks_the_collector():
+    class slow:
+        def __call__(self, batch):
+            time.sleep(0.05)
+            return []
+
+    template = compiled_template(256, FIELDS)
+    decoded = [("exporter", 1, [(template, flow_records(10))])]
+    dropping = mediator_pipeline([slow()], queue_batches=1, on_full="drop")
+    for _ in range(10):
+        dropping.submit(decoded)
+    dropping.close()
+    assert dropping.stats()["dropped_batches"] > 0
+    blocking = mediator_pipeline([slow()], queue_batches=1, on_full="block", block_timeout=5)
+    for _ in range(5):
+        blocking.submit(decoded)
+    blocking.close()
+    stats = blocking.stats()
+    assert stats["blocked"] > 0 and stats["dropped_batches"] == 0 and stats["stages"][0]["records_in"] == 50
@@ -0,0 +1,130 @@
+import sys, os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+import struct
+import sqlite3
+
+import numpy as np
+import pytest
+
+from core.entities.ipfix_record import FLOW_TEMPLATE_IPV4
+from core.data_domain.ipfix_decoder import ipfix_decoder
+from core.data_domain.ipfix_templates import template_cache, exporter_name
+from ports.repositories.ipfix import templateStore
+from adapters.infrastructure.databases.key_value.redis.templates import redis_templates
+from core.use_cases.collector.collector_service import shared_templates
+from adapters.infrastructure.ipfix.exporter.file_writer import MESSAGE_HEADER, SET_HEADER, _template_record
+from adapters.infrastructure.ipfix.exporter.simulator import flow_records
+
+EXPORTER = ("192.0.2.1", 4739)
+
+
+def _message(*sets: tuple[int, bytes], domain: int = 1) -> bytes:
+    body = b"".join(SET_HEADER.pack(set_id, SET_HEADER.size + len(data)) + data for set_id, data in sets)
+    return MESSAGE_HEADER.pack(10, MESSAGE_HEADER.size + len(body), 0, 0, domain) + body
+
+
+def _pod(store) -> ipfix_decoder:
+    return ipfix_decoder(template_cache(store, sync_interval=0))
+
+
+def test_data_sets_decode_on_a_pod_that_never_saw_the_template(tmp_path):
+    store = templateStore("sqlite", str(tmp_path / "templates.sqlite"))
+    first, second = _pod(store), _pod(store)
+    records = flow_records(5)
+    data = _message((256, records.tobytes()))
+    # Unknown everywhere: one store lookup, then remembered as missing
+    assert second.decode_message(EXPORTER, data) == []
+    assert second.decode_message(EXPORTER, data) == []
+    first.decode_message(EXPORTER, _message((2, _template_record(FLOW_TEMPLATE_IPV4))))
+    [(_, decoded)] = second.decode_message(EXPORTER, data)
+    assert np.array_equal(decoded, records)
+    # Template refresh of a UDP exporter: no new version
+    first.decode_message(EXPORTER, _message((2, _template_record(FLOW_TEMPLATE_IPV4))))
+    assert first.templates.stats()["shared_writes"] == 1
+    assert store.get(exporter_name(EXPORTER), 1, 256)[0] == 1
+
+
+def test_withdrawals_and_redefinitions_invalidate_the_other_caches(tmp_path):
+    store = templateStore("sqlite", str(tmp_path / "templates.sqlite"))
+    first, second = _pod(store), _pod(store)
+    first.decode_message(EXPORTER, _message((2, _template_record(FLOW_TEMPLATE_IPV4))))
+    assert second.template(EXPORTER, 1, 256) is not None
+    # Template 256 redefined (2 fields) by the exporter
+    first.decode_message(EXPORTER, _message((2, struct.pack("!HHHHHH", 256, 2, 1, 4, 4, 1))))
+    [(_, decoded)] = second.decode_message(EXPORTER, _message((256, struct.pack("!IB", 1500, 6))))
+    assert decoded["octetDeltaCount"].tolist() == [1500]
+    # Every template of the session withdrawn
+    first.decode_message(EXPORTER, _message((2, struct.pack("!HH", 2, 0))))
+    assert second.decode_message(EXPORTER, _message((256, struct.pack("!IB", 1500, 6)))) == []
+    assert second.templates.stats()["invalidations"] == 2
+
+
+def test_prefetch_and_unavailable_store(tmp_path):
+    store = templateStore("sqlite", str(tmp_path / "templates.sqlite"))
+    first = _pod(store)
+    for domain in range(1, 4):
+        first.decode_message(EXPORTER, _message((2, _template_record(FLOW_TEMPLATE_IPV4)), domain=domain))
+    first.withdraw(EXPORTER, 3, 256)
+    starting = template_cache(store)
+    assert starting.prefetch() == 2 and len(starting) == 2
+    assert starting.get(EXPORTER, 2, 256).dtype == FLOW_TEMPLATE_IPV4.dtype
+
+    class unavailable:
+        def __getattr__(self, name):
+            def fail(*args):
+                raise ConnectionError("store down")
+            return fail
+
+    # Local decoding goes on without the store
+    alone = _pod(unavailable())
+    alone.decode_message(EXPORTER, _message((2, _template_record(FLOW_TEMPLATE_IPV4))))
+    assert len(alone.decode_message(EXPORTER, _message((256, flow_records(2).tobytes())))) == 1
+    assert alone.templates.stats()["store_errors"] > 0
+
+
+def test_closed_sessions_are_withdrawn_from_the_store(tmp_path):
+    store = templateStore("sqlite", str(tmp_path / "templates.sqlite"))
+    session, other = _pod(store), _pod(store)
+    for domain in (1, 2):
+        session.decode_message(EXPORTER, _message((2, _template_record(FLOW_TEMPLATE_IPV4)), domain=domain))
+    assert other.template(EXPORTER, 2, 256) is not None
+    # TCP session closed: its templates are dead everywhere, and not prefetched again
+    session.forget(EXPORTER)
+    assert other.template(EXPORTER, 2, 256) is None
+    assert store.load()[1] == [] and template_cache(store).prefetch() == 0
+
+
+def test_unusable_template_database(tmp_path, monkeypatch):
+    import core.use_cases.collector.collector_service as collector_service
+
+    def locked(*args):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(collector_service, "templateStore", locked)
+    # The collector starts without shared templates
+    assert shared_templates().stats()["templates"] == 0
+
+
+def test_redis_store_scripts():
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    store = redis_templates(client=fakeredis.FakeRedis())
+    first, second = _pod(store), _pod(store)
+    for domain in (1, 2):
+        first.decode_message(EXPORTER, _message((2, _template_record(FLOW_TEMPLATE_IPV4)), domain=domain))
+    name = exporter_name(EXPORTER)
+    assert store.get(name, 1, 256)[0] == 1 and store.get(name, 2, 256)[0] == 2
+    records = flow_records(3)
+    [(_, decoded)] = second.decode_message(EXPORTER, _message((256, records.tobytes()), domain=2))
+    assert np.array_equal(decoded, records)
+    # One template withdrawn, then the session closed: changes carry the withdrawals
+    first.withdraw(EXPORTER, 1, 256)
+    assert store.get(name, 1, 256) is None
+    generation, changes = store.changes(2)
+    assert generation == 3 and changes == [(name, 1, 256, 3, None)]
+    first.forget(EXPORTER)
+    generation, changes = store.changes(3)
+    assert generation == 5 and changes == [(name, 2, 256, 5, None)]
+    assert second.decode_message(EXPORTER, _message((256, records.tobytes()), domain=2)) == []
+    assert store.load() == (5, [])
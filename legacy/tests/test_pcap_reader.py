@@ -0,0 +1,102 @@
+import sys, os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+import struct
+from pytest import fixture, raises
+
+from adapters.infrastructure.pcap.data_access import pcap_error
+from ports.repositories.pcap import pcapReader
+
+PACKETS = [(1700000000.25, b"\x00" * 60), (1700000001.5, b"\x01" * 1514), (1700000002.0, b"\x02" * 42)]
+
+
+def _pcap_bytes(order: str = "<") -> bytes:
+    out = struct.pack(order + "IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, 1)
+    for ts, data in PACKETS:
+        out += struct.pack(order + "IIII", int(ts), round(ts % 1 * 1e6), len(data), len(data)) + data
+    return out
+
+
+def _block(block_type: int, body: bytes, order: str = "<") -> bytes:
+    body += b"\x00" * (-len(body) % 4)
+    return struct.pack(order + "II", block_type, len(body) + 12) + body + struct.pack(order + "I", len(body) + 12)
+
+
+def _pcapng_bytes(order: str = "<") -> bytes:
+    block = lambda block_type, body: _block(block_type, body, order)
+    out = block(0x0A0D0D0A, struct.pack(order + "IHHq", 0x1A2B3C4D, 1, 0, -1))
+    # if_tsresol = 9 (nanoseconds), then opt_endofopt
+    out += block(1, struct.pack(order + "HHI", 1, 0, 262144) + struct.pack(order + "HHB3x", 9, 1, 9)
+                 + struct.pack(order + "HH", 0, 0))
+    for ts, data in PACKETS:
+        ts_ns = round(ts * 1e9)
+        out += block(6, struct.pack(order + "IIIII", 0, ts_ns >> 32, ts_ns & 0xFFFFFFFF, len(data), len(data)) + data)
+    return out
+
+
+@fixture(params=["pcap", "pcap_big_endian", "pcapng", "pcapng_big_endian"])
+def capture(request, tmp_path):
+    path = tmp_path / f"capture.{request.param}"
+    order = ">" if request.param.endswith("big_endian") else "<"
+    path.write_bytes(_pcapng_bytes(order) if request.param.startswith("pcapng") else _pcap_bytes(order))
+    return str(path)
+
+
+def test_pcap_reader_streams_packets(capture):
+    with pcapReader(capture) as reader:
+        info = reader.info()
+        packets = [(p.timestamp, p.caplen, bytes(p.data), p.link_type) for p in reader.packets()]
+
+    assert info.interfaces[0].link_type == 1
+    assert len(packets) == len(PACKETS)
+    for (ts, caplen, data, link_type), (expected_ts, expected_data) in zip(packets, PACKETS):
+        assert abs(ts - expected_ts) < 1e-6
+        assert caplen == len(expected_data)
+        assert data == expected_data
+
+
+def test_pcap_reader_offset_range(capture):
+    with pcapReader(capture) as reader:
+        offsets = [p.offset for p in reader.packets()]
+        tail = [p.offset for p in reader.packets(start=offsets[1])]
+        head = [p.offset for p in reader.packets(end=offsets[2])]
+
+    assert tail == offsets[1:]
+    assert head == offsets[:2]
+
+
+def test_pcap_reader_zero_copy_and_truncation(tmp_path):
+    path = tmp_path / "truncated.pcap"
+    path.write_bytes(_pcap_bytes()[:-10])
+    reader = pcapReader(str(path))
+    packets = list(reader.packets())
+
+    assert isinstance(packets[0].data, memoryview)
+    assert len(packets) == len(PACKETS) - 1
+    reader.close()
+
+
+def test_pcap_reader_unknown_format(tmp_path):
+    path = tmp_path / "not_a_capture.pcap"
+    path.write_bytes(b"GARBAGE" * 10)
+
+    with raises(pcap_error):
+        pcapReader(str(path))
+
+
+def test_pcapng_reader_skips_unknown_interfaces_and_dates_simple_packets(tmp_path):
+    data = b"\x03" * 60
+    spb = _block(3, struct.pack("<I", len(data)) + data)
+    content = _pcapng_bytes()
+    # Simple packet before any timestamp, enhanced packet of an undescribed interface
+    first_packet = content.index(struct.pack("<I", 6))
+    content = content[:first_packet] + spb + _block(6, struct.pack("<IIIII", 7, 0, 0, 60, 60) + data) \
+        + content[first_packet:] + spb
+    path = tmp_path / "malformed.pcapng"
+    path.write_bytes(content)
+    with pcapReader(str(path)) as reader:
+        packets = [(p.timestamp, bytes(p.data)) for p in reader.packets()]
+
+    assert len(packets) == len(PACKETS) + 1
+    # The trailing simple packet takes the time of the packet before it
+    assert packets[-1][1] == data and abs(packets[-1][0] - PACKETS[-1][0]) < 1e-6
@@ -0,0 +1,140 @@
+import sys, os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+import uuid
+import platform
+import threading
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from core.entities.ipfix_record import FLOW_TEMPLATE_IPV4
+from core.entities.ipfix_buffer import IpfixRecordBatch
+from core.data_domain.ipfix_decoder import ipfix_decoder, compiled_template
+from core.data_domain.ipfix_collector import frame_messages
+from core.use_cases.mediator_exporter.mediator_pipeline import (
+    mediator_pipeline, exporter_sink, consume_rings, ring_writer,
+)
+from ports.output.record_ring import recordRing
+from ports.output.exporter_buffer import exporterBuffer
+from adapters.infrastructure.ipfix.exporter.simulator import flow_records
+
+FIELDS = tuple((ie.element_id, ie.length, 0) for ie in FLOW_TEMPLATE_IPV4.fields)
+
+
+def _name() -> str:
+    return f"ipyfix-test-{uuid.uuid4().hex[:12]}"
+
+
+def _produce(name: str, batches: int, records: int) -> None:
+    ring = recordRing(name, on_full="block", block_timeout=30)
+    # Entries of at most 300 records: 2 per collector batch
+    writer, template = ring_writer(ring, batch_records=300), compiled_template(256, FIELDS)
+    for seed in range(batches):
+        parts = np.array_split(flow_records(records, seed=seed), 3)
+        writer([(("192.0.2.1", 4739), seed, [(template, part) for part in parts])])
+    ring.close()
+
+
+def test_batches_round_trip_across_the_ring_end():
+    ring = recordRing(_name(), create=True, capacity=64 * 1024)
+    try:
+        consumer = recordRing(ring.name)
+        assert ring.capacity == consumer.capacity == 64 * 1024
+        # About 9 KiB per batch: the ring wraps several times
+        for seed in range(40):
+            records = flow_records(200, seed=seed)
+            assert ring.put(IpfixRecordBatch(FIELDS, [records[:50], records[50:]], 256, seed))
+            batch = consumer.get(timeout=1)
+            assert batch.fields == FIELDS and batch.template_id == 256 and batch.domain == seed
+            assert len(batch) == 200 and np.array_equal(batch.records, records)
+            consumer.release()
+        del batch
+        assert consumer.get(timeout=0) is None
+        stats = ring.stats()
+        assert stats["put_batches"] == stats["got_batches"] == 40 and stats["used_bytes"] == 0
+        consumer.close()
+    finally:
+        ring.close(unlink=True)
+
+
+def test_no_ring_without_ordered_stores(monkeypatch):
+    # Lock-free indexes: a ring on a weakly ordered machine would race silently
+    monkeypatch.setattr(platform, "machine", lambda: "aarch64")
+    with pytest.raises(ValueError, match="aarch64"):
+        recordRing(_name(), create=True)
+    with pytest.raises(ValueError, match="aarch64"):
+        recordRing(_name())
+
+
+def test_full_ring_drops_and_counts_overruns():
+    ring = recordRing(_name(), create=True, capacity=16 * 1024, on_full="drop")
+    try:
+        records = flow_records(100)
+        accepted = sum(ring.put(IpfixRecordBatch(FIELDS, records, 256)) for _ in range(10))
+        stats = ring.stats()
+        assert 0 < accepted < 10 and stats["dropped_batches"] == 10 - accepted
+        assert stats["dropped_records"] == 100 * (10 - accepted)
+        assert stats["high_water_bytes"] == stats["used_bytes"] and stats["fill"] > 0.5
+        # Over half the ring, or variable-length records: never written
+        assert not ring.put(IpfixRecordBatch(FIELDS, flow_records(400), 256))
+        assert not ring.put(IpfixRecordBatch(((82, 65535, 0),), np.array([b"eth0"], dtype=object), 257))
+        assert ring.stats()["oversized"] == 2
+    finally:
+        ring.close(unlink=True)
+
+
+class _closing_ring:
+    """Ring whose producer writes its last batch and closes it between the consumer's
+    empty get() and its stats()"""
+    def __init__(self, batch: IpfixRecordBatch) -> None:
+        self._batches = [None, batch]
+        self.released = 0
+
+    def get(self, timeout=None):
+        return self._batches.pop(0) if self._batches else None
+
+    def release(self) -> None:
+        self.released += 1
+
+    def stats(self) -> dict:
+        return {"closed": len(self._batches) < 2}
+
+
+def test_consumer_drains_a_ring_closed_after_an_empty_get():
+    ring = _closing_ring(IpfixRecordBatch(FIELDS, flow_records(100), 256))
+    received = []
+    pipeline = mediator_pipeline([lambda batch: received.append(len(batch))])
+    assert consume_rings([ring], pipeline, threading.Event()) == 100
+    pipeline.close()
+    assert received == [100] and ring.released == 1
+
+
+def test_mediator_process_drains_the_rings_of_the_collectors(tmp_path):
+    path = str(tmp_path / "mediated.ipfix")
+    rings = [recordRing(_name(), create=True, capacity=256 * 1024) for _ in range(2)]
+    producers = [multiprocessing.get_context("spawn").Process(target=_produce, args=(ring.name, 20, 500))
+                 for ring in rings]
+    try:
+        for producer in producers:
+            producer.start()
+        pipeline = mediator_pipeline([exporter_sink(exporterBuffer(path))], batch_records=1000)
+        # Returns once both producers closed their ring and it is drained
+        consumed = consume_rings(rings, pipeline, threading.Event())
+        pipeline.close()
+        for producer in producers:
+            producer.join(30)
+        assert consumed == 2 * 20 * 500 and pipeline.stats()["dropped_records"] == 0
+        assert all(ring.stats()["closed"] and ring.stats()["got_batches"] == 40 for ring in rings)
+    finally:
+        for ring in rings:
+            ring.close(unlink=True)
+    with open(path, "rb") as file:
+        data = file.read()
+    offsets, lengths, _ = frame_messages(data, 0, len(data))
+    decoder = ipfix_decoder()
+    exported = np.concatenate([records for offset, length in zip(offsets, lengths)
+                               for _, records in decoder.decode_message("file", memoryview(data)[offset:offset + length])])
+    expected = np.concatenate([flow_records(500, seed=seed) for seed in range(20)] * 2)
+    assert np.array_equal(np.sort(exported["octetDeltaCount"]), np.sort(expected["octetDeltaCount"]))
@@ -0,0 +1,75 @@
+import sys, os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+import asyncio
+import shutil
+
+from adapters.infrastructure.databases.time_series.rrdtool import meta_index as index_module
+from adapters.infrastructure.databases.time_series.rrdtool.meta_index import rrd_meta_index
+
+SAMPLES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "samples", "tenant_test", "rrdtool")
+SERVICE_UUID = "1164a4ac-1415-4316-a455-1f8d650348b2"
+
+
+def test_rrd_meta_index_lookup_and_parsing(tmp_path):
+    shutil.copytree(SAMPLES, tmp_path / "tenant")
+    index = rrd_meta_index(str(tmp_path / "tenant"))
+    index.refresh()
+
+    instance = asyncio.run(index.lookup(SERVICE_UUID))
+    assert instance["instance_dir"].startswith(str(tmp_path / "tenant"))
+    first = instance["measurements"][0]
+    assert first["rrd_id"] == "714db67f8406f33e6dc69e8eff9f343e"
+    assert first["uuid"] == "3fdb16a0-00db-51eb-b9ec-7d8aebd5243a"
+    assert first["tags"] == ["HTTPS"]
+    assert first["fields"] == {"FlowsFile": "34", "REC": "54", "server_ip": "10.1.96.15", "client_ip": "192.168.1.148"}
+
+    asyncio.run(index.lookup(SERVICE_UUID))
+    assert asyncio.run(index.lookup("00000000-0000-0000-0000-000000000000")) is None
+    stats = index.stats()
+    assert (stats["hits"], stats["misses"], stats["reloads"]) == (2, 1, 2)
+
+
+def test_rrd_meta_index_incremental_updates(tmp_path, monkeypatch):
+    monkeypatch.setattr(index_module, "RESCAN_INTERVAL", 0)
+    tenant = tmp_path / "tenant"
+    shutil.copytree(SAMPLES, tenant)
+    index = rrd_meta_index(str(tenant))
+    index.refresh()
+
+    new_instance = tenant / "0123456789abcdef0123456789abcdef"
+    new_instance.mkdir()
+    (new_instance / "rrd_meta").write_text("service_uuid:11111111-2222-3333-4444-555555555555\n")
+    assert asyncio.run(index.lookup("11111111-2222-3333-4444-555555555555"))["measurements"] == []
+
+    # Modified rrd_meta: only that file is read again
+    instance = asyncio.run(index.lookup(SERVICE_UUID))
+    meta = os.path.join(instance["instance_dir"], "rrd_meta")
+    with open(meta) as f:
+        lines = f.readlines()
+    with open(meta, "w") as f:
+        f.writelines(lines[:2])
+    os.utime(meta, ns=(0, 0))
+    reloads = index.stats()["reloads"]
+    assert len(asyncio.run(index.lookup(SERVICE_UUID))["measurements"]) == 1
+    assert index.stats()["reloads"] == reloads + 1
+
+    shutil.rmtree(new_instance)
+    assert asyncio.run(index.lookup("11111111-2222-3333-4444-555555555555")) is None
+
+
+def test_parse_rrd_info_single_pass():
+    from adapters.infrastructure.databases.time_series.rrdtool.rrd_info import parse_rrd_info
+    info = {
+        "filename": "x.rrd", "step": 1, "last_update": 1700000000,
+        "ds[bytes].index": 0, "ds[bytes].type": "GAUGE", "ds[bytes].minimal_heartbeat": 2, "ds[bytes].min": None,
+        "ds[flows].index": 1, "ds[flows].type": "COUNTER", "ds[flows].minimal_heartbeat": 2, "ds[flows].last_ds": "U",
+        "rra[0].cf": "AVERAGE", "rra[0].rows": 7200, "rra[0].cur_row": 7084, "rra[0].pdp_per_row": 1, "rra[0].xff": 0.5,
+        "rra[0].cdp_prep[0].value": None, "rra[0].cdp_prep[0].unknown_datapoints": 0,
+        "rra[1].cf": "MAX", "rra[1].rows": 100, "rra[1].cur_row": 3, "rra[1].pdp_per_row": 60, "rra[1].xff": 0.5,
+    }
+
+    assert parse_rrd_info(info) == (
+        ("bytes", "GAUGE", 2), ("flows", "COUNTER", 2),
+        ("AVERAGE", 7200, 7084, 1, 0.5), ("MAX", 100, 3, 60, 0.5),
+    )
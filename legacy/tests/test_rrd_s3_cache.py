@@ -0,0 +1,64 @@
+import sys, os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+import asyncio
+import pytest
+
+boto3 = pytest.importorskip("boto3")
+moto = pytest.importorskip("moto")
+
+from adapters.infrastructure.databases.time_series.rrdtool.s3_cache import s3_block_cache, s3_meta_index
+
+BUCKET = "ipyfix-test"
+SERVICE_UUID = "3fdb16a0-00db-51eb-b9ec-7d8aebd5243a"
+
+
+@pytest.fixture
+def client():
+    with moto.mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+def _cache(client, cache_dir, **options) -> s3_block_cache:
+    return s3_block_cache(bucket=BUCKET, cache_dir=str(cache_dir), client=client, **options)
+
+
+def test_ranged_download_cached_per_etag(client, tmp_path):
+    data = os.urandom(300_000)
+    client.put_object(Bucket=BUCKET, Key="t/i1/a.rrd", Body=data)
+    cache = _cache(client, tmp_path, part_bytes=64 * 1024, revalidate_interval=0)
+    path = cache.get("t/i1/a.rrd")
+    assert open(path, "rb").read() == data
+    # Unchanged: revalidated (HEAD), not downloaded again, also by a new cache over the same directory
+    assert cache.get("t/i1/a.rrd") == path
+    assert _cache(client, tmp_path, revalidate_interval=0).get("t/i1/a.rrd") == path
+    assert (cache.stats()["downloads"], cache.stats()["revalidated"]) == (1, 1)
+    # Changed: new copy, the stale one removed
+    client.put_object(Bucket=BUCKET, Key="t/i1/a.rrd", Body=b"v2")
+    new_path = cache.get("t/i1/a.rrd")
+    assert new_path != path and open(new_path, "rb").read() == b"v2" and not os.path.exists(path)
+
+
+def test_lru_eviction_by_size(client, tmp_path):
+    for name in "abc":
+        client.put_object(Bucket=BUCKET, Key=f"t/i1/{name}.rrd", Body=name.encode() * 1000)
+    cache = _cache(client, tmp_path, max_bytes=2500)
+    a, b = asyncio.run(cache.get_many(["t/i1/a.rrd", "t/i1/b.rrd"]))
+    cache.get("t/i1/a.rrd")
+    cache.get("t/i1/c.rrd")
+    assert os.path.exists(a) and not os.path.exists(b)
+    assert cache.stats()["bytes"] == 2000 and cache.stats()["evictions"] == 1
+
+
+def test_instances_indexed_from_rrd_meta(client, tmp_path):
+    meta = f"service_uuid:{SERVICE_UUID}\nrdd_id:m1,measurement_uuid:u1,flows,proto:tcp\n"
+    client.put_object(Bucket=BUCKET, Key="tenant/i1/rrd_meta", Body=meta.encode())
+    client.put_object(Bucket=BUCKET, Key="tenant/i1/m1.rrd", Body=b"rrd")
+    client.put_object(Bucket=BUCKET, Key="tenant/i1/nested/rrd_meta", Body=b"service_uuid:other\n")
+    index = s3_meta_index("tenant/", _cache(client, tmp_path))
+    instance = asyncio.run(index.lookup(SERVICE_UUID))
+    assert instance["instance_dir"] == "tenant/i1/"
+    assert instance["measurements"][0]["uuid"] == "u1"
+    assert asyncio.run(index.lookup("other")) is None
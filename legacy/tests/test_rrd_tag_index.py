@@ -0,0 +1,67 @@
+import sys, os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+import asyncio
+import shutil
+import pytest
+
+from adapters.infrastructure.databases.time_series.rrdtool import meta_index as index_module
+from adapters.infrastructure.databases.time_series.rrdtool.meta_index import rrd_meta_index
+from adapters.infrastructure.databases.time_series.rrdtool.tag_index import measurement_tag_index
+
+SAMPLES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "samples", "tenant_test", "rrdtool")
+
+
+def _instance(service_uuid: str, *lines: tuple[str, list[str], dict]) -> dict:
+    return {"service_uuid": service_uuid,
+            "measurements": [{"uuid": uuid, "tags": tags, "fields": fields} for uuid, tags, fields in lines]}
+
+
+def _uuids(results: list[dict]) -> list[str]:
+    return [result["uuid"] for result in results]
+
+
+def test_tag_field_and_prefix_search():
+    index = measurement_tag_index()
+    first = _instance("s1", ("m1", ["SSH"], {"server_ip": "10.1.32.4"}), ("m2", ["SSH"], {"server_ip": "10.1.33.4"}),
+                      ("m3", ["HTTPS"], {"server_ip": "10.1.32.200", "client_ip": "2001:db8::1"}))
+    second = _instance("s2", ("m4", ["SSH"], {"server_ip": "10.1.32.4"}))
+    index.add_instance(first)
+    index.add_instance(second)
+    assert _uuids(index.search(["SSH", "server_ip:10.1.32.0/24"])) == ["m1", "m4"]
+    assert _uuids(index.search(["server_ip:10.1.32.0/24"])) == ["m1", "m3", "m4"]
+    assert _uuids(index.search(["server_ip:10.1.32.4"])) == ["m1", "m4"]
+    assert _uuids(index.search(["client_ip:2001:db8::/32"])) == ["m3"]
+    assert index.search(["SSH", "HTTPS"]) == []
+    assert len(index.search([])) == 4 and _uuids(index.search([], limit=1)) == ["m1"]
+    index.remove_instance(second)
+    assert _uuids(index.search(["server_ip:10.1.32.4/32"])) == ["m1"]
+    index.remove_instance(first)
+    assert index.search([]) == [] and index.search(["server_ip:0.0.0.0/0"]) == []
+    with pytest.raises(ValueError):
+        index.search(["server_ip:10.1.32.0/99"])
+
+
+def test_tag_index_follows_rrd_meta_changes(tmp_path, monkeypatch):
+    monkeypatch.setattr(index_module, "RESCAN_INTERVAL", 0)
+    tenant = tmp_path / "tenant"
+    shutil.copytree(SAMPLES, tenant)
+    index = rrd_meta_index(str(tenant))
+    index.refresh()
+    ssh = asyncio.run(index.search(["SSH", "server_ip:10.1.32.0/24"]))
+    assert _uuids(ssh) == ["9a8589cb-724e-5102-b9b8-d57783637a70"]
+    assert ssh[0]["fields"]["client_ip"] == "172.16.0.25"
+
+    new_instance = tenant / "0123456789abcdef0123456789abcdef"
+    new_instance.mkdir()
+    (new_instance / "rrd_meta").write_text("service_uuid:11111111-2222-3333-4444-555555555555\n"
+                                           "rdd_id:abc,measurement_uuid:m-new,SSH,server_ip:10.1.32.9\n")
+    assert len(asyncio.run(index.search(["SSH", "server_ip:10.1.32.0/24"]))) == 2
+    ipv6_instance = tenant / "fedcba9876543210fedcba9876543210"
+    ipv6_instance.mkdir()
+    (ipv6_instance / "rrd_meta").write_text("service_uuid:66666666-7777-8888-9999-000000000000\n"
+                                            "rdd_id:def,measurement_uuid:m-v6,SSH,server_ip:2001:db8:0:1::15\n")
+    ipv6 = asyncio.run(index.search(["SSH", "server_ip:2001:db8::/32"]))
+    assert _uuids(ipv6) == ["m-v6"] and ipv6[0]["fields"]["server_ip"] == "2001:db8:0:1::15"
+    shutil.rmtree(new_instance)
+    assert len(asyncio.run(index.search(["SSH", "server_ip:10.1.32.0/24"]))) == 1
@@ -0,0 +1,64 @@
+import sys, os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+import threading
+import pytest
+
+from adapters.infrastructure.databases.time_series.rrdtool.update_buffer import rrd_update_buffer, update_args
+
+
+class _Writer:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, path, args):
+        self.calls.append((path, args))
+
+
+def test_update_args():
+    args = update_args({120: {"in": 2.0}, 60: {"in": 1.5, "out": float("nan")}}, daemon="unix:/run/rrdcached.sock")
+    assert args == ["--daemon", "unix:/run/rrdcached.sock", "--template", "in:out", "60:1.5:U", "120:2:U"]
+
+
+def test_samples_coalesced_per_file_and_timestamp():
+    writer = _Writer()
+    buffer = rrd_update_buffer(max_pending=100, flush_interval=3600, writer=writer)
+    for _ in range(3):
+        assert buffer.add("a.rrd", 60, {"flows": 1, "octets": 100})
+    assert buffer.add("a.rrd", 120, {"flows": 1})
+    assert buffer.add("b.rrd", 60, {"flows": 5})
+    buffer.flush()
+    assert sorted(writer.calls) == [
+        ("a.rrd", ["--template", "flows:octets", "60:3:300", "120:1:U"]),
+        ("b.rrd", ["--template", "flows", "60:5"]),
+    ]
+    # Not newer than the last written update of the file
+    assert not buffer.add("a.rrd", 120, {"flows": 1})
+    stats = buffer.stats()
+    assert (stats["accepted"], stats["coalesced"], stats["dropped_late"]) == (3, 2, 1)
+    assert (stats["update_calls"], stats["samples_written"], stats["pending"]) == (2, 3, 0)
+    buffer.close()
+
+
+def test_full_buffer_drops_or_blocks():
+    writer = _Writer()
+    buffer = rrd_update_buffer(max_pending=4, flush_interval=3600, writer=writer)
+    # Half full: the flush thread is woken up, stop it from emptying the buffer for this test
+    with buffer._flush_lock:
+        for timestamp in range(1, 5):
+            buffer.add("a.rrd", timestamp, {"flows": 1})
+        assert buffer.full()
+        assert not buffer.add("a.rrd", 5, {"flows": 1})
+        # Coalesced samples take no room
+        assert buffer.add("a.rrd", 4, {"flows": 1})
+        assert not buffer.add("a.rrd", 6, {"flows": 1}, block=True, timeout=0.05)
+        assert buffer.stats()["dropped_full"] == 2
+        blocked = threading.Thread(target=lambda: results.append(buffer.add("a.rrd", 7, {"flows": 1}, block=True, timeout=10)))
+        results = []
+        blocked.start()
+    blocked.join(10)
+    assert results == [True]
+    buffer.close()
+    assert sum(len(args) - 2 for _, args in writer.calls) == 5
+    with pytest.raises(ValueError):
+        buffer.add("a.rrd", 8, {"flows": 1})
@@ -0,0 +1,40 @@
+import sys, os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+import numpy as np
+import pytest
+
+from core.data_domain.time_series_aggregation import align, aggregate
+
+
+def _series(step: int, first: int, values: list[float], name: str = "flows", **extra) -> dict:
+    return {"step": step, "timestamps": first + step * np.arange(len(values), dtype=np.int64),
+            "columns": {name: np.array(values, dtype=np.float64)}, **extra}
+
+
+def test_align_on_largest_step():
+    timestamps, names, values = align([_series(60, 60, [1, 3, 5, 7]), _series(120, 120, [10, np.nan]),
+                                       _series(60, 60, [2], name="octets")])
+    assert timestamps.tolist() == [120, 240]
+    assert names == ["flows", "octets"]
+    # Finer rows averaged into the common step (rows labeled with the end of their step)
+    assert values[0, :, 0].tolist() == [2, 6]
+    assert values[1, 0, 0] == 10 and np.isnan(values[1, 1, 0])
+    assert values[2, 0, 1] == 2 and np.isnan(values[2, :, 0]).all()
+
+
+def test_sum_and_avg_ignore_unknown_values():
+    series = [_series(60, 60, [1, np.nan, np.nan]), _series(60, 60, [3, 4, np.nan])]
+    (merged,) = aggregate(series, "sum")
+    assert merged["members"] == 2 and merged["timestamps"].tolist() == [60, 120, 180]
+    assert merged["columns"]["flows"][:2].tolist() == [4, 4] and np.isnan(merged["columns"]["flows"][2])
+    assert aggregate(series, "avg")[0]["columns"]["flows"][:2].tolist() == [2, 4]
+
+
+def test_top_series_by_total():
+    series = [_series(60, 60, [1, 1], uuid="a"), _series(60, 60, [5, np.nan], uuid="b"), _series(60, 60, [2, 2], uuid="c")]
+    assert [item["uuid"] for item in aggregate(series, "top", top=2)] == ["b", "c"]
+    with pytest.raises(ValueError):
+        aggregate(series, "top", by="octets")
+    with pytest.raises(ValueError):
+        aggregate(series, "median")
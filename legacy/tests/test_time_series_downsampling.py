@@ -0,0 +1,38 @@
+import sys, os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+import numpy as np
+
+from core.data_domain.time_series_downsampling import downsample
+
+
+def _week_of_minutes():
+    timestamps = 1_700_000_000 + 60 * np.arange(1, 7 * 24 * 60 + 1, dtype=np.int64)
+    flows = np.sin(np.arange(len(timestamps)) / 200.0)
+    flows[5000] = 40.0
+    flows[7000:7100] = np.nan
+    octets = 1000 * np.cos(np.arange(len(timestamps)) / 50.0)
+    return timestamps, {"flows": flows, "octets": octets}
+
+
+def test_lttb_keeps_shape_and_spikes():
+    timestamps, columns = _week_of_minutes()
+    reduced_ts, reduced = downsample(timestamps, columns, 500, "lttb")
+
+    assert len(reduced_ts) == 500 and all(len(column) == 500 for column in reduced.values())
+    assert reduced_ts[0] == timestamps[0] and reduced_ts[-1] == timestamps[-1]
+    assert (np.diff(reduced_ts) > 0).all()
+    assert np.nanmax(reduced["flows"]) == 40.0
+    assert set(reduced_ts) <= set(timestamps)
+
+
+def test_min_max_keeps_every_bucket_extreme():
+    timestamps, columns = _week_of_minutes()
+    reduced_ts, reduced = downsample(timestamps, columns, 400, "minmax")
+
+    assert len(reduced_ts) <= 400
+    assert np.nanmax(reduced["flows"]) == 40.0
+    assert reduced["octets"].min() == columns["octets"].min() and reduced["octets"].max() == columns["octets"].max()
+    # Nothing to reduce
+    short_ts, short = downsample(timestamps[:10], {"flows": columns["flows"][:10]}, 400)
+    assert len(short_ts) == 10 and len(short["flows"]) == 10
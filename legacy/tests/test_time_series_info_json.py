@@ -0,0 +1,42 @@
+import sys, os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+import json
+
+from core.entities.time_series import Instance
+from core.use_cases.analyses.time_series_business import info_json_cache
+
+TS_UUID = "1164a4ac-1415-4316-a455-1f8d650348b2"
+
+
+def _info(version: tuple, rows: int = 7200) -> dict:
+    return {
+        "tenant_uuid": "73861fb6-feb7-5bf2-a6ce-8fee04d1919b", "ts_uuid": TS_UUID,
+        "ts_backend": "rrdtool-local-file-system", "version": version,
+        "measurements_list": ["3fdb16a0-00db-51eb-b9ec-7d8aebd5243a"],
+        "measurements": [{
+            "uuid": "3fdb16a0-00db-51eb-b9ec-7d8aebd5243a", "tags": ["HTTPS"],
+            "fields": {"REC": "54", "server_ip": "10.1.96.15"},
+            "data_sources_info": [("flows", "GAUGE", 600), ("AVERAGE", rows, 7084, 1, 0.5)],
+        }],
+    }
+
+
+def test_info_serialized_once_per_version():
+    cache = info_json_cache()
+    body = cache.get(TS_UUID, _info(("rrd", 1)))
+    assert json.loads(body) == Instance(**_info(("rrd", 1))).model_dump(mode="json")
+    assert json.loads(body)["measurements"][0]["fields"] == {"REC": 54, "server_ip": "10.1.96.15"}
+    assert cache.get(TS_UUID, _info(("rrd", 1))) is body
+    # Changed instance files: validated and serialized again
+    changed = cache.get(TS_UUID, _info(("rrd", 2), rows=100))
+    assert json.loads(changed)["measurements"][0]["data_sources_info"][1][1] == 100
+    assert cache.stats() == {"hits": 1, "misses": 2, "entries": 1, "max_entries": cache.stats()["max_entries"]}
+
+
+def test_info_cache_lru():
+    cache = info_json_cache(max_entries=1)
+    cache.get("a", _info(("rrd", 1)))
+    cache.get("b", _info(("rrd", 1)))
+    cache.get("a", _info(("rrd", 1)))
+    assert cache.stats()["misses"] == 3 and cache.stats()["entries"] == 1
@@ -0,0 +1,104 @@
+import sys, os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+import asyncio
+
+import numpy as np
+import pytest
+
+from core.data_domain.time_series_rollups import rollup_buckets, plan_tier
+from adapters.infrastructure.databases.relational.sqlite.rollups import sqlite_rollups
+import core.use_cases.analyses.time_series_rollups as rollups_module
+import core.use_cases.analyses.time_series_business as business_module
+
+HOUR, DAY = 3600, 86400
+
+
+def test_rollup_buckets_match_numpy():
+    rng = np.random.default_rng(7)
+    timestamps = np.arange(300, 2 * DAY + 300, 300, dtype=np.int64)
+    values = rng.random(len(timestamps)) * 100
+    values[::7] = np.nan
+    buckets = rollup_buckets(timestamps, 300, {"octets": values}, HOUR, since=HOUR, until=DAY)["octets"]
+    assert buckets["ts"].tolist() == list(range(HOUR, DAY, HOUR))
+    for i, start in enumerate(buckets["ts"].tolist()):
+        rows = values[(timestamps > start) & (timestamps <= start + HOUR)]
+        rows = rows[~np.isnan(rows)]
+        assert buckets["count"][i] == len(rows)
+        assert buckets["sum"][i] == pytest.approx(rows.sum())
+        assert buckets["max"][i] == rows.max()
+        assert buckets["p95"][i] == pytest.approx(np.percentile(rows, 95))
+    # Rows coarser than the tier are left out
+    assert rollup_buckets(timestamps, DAY, {"octets": values}, HOUR) == {}
+
+
+def test_plan_tier_picks_coarsest_satisfying_tier():
+    tiers = [HOUR, DAY]
+    assert plan_tier(tiers, 0, 365 * DAY, points=365) == DAY
+    assert plan_tier(tiers, 0, 7 * DAY, points=168) == HOUR
+    assert plan_tier(tiers, 0, 7 * DAY, resolution=2 * HOUR) == HOUR
+    assert plan_tier(tiers, 0, DAY, points=1440) is None
+    assert plan_tier(tiers, 0, DAY) == HOUR
+
+
+def test_sqlite_store_roundtrip(tmp_path):
+    store = sqlite_rollups(str(tmp_path / "rollups.sqlite"))
+    buckets = {"ts": np.array([0, HOUR]), "sum": np.array([1.0, 2.0]), "count": np.array([1, 2]),
+               "max": np.array([1.0, 1.5]), "p95": np.array([1.0, 1.4])}
+    assert store.watermark("tenant", HOUR) is None
+    assert store.write("tenant", HOUR, {"*": {"octets": buckets, "flows": buckets}, "SSH": {"octets": buckets}}, 2 * HOUR) == 6
+    # Rolled up again: replaced, not duplicated
+    store.write("tenant", HOUR, {"*": {"octets": {**buckets, "sum": np.array([3.0, 4.0])}}}, 2 * HOUR)
+    assert store.watermark("tenant", HOUR) == 2 * HOUR
+    read = store.read("tenant", HOUR, "*", HOUR, 2 * HOUR)
+    assert sorted(read) == ["flows", "octets"]
+    assert read["octets"]["ts"].tolist() == [HOUR] and read["octets"]["sum"].tolist() == [4.0]
+    assert store.read("tenant", DAY, "*", 0, DAY) == {}
+    assert store.lock() and store.lock()
+
+
+class _fake_db:
+    def __init__(self, ts_uuid: str) -> None:
+        self._ts_uuid = ts_uuid
+
+    async def fetch(self, start: int, end: int, options: dict) -> dict:
+        timestamps = np.arange(start // 300 * 300 + 300, end + 1, 300, dtype=np.int64)
+        value = 1.0 if self._ts_uuid == "a" else 2.0
+        return {"m1": {"step": 300, "start": start, "end": end, "timestamps": timestamps,
+                       "columns": {"octets": np.full(len(timestamps), value)}}}
+
+
+class _fake_index:
+    async def search(self, terms: list[str], limit: int | None = None) -> list[dict]:
+        items = [{"ts_uuid": "a", "uuid": "m1", "tags": ["SSH"], "fields": {}},
+                 {"ts_uuid": "b", "uuid": "m1", "tags": [], "fields": {}}]
+        return [item for item in items if all(term in item["tags"] for term in terms)]
+
+
+def test_rollups_resume_at_watermarks_and_serve_queries(tmp_path, monkeypatch):
+    store = sqlite_rollups(str(tmp_path / "rollups.sqlite"))
+    for module in (rollups_module, business_module):
+        monkeypatch.setattr(module, "rollupStore", lambda: store)
+        monkeypatch.setattr(module, "timeSeriesTenant", lambda: "tenant")
+        monkeypatch.setattr(module, "timeSeriesIndex", lambda: _fake_index())
+        monkeypatch.setattr(module, "timeSeriesDb", lambda ts_uuid: _fake_db(ts_uuid))
+    monkeypatch.setattr(rollups_module, "ROLLUP_DELAY", 0)
+    monkeypatch.setattr(rollups_module, "ROLLUP_BACKFILL_DAYS", 3)
+    monkeypatch.setattr(rollups_module, "ROLLUP_WINDOW_DAYS", 1)
+    now = 100 * DAY + 5 * HOUR + 10
+    result = asyncio.run(rollups_module.run_rollups(now, [HOUR, DAY]))
+    assert result["watermarks"] == {HOUR: 100 * DAY + 5 * HOUR, DAY: 100 * DAY}
+    hourly = store.read("tenant", HOUR, "*", 0, now)["octets"]
+    assert hourly["ts"][0] == 97 * DAY and hourly["ts"][-1] == 100 * DAY + 4 * HOUR
+    assert (hourly["sum"] == 36).all() and (hourly["count"] == 12).all() and (hourly["max"] == 3).all()
+    assert (store.read("tenant", DAY, "SSH", 0, now)["octets"]["sum"] == 288).all()
+    # Nothing left to roll up until the next bucket is complete
+    assert asyncio.run(rollups_module.run_rollups(now + 60, [HOUR, DAY]))["buckets"] == 0
+
+    monkeypatch.setattr(business_module, "ROLLUP_TIERS", [HOUR, DAY])
+    daily = asyncio.run(business_module.query_rollups("*", 97 * DAY, 100 * DAY, points=3, stat="avg"))
+    assert daily["tier"] == DAY and daily["watermark"] == 100 * DAY
+    (series,) = daily["series"]
+    assert series["timestamps"] == [98 * DAY, 99 * DAY, 100 * DAY] and series["columns"]["octets"] == [3, 3, 3]
+    with pytest.raises(ValueError):
+        asyncio.run(business_module.query_rollups(stat="median"))
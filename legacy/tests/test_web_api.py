@@ -3,12 +3,20 @@ from pytest import fixture
 from fastapi.testclient import TestClient
 
 from src.adapters.web_api.fastapi.web_server import web_app
+from core.use_cases.file_exporter import scheduler
 
 
 @fixture
 def client():
     return TestClient(web_app)
 
+@fixture
+def export_journal(tmp_path, monkeypatch):
+    # The scheduler (started by the first export) journals to tmp_path, not to the host
+    journal = tmp_path / "export_queue.journal"
+    monkeypatch.setattr(scheduler, "JOURNAL_PATH", journal)
+    return journal
+
 @fixture
 def time_series_uuid():
     return [
@@ -24,13 +32,14 @@ def test_health_check(client):
     assert response.status_code == 200
     assert response.json() == {"status": "healthy"}
 
-def test_export_fake_task(client):
+def test_export_fake_task(client, export_journal):
     response = client.post("/api/v1/test/file_exporter/export_task")
     data = response.json()
 
-    assert response.status_code == 200
+    assert response.status_code == 202
     assert "task_id" in data
-    assert data["status"] == "export task started"
+    assert data["status"] == "queued" and data["queue_position"] >= 0
+    assert data["task_id"] in export_journal.read_text()
 
 def test_fake_time_series(client, time_series_uuid):
     response = client.get(f"/api/v1/test/time_series/{time_series_uuid[0]}")